@@ -50,9 +50,19 @@ NS_PREFIX = 'qdhcp-'
 METADATA_DEFAULT_PREFIX = 16
 METADATA_DEFAULT_IP = '169.254.169.254/%d' % METADATA_DEFAULT_PREFIX
 METADATA_PORT = 80
+# Number of networks fetched by each call of a digest sync
+SYNC_NETWORKS_BATCH_SIZE = 100
 
 
 class DhcpAgent(manager.Manager):
+    """DHCP agent.
+
+    RPC API version history:
+        1.0 - Initial version.
+        1.1 - Added network_changed.
+    """
+    RPC_API_VERSION = '1.1'
+
     OPTS = [
         cfg.IntOpt('resync_interval', default=5,
                    help=_("Interval to resync.")),
@@ -69,6 +79,16 @@ class DhcpAgent(manager.Manager):
                            "enable_isolated_metadata = True")),
         cfg.IntOpt('num_sync_threads', default=4,
                    help=_('Number of threads to use during sync process.')),
+        cfg.BoolOpt('sync_network_digests', default=False,
+                    help=_("Synchronize the state by fetching a digest of "
+                           "each network first, and then only the networks "
+                           "whose digest changed since they were last "
+                           "configured.")),
+        cfg.FloatOpt('dhcp_reload_delay', default=0.5,
+                     help=_("Seconds to wait after a port event before "
+                            "reloading the DHCP server, so that a burst of "
+                            "port events results in a single reload. 0 "
+                            "reloads on every event.")),
     ]
 
     def __init__(self, host=None):
@@ -76,6 +96,8 @@ class DhcpAgent(manager.Manager):
         self.needs_resync = False
         self.conf = cfg.CONF
         self.cache = NetworkCache()
+        self.pending_reloads = set()
+        self._reload_thread = None
         self.root_helper = config.get_root_helper(self.conf)
         self.dhcp_driver_cls = importutils.import_class(self.conf.dhcp_driver)
         ctx = context.get_admin_context_without_session()
@@ -153,8 +175,16 @@ class DhcpAgent(manager.Manager):
         known_network_ids = set(self.cache.get_network_ids())
 
         try:
-            active_networks = self.plugin_rpc.get_active_networks_info()
-            active_network_ids = set(network.id for network in active_networks)
+            digests = None
+            if self.conf.sync_network_digests:
+                digests = self._get_network_digests()
+            if digests is None:
+                active_networks = self.plugin_rpc.get_active_networks_info()
+                active_network_ids = set(network.id
+                                         for network in active_networks)
+            else:
+                active_network_ids = set(digests)
+                active_networks = self._get_changed_networks(digests)
             for deleted_id in known_network_ids - active_network_ids:
                 try:
                     self.disable_dhcp_helper(deleted_id)
@@ -169,6 +199,33 @@ class DhcpAgent(manager.Manager):
         except Exception:
             self.needs_resync = True
             LOG.exception(_('Unable to sync network state.'))
+        pool.waitall()
+
+    def _get_network_digests(self):
+        """Return the digest of each active network, or None if the
+        plugin does not provide them.
+        """
+        try:
+            return self.plugin_rpc.get_active_networks_digests()
+        except Exception:
+            LOG.exception(_('Unable to get the network digests, '
+                            'synchronizing all the networks.'))
+            return None
+
+    def _get_changed_networks(self, digests):
+        """Fetch the networks whose digest changed, a batch at a time."""
+        changed_ids = []
+        for network_id, digest in digests.iteritems():
+            network = self.cache.get_network_by_id(network_id)
+            if getattr(network, 'digest', None) != digest:
+                changed_ids.append(network_id)
+        LOG.info(_('%(changed)d of %(total)d networks changed'),
+                 {'changed': len(changed_ids), 'total': len(digests)})
+        for i in xrange(0, len(changed_ids), SYNC_NETWORKS_BATCH_SIZE):
+            batch = changed_ids[i:i + SYNC_NETWORKS_BATCH_SIZE]
+            for network in self.plugin_rpc.get_active_networks_info(
+                    network_ids=batch):
+                yield network
 
     def _periodic_resync_helper(self):
         """Resync the dhcp state at the configured interval."""
@@ -182,6 +239,29 @@ class DhcpAgent(manager.Manager):
         """Spawn a thread to periodically resync the dhcp state."""
         eventlet.spawn(self._periodic_resync_helper)
 
+    def schedule_reload(self, network):
+        """Reload the allocations of a network once the delay expires."""
+        if self.conf.dhcp_reload_delay <= 0:
+            self.call_driver('reload_allocations', network)
+            return
+
+        self.pending_reloads.add(network.id)
+        if not self._reload_thread:
+            self._reload_thread = eventlet.spawn_after(
+                self.conf.dhcp_reload_delay, self._reload_pending_networks)
+
+    @utils.synchronized('dhcp-agent')
+    def _reload_pending_networks(self):
+        """Reload every network that received port events since the last
+        reload.
+        """
+        self._reload_thread = None
+        network_ids, self.pending_reloads = self.pending_reloads, set()
+        for network_id in network_ids:
+            network = self.cache.get_network_by_id(network_id)
+            if network:
+                self.call_driver('reload_allocations', network)
+
     def enable_dhcp_helper(self, network_id):
         """Enable DHCP for a network that meets enabling criteria."""
         try:
@@ -235,8 +315,10 @@ class DhcpAgent(manager.Manager):
         new_cidrs = set(s.cidr for s in network.subnets if s.enable_dhcp)
 
         if new_cidrs and old_cidrs == new_cidrs:
-            self.call_driver('reload_allocations', network)
-            self.cache.put(network)
+            # Only cache the network once configured, so that the next
+            # sync retries a failed reload
+            if self.call_driver('reload_allocations', network):
+                self.cache.put(network)
         elif new_cidrs:
             if self.call_driver('restart', network):
                 self.cache.put(network)
@@ -290,7 +372,7 @@ class DhcpAgent(manager.Manager):
         network = self.cache.get_network_by_id(port.network_id)
         if network:
             self.cache.put_port(port)
-            self.call_driver('reload_allocations', network)
+            self.schedule_reload(network)
 
     # Use the update handler for the port create event.
     port_create_end = port_update_end
@@ -302,7 +384,16 @@ class DhcpAgent(manager.Manager):
         if port:
             network = self.cache.get_network_by_id(port.network_id)
             self.cache.remove_port(port)
-            self.call_driver('reload_allocations', network)
+            self.schedule_reload(network)
+
+    @utils.synchronized('dhcp-agent')
+    def network_changed(self, context, payload):
+        """Handle the port and subnet events of a network merged by the
+        server.
+        """
+        LOG.debug(_("Network %(network_id)s changed, ports %(port_ids)s"),
+                  payload)
+        self.refresh_dhcp_helper(payload['network_id'])
 
     def enable_isolated_metadata_proxy(self, network):
 
@@ -374,14 +465,27 @@ class DhcpPluginApi(proxy.RpcProxy):
         self.context = context
         self.host = cfg.CONF.host
 
-    def get_active_networks_info(self):
-        """Make a remote process call to retrieve all network info."""
+    def get_active_networks_info(self, network_ids=None):
+        """Make a remote process call to retrieve all network info.
+
+        Only the networks listed in network_ids are retrieved if given.
+        """
+        kwargs = {'host': self.host}
+        if network_ids is not None:
+            kwargs['network_ids'] = network_ids
         networks = self.call(self.context,
                              self.make_msg('get_active_networks_info',
-                                           host=self.host),
+                                           **kwargs),
                              topic=self.topic)
         return [DictModel(n) for n in networks]
 
+    def get_active_networks_digests(self):
+        """Make a remote process call to retrieve the network digests."""
+        return self.call(self.context,
+                         self.make_msg('get_active_networks_digests',
+                                       host=self.host),
+                         topic=self.topic)
+
     def get_network_info(self, network_id):
         """Make a remote process call to retrieve network info."""
         return DictModel(self.call(self.context,
@@ -452,6 +556,8 @@ class NetworkCache(object):
         self.cache = {}
         self.subnet_lookup = {}
         self.port_lookup = {}
+        # network id -> {port id: position in network.ports}
+        self.port_index = {}
 
     def get_network_ids(self):
         return self.cache.keys()
@@ -477,8 +583,12 @@ class NetworkCache(object):
         for port in network.ports:
             self.port_lookup[port.id] = network.id
 
+        self.port_index[network.id] = dict(
+            (port.id, index) for index, port in enumerate(network.ports))
+
     def remove(self, network):
         del self.cache[network.id]
+        self.port_index.pop(network.id, None)
 
         for subnet in network.subnets:
             del self.subnet_lookup[subnet.id]
@@ -488,30 +598,37 @@ class NetworkCache(object):
 
     def put_port(self, port):
         network = self.get_network_by_id(port.network_id)
-        for index in range(len(network.ports)):
-            if network.ports[index].id == port.id:
-                network.ports[index] = port
-                break
-        else:
+        port_index = self.port_index.setdefault(network.id, {})
+        index = port_index.get(port.id)
+        if index is None:
+            port_index[port.id] = len(network.ports)
             network.ports.append(port)
+        else:
+            network.ports[index] = port
 
         self.port_lookup[port.id] = network.id
 
     def remove_port(self, port):
         network = self.get_network_by_port_id(port.id)
+        port_index = self.port_index.get(network.id, {})
+        index = port_index.pop(port.id, None)
+        if index is None:
+            return
 
-        for index in range(len(network.ports)):
-            if network.ports[index] == port:
-                del network.ports[index]
-                del self.port_lookup[port.id]
-                break
+        # Move the last port into the freed slot so that removal does not
+        # shift the whole list.
+        last = network.ports.pop()
+        if index < len(network.ports):
+            network.ports[index] = last
+            port_index[last.id] = index
+        del self.port_lookup[port.id]
 
     def get_port_by_id(self, port_id):
         network = self.get_network_by_port_id(port_id)
         if network:
-            for port in network.ports:
-                if port.id == port_id:
-                    return port
+            index = self.port_index.get(network.id, {}).get(port_id)
+            if index is not None:
+                return network.ports[index]
 
     def get_state(self):
         net_ids = self.get_network_ids()
@@ -17,7 +17,11 @@
 # @author: Dan Wendlandt, Nicira, Inc
 #
 
+import heapq
+import itertools
+
 import eventlet
+from eventlet import semaphore
 import netaddr
 from oslo.config import cfg
 
@@ -42,6 +46,7 @@ from neutron.openstack.common import periodic_task
 from neutron.openstack.common.rpc import common as rpc_common
 from neutron.openstack.common.rpc import proxy
 from neutron.openstack.common import service
+from neutron.openstack.common import timeutils
 from neutron import service as neutron_service
 
 
@@ -50,6 +55,9 @@ NS_PREFIX = 'qrouter-'
 INTERNAL_DEV_PREFIX = 'qr-'
 EXTERNAL_DEV_PREFIX = 'qg-'
 RPC_LOOP_INTERVAL = 1
+# Lower values are processed first
+PRIORITY_RPC = 0
+PRIORITY_SYNC_ROUTERS_TASK = 1
 
 
 class L3PluginApi(proxy.RpcProxy):
@@ -138,6 +146,94 @@ class RouterInfo(object):
         self._snat_action = None
 
 
+class RouterUpdate(object):
+    """A router to process, or to remove when router is None."""
+
+    def __init__(self, router_id, priority, timestamp=None, router=None):
+        self.router_id = router_id
+        self.priority = priority
+        # When the state of the router was fetched from the server
+        self.timestamp = timestamp or timeutils.utcnow()
+        self.router = router
+
+    def merge(self, update):
+        """Keep the newest state and the highest priority of both."""
+        if update.timestamp >= self.timestamp:
+            self.timestamp = update.timestamp
+            self.router = update.router
+        self.priority = min(self.priority, update.priority)
+
+
+class RouterProcessingQueue(object):
+    """The routers waiting to be processed by the workers.
+
+    A router has at most one update waiting: a new update of a waiting
+    router is merged into it. The update of a router being processed is
+    held back until the router is done, so that the same router is never
+    processed by two workers at the same time.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        # The update waiting for each router, which is in the heap
+        self._pending = {}
+        # The updates of the routers being processed
+        self._held = {}
+        self._processing = set()
+        # Counts the waiting routers
+        self._ready = semaphore.Semaphore(0)
+
+    def __len__(self):
+        return len(self._pending) + len(self._held)
+
+    def add(self, update):
+        router_id = update.router_id
+        if router_id in self._processing:
+            if router_id in self._held:
+                self._held[router_id].merge(update)
+            else:
+                self._held[router_id] = update
+            return
+        pending = self._pending.get(router_id)
+        if pending is None:
+            self._pending[router_id] = update
+            self._push(update)
+            self._ready.release()
+            return
+        priority = pending.priority
+        pending.merge(update)
+        if pending.priority != priority:
+            # The entry with the previous priority is skipped by get()
+            self._push(pending)
+
+    def _push(self, update):
+        heapq.heappush(self._heap,
+                       (update.priority, next(self._counter), update))
+
+    def get(self):
+        """Wait for the next router to process.
+
+        The router is being processed until done() is called for it.
+        """
+        self._ready.acquire()
+        while True:
+            priority, _count, update = heapq.heappop(self._heap)
+            if (self._pending.get(update.router_id) is update and
+                    update.priority == priority):
+                break
+        del self._pending[update.router_id]
+        self._processing.add(update.router_id)
+        return update
+
+    def done(self, router_id):
+        """Queue the update of the router received while processing it."""
+        self._processing.discard(router_id)
+        update = self._held.pop(router_id, None)
+        if update:
+            self.add(update)
+
+
 class L3NATAgent(manager.Manager):
     """Manager for L3NatAgent
 
@@ -181,6 +277,9 @@ class L3NATAgent(manager.Manager):
                           "by the agents.")),
         cfg.BoolOpt('enable_metadata_proxy', default=True,
                     help=_("Allow running metadata proxy.")),
+        cfg.IntOpt('router_workers', default=8,
+                   help=_("Number of routers processed at the same "
+                          "time.")),
     ]
 
     def __init__(self, host, conf=None):
@@ -208,6 +307,7 @@ class L3NATAgent(manager.Manager):
         self.fullsync = True
         self.updated_routers = set()
         self.removed_routers = set()
+        self.router_queue = RouterProcessingQueue()
         self.sync_progress = False
         if self.conf.use_namespaces:
             self._destroy_router_namespaces(self.conf.router_id)
@@ -624,14 +724,19 @@ class L3NATAgent(manager.Manager):
         LOG.debug(_('Got router added to agent :%r'), payload)
         self.routers_updated(context, payload)
 
-    def _process_routers(self, routers, all_routers=False):
-        pool = eventlet.GreenPool()
+    def _process_routers(self, routers, all_routers=False,
+                         priority=PRIORITY_RPC, timestamp=None):
+        """Queue the routers to process and to remove.
+
+        :param timestamp: when the routers were fetched from the server.
+        """
         if (self.conf.external_network_bridge and
             not ip_lib.device_exists(self.conf.external_network_bridge)):
             LOG.error(_("The external network bridge '%s' does not exist"),
                       self.conf.external_network_bridge)
             return
 
+        timestamp = timestamp or timeutils.utcnow()
         target_ex_net_id = self._fetch_external_net_id()
         # if routers are all the routers we have (They are from router sync on
         # starting or when error occurs during running), we seek the
@@ -659,15 +764,34 @@ class L3NATAgent(manager.Manager):
             if ex_net_id and ex_net_id != target_ex_net_id:
                 continue
             cur_router_ids.add(r['id'])
-            if r['id'] not in self.router_info:
-                self._router_added(r['id'], r)
-            ri = self.router_info[r['id']]
-            ri.router = r
-            pool.spawn_n(self.process_router, ri)
+            self.router_queue.add(
+                RouterUpdate(r['id'], priority, timestamp, router=r))
         # identify and remove routers that no longer exist
         for router_id in prev_router_ids - cur_router_ids:
-            pool.spawn_n(self._router_removed, router_id)
-        pool.waitall()
+            self.router_queue.add(
+                RouterUpdate(router_id, priority, timestamp))
+
+    def _process_router_update(self, update):
+        router_id = update.router_id
+        try:
+            if update.router is None:
+                if router_id in self.router_info:
+                    self._router_removed(router_id)
+            else:
+                if router_id not in self.router_info:
+                    self._router_added(router_id, update.router)
+                ri = self.router_info[router_id]
+                ri.router = update.router
+                self.process_router(ri)
+        except Exception:
+            LOG.exception(_("Failed processing router %s"), router_id)
+            self.fullsync = True
+        finally:
+            self.router_queue.done(router_id)
+
+    def _process_router_loop(self):
+        while True:
+            self._process_router_update(self.router_queue.get())
 
     @lockutils.synchronized('l3-agent', 'neutron-')
     def _rpc_loop(self):
@@ -679,9 +803,10 @@ class L3NATAgent(manager.Manager):
             if self.updated_routers:
                 router_ids = list(self.updated_routers)
                 self.updated_routers.clear()
+                timestamp = timeutils.utcnow()
                 routers = self.plugin_rpc.get_routers(
                     self.context, router_ids)
-                self._process_routers(routers)
+                self._process_routers(routers, timestamp=timestamp)
             self._process_router_delete()
         except Exception:
             LOG.exception(_("Failed synchronizing routers"))
@@ -690,7 +815,7 @@ class L3NATAgent(manager.Manager):
     def _process_router_delete(self):
         current_removed_routers = list(self.removed_routers)
         for router_id in current_removed_routers:
-            self._router_removed(router_id)
+            self.router_queue.add(RouterUpdate(router_id, PRIORITY_RPC))
             self.removed_routers.remove(router_id)
 
     def _router_ids(self):
@@ -706,17 +831,22 @@ class L3NATAgent(manager.Manager):
             router_ids = self._router_ids()
             self.updated_routers.clear()
             self.removed_routers.clear()
+            timestamp = timeutils.utcnow()
             routers = self.plugin_rpc.get_routers(
                 context, router_ids)
 
             LOG.debug(_('Processing :%r'), routers)
-            self._process_routers(routers, all_routers=True)
+            self._process_routers(routers, all_routers=True,
+                                  priority=PRIORITY_SYNC_ROUTERS_TASK,
+                                  timestamp=timestamp)
             self.fullsync = False
         except Exception:
             LOG.exception(_("Failed synchronizing routers"))
             self.fullsync = True
 
     def after_start(self):
+        for i in xrange(self.conf.router_workers):
+            eventlet.spawn_n(self._process_router_loop)
         LOG.info(_("L3 agent started"))
 
     def _update_routing_table(self, ri, operation, route):
@@ -121,6 +121,11 @@ class DhcpLocalProcess(DhcpBase):
         interface_name = self.device_delegate.setup(self.network,
                                                     reuse_existing=True)
         if self.active:
+            if (self.interface_name == interface_name and
+                    self._config_unchanged()):
+                LOG.debug(_('DHCP configuration of network %s is '
+                            'unchanged'), self.network.id)
+                return
             self.restart()
         elif self._enable_dhcp():
             self.interface_name = interface_name
@@ -144,6 +149,12 @@ class DhcpLocalProcess(DhcpBase):
 
         self._remove_config_files()
 
+    def _config_unchanged(self):
+        """Tell whether the running process already has the current
+        configuration of the network, and needs no restart.
+        """
+        return False
+
     def _remove_config_files(self):
         confs_dir = os.path.abspath(os.path.normpath(self.conf.dhcp_confs))
         conf_dir = os.path.join(confs_dir, self.network.id)
@@ -257,8 +268,8 @@ class Dnsmasq(DhcpLocalProcess):
                 cls(conf, FakeNetwork(c), root_helper).active)
         ]
 
-    def spawn_process(self):
-        """Spawns a Dnsmasq process for the network."""
+    def _build_cmdline(self):
+        """Return the environment and the command spawning dnsmasq."""
         env = {
             self.NEUTRON_NETWORK_ID_KEY: self.network.id,
             self.NEUTRON_RELAY_SOCKET_PATH_KEY:
@@ -273,12 +284,11 @@ class Dnsmasq(DhcpLocalProcess):
             '--bind-interfaces',
             '--interface=%s' % self.interface_name,
             '--except-interface=lo',
-            '--pid-file=%s' % self.get_conf_file_name(
-                'pid', ensure_conf_dir=True),
+            '--pid-file=%s' % self.get_conf_file_name('pid'),
             #TODO (mark): calculate value from cidr (defaults to 150)
             #'--dhcp-lease-max=%s' % ?,
-            '--dhcp-hostsfile=%s' % self._output_hosts_file(),
-            '--dhcp-optsfile=%s' % self._output_opts_file(),
+            '--dhcp-hostsfile=%s' % self.get_conf_file_name('host'),
+            '--dhcp-optsfile=%s' % self.get_conf_file_name('opts'),
             '--dhcp-script=%s' % self._lease_relay_script_path(),
             '--leasefile-ro',
         ]
@@ -310,6 +320,24 @@ class Dnsmasq(DhcpLocalProcess):
         if self.conf.dhcp_domain:
             cmd.append('--domain=%s' % self.conf.dhcp_domain)
 
+        return env, cmd
+
+    @staticmethod
+    def _format_cmdline(env, cmd):
+        return '\n'.join(['%s=%s' % pair for pair in sorted(env.items())] +
+                         cmd)
+
+    def spawn_process(self):
+        """Spawns a Dnsmasq process for the network."""
+        env, cmd = self._build_cmdline()
+        # Kept to tell whether the process needs a restart for changed
+        # options, which dnsmasq only reads from its command line
+        utils.replace_file(
+            self.get_conf_file_name('cmdline', ensure_conf_dir=True),
+            self._format_cmdline(env, cmd))
+        self._output_hosts_file()
+        self._output_opts_file()
+
         if self.namespace:
             ip_wrapper = ip_lib.IPWrapper(self.root_helper, self.namespace)
             ip_wrapper.netns.execute(cmd, addl_env=env)
@@ -319,7 +347,11 @@ class Dnsmasq(DhcpLocalProcess):
             utils.execute(cmd, self.root_helper)
 
     def reload_allocations(self):
-        """Rebuild the dnsmasq config and signal the dnsmasq to reload."""
+        """Rebuild the dnsmasq config and signal the dnsmasq to reload.
+
+        The signal is skipped when neither the hosts nor the options file
+        changed, since dnsmasq would only reread the same entries.
+        """
 
         # If all subnets turn off dhcp, kill the process.
         if not self._enable_dhcp():
@@ -328,8 +360,13 @@ class Dnsmasq(DhcpLocalProcess):
                         'turned off DHCP: %s'), self.network.id)
             return
 
-        self._output_hosts_file()
-        self._output_opts_file()
+        hosts_changed = self._write_conf_file('host', self._build_hosts())
+        opts_changed = self._write_conf_file('opts', self._build_opts())
+        if not (hosts_changed or opts_changed):
+            LOG.debug(_('Allocations for network %s are unchanged'),
+                      self.network.id)
+            return
+
         if self.active:
             cmd = ['kill', '-HUP', self.pid]
             utils.execute(cmd, self.root_helper)
@@ -337,8 +374,21 @@ class Dnsmasq(DhcpLocalProcess):
             LOG.debug(_('Pid %d is stale, relaunching dnsmasq'), self.pid)
         LOG.debug(_('Reloading allocations for network: %s'), self.network.id)
 
-    def _output_hosts_file(self):
-        """Writes a dnsmasq compatible hosts file."""
+    def _config_unchanged(self):
+        cmdline = self._get_value_from_conf_file('cmdline')
+        hosts = self._get_value_from_conf_file('host')
+        opts = self._get_value_from_conf_file('opts')
+        return (cmdline == self._format_cmdline(*self._build_cmdline()) and
+                hosts == self._build_hosts() and opts == self._build_opts())
+
+    def _write_conf_file(self, kind, data):
+        """Replace a config file, returning False if it already held data."""
+        if self._get_value_from_conf_file(kind) == data:
+            return False
+        utils.replace_file(self.get_conf_file_name(kind), data)
+        return True
+
+    def _build_hosts(self):
         r = re.compile('[:.]')
         buf = StringIO.StringIO()
 
@@ -348,14 +398,15 @@ class Dnsmasq(DhcpLocalProcess):
                                        self.conf.dhcp_domain)
                 buf.write('%s,%s,%s\n' %
                           (port.mac_address, name, alloc.ip_address))
+        return buf.getvalue()
 
+    def _output_hosts_file(self):
+        """Writes a dnsmasq compatible hosts file."""
         name = self.get_conf_file_name('host')
-        utils.replace_file(name, buf.getvalue())
+        utils.replace_file(name, self._build_hosts())
         return name
 
-    def _output_opts_file(self):
-        """Write a dnsmasq compatible options file."""
-
+    def _build_opts(self):
         if self.conf.enable_isolated_metadata:
             subnet_to_interface_ip = self._make_subnet_interface_ip_map()
 
@@ -402,8 +453,12 @@ class Dnsmasq(DhcpLocalProcess):
                 else:
                     options.append(self._format_option(i, 'router'))
 
+        return '\n'.join(options)
+
+    def _output_opts_file(self):
+        """Write a dnsmasq compatible options file."""
         name = self.get_conf_file_name('opts')
-        utils.replace_file(name, '\n'.join(options))
+        utils.replace_file(name, self._build_opts())
         return name
 
     def _make_subnet_interface_ip_map(self):
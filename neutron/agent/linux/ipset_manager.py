@@ -0,0 +1,80 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Manages ipset hash:ip sets through the ipset utility."""
+
+from neutron.agent.linux import utils as linux_utils
+from neutron.common import constants
+from neutron.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# ipset refuses set names longer than 31 characters
+MAX_SET_NAME_LEN = 31
+SET_FAMILY = {constants.IPv4: 'inet',
+              constants.IPv6: 'inet6'}
+
+
+def get_set_name(id, ethertype):
+    return ('%s%s' % (ethertype, id))[:MAX_SET_NAME_LEN]
+
+
+class IpsetManager(object):
+    """Keeps hash:ip sets in line with the members they should hold.
+
+    The members of each set are remembered, so updating a set only adds
+    and deletes the addresses that changed, in a single 'ipset restore'.
+    """
+
+    def __init__(self, _execute=None, root_helper=None):
+        if _execute:
+            self.execute = _execute
+        else:
+            self.execute = linux_utils.execute
+        self.root_helper = root_helper
+        # set name -> members of the set
+        self.sets = {}
+
+    def set_members(self, name, ethertype, members):
+        """Make the set name hold exactly members, creating it if needed."""
+        members = set(members)
+        commands = []
+        if name not in self.sets:
+            # The set may be left over from a previous run of the agent
+            commands.append('create %s hash:ip family %s' %
+                            (name, SET_FAMILY[ethertype]))
+            commands.append('flush %s' % name)
+            current = set()
+        else:
+            current = self.sets[name]
+        commands += ['add %s %s' % (name, ip) for ip in members - current]
+        commands += ['del %s %s' % (name, ip) for ip in current - members]
+        if commands:
+            self._restore(commands)
+        self.sets[name] = members
+
+    def destroy(self, name):
+        """Destroy the set name. No iptables rule may still reference it."""
+        self.execute(['ipset', 'destroy', name],
+                     root_helper=self.root_helper)
+        self.sets.pop(name, None)
+
+    def _restore(self, commands):
+        LOG.debug(_("Updating ipsets: %s"), commands)
+        self.execute(['ipset', 'restore', '-exist'],
+                     process_input='\n'.join(commands) + '\n',
+                     root_helper=self.root_helper)
@@ -19,12 +19,15 @@ import netaddr
 from oslo.config import cfg
 
 from neutron.agent import firewall
+from neutron.agent.linux import ipset_manager
 from neutron.agent.linux import iptables_manager
 from neutron.common import constants
 from neutron.openstack.common import log as logging
 
 
 LOG = logging.getLogger(__name__)
+cfg.CONF.import_opt('enable_ipset', 'neutron.agent.securitygroups_rpc',
+                    'SECURITYGROUP')
 SG_CHAIN = 'sg-chain'
 INGRESS_DIRECTION = 'ingress'
 EGRESS_DIRECTION = 'egress'
@@ -33,6 +36,11 @@ CHAIN_NAME_PREFIX = {INGRESS_DIRECTION: 'i',
                      EGRESS_DIRECTION: 'o',
                      IP_SPOOF_FILTER: 's'}
 LINUX_DEV_LEN = 14
+# the server expands remote group rules into one rule per member address
+DIRECTION_IP_PREFIX = {INGRESS_DIRECTION: 'source_ip_prefix',
+                       EGRESS_DIRECTION: 'dest_ip_prefix'}
+IPSET_DIRECTION = {INGRESS_DIRECTION: 'src',
+                   EGRESS_DIRECTION: 'dst'}
 
 
 class IptablesFirewallDriver(firewall.FirewallDriver):
@@ -49,6 +57,13 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self._add_fallback_chain_v4v6()
         self._defer_apply = False
         self._pre_defer_filtered_ports = None
+        self._chains_changed = False
+        # one hash:ip set per remote group and ethertype replaces the
+        # per member rules of the remote group
+        self.ipset = None
+        if cfg.CONF.SECURITYGROUP.enable_ipset:
+            self.ipset = ipset_manager.IpsetManager(
+                root_helper=cfg.CONF.AGENT.root_helper)
 
     @property
     def ports(self):
@@ -60,7 +75,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self.filtered_ports[port['device']] = port
         # each security group has it own chains
         self._setup_chains()
-        self.iptables.apply()
+        self._apply()
 
     def update_port_filter(self, port):
         LOG.debug(_("Updating device (%s) filter"), port['device'])
@@ -68,10 +83,18 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             LOG.info(_('Attempted to update port filter which is not '
                        'filtered %s'), port['device'])
             return
+        if self.ipset and self._only_members_changed(port):
+            LOG.debug(_("Updating remote group sets of device (%s)"),
+                      port['device'])
+            self.filtered_ports[port['device']] = port
+            if not self._defer_apply:
+                self._update_ipsets(self.filtered_ports)
+                self._remove_unused_ipsets()
+            return
         self._remove_chains()
         self.filtered_ports[port['device']] = port
         self._setup_chains()
-        self.iptables.apply()
+        self._apply()
 
     def remove_port_filter(self, port):
         LOG.debug(_("Removing device (%s) filter"), port['device'])
@@ -82,14 +105,24 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self._remove_chains()
         self.filtered_ports.pop(port['device'], None)
         self._setup_chains()
+        self._apply()
+
+    def _apply(self):
         self.iptables.apply()
+        if not self._defer_apply:
+            self._remove_unused_ipsets()
 
     def _setup_chains(self):
         """Setup ingress and egress chain for a port."""
         if not self._defer_apply:
             self._setup_chains_apply(self.filtered_ports)
+        else:
+            self._chains_changed = True
 
     def _setup_chains_apply(self, ports):
+        if self.ipset:
+            # the sets must exist before any rule references them
+            self._update_ipsets(ports)
         self._add_chain_by_name_v4v6(SG_CHAIN)
         for port in ports.values():
             self._setup_chain(port, INGRESS_DIRECTION)
@@ -109,6 +142,60 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             self._remove_chain(port, IP_SPOOF_FILTER)
         self._remove_chain_by_name_v4v6(SG_CHAIN)
 
+    def _ipset_members(self, ports):
+        """Return the ethertype and members of each set used by ports."""
+        members = {}
+        for port in ports.values():
+            for rule in port.get('security_group_rules', []):
+                remote_group_id = rule.get('remote_group_id')
+                ip_prefix = rule.get(DIRECTION_IP_PREFIX[rule['direction']])
+                if not (remote_group_id and ip_prefix):
+                    continue
+                ethertype = rule['ethertype']
+                name = ipset_manager.get_set_name(remote_group_id, ethertype)
+                members.setdefault(name, (ethertype, set()))[1].add(
+                    ip_prefix.split('/')[0])
+        return members
+
+    def _update_ipsets(self, ports):
+        for name, (ethertype, ips) in self._ipset_members(ports).items():
+            self.ipset.set_members(name, ethertype, ips)
+
+    def _remove_unused_ipsets(self):
+        """Destroy the sets the applied rules no longer reference."""
+        if not self.ipset:
+            return
+        used = self._ipset_members(self.filtered_ports)
+        for name in set(self.ipset.sets) - set(used):
+            self.ipset.destroy(name)
+
+    def _collapse_remote_group_rules(self, security_group_rules):
+        """Merge the per member copies of each remote group rule.
+
+        The members are matched through the set of the remote group, so
+        the copies only differ by the member address.
+        """
+        collapsed = []
+        for rule in security_group_rules:
+            if rule.get('remote_group_id'):
+                rule = dict(rule)
+                rule.pop(DIRECTION_IP_PREFIX[rule['direction']], None)
+                if rule in collapsed:
+                    continue
+            collapsed.append(rule)
+        return collapsed
+
+    def _only_members_changed(self, port):
+        """Whether the chains of the filtered port stay the same."""
+        old_port = self.filtered_ports[port['device']]
+        return self._chain_key(old_port) == self._chain_key(port)
+
+    def _chain_key(self, port):
+        rules = port.get('security_group_rules', [])
+        return dict(port,
+                    security_group_rules=(
+                        self._collapse_remote_group_rules(rules)))
+
     def _setup_chain(self, port, DIRECTION):
         self._add_chain(port, DIRECTION)
         self._add_rule_by_security_group(port, DIRECTION)
@@ -176,7 +263,8 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
                 ipv4_sg_rules.append(rule)
             elif rule.get('ethertype') == constants.IPv6:
                 if rule.get('protocol') == 'icmp':
-                    rule['protocol'] = 'icmpv6'
+                    # the port keeps the rules as sent by the server
+                    rule = dict(rule, protocol='icmpv6')
                 ipv6_sg_rules.append(rule)
         return ipv4_sg_rules, ipv6_sg_rules
 
@@ -223,6 +311,9 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         chain_name = self._port_chain_name(port, direction)
         # select rules for current direction
         security_group_rules = self._select_sgr_by_direction(port, direction)
+        if self.ipset:
+            security_group_rules = self._collapse_remote_group_rules(
+                security_group_rules)
         # split groups by ip version
         # for ipv4, iptables command is used
         # for ipv6, iptables6 command is used
@@ -267,6 +358,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
                                    rule.get('protocol'),
                                    rule.get('port_range_min'),
                                    rule.get('port_range_max'))
+            args += self._ipset_arg(rule)
             args += ['-j RETURN']
             iptables_rules += [' '.join(args)]
 
@@ -305,6 +397,14 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
                     '--%ss' % direction,
                     '%s:%s' % (port_range_min, port_range_max)]
 
+    def _ipset_arg(self, rule):
+        remote_group_id = rule.get('remote_group_id')
+        if not (self.ipset and remote_group_id):
+            return []
+        name = ipset_manager.get_set_name(remote_group_id, rule['ethertype'])
+        return ['-m', 'set', '--match-set', name,
+                IPSET_DIRECTION[rule['direction']]]
+
     def _ip_prefix_arg(self, direction, ip_prefix):
         #NOTE (nati) : source_group_id is converted to list of source_
         # ip_prefix in server side
@@ -325,10 +425,17 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
     def filter_defer_apply_off(self):
         if self._defer_apply:
             self._defer_apply = False
-            self._remove_chains_apply(self._pre_defer_filtered_ports)
+            if self._chains_changed or not self.ipset:
+                self._remove_chains_apply(self._pre_defer_filtered_ports)
+                self._setup_chains_apply(self.filtered_ports)
+                self.iptables.defer_apply_off()
+            else:
+                # only the members of remote groups changed
+                self._update_ipsets(self.filtered_ports)
+                self.iptables.defer_apply_off(apply=False)
             self._pre_defer_filtered_ports = None
-            self._setup_chains_apply(self.filtered_ports)
-            self.iptables.defer_apply_off()
+            self._chains_changed = False
+            self._remove_unused_ipsets()
 
 
 class OVSHybridIptablesFirewallDriver(IptablesFirewallDriver):
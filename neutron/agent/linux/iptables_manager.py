@@ -23,6 +23,9 @@
 
 import inspect
 import os
+import time
+
+from oslo.config import cfg
 
 from neutron.agent.linux import utils as linux_utils
 from neutron.common import utils
@@ -30,6 +33,14 @@ from neutron.openstack.common import log as logging
 
 LOG = logging.getLogger(__name__)
 
+OPTS = [
+    cfg.BoolOpt('iptables_incremental_apply', default=True,
+                help=_("Only restore the chains of the agent that changed "
+                       "since its last apply, instead of saving and "
+                       "restoring the whole ruleset on every apply")),
+]
+cfg.CONF.register_opts(OPTS, 'AGENT')
+
 
 # NOTE(vish): Iptables supports chain names of up to 28 characters,  and we
 #             add up to 12 characters to binary_name which is used as a prefix,
@@ -261,6 +272,10 @@ class IptablesManager(object):
         self.root_helper = root_helper
         self.namespace = namespace
         self.iptables_apply_deferred = False
+        self.incremental_apply = cfg.CONF.AGENT.iptables_incremental_apply
+        # command -> table name -> state of the table at the last apply,
+        # as returned by _table_state()
+        self._applied = {}
 
         self.ipv4 = {'filter': IptablesTable()}
         self.ipv6 = {'filter': IptablesTable()}
@@ -324,9 +339,11 @@ class IptablesManager(object):
     def defer_apply_on(self):
         self.iptables_apply_deferred = True
 
-    def defer_apply_off(self):
+    def defer_apply_off(self, apply=True):
+        """Stop deferring and apply, unless the caller changed nothing."""
         self.iptables_apply_deferred = False
-        self._apply()
+        if apply:
+            self._apply()
 
     def apply(self):
         if self.iptables_apply_deferred:
@@ -338,32 +355,136 @@ class IptablesManager(object):
     def _apply(self):
         """Apply the current in-memory set of iptables rules.
 
-        This will blow away any rules left over from previous runs of the
-        same component of Nova, and replace them with our current set of
-        rules. This happens atomically, thanks to iptables-restore.
+        The first apply, and any apply that changes the unwrapped chains
+        shared with other components, blows away any rules left over from
+        previous runs of the same component and replaces them with our
+        current set of rules, through iptables-save and iptables-restore.
+
+        Later applies only restore the wrapped chains that changed since
+        the last apply, with iptables-restore --noflush. Either way the
+        changes happen atomically.
 
         """
+        start = time.time()
         s = [('iptables', self.ipv4)]
         if self.use_ipv6:
             s += [('ip6tables', self.ipv6)]
 
+        applied = []
         for cmd, tables in s:
-            args = ['%s-save' % (cmd,), '-c']
-            if self.namespace:
-                args = ['ip', 'netns', 'exec', self.namespace] + args
-            all_tables = self.execute(args, root_helper=self.root_helper)
-            all_lines = all_tables.split('\n')
-            for table_name, table in tables.iteritems():
-                start, end = self._find_table(all_lines, table_name)
-                all_lines[start:end] = self._modify_rules(
-                    all_lines[start:end], table, table_name)
-
-            args = ['%s-restore' % (cmd,), '-c']
-            if self.namespace:
-                args = ['ip', 'netns', 'exec', self.namespace] + args
-            self.execute(args, process_input='\n'.join(all_lines),
-                         root_helper=self.root_helper)
-        LOG.debug(_("IPTablesManager.apply completed with success"))
+            state = dict((table_name, self._table_state(table))
+                         for table_name, table in tables.iteritems())
+            lines = self._incremental_restore_lines(cmd, tables, state)
+            # Forget the last apply until this one succeeded
+            self._applied.pop(cmd, None)
+            if lines is None:
+                self._apply_full(cmd, tables)
+                applied.append('%s: all chains' % cmd)
+            elif lines:
+                try:
+                    self._execute_restore(cmd, lines, ['-n'])
+                except RuntimeError:
+                    LOG.warn(_("Restoring the changed %s chains failed, "
+                               "restoring all chains"), cmd)
+                    self._apply_full(cmd, tables)
+                    applied.append('%s: all chains' % cmd)
+                else:
+                    applied.append(
+                        '%(cmd)s: %(count)d chains' %
+                        {'cmd': cmd,
+                         'count': len([l for l in lines
+                                       if l.startswith(':')])})
+            self._applied[cmd] = state
+        LOG.debug(_("IPTablesManager.apply completed with success in "
+                    "%(time).3f seconds (%(applied)s)"),
+                  {'time': time.time() - start,
+                   'applied': ', '.join(applied) or 'no changes'})
+
+    def _apply_full(self, cmd, tables):
+        args = ['%s-save' % (cmd,), '-c']
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        all_tables = self.execute(args, root_helper=self.root_helper)
+        all_lines = all_tables.split('\n')
+        for table_name, table in tables.iteritems():
+            start, end = self._find_table(all_lines, table_name)
+            all_lines[start:end] = self._modify_rules(
+                all_lines[start:end], table, table_name)
+
+        self._execute_restore(cmd, all_lines, ['-c'])
+
+    def _execute_restore(self, cmd, lines, options):
+        args = ['%s-restore' % (cmd,)] + options
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        self.execute(args, process_input='\n'.join(lines),
+                     root_helper=self.root_helper)
+
+    def _table_state(self, table):
+        """Return the shared part and the wrapped chains of a table.
+
+        The shared part holds the unwrapped chains and the rules of the
+        unwrapped chains, which other components may change as well. The
+        wrapped chains map to their rules, in the order they are applied.
+        """
+        chains = dict(('%s-%s' % (binary_name, name), [])
+                      for name in table.chains)
+        shared_rules = []
+        rules = ([rule for rule in table.rules if rule.top] +
+                 [rule for rule in table.rules if not rule.top])
+        for rule in rules:
+            if rule.wrap:
+                chain = '%s-%s' % (binary_name, rule.chain)
+                chains.setdefault(chain, []).append(str(rule))
+            else:
+                shared_rules.append(str(rule))
+        for chain, chain_rules in chains.iteritems():
+            # Like the full apply, keep the last of duplicated rules
+            seen = set()
+            unique = []
+            for rule in reversed(chain_rules):
+                if rule not in seen:
+                    seen.add(rule)
+                    unique.append(rule)
+            unique.reverse()
+            chains[chain] = unique
+        return (table.unwrapped_chains.copy(), shared_rules), chains
+
+    def _incremental_restore_lines(self, cmd, tables, state):
+        """Return the iptables-restore --noflush input for the changes.
+
+        Declaring a chain in the input creates it, or flushes it if it
+        exists, so each changed chain is declared and refilled. Removed
+        chains are flushed and then deleted. Returns None if the tables
+        have to be fully applied instead.
+        """
+        applied = self._applied.get(cmd)
+        if (not self.incremental_apply or applied is None or
+                set(applied) != set(state)):
+            return None
+        lines = []
+        for table_name, table in tables.iteritems():
+            if table.remove_chains or table.remove_rules:
+                return None
+            old_shared, old_chains = applied[table_name]
+            shared, chains = state[table_name]
+            if shared != old_shared:
+                return None
+            changed = [chain for chain, rules in chains.iteritems()
+                       if old_chains.get(chain) != rules]
+            removed = [chain for chain in old_chains if chain not in chains]
+            if not (changed or removed):
+                continue
+            lines.append('*%s' % table_name)
+            lines += [':%s - [0:0]' % chain
+                      for chain in sorted(changed + removed)]
+            for chain in sorted(changed):
+                lines += chains[chain]
+            lines += ['-X %s' % chain for chain in sorted(removed)]
+            lines.append('COMMIT')
+        if lines:
+            lines.append('')
+        return lines
 
     def _find_table(self, lines, table_name):
         if len(lines) < 3:
@@ -555,7 +676,6 @@ class IptablesManager(object):
 
         # flush lists, just in case we didn't find something
         remove_chains.clear()
-        for rule in remove_rules:
-            remove_rules.remove(rule)
+        del remove_rules[:]
 
         return new_filter
@@ -18,6 +18,8 @@
 # @author: Dan Wendlandt, Nicira Networks, Inc.
 # @author: Dave Lapsley, Nicira Networks, Inc.
 
+import contextlib
+import itertools
 import re
 
 from neutron.agent.linux import ip_lib
@@ -27,6 +29,8 @@ from neutron.openstack.common import log as logging
 from neutron.plugins.openvswitch.common import constants
 
 LOG = logging.getLogger(__name__)
+# --oneline prints newlines as \n and doubles backslashes
+ONELINE_ESCAPE_RE = re.compile(r'\\(.)')
 
 
 class VifPort:
@@ -44,11 +48,122 @@ class VifPort:
                 self.switch.br_name)
 
 
+class OVSCommand(object):
+    """A command queued in an OVSTransaction.
+
+    result holds the parsed output of the command once the transaction is
+    committed, or default if the transaction failed.
+    """
+    def __init__(self, args, parser=None, default=None):
+        self.args = args
+        self.parser = parser
+        self.result = default
+
+
+class OVSTransaction(object):
+    """Run many OVSDB commands with a single ovs-vsctl invocation.
+
+    ovs-vsctl applies the commands, separated by '--', in one OVSDB
+    transaction. With --oneline it prints one line of output per command,
+    which is parsed into the result of the matching OVSCommand.
+    """
+    def __init__(self, root_helper):
+        self.root_helper = root_helper
+        self.commands = []
+
+    def add_command(self, args, parser=None, default=None):
+        command = OVSCommand(args, parser, default)
+        self.commands.append(command)
+        return command
+
+    def add_port(self, br_name, port_name, interface_attrs=None):
+        """Add a port, setting the (column, value) pairs on its interface."""
+        self.add_command(["--may-exist", "add-port", br_name, port_name])
+        if interface_attrs:
+            self.add_command(["set", "Interface", port_name] +
+                             ["%s=%s" % attr for attr in interface_attrs])
+
+    def delete_port(self, br_name, port_name):
+        self.add_command(["--if-exists", "del-port", br_name, port_name])
+
+    def set_db_attribute(self, table_name, record, column, value):
+        self.add_command(["set", table_name, record,
+                          "%s=%s" % (column, value)])
+
+    def clear_db_attribute(self, table_name, record, column):
+        self.add_command(["clear", table_name, record, column])
+
+    def db_get_val(self, table, record, column):
+        return self.add_command(["get", table, record, column])
+
+    def db_get_map(self, table, record, column):
+        return self.add_command(["get", table, record, column],
+                                parser=db_str_to_map, default={})
+
+    def get_port_ofport(self, port_name):
+        """Queue a read of the ofport of a port, parsed to an int.
+
+        An ofport is only assigned once the transaction that added the port
+        completed, so it must be read in a later transaction. -1 is returned
+        for ports without an ofport.
+        """
+        return self.add_command(["get", "Interface", port_name, "ofport"],
+                                parser=_parse_ofport, default=-1)
+
+    def commit(self):
+        """Run the queued commands, returning False if ovs-vsctl failed."""
+        commands, self.commands = self.commands, []
+        if not commands:
+            return True
+        full_args = ["ovs-vsctl", "--timeout=2", "--oneline"]
+        for command in commands:
+            full_args += ["--"] + command.args
+        try:
+            output = utils.execute(full_args, root_helper=self.root_helper)
+        except Exception as e:
+            LOG.error(_("Unable to execute %(cmd)s. Exception: %(exception)s"),
+                      {'cmd': full_args, 'exception': e})
+            return False
+        for command, line in zip(commands, output.split("\n")):
+            line = ONELINE_ESCAPE_RE.sub(_unescape, line)
+            if command.parser:
+                command.result = command.parser(line)
+            else:
+                command.result = line
+        return True
+
+
+def _unescape(match):
+    char = match.group(1)
+    return char == 'n' and '\n' or char
+
+
+def _parse_ofport(value):
+    try:
+        return int(value)
+    except ValueError:
+        return -1
+
+
+def db_str_to_map(full_str):
+    list = full_str.strip("{}").split(", ")
+    ret = {}
+    for e in list:
+        if e.find("=") == -1:
+            continue
+        arr = e.split("=")
+        ret[arr[0]] = arr[1].strip("\"")
+    return ret
+
+
 class OVSBridge:
     def __init__(self, br_name, root_helper):
         self.br_name = br_name
         self.root_helper = root_helper
         self.re_id = self.re_compile_id()
+        self.defer_apply_flows = False
+        # (action, flow) pairs, in the order they were requested
+        self.deferred_flows = []
 
     def re_compile_id(self):
         external = 'external_ids\s*'
@@ -100,6 +215,45 @@ class OVSBridge:
             LOG.error(_("Unable to execute %(cmd)s. Exception: %(exception)s"),
                       {'cmd': full_args, 'exception': e})
 
+    def run_ofctl_batch(self, action, flows):
+        """Apply flow mods with a single ovs-ofctl reading them from stdin."""
+        full_args = ["ovs-ofctl", "%s-flows" % action, self.br_name, "-"]
+        try:
+            return utils.execute(full_args, root_helper=self.root_helper,
+                                 process_input='\n'.join(flows) + '\n')
+        except Exception as e:
+            LOG.error(_("Unable to execute %(cmd)s. Exception: %(exception)s"),
+                      {'cmd': full_args, 'exception': e})
+
+    def defer_apply_on(self):
+        LOG.debug(_('defer_apply_on'))
+        self.defer_apply_flows = True
+
+    def defer_apply_off(self):
+        LOG.debug(_('defer_apply_off'))
+        self.defer_apply_flows = False
+        self.apply_deferred_flows()
+
+    @contextlib.contextmanager
+    def defer_apply(self):
+        """Defer apply context."""
+        self.defer_apply_on()
+        try:
+            yield
+        finally:
+            self.defer_apply_off()
+
+    def apply_deferred_flows(self):
+        """Push the deferred flow mods to the bridge.
+
+        Consecutive mods of the same action are sent together, so that the
+        mods are applied in the order they were requested.
+        """
+        deferred_flows, self.deferred_flows = self.deferred_flows, []
+        for action, mods in itertools.groupby(deferred_flows,
+                                              lambda mod: mod[0]):
+            self.run_ofctl_batch(action, [flow for action, flow in mods])
+
     def count_flows(self):
         flow_list = self.run_ofctl("dump-flows", []).split("\n")[1:]
         return len(flow_list) - 1
@@ -155,7 +309,10 @@ class OVSBridge:
         flow_expr_arr = self._build_flow_expr_arr(**kwargs)
         flow_expr_arr.append("actions=%s" % (kwargs["actions"]))
         flow_str = ",".join(flow_expr_arr)
-        self.run_ofctl("add-flow", [flow_str])
+        if self.defer_apply_flows:
+            self.deferred_flows.append(('add', flow_str))
+        else:
+            self.run_ofctl("add-flow", [flow_str])
 
     def delete_flows(self, **kwargs):
         kwargs['delete'] = True
@@ -163,34 +320,64 @@ class OVSBridge:
         if "actions" in kwargs:
             flow_expr_arr.append("actions=%s" % (kwargs["actions"]))
         flow_str = ",".join(flow_expr_arr)
-        self.run_ofctl("del-flows", [flow_str])
+        if not self.defer_apply_flows:
+            self.run_ofctl("del-flows", [flow_str])
+        elif flow_str:
+            self.deferred_flows.append(('del', flow_str))
+        else:
+            # A blank line would not match any flow in a batch, so delete
+            # all flows now, after the mods requested before.
+            self.apply_deferred_flows()
+            self.run_ofctl("del-flows", [flow_str])
+
+    def transaction(self):
+        return OVSTransaction(self.root_helper)
 
     def add_tunnel_port(self, port_name, remote_ip, local_ip,
                         tunnel_type=constants.TYPE_GRE,
                         vxlan_udp_port=constants.VXLAN_UDP_PORT):
-        self.run_vsctl(["add-port", self.br_name, port_name])
-        self.set_db_attribute("Interface", port_name, "type", tunnel_type)
-        if tunnel_type == constants.TYPE_VXLAN:
-            # Only set the VXLAN UDP port if it's not the default
-            if vxlan_udp_port != constants.VXLAN_UDP_PORT:
-                self.set_db_attribute("Interface", port_name,
-                                      "options:dst_port",
-                                      vxlan_udp_port)
-        self.set_db_attribute("Interface", port_name, "options:remote_ip",
-                              remote_ip)
-        self.set_db_attribute("Interface", port_name, "options:local_ip",
-                              local_ip)
-        self.set_db_attribute("Interface", port_name, "options:in_key", "flow")
-        self.set_db_attribute("Interface", port_name, "options:out_key",
-                              "flow")
-        return self.get_port_ofport(port_name)
+        ofports = self.add_tunnel_ports({port_name: remote_ip}, local_ip,
+                                        tunnel_type, vxlan_udp_port)
+        return ofports[port_name]
+
+    def add_tunnel_ports(self, tunnels, local_ip,
+                         tunnel_type=constants.TYPE_GRE,
+                         vxlan_udp_port=constants.VXLAN_UDP_PORT):
+        """Add tunnel ports with two ovs-vsctl calls.
+
+        :param tunnels: a dict mapping tunnel port names to remote IPs.
+        :returns: a dict mapping tunnel port names to ofports.
+        """
+        txn = self.transaction()
+        for port_name, remote_ip in sorted(tunnels.items()):
+            attrs = [("type", tunnel_type)]
+            if tunnel_type == constants.TYPE_VXLAN:
+                # Only set the VXLAN UDP port if it's not the default
+                if vxlan_udp_port != constants.VXLAN_UDP_PORT:
+                    attrs.append(("options:dst_port", vxlan_udp_port))
+            attrs += [("options:remote_ip", remote_ip),
+                      ("options:local_ip", local_ip),
+                      ("options:in_key", "flow"),
+                      ("options:out_key", "flow")]
+            txn.add_port(self.br_name, port_name, attrs)
+        txn.commit()
+        return self.get_ofports(tunnels)
 
     def add_patch_port(self, local_name, remote_name):
-        self.run_vsctl(["add-port", self.br_name, local_name])
-        self.set_db_attribute("Interface", local_name, "type", "patch")
-        self.set_db_attribute("Interface", local_name, "options:peer",
-                              remote_name)
-        return self.get_port_ofport(local_name)
+        txn = self.transaction()
+        txn.add_port(self.br_name, local_name,
+                     [("type", "patch"), ("options:peer", remote_name)])
+        txn.commit()
+        return self.get_ofports([local_name])[local_name]
+
+    def get_ofports(self, port_names):
+        """Return a dict mapping port names to ofports, with one call."""
+        txn = self.transaction()
+        ofports = dict((port_name, txn.get_port_ofport(port_name))
+                       for port_name in sorted(port_names))
+        txn.commit()
+        return dict((port_name, command.result)
+                    for port_name, command in ofports.iteritems())
 
     def db_get_map(self, table, record, column):
         output = self.run_vsctl(["get", table, record, column])
@@ -205,14 +392,7 @@ class OVSBridge:
             return output.rstrip("\n\r")
 
     def db_str_to_map(self, full_str):
-        list = full_str.strip("{}").split(", ")
-        ret = {}
-        for e in list:
-            if e.find("=") == -1:
-                continue
-            arr = e.split("=")
-            ret[arr[0]] = arr[1].strip("\"")
-        return ret
+        return db_str_to_map(full_str)
 
     def get_port_name_list(self):
         res = self.run_vsctl(["list-ports", self.br_name])
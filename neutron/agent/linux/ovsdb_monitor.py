@@ -0,0 +1,186 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import shlex
+import time
+
+import eventlet
+from eventlet.green import subprocess
+from eventlet import queue
+
+from neutron.common import utils
+from neutron.openstack.common import jsonutils
+from neutron.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+COLUMNS = ['name', 'ofport', 'external_ids']
+
+
+class OvsdbMonitor(object):
+    """Track VIF interfaces through a long-lived ovsdb-client monitor.
+
+    ovsdb-client prints one JSON table per OVSDB update. Each row carries
+    the row uuid, an action (initial, insert, delete, old or new) and the
+    monitored columns. The monitor turns these rows into a map of changed
+    iface-ids, so that callers no longer need to list every interface to
+    find out what changed.
+    """
+
+    def __init__(self, root_helper, respawn_interval=30):
+        self.root_helper = root_helper
+        self.respawn_interval = respawn_interval
+        self._process = None
+        self._started_at = None
+        self._wakeup = queue.LightQueue()
+        self._reset()
+
+    def _reset(self):
+        # row uuid -> (interface name, iface-id or None)
+        self._rows = {}
+        # iface-id -> interface name, or None if the VIF went away
+        self._changes = {}
+        self._resync = True
+
+    @property
+    def is_active(self):
+        return self._process is not None and self._process.poll() is None
+
+    def start(self):
+        cmd = ['ovsdb-client', 'monitor', 'Interface', ','.join(COLUMNS),
+               '--format=json']
+        if self.root_helper:
+            cmd = shlex.split(self.root_helper) + cmd
+        LOG.debug(_("Starting OVSDB monitor: %s"), cmd)
+        self._reset()
+        self._started_at = time.time()
+        self._process = utils.subprocess_popen(cmd,
+                                               stdin=subprocess.PIPE,
+                                               stdout=subprocess.PIPE,
+                                               stderr=subprocess.PIPE)
+        eventlet.spawn_n(self._read_stdout, self._process)
+        eventlet.spawn_n(self._read_stderr, self._process)
+
+    def stop(self):
+        """Stop monitoring.
+
+        The monitor usually runs through the root helper and cannot be
+        signalled directly. Closing the pipes makes ovsdb-client exit on its
+        next write, and it is reaped in the background once it exits.
+        """
+        process, self._process = self._process, None
+        if process:
+            for pipe in (process.stdin, process.stdout, process.stderr):
+                pipe.close()
+            eventlet.spawn_n(process.wait)
+
+    def _read_lines(self, pipe):
+        try:
+            for line in iter(pipe.readline, ''):
+                yield line
+        except (IOError, ValueError):
+            # The pipe was closed by stop()
+            return
+
+    def _read_stdout(self, process):
+        for line in self._read_lines(process.stdout):
+            if process is not self._process:
+                return
+            self._process_line(line)
+        if process is self._process:
+            LOG.error(_("OVSDB monitor exited unexpectedly"))
+            self._resync = True
+            self._wakeup.put(None)
+
+    def _read_stderr(self, process):
+        for line in self._read_lines(process.stderr):
+            LOG.error(_("OVSDB monitor error: %s"), line.rstrip())
+
+    def _process_line(self, line):
+        try:
+            self._process_update(jsonutils.loads(line))
+        except Exception:
+            LOG.exception(_("Unable to parse OVSDB monitor output: %s"), line)
+            self._resync = True
+        self._wakeup.put(None)
+
+    def _process_update(self, update):
+        headings = update['headings']
+        uuid = None
+        for data in update['data']:
+            row = dict(zip(headings, data))
+            # The new half of a modification does not repeat the row uuid
+            uuid = row['row'] or uuid
+            action = row['action']
+            if action == 'old':
+                continue
+            old_name, old_iface_id = self._rows.pop(uuid, (None, None))
+            if action == 'delete':
+                name, iface_id = old_name, None
+            else:
+                name = row['name']
+                iface_id = self._get_iface_id(row)
+                self._rows[uuid] = (name, iface_id)
+            if old_iface_id and old_iface_id != iface_id:
+                self._changes[old_iface_id] = None
+            if iface_id and iface_id != old_iface_id:
+                self._changes[iface_id] = name
+
+    def _get_iface_id(self, row):
+        """Return the iface-id of a VIF row, or None for other interfaces.
+
+        Interfaces are only reported once ovs-vswitchd assigned them an
+        ofport, so that the port can be wired right away.
+        """
+        external_ids = dict(row['external_ids'][1])
+        if 'attached-mac' not in external_ids:
+            return
+        if 'iface-id' not in external_ids:
+            if 'xs-vif-uuid' in external_ids:
+                # The iface-id has to be read from XAPI
+                self._resync = True
+            return
+        if isinstance(row['ofport'], int):
+            return external_ids['iface-id']
+
+    def wait(self, timeout):
+        """Wait up to timeout seconds for interface changes."""
+        try:
+            self._wakeup.get(timeout=timeout)
+        except queue.Empty:
+            pass
+
+    def get_changes(self):
+        """Return the VIF changes seen since the last call.
+
+        :returns: a dict mapping each changed iface-id to its interface
+                  name, or to None if the VIF went away. Returns None when
+                  the changes are unknown and a full resync is required.
+        """
+        while self._wakeup.qsize():
+            self._wakeup.get()
+        if not self.is_active:
+            if (self._started_at is None or
+                time.time() - self._started_at >= self.respawn_interval):
+                self.stop()
+                self.start()
+            return
+        changes, self._changes = self._changes, {}
+        if self._resync:
+            self._resync = False
+            return
+        return changes
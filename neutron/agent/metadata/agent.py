@@ -16,13 +16,16 @@
 #
 # @author: Mark McClain, DreamHost
 
+import collections
 import hashlib
 import hmac
 import os
 import socket
+import time
 import urlparse
 
 import eventlet
+from eventlet import pools
 import httplib2
 from neutronclient.v2_0 import client
 from oslo.config import cfg
@@ -31,6 +34,7 @@ import webob
 from neutron.common import config
 from neutron.common import utils
 from neutron.openstack.common import log as logging
+from neutron.openstack.common import service
 from neutron import wsgi
 
 LOG = logging.getLogger(__name__)
@@ -38,6 +42,46 @@ LOG = logging.getLogger(__name__)
 DEVICE_OWNER_ROUTER_INTF = "network:router_interface"
 
 
+class InstanceCache(object):
+    """The instance ids of the addresses requesting metadata.
+
+    Entries are keyed by the router or network id and the remote address
+    of the requests, and expire after ttl seconds. The least recently
+    used entries are dropped beyond size entries.
+    """
+
+    def __init__(self, ttl, size):
+        self.ttl = ttl
+        self.size = size
+        self._entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.pop(key, None)
+        if entry and time.time() - entry[0] < self.ttl:
+            # Move it to the most recently used end
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+
+    def set(self, key, value):
+        if self.ttl <= 0 or self.size <= 0:
+            return
+        self._entries.pop(key, None)
+        self._entries[key] = (time.time(), value)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.0
+
+
 class MetadataProxyHandler(object):
     OPTS = [
         cfg.StrOpt('admin_user',
@@ -65,12 +109,31 @@ class MetadataProxyHandler(object):
         cfg.StrOpt('metadata_proxy_shared_secret',
                    default='',
                    help=_('Shared secret to sign instance-id request'),
-                   secret=True)
+                   secret=True),
+        cfg.IntOpt('metadata_cache_ttl', default=5,
+                   help=_("Seconds the instance id of a remote address is "
+                          "cached for. 0 disables the cache")),
+        cfg.IntOpt('metadata_cache_size', default=1024,
+                   help=_("Maximum number of instance ids cached")),
+        cfg.IntOpt('metadata_pool_size', default=8,
+                   help=_("Maximum number of Neutron clients and of "
+                          "connections to the Nova metadata server kept "
+                          "open")),
     ]
 
     def __init__(self, conf):
         self.conf = conf
+        # The token and endpoint of the last client, reused by the
+        # clients created afterwards
         self.auth_info = {}
+        self.instance_cache = InstanceCache(conf.metadata_cache_ttl,
+                                            conf.metadata_cache_size)
+        self._clients = pools.Pool(max_size=conf.metadata_pool_size,
+                                   create=self._get_neutron_client)
+        # httplib2 keeps the connection of each Http object open
+        self._nova_connections = pools.Pool(
+            max_size=conf.metadata_pool_size,
+            create=lambda: httplib2.Http())
 
     def _get_neutron_client(self):
         qclient = client.Client(
@@ -104,12 +167,28 @@ class MetadataProxyHandler(object):
             return webob.exc.HTTPInternalServerError(explanation=unicode(msg))
 
     def _get_instance_id(self, req):
-        qclient = self._get_neutron_client()
-
         remote_address = req.headers.get('X-Forwarded-For')
         network_id = req.headers.get('X-Neutron-Network-ID')
         router_id = req.headers.get('X-Neutron-Router-ID')
 
+        key = (network_id or router_id, remote_address)
+        instance_id = self.instance_cache.get(key)
+        LOG.debug(_("Instance cache: %(hits)d hits, %(misses)d misses"),
+                  {'hits': self.instance_cache.hits,
+                   'misses': self.instance_cache.misses})
+        if instance_id:
+            return instance_id
+
+        with self._clients.item() as qclient:
+            instance_id = self._lookup_instance_id(
+                qclient, remote_address, network_id, router_id)
+            self.auth_info = qclient.get_auth_info()
+        if instance_id:
+            self.instance_cache.set(key, instance_id)
+        return instance_id
+
+    def _lookup_instance_id(self, qclient, remote_address, network_id,
+                            router_id):
         if network_id:
             networks = [network_id]
         else:
@@ -123,8 +202,6 @@ class MetadataProxyHandler(object):
             network_id=networks,
             fixed_ips=['ip_address=%s' % remote_address])['ports']
 
-        self.auth_info = qclient.get_auth_info()
-
         if len(ports) == 1:
             return ports[0]['device_id']
 
@@ -143,9 +220,9 @@ class MetadataProxyHandler(object):
             req.query_string,
             ''))
 
-        h = httplib2.Http()
-        resp, content = h.request(url, method=req.method, headers=headers,
-                                  body=req.body)
+        with self._nova_connections.item() as h:
+            resp, content = h.request(url, method=req.method,
+                                      headers=headers, body=req.body)
 
         if resp.status == 200:
             LOG.debug(str(resp))
@@ -185,12 +262,55 @@ class UnixDomainHttpProtocol(eventlet.wsgi.HttpProtocol):
                                             server)
 
 
+class WorkerService(object):
+    """Serves an application on the socket of a server in a worker."""
+
+    def __init__(self, server, application):
+        self._server = server
+        self._application = application
+        self._thread = None
+
+    def start(self):
+        # Not in the pool of the server, whose requests are waited for
+        # when the server is stopped
+        self._thread = eventlet.spawn(self._server._run,
+                                      self._application,
+                                      self._server._socket)
+
+    def wait(self):
+        if self._thread is not None:
+            self._thread.wait()
+
+    def stop(self):
+        if self._thread is not None:
+            self._thread.kill()
+
+
 class UnixDomainWSGIServer(wsgi.Server):
+    def __init__(self, name, workers=0):
+        super(UnixDomainWSGIServer, self).__init__(name)
+        self._workers = workers
+        self._launcher = None
+
     def start(self, application, file_socket, backlog=128):
-        sock = eventlet.listen(file_socket,
-                               family=socket.AF_UNIX,
-                               backlog=backlog)
-        self.pool.spawn_n(self._run, application, sock)
+        self._socket = eventlet.listen(file_socket,
+                                       family=socket.AF_UNIX,
+                                       backlog=backlog)
+        if self._workers < 1:
+            self.pool.spawn_n(self._run, application, self._socket)
+            return
+        # The workers accept the connections of the socket they inherit.
+        # Each of them gets its own copy of the application, whose caches
+        # and connection pools are still empty.
+        self._launcher = service.ProcessLauncher()
+        self._launcher.launch_service(WorkerService(self, application),
+                                      workers=self._workers)
+
+    def wait(self):
+        if self._launcher:
+            self._launcher.wait()
+        else:
+            super(UnixDomainWSGIServer, self).wait()
 
     def _run(self, application, socket):
         """Start a WSGI service in a new green thread."""
@@ -206,7 +326,10 @@ class UnixDomainMetadataProxy(object):
     OPTS = [
         cfg.StrOpt('metadata_proxy_socket',
                    default='$state_path/metadata_proxy',
-                   help=_('Location for Metadata Proxy UNIX domain socket'))
+                   help=_('Location for Metadata Proxy UNIX domain socket')),
+        cfg.IntOpt('metadata_workers', default=0,
+                   help=_("Number of worker processes serving the metadata "
+                          "requests. 0 serves them in the agent process"))
     ]
 
     def __init__(self, conf):
@@ -223,7 +346,8 @@ class UnixDomainMetadataProxy(object):
             os.makedirs(dirname, 0o755)
 
     def run(self):
-        server = UnixDomainWSGIServer('neutron-metadata-agent')
+        server = UnixDomainWSGIServer('neutron-metadata-agent',
+                                      workers=self.conf.metadata_workers)
         server.start(MetadataProxyHandler(self.conf),
                      self.conf.metadata_proxy_socket)
         server.wait()
@@ -29,7 +29,13 @@ security_group_opts = [
     cfg.StrOpt(
         'firewall_driver',
         default='neutron.agent.firewall.NoopFirewallDriver',
-        help=_('Driver for Security Groups Firewall'))
+        help=_('Driver for Security Groups Firewall')),
+    cfg.BoolOpt(
+        'enable_ipset',
+        default=False,
+        help=_('Match the members of remote security groups through '
+               'ipset sets instead of one iptables rule per member. '
+               'Only used by the iptables firewall drivers'))
 ]
 cfg.CONF.register_opts(security_group_opts, 'SECURITYGROUP')
 
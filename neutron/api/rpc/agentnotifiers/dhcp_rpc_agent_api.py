@@ -13,9 +13,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import eventlet
+from oslo.config import cfg
+
 from neutron.common import constants
 from neutron.common import topics
 from neutron.common import utils
+from neutron import context as q_context
 from neutron import manager
 from neutron.openstack.common import log as logging
 from neutron.openstack.common.rpc import proxy
@@ -23,12 +27,28 @@ from neutron.openstack.common.rpc import proxy
 
 LOG = logging.getLogger(__name__)
 
+# Port and subnet events waiting for the end of the notification window,
+# per network. They are shared by the notifiers of all the controllers.
+_pending_changes = {}
+
 
 class DhcpAgentNotifyAPI(proxy.RpcProxy):
-    """API for plugin to notify DHCP agent."""
+    """API for plugin to notify DHCP agent.
+
+    API version history:
+        1.0 - Initial version.
+        1.1 - Added network_changed.
+    """
     BASE_RPC_API_VERSION = '1.0'
     # It seems dhcp agent does not support bulk operation
     VALID_RESOURCES = ['network', 'subnet', 'port']
+    # Events of the resources of a network merged in network_changed
+    COALESCED_METHOD_NAMES = ['subnet_create_end',
+                              'subnet_update_end',
+                              'subnet_delete_end',
+                              'port_create_end',
+                              'port_update_end',
+                              'port_delete_end']
     VALID_METHOD_NAMES = ['network.create.end',
                           'network.update.end',
                           'network.delete.end',
@@ -57,25 +77,30 @@ class DhcpAgentNotifyAPI(proxy.RpcProxy):
                                    payload=payload),
             topic='%s.%s' % (topics.DHCP_AGENT, host))
 
+    def _schedule_network(self, context, network_id):
+        """Schedule the network and notify the agents chosen for it."""
+        plugin = manager.NeutronManager.get_plugin()
+        # we don't schedule when we create network
+        # because we want to give admin a chance to
+        # schedule network manually by API
+        adminContext = (context if context.is_admin else
+                        context.elevated())
+        network = plugin.get_network(adminContext, network_id)
+        chosen_agents = plugin.schedule_network(adminContext, network)
+        if chosen_agents:
+            for agent in chosen_agents:
+                self._notification_host(
+                    context, 'network_create_end',
+                    {'network': {'id': network_id}},
+                    agent['host'])
+
     def _notification(self, context, method, payload, network_id):
         """Notify all the agents that are hosting the network."""
         plugin = manager.NeutronManager.get_plugin()
         if (method != 'network_delete_end' and utils.is_extension_supported(
                 plugin, constants.DHCP_AGENT_SCHEDULER_EXT_ALIAS)):
             if method == 'port_create_end':
-                # we don't schedule when we create network
-                # because we want to give admin a chance to
-                # schedule network manually by API
-                adminContext = (context if context.is_admin else
-                                context.elevated())
-                network = plugin.get_network(adminContext, network_id)
-                chosen_agents = plugin.schedule_network(adminContext, network)
-                if chosen_agents:
-                    for agent in chosen_agents:
-                        self._notification_host(
-                            context, 'network_create_end',
-                            {'network': {'id': network_id}},
-                            agent['host'])
+                self._schedule_network(context, network_id)
             for (host, topic) in self._get_dhcp_agents(context, network_id):
                 self.cast(
                     context, self.make_msg(method,
@@ -94,6 +119,51 @@ class DhcpAgentNotifyAPI(proxy.RpcProxy):
                                    payload=payload),
             topic=topics.DHCP_AGENT)
 
+    def _coalesce(self, context, method, obj_value, network_id):
+        """Add an event to the pending changes of its network.
+
+        The first event of a network starts its notification window, at
+        the end of which network_changed is sent once to each agent.
+        """
+        if method == 'port_create_end':
+            plugin = manager.NeutronManager.get_plugin()
+            if utils.is_extension_supported(
+                    plugin, constants.DHCP_AGENT_SCHEDULER_EXT_ALIAS):
+                self._schedule_network(context, network_id)
+        change = _pending_changes.get(network_id)
+        if change is None:
+            change = _pending_changes[network_id] = {'port_ids': set()}
+            eventlet.spawn_after(cfg.CONF.dhcp_notification_window,
+                                 self._network_changed, network_id)
+        if method.startswith('port_') and 'id' in obj_value:
+            change['port_ids'].add(obj_value['id'])
+
+    def _network_changed(self, network_id):
+        """Send the changes of a network once its window expires."""
+        change = _pending_changes.pop(network_id, None)
+        if not change:
+            return
+        # The requests which made the changes may still be using their
+        # sessions
+        context = q_context.get_admin_context()
+        msg = self.make_msg('network_changed',
+                            payload={'network_id': network_id,
+                                     'port_ids': sorted(change['port_ids'])})
+        plugin = manager.NeutronManager.get_plugin()
+        try:
+            if utils.is_extension_supported(
+                    plugin, constants.DHCP_AGENT_SCHEDULER_EXT_ALIAS):
+                for (host, topic) in self._get_dhcp_agents(context,
+                                                           network_id):
+                    self.cast(context, msg, topic='%s.%s' % (topic, host),
+                              version='1.1')
+            else:
+                self.fanout_cast(context, msg, topic=topics.DHCP_AGENT,
+                                 version='1.1')
+        except Exception:
+            LOG.exception(_("Failed to notify the DHCP agents of the "
+                            "changes of network %s"), network_id)
+
     def network_removed_from_agent(self, context, network_id, host):
         self._notification_host(context, 'network_delete_end',
                                 {'network_id': network_id}, host)
@@ -112,6 +182,12 @@ class DhcpAgentNotifyAPI(proxy.RpcProxy):
         if methodname not in self.VALID_METHOD_NAMES:
             return
         obj_type = data.keys()[0]
+        if (obj_type.endswith('s') and
+                obj_type[:-1] in self.VALID_RESOURCES):
+            # A bulk operation is notified item by item
+            for obj_value in data[obj_type]:
+                self.notify(context, {obj_type[:-1]: obj_value}, methodname)
+            return
         if obj_type not in self.VALID_RESOURCES:
             return
         obj_value = data[obj_type]
@@ -123,6 +199,13 @@ class DhcpAgentNotifyAPI(proxy.RpcProxy):
         if not network_id:
             return
         methodname = methodname.replace(".", "_")
+        if (cfg.CONF.dhcp_notification_window > 0 and
+                methodname in self.COALESCED_METHOD_NAMES):
+            self._coalesce(context, methodname, obj_value, network_id)
+            return
+        if methodname == 'network_delete_end':
+            # The agents drop the network anyway
+            _pending_changes.pop(network_id, None)
         if methodname.endswith("_delete_end"):
             if 'id' in obj_value:
                 self._notification(context, methodname,
@@ -15,6 +15,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import inspect
+
 import netaddr
 import webob.exc
 
@@ -25,6 +27,7 @@ from neutron.api.rpc.agentnotifiers import dhcp_rpc_agent_api
 from neutron.api.v2 import attributes
 from neutron.api.v2 import resource as wsgi_resource
 from neutron.common import exceptions
+from neutron.db import db_base_plugin_v2
 from neutron.openstack.common import log as logging
 from neutron.openstack.common.notifier import api as notifier_api
 from neutron import policy
@@ -41,6 +44,8 @@ FAULT_MAP = {exceptions.NotFound: webob.exc.HTTPNotFound,
              exceptions.NotAuthorized: webob.exc.HTTPForbidden,
              netaddr.AddrFormatError: webob.exc.HTTPBadRequest,
              }
+# Arguments of the collection getters which page and sort in the database
+DB_PAGING_ARGS = ('sorts', 'limit', 'marker', 'page_reverse')
 
 
 class Controller(object):
@@ -62,6 +67,19 @@ class Controller(object):
         self._allow_bulk = allow_bulk
         self._allow_pagination = allow_pagination
         self._allow_sorting = allow_sorting
+        if parent:
+            self._parent_id_name = '%s_id' % parent['member_name']
+            parent_part = '_%s' % parent['member_name']
+        else:
+            self._parent_id_name = None
+            parent_part = ''
+        self._plugin_handlers = {
+            self.LIST: 'get%s_%s' % (parent_part, self._collection),
+            self.SHOW: 'get%s_%s' % (parent_part, self._resource)
+        }
+        for action in [self.CREATE, self.UPDATE, self.DELETE]:
+            self._plugin_handlers[action] = '%s%s_%s' % (action, parent_part,
+                                                         self._resource)
         self._native_bulk = self._is_native_bulk_supported()
         self._native_pagination = self._is_native_pagination_supported()
         self._native_sorting = self._is_native_sorting_supported()
@@ -82,20 +100,6 @@ class Controller(object):
                            "pagination requires native sorting"))
                 self._allow_sorting = True
 
-        if parent:
-            self._parent_id_name = '%s_id' % parent['member_name']
-            parent_part = '_%s' % parent['member_name']
-        else:
-            self._parent_id_name = None
-            parent_part = ''
-        self._plugin_handlers = {
-            self.LIST: 'get%s_%s' % (parent_part, self._collection),
-            self.SHOW: 'get%s_%s' % (parent_part, self._resource)
-        }
-        for action in [self.CREATE, self.UPDATE, self.DELETE]:
-            self._plugin_handlers[action] = '%s%s_%s' % (action, parent_part,
-                                                         self._resource)
-
     def _get_primary_key(self, default_primary_key='id'):
         for key, value in self._attr_info.iteritems():
             if value.get('primary_key', False):
@@ -110,14 +114,35 @@ class Controller(object):
     def _is_native_pagination_supported(self):
         native_pagination_attr_name = ("_%s__native_pagination_support"
                                        % self._plugin.__class__.__name__)
-        return getattr(self._plugin, native_pagination_attr_name, False)
+        return (getattr(self._plugin, native_pagination_attr_name, False) or
+                self._is_db_paging_supported())
 
     def _is_native_sorting_supported(self):
         native_sorting_attr_name = ("_%s__native_sorting_support"
                                     % self._plugin.__class__.__name__)
-        return getattr(self._plugin, native_sorting_attr_name, False)
+        return (getattr(self._plugin, native_sorting_attr_name, False) or
+                self._is_db_paging_supported())
+
+    def _is_db_paging_supported(self):
+        """Check whether the list handler sorts and pages in the database.
 
-    def _is_visible(self, context, attr_name, data):
+        The collection getters of the DB plugin and of the DB mixins hand
+        sorts, limit and marker to sqlalchemyutils.paginate_query. Any
+        plugin built on them gets sorting and pagination done in SQL for
+        each collection whose getter takes those arguments, whether or
+        not the plugin class declares native support.
+        """
+        if not isinstance(self._plugin, db_base_plugin_v2.CommonDbMixin):
+            return False
+        obj_getter = getattr(self._plugin, self._plugin_handlers[self.LIST],
+                             None)
+        try:
+            args = inspect.getargspec(obj_getter).args
+        except TypeError:
+            return False
+        return all(arg in args for arg in DB_PAGING_ARGS)
+
+    def _is_visible(self, context, attr_name, data, checker=None):
         action = "%s:%s" % (self._plugin_handlers[self.SHOW], attr_name)
         # Optimistically init authz_check to True
         authz_check = True
@@ -125,8 +150,11 @@ class Controller(object):
             attr = (attributes.RESOURCE_ATTRIBUTE_MAP
                     [self._collection].get(attr_name))
             if attr and attr.get('enforce_policy'):
-                authz_check = policy.check_if_exists(
-                    context, action, data)
+                if checker:
+                    authz_check = checker.check_if_exists(action, data)
+                else:
+                    authz_check = policy.check_if_exists(
+                        context, action, data)
         except KeyError:
             # The extension was not configured for adding its resources
             # to the global resource attribute map. Policy check should
@@ -144,13 +172,13 @@ class Controller(object):
         attr_val = self._attr_info.get(attr_name)
         return attr_val and attr_val['is_visible'] and authz_check
 
-    def _view(self, context, data, fields_to_strip=None):
+    def _view(self, context, data, fields_to_strip=None, checker=None):
         # make sure fields_to_strip is iterable
         if not fields_to_strip:
             fields_to_strip = []
 
         return dict(item for item in data.iteritems()
-                    if (self._is_visible(context, item[0], data) and
+                    if (self._is_visible(context, item[0], data, checker) and
                         item[0] not in fields_to_strip))
 
     def _do_field_list(self, original_fields):
@@ -226,20 +254,24 @@ class Controller(object):
         obj_list = obj_getter(request.context, **kwargs)
         obj_list = sorting_helper.sort(obj_list)
         obj_list = pagination_helper.paginate(obj_list)
+        # The same policies are checked for every item
+        checker = policy.CollectionChecker(request.context)
         # Check authz
         if do_authz:
             # FIXME(salvatore-orlando): obj_getter might return references to
             # other resources. Must check authZ on them too.
             # Omit items from list that should not be visible
             obj_list = [obj for obj in obj_list
-                        if policy.check(request.context,
-                                        self._plugin_handlers[self.SHOW],
-                                        obj,
-                                        plugin=self._plugin)]
+                        if checker.check(self._plugin_handlers[self.SHOW],
+                                         obj)]
+        # The views are built while the response is serialized, so that
+        # large collections are never held twice in memory. The Resource
+        # builds the first ones before starting the response
         collection = {self._collection:
-                      [self._view(request.context, obj,
-                                  fields_to_strip=fields_to_add)
-                       for obj in obj_list]}
+                      (self._view(request.context, obj,
+                                  fields_to_strip=fields_to_add,
+                                  checker=checker)
+                       for obj in obj_list)}
         pagination_links = pagination_helper.get_links(obj_list)
         if pagination_links:
             collection[self._collection + "_links"] = pagination_links
@@ -347,6 +379,8 @@ class Controller(object):
         else:
             items = [body]
             bulk = False
+        # Resources of each tenant, counted once for all the items
+        counts = {}
         for item in items:
             self._validate_network_tenant_ownership(request,
                                                     item[self._resource])
@@ -355,9 +389,11 @@ class Controller(object):
                            item[self._resource])
             try:
                 tenant_id = item[self._resource]['tenant_id']
-                count = quota.QUOTAS.count(request.context, self._resource,
-                                           self._plugin, self._collection,
-                                           tenant_id)
+                if tenant_id not in counts:
+                    counts[tenant_id] = quota.QUOTAS.count(
+                        request.context, self._resource, self._plugin,
+                        self._collection, tenant_id)
+                count = counts[tenant_id]
                 if bulk:
                     delta = deltas.get(tenant_id, 0) + 1
                     deltas[tenant_id] = delta
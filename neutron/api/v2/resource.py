@@ -17,18 +17,72 @@
 Utility methods for working with WSGI servers redux
 """
 
+import itertools
+import types
+
 import netaddr
+from oslo.config import cfg
 import webob.dec
 import webob.exc
 
 from neutron.api.v2 import attributes
 from neutron.common import exceptions
+from neutron.db import query_stats
 from neutron.openstack.common import log as logging
+from neutron.openstack.common.notifier import api as notifier_api
 from neutron import wsgi
 
 
 LOG = logging.getLogger(__name__)
 
+# Items of a lazily built collection built before the response is started
+STREAM_PREFETCH = 100
+
+
+def _is_collection(data):
+    """Check whether data holds collections."""
+    return (isinstance(data, dict) and
+            any(isinstance(value, (list, types.GeneratorType))
+                for value in data.itervalues()))
+
+
+def _prefetch(items, count):
+    """Build the first count items of a generator now.
+
+    Return a generator of all the items.
+    """
+    first = list(itertools.islice(items, count))
+    return (item for item in itertools.chain(first, items))
+
+
+def _iter_body(chunks, action):
+    """Yield the chunks of a streamed body, logging a failure.
+
+    The status was already sent, so the failure is raised to the server,
+    which closes the connection before the end of the body.
+    """
+    try:
+        for chunk in chunks:
+            yield chunk
+    except Exception:
+        LOG.exception(_('%s failed while sending the response'), action)
+        raise
+
+
+def _report_query_stats(request, status, stats):
+    """Log and notify the SQL statements run by a request."""
+    LOG.info(_("%(method)s %(url)s status: %(status)s %(stats)s"),
+             {'method': request.method, 'url': request.url,
+              'status': status, 'stats': stats})
+    payload = stats.to_dict()
+    payload.update(method=request.method, path=request.path,
+                   status=status)
+    notifier_api.notify(request.context,
+                        notifier_api.publisher_id('network'),
+                        'api.request.query_stats',
+                        notifier_api.CONF.default_notification_level,
+                        payload)
+
 
 class Request(wsgi.Request):
     pass
@@ -57,6 +111,25 @@ def Resource(controller, faults=None, deserializers=None, serializers=None):
 
     @webob.dec.wsgify(RequestClass=Request)
     def resource(request):
+        stats = getattr(request.context, 'query_stats', None)
+        if stats is None:
+            return _resource(request)
+        # The statements run by the greenthread are counted for the request
+        query_stats.start(stats)
+        status = 500
+        try:
+            response = _resource(request)
+            status = response.status_int
+            return response
+        except webob.exc.HTTPException as e:
+            status = e.status_int
+            raise
+        finally:
+            query_stats.stop()
+            if cfg.CONF.database.report_query_stats:
+                _report_query_stats(request, status, stats)
+
+    def _resource(request):
         route_args = request.environ.get('wsgiorg.routing_args')
         if route_args:
             args = route_args[1].copy()
@@ -80,6 +153,21 @@ def Resource(controller, faults=None, deserializers=None, serializers=None):
             method = getattr(controller, action)
 
             result = method(request=request, **args)
+            # NOTE: only the JSON serializer can encode collections while
+            # they are being built and sent. The first items are built
+            # here, so that the errors raised by all of them, such as
+            # policy failures, are still turned into faults
+            stream = (action == 'index' and
+                      hasattr(serializer, 'iter_serialize') and
+                      _is_collection(result))
+            if isinstance(result, dict):
+                for key, value in result.items():
+                    if not isinstance(value, types.GeneratorType):
+                        continue
+                    if stream:
+                        result[key] = _prefetch(value, STREAM_PREFETCH)
+                    else:
+                        result[key] = list(value)
         except (exceptions.NeutronException,
                 netaddr.AddrFormatError) as e:
             LOG.exception(_('%s failed'), action)
@@ -116,6 +204,13 @@ def Resource(controller, faults=None, deserializers=None, serializers=None):
             raise webob.exc.HTTPInternalServerError(**kwargs)
 
         status = action_status.get(action, 200)
+        if stream:
+            # The body is sent while being encoded, without a length
+            return webob.Response(request=request, status=status,
+                                  content_type=content_type,
+                                  app_iter=_iter_body(
+                                      serializer.iter_serialize(result),
+                                      action))
         body = serializer.serialize(result)
         # NOTE(jkoelker) Comply with RFC2616 section 9.7
         if status == 204:
@@ -74,9 +74,20 @@ core_opts = [
     cfg.IntOpt('dhcp_lease_duration', default=120,
                deprecated_name='dhcp_lease_time',
                help=_("DHCP lease duration")),
+    cfg.IntOpt('ip_recycle_interval', default=0,
+               help=_("Seconds between runs of the server task returning "
+                      "IPs with expired leases to the allocation pools. "
+                      "When 0 they are recycled while creating or "
+                      "updating ports")),
     cfg.BoolOpt('dhcp_agent_notification', default=True,
                 help=_("Allow sending resource operation"
                        " notification to DHCP agent")),
+    cfg.FloatOpt('dhcp_notification_window', default=0,
+                 help=_("Seconds during which the port and subnet events of "
+                        "a network are merged into a single notification "
+                        "to each DHCP agent hosting it. Requires DHCP "
+                        "agents supporting network_changed. 0 notifies "
+                        "each event as it happens")),
     cfg.BoolOpt('allow_overlapping_ips', default=False,
                 help=_("Allow overlapping IP support in Neutron")),
     cfg.StrOpt('host', default=utils.get_hostname(),
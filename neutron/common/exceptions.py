@@ -219,6 +219,11 @@ class IpAddressGenerationFailure(Conflict):
     message = _("No more IP addresses available on network %(net_id)s.")
 
 
+class IpAddressAllocationConflict(Conflict):
+    message = _("Unable to update the available IP addresses of subnet "
+                "%(subnet_id)s because of concurrent updates.")
+
+
 class BridgeDoesNotExist(NeutronException):
     message = _("Bridge %(bridge)s does not exist.")
 
@@ -22,6 +22,7 @@ import copy
 from datetime import datetime
 
 from neutron.db import api as db_api
+from neutron.db import query_stats
 from neutron.openstack.common import context as common_context
 from neutron.openstack.common import log as logging
 from neutron import policy
@@ -55,6 +56,8 @@ class ContextBase(common_context.RequestContext):
             timestamp = datetime.utcnow()
         self.timestamp = timestamp
         self._session = None
+        # SQL statements run while processing the request
+        self.query_stats = query_stats.QueryStats()
         self.roles = roles or []
         if self.is_admin is None:
             self.is_admin = policy.check_is_admin(self)
@@ -19,18 +19,26 @@ from oslo.config import cfg
 import sqlalchemy as sa
 from sqlalchemy.orm import exc
 
+from neutron.db import api as db_api
 from neutron.db import model_base
 from neutron.db import models_v2
 from neutron.extensions import agent as ext_agent
 from neutron import manager
 from neutron.openstack.common import jsonutils
 from neutron.openstack.common import log as logging
+from neutron.openstack.common import loopingcall
 from neutron.openstack.common import timeutils
 
 LOG = logging.getLogger(__name__)
-cfg.CONF.register_opt(
+cfg.CONF.register_opts([
     cfg.IntOpt('agent_down_time', default=5,
-               help=_("Seconds to regard the agent is down.")))
+               help=_("Seconds to regard the agent is down.")),
+    cfg.IntOpt('agent_heartbeat_batch_interval', default=0,
+               help=_("Seconds during which the heartbeats of the agents "
+                      "whose state did not change are only kept in memory, "
+                      "before being written to the database together. "
+                      "0 writes each heartbeat when it is received")),
+])
 
 
 class Agent(model_base.BASEV2, models_v2.HasId):
@@ -57,6 +65,140 @@ class Agent(model_base.BASEV2, models_v2.HasId):
     configurations = sa.Column(sa.String(4095), nullable=False)
 
 
+class AgentHeartbeats(object):
+    """Heartbeats of the agents reporting their state to this process.
+
+    When agent_heartbeat_batch_interval is set, a report which does not
+    change the state of a known agent only updates its heartbeat in
+    memory. The pending heartbeats are written to the database every
+    agent_heartbeat_batch_interval seconds in one statement, so the
+    heartbeats in the database are late by at most that many seconds.
+    The liveness of the agents is checked against the latest heartbeats.
+    The known agents are reloaded from the database every agent_down_time
+    seconds, to notice the agents deleted or updated by another server.
+    """
+
+    def __init__(self):
+        # (agent_type, host) -> (agent id, configurations) as in database
+        self._agents = {}
+        # agent id -> latest heartbeat
+        self._heartbeats = {}
+        # agent id -> heartbeat not written to the database yet
+        self._pending = {}
+        self._flusher = None
+        # when the known agents were last reloaded from the database
+        self._loaded_at = None
+
+    @property
+    def enabled(self):
+        return cfg.CONF.agent_heartbeat_batch_interval > 0
+
+    def remember(self, agent_db):
+        """Record the state of an agent written to the database."""
+        if not self.enabled:
+            return
+        self._agents[(agent_db.agent_type, agent_db.host)] = (
+            agent_db.id, agent_db.configurations)
+        self._heartbeats[agent_db.id] = agent_db.heartbeat_timestamp
+        self._pending.pop(agent_db.id, None)
+
+    def forget(self, agent_id):
+        for key, (known_id, configurations) in self._agents.items():
+            if known_id == agent_id:
+                del self._agents[key]
+        self._heartbeats.pop(agent_id, None)
+        self._pending.pop(agent_id, None)
+
+    def report(self, agent_type, host, configurations, heartbeat):
+        """Record the heartbeat of an agent in memory.
+
+        Returns False, and records nothing, if the agent is not known or
+        if its configurations changed.
+        """
+        if not self.enabled:
+            return False
+        agent_id, known_configurations = self._agents.get(
+            (agent_type, host), (None, None))
+        if agent_id is None or known_configurations != configurations:
+            return False
+        self._heartbeats[agent_id] = heartbeat
+        self._pending[agent_id] = heartbeat
+        if self._flusher is None:
+            self._flusher = loopingcall.FixedIntervalLoopingCall(self.flush)
+            self._flusher.start(cfg.CONF.agent_heartbeat_batch_interval)
+        return True
+
+    def get_heartbeat(self, agent_id, heartbeat):
+        """Return the latest of heartbeat and of the one in memory."""
+        latest = self._heartbeats.get(agent_id)
+        if latest is None or latest < heartbeat:
+            return heartbeat
+        return latest
+
+    def _load_agents(self, session):
+        """Reload the known agents, forgetting the deleted ones."""
+        known_ids = set(agent_id for agent_id, configurations
+                        in self._agents.itervalues())
+        agents = {}
+        if known_ids:
+            query = session.query(Agent.id, Agent.agent_type, Agent.host,
+                                  Agent.configurations)
+            for agent in query.filter(Agent.id.in_(known_ids)):
+                agents[(agent.agent_type, agent.host)] = (
+                    agent.id, agent.configurations)
+        for agent_id in known_ids - set(agent_id for agent_id, configurations
+                                        in agents.itervalues()):
+            self._heartbeats.pop(agent_id, None)
+            self._pending.pop(agent_id, None)
+        self._agents = agents
+        self._loaded_at = timeutils.utcnow()
+
+    def flush(self):
+        """Write the pending heartbeats to the database.
+
+        The known agents are reloaded when some of them were not found or
+        when they were last loaded agent_down_time seconds ago.
+        """
+        pending, self._pending = self._pending, {}
+        load = (self._loaded_at is None or
+                timeutils.is_older_than(self._loaded_at,
+                                        cfg.CONF.agent_down_time))
+        if not pending and not load:
+            return
+        table = Agent.__table__
+        statement = table.update().where(
+            table.c.id == sa.bindparam('agent_id')).values(
+                heartbeat_timestamp=sa.bindparam('heartbeat'))
+        try:
+            session = db_api.get_session()
+            with session.begin():
+                if pending:
+                    result = session.execute(
+                        statement,
+                        [{'agent_id': agent_id, 'heartbeat': heartbeat}
+                         for agent_id, heartbeat in pending.items()])
+                    if result.rowcount < len(pending):
+                        # Deleted through another server
+                        load = True
+                if load:
+                    self._load_agents(session)
+        except Exception:
+            LOG.exception(_('Failed writing the heartbeats of %d agents'),
+                          len(pending))
+            # Keep them for the next attempt, unless superseded
+            for agent_id, heartbeat in pending.iteritems():
+                self._pending.setdefault(agent_id, heartbeat)
+
+    def stop(self):
+        if self._flusher is not None:
+            self._flusher.stop()
+            self._flusher = None
+        self.flush()
+
+
+heartbeats = AgentHeartbeats()
+
+
 class AgentDbMixin(ext_agent.AgentPluginBase):
     """Mixin class to add agent extension to db_plugin_base_v2."""
 
@@ -72,6 +214,16 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
         return timeutils.is_older_than(heart_beat_time,
                                        cfg.CONF.agent_down_time)
 
+    @classmethod
+    def get_heartbeat_timestamp(cls, agent):
+        """Return the latest heartbeat of an agent row or dict."""
+        return heartbeats.get_heartbeat(agent['id'],
+                                        agent['heartbeat_timestamp'])
+
+    @classmethod
+    def is_agent_db_down(cls, agent):
+        return cls.is_agent_down(cls.get_heartbeat_timestamp(agent))
+
     def get_configuration_dict(self, agent_db):
         try:
             conf = jsonutils.loads(agent_db.configurations)
@@ -88,6 +240,8 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
             ext_agent.RESOURCE_NAME + 's')
         res = dict((k, agent[k]) for k in attr
                    if k not in ['alive', 'configurations'])
+        res['heartbeat_timestamp'] = AgentDbMixin.get_heartbeat_timestamp(
+            res)
         res['alive'] = not AgentDbMixin.is_agent_down(
             res['heartbeat_timestamp'])
         res['configurations'] = self.get_configuration_dict(agent)
@@ -97,6 +251,7 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
         with context.session.begin(subtransactions=True):
             agent = self._get_agent(context, id)
             context.session.delete(agent)
+        heartbeats.forget(id)
 
     def update_agent(self, context, id, agent):
         agent_data = agent['agent']
@@ -133,27 +288,34 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
 
     def create_or_update_agent(self, context, agent):
         """Create or update agent according to report."""
+        configurations_dict = agent.get('configurations', {})
+        configurations = jsonutils.dumps(configurations_dict)
+        current_time = timeutils.utcnow()
+        if not agent.get('start_flag') and heartbeats.report(
+                agent['agent_type'], agent['host'], configurations,
+                current_time):
+            return
         with context.session.begin(subtransactions=True):
             res_keys = ['agent_type', 'binary', 'host', 'topic']
             res = dict((k, agent[k]) for k in res_keys)
-
-            configurations_dict = agent.get('configurations', {})
-            res['configurations'] = jsonutils.dumps(configurations_dict)
-            current_time = timeutils.utcnow()
             try:
                 agent_db = self._get_agent_by_type_and_host(
                     context, agent['agent_type'], agent['host'])
                 res['heartbeat_timestamp'] = current_time
                 if agent.get('start_flag'):
                     res['started_at'] = current_time
+                if agent_db.configurations != configurations:
+                    res['configurations'] = configurations
                 agent_db.update(res)
             except ext_agent.AgentNotFoundByTypeHost:
                 res['created_at'] = current_time
                 res['started_at'] = current_time
                 res['heartbeat_timestamp'] = current_time
                 res['admin_state_up'] = True
+                res['configurations'] = configurations
                 agent_db = Agent(**res)
                 context.session.add(agent_db)
+        heartbeats.remember(agent_db)
 
 
 class AgentExtRpcCallback(object):
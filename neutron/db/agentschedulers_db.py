@@ -17,6 +17,8 @@
 
 from oslo.config import cfg
 import sqlalchemy as sa
+from sqlalchemy import distinct
+from sqlalchemy import func
 from sqlalchemy import orm
 from sqlalchemy.orm import exc
 from sqlalchemy.orm import joinedload
@@ -97,8 +99,7 @@ class AgentSchedulerDbMixin(agents_db.AgentDbMixin):
             #                   filter is set, only agents which are 'up'
             #                   (i.e. have a recent heartbeat timestamp)
             #                   are eligible, even if active is False
-            return not agents_db.AgentDbMixin.is_agent_down(
-                agent['heartbeat_timestamp'])
+            return not agents_db.AgentDbMixin.is_agent_db_down(agent)
 
     def update_agent(self, context, id, agent):
         original_agent = self.get_agent(context, id)
@@ -228,8 +229,7 @@ class L3AgentSchedulerDbMixin(l3agentscheduler.L3AgentSchedulerPluginBase,
         if active is not None:
             l3_agents = [l3_agent for l3_agent in
                          l3_agents if not
-                         agents_db.AgentDbMixin.is_agent_down(
-                         l3_agent['heartbeat_timestamp'])]
+                         agents_db.AgentDbMixin.is_agent_db_down(l3_agent)]
         return l3_agents
 
     def _get_l3_bindings_hosting_routers(self, context, router_ids):
@@ -297,6 +297,41 @@ class L3AgentSchedulerDbMixin(l3agentscheduler.L3AgentSchedulerPluginBase,
             candidates.append(l3_agent)
         return candidates
 
+    def get_l3_agents_load(self, context, l3_agents):
+        """Return the loads of l3_agents by agent id.
+
+        A load is a (routers, ports) tuple of the number of routers bound
+        to the agent, counted for all the agents in one query, and of the
+        number of interfaces and floating IPs last reported by the agent.
+        """
+        if not l3_agents:
+            return {}
+        query = context.session.query(
+            RouterL3AgentBinding.l3_agent_id,
+            func.count(RouterL3AgentBinding.router_id))
+        query = query.filter(RouterL3AgentBinding.l3_agent_id.in_(
+            [l3_agent.id for l3_agent in l3_agents]))
+        query = query.group_by(RouterL3AgentBinding.l3_agent_id)
+        router_counts = dict(query)
+        loads = {}
+        for l3_agent in l3_agents:
+            agent_conf = self.get_configuration_dict(l3_agent)
+            ports = (agent_conf.get('interfaces', 0) +
+                     agent_conf.get('floating_ips', 0))
+            loads[l3_agent.id] = (router_counts.get(l3_agent.id, 0), ports)
+        return loads
+
+    def rebalance_routers(self, context, max_routers):
+        """Move up to max_routers routers off the most loaded agents."""
+        if not hasattr(self.router_scheduler, 'rebalance'):
+            raise l3agentscheduler.RouterRebalancingNotSupported(
+                scheduler=self.router_scheduler.__class__.__name__)
+        moves = self.router_scheduler.rebalance(self, context, max_routers)
+        return {'moved_routers': [{'router_id': router_id,
+                                   'source_agent_id': source.id,
+                                   'destination_agent_id': dest.id}
+                                  for router_id, source, dest in moves]}
+
     def auto_schedule_routers(self, context, host, router_ids):
         if self.router_scheduler:
             return self.router_scheduler.auto_schedule_routers(
@@ -332,7 +367,7 @@ class DhcpAgentSchedulerDbMixin(dhcpagentscheduler
                 NetworkDhcpAgentBinding.network_id == network_ids[0])
         elif network_ids:
             query = query.filter(
-                NetworkDhcpAgentBinding.network_id in network_ids)
+                NetworkDhcpAgentBinding.network_id.in_(network_ids))
         if active is not None:
             query = (query.filter(agents_db.Agent.admin_state_up == active))
 
@@ -341,6 +376,30 @@ class DhcpAgentSchedulerDbMixin(dhcpagentscheduler
                 if AgentSchedulerDbMixin.is_eligible_agent(active,
                                                            binding.dhcp_agent)]
 
+    def get_dhcp_agents_load(self, context, dhcp_agents):
+        """Return the loads of dhcp_agents by agent id.
+
+        A load is a (networks, ports) tuple of the number of networks bound
+        to the agent and of the number of ports on them, counted for all
+        the agents in one query.
+        """
+        if not dhcp_agents:
+            return {}
+        query = context.session.query(
+            NetworkDhcpAgentBinding.dhcp_agent_id,
+            func.count(distinct(NetworkDhcpAgentBinding.network_id)),
+            func.count(models_v2.Port.id))
+        query = query.outerjoin(
+            models_v2.Port,
+            models_v2.Port.network_id == NetworkDhcpAgentBinding.network_id)
+        query = query.filter(NetworkDhcpAgentBinding.dhcp_agent_id.in_(
+            [dhcp_agent.id for dhcp_agent in dhcp_agents]))
+        query = query.group_by(NetworkDhcpAgentBinding.dhcp_agent_id)
+        loads = dict((agent_id, (networks, ports))
+                     for agent_id, networks, ports in query)
+        return dict((dhcp_agent.id, loads.get(dhcp_agent.id, (0, 0)))
+                    for dhcp_agent in dhcp_agents)
+
     def add_network_to_dhcp_agent(self, context, id, network_id):
         self._get_network(context, network_id)
         with context.session.begin(subtransactions=True):
@@ -391,13 +450,19 @@ class DhcpAgentSchedulerDbMixin(dhcpagentscheduler
         else:
             return {'networks': []}
 
-    def list_active_networks_on_active_dhcp_agent(self, context, host):
+    def list_active_networks_on_active_dhcp_agent(self, context, host,
+                                                  network_ids=None):
         agent = self._get_agent_by_type_and_host(
             context, constants.AGENT_TYPE_DHCP, host)
         if not agent.admin_state_up:
             return []
         query = context.session.query(NetworkDhcpAgentBinding.network_id)
         query = query.filter(NetworkDhcpAgentBinding.dhcp_agent_id == agent.id)
+        if network_ids is not None:
+            if not network_ids:
+                return []
+            query = query.filter(
+                NetworkDhcpAgentBinding.network_id.in_(network_ids))
 
         net_ids = [item[0] for item in query]
         if net_ids:
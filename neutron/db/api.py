@@ -20,6 +20,7 @@
 import sqlalchemy as sql
 
 from neutron.db import model_base
+from neutron.db import query_stats
 from neutron.openstack.common.db.sqlalchemy import session
 from neutron.openstack.common import log as logging
 
@@ -38,6 +39,7 @@ def configure_db():
     global _DB_ENGINE
     if not _DB_ENGINE:
         _DB_ENGINE = session.get_engine(sqlite_fk=True)
+        query_stats.instrument(_DB_ENGINE)
         register_models()
 
 
@@ -50,9 +52,11 @@ def clear_db(base=BASE):
 
 def get_session(autocommit=True, expire_on_commit=False):
     """Helper method to grab session."""
-    return session.get_session(autocommit=autocommit,
-                               expire_on_commit=expire_on_commit,
-                               sqlite_fk=True)
+    db_session = session.get_session(autocommit=autocommit,
+                                     expire_on_commit=expire_on_commit,
+                                     sqlite_fk=True)
+    query_stats.instrument(db_session.bind)
+    return db_session
 
 
 def register_models(base=BASE):
@@ -27,6 +27,7 @@ from neutron.api.v2 import attributes
 from neutron.common import constants
 from neutron.common import exceptions as q_exc
 from neutron.db import api as db
+from neutron.db import ipam
 from neutron.db import models_v2
 from neutron.db import sqlalchemyutils
 from neutron import neutron_plugin_base_v2
@@ -84,6 +85,45 @@ class CommonDbMixin(object):
         model_hooks[name] = {'query': query_hook, 'filter': filter_hook,
                              'result_filters': result_filters}
 
+    # This dictionary maps models to the relationships read when building
+    # each field of the dicts made from them.
+    # Mixins and plugins can register the relationships they read with
+    # register_model_load_profile
+    _model_load_profiles = {}
+
+    @classmethod
+    def register_model_load_profile(cls, model, profile):
+        """Register the relationships read to build the dicts of a model.
+
+        profile maps the names of fields of the dicts made from model to
+        the relationships of model read to build them. When a collection
+        is read, the relationships behind the requested fields are loaded
+        along with the rows rather than with one query for each row.
+        """
+        model_profile = cls._model_load_profiles.setdefault(model, {})
+        for field, relationships in profile.iteritems():
+            model_profile.setdefault(field, []).extend(relationships)
+
+    def _apply_load_profile(self, query, model, fields=None):
+        relationships = set()
+        for field, field_relationships in self._model_load_profiles.get(
+                model, {}).iteritems():
+            if not fields or field in fields:
+                relationships.update(field_relationships)
+        mapper = orm.class_mapper(model)
+        for name in relationships:
+            prop = mapper.get_property(name)
+            if prop.lazy not in (True, 'select'):
+                # Already loaded with the rows
+                continue
+            # Lists are read with one more query for all the rows, so
+            # that the rows returned are not multiplied by a join
+            if prop.uselist:
+                query = query.options(orm.subqueryload(name))
+            else:
+                query = query.options(orm.joinedload(name))
+        return query
+
     def _model_query(self, context, model):
         query = context.session.query(model)
         # define basic filter condition for model query
@@ -166,6 +206,7 @@ class CommonDbMixin(object):
                                            limit=limit,
                                            marker_obj=marker_obj,
                                            page_reverse=page_reverse)
+        query = self._apply_load_profile(query, model, fields)
         items = [dict_func(c, fields) for c in query]
         if limit and page_reverse:
             items.reverse()
@@ -197,6 +238,16 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
     # TODO(salvatore-orlando): Avoid using class-level variables
     _dict_extend_functions = {}
 
+    # Relationships read to build the dicts of the core resources
+    CommonDbMixin.register_model_load_profile(
+        models_v2.Network, {'subnets': ['subnets']})
+    CommonDbMixin.register_model_load_profile(
+        models_v2.Subnet, {'allocation_pools': ['allocation_pools'],
+                           'dns_nameservers': ['dns_nameservers'],
+                           'host_routes': ['routes']})
+    CommonDbMixin.register_model_load_profile(
+        models_v2.Port, {'fixed_ips': ['fixed_ips']})
+
     def __init__(self):
         # NOTE(jkoelker) This is an incomlete implementation. Subclasses
         #                must override __init__ and setup the database
@@ -257,16 +308,20 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         return context.session.query(models_v2.Subnet).all()
 
     @staticmethod
-    def _generate_mac(context, network_id):
+    def _random_mac():
         base_mac = cfg.CONF.base_mac.split(':')
+        mac = [int(base_mac[0], 16), int(base_mac[1], 16),
+               int(base_mac[2], 16), random.randint(0x00, 0xff),
+               random.randint(0x00, 0xff), random.randint(0x00, 0xff)]
+        if base_mac[3] != '00':
+            mac[3] = int(base_mac[3], 16)
+        return ':'.join(map(lambda x: "%02x" % x, mac))
+
+    @staticmethod
+    def _generate_mac(context, network_id):
         max_retries = cfg.CONF.mac_generation_retries
         for i in range(max_retries):
-            mac = [int(base_mac[0], 16), int(base_mac[1], 16),
-                   int(base_mac[2], 16), random.randint(0x00, 0xff),
-                   random.randint(0x00, 0xff), random.randint(0x00, 0xff)]
-            if base_mac[3] != '00':
-                mac[3] = int(base_mac[3], 16)
-            mac_address = ':'.join(map(lambda x: "%02x" % x, mac))
+            mac_address = NeutronDbPluginV2._random_mac()
             if NeutronDbPluginV2._check_unique_mac(context, network_id,
                                                    mac_address):
                 LOG.debug(_("Generated mac for network %(network_id)s "
@@ -293,6 +348,47 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             return True
         return False
 
+    @staticmethod
+    def _get_used_macs(context, network_id, mac_addresses):
+        """Return the given MAC addresses already used on the network."""
+        if not mac_addresses:
+            return set()
+        mac_qry = context.session.query(models_v2.Port.mac_address)
+        mac_qry = mac_qry.filter(
+            models_v2.Port.network_id == network_id,
+            models_v2.Port.mac_address.in_(mac_addresses))
+        return set(mac_address for (mac_address,) in mac_qry)
+
+    @staticmethod
+    def _generate_macs(context, network_id, count, reserved=()):
+        """Generate count MAC addresses unique on the network.
+
+        The candidates of each attempt are checked with a single query.
+        """
+        macs = set()
+        reserved = set(reserved)
+        max_retries = cfg.CONF.mac_generation_retries
+        for i in range(max_retries):
+            candidates = set()
+            while len(macs) + len(candidates) < count:
+                candidates.add(NeutronDbPluginV2._random_mac())
+            candidates -= macs | reserved
+            candidates -= NeutronDbPluginV2._get_used_macs(
+                context, network_id, candidates)
+            macs |= candidates
+            if len(macs) == count:
+                LOG.debug(_("Generated %(count)d macs for network "
+                            "%(network_id)s"),
+                          {'count': count, 'network_id': network_id})
+                return list(macs)
+            LOG.debug(_("%(missing)d generated macs exist. Remaining "
+                        "attempts %(max_retries)s."),
+                      {'missing': count - len(macs),
+                       'max_retries': max_retries - (i + 1)})
+        LOG.error(_("Unable to generate mac address after %s attempts"),
+                  max_retries)
+        raise q_exc.MacAddressGenerationFailure(net_id=network_id)
+
     @staticmethod
     def _hold_ip(context, network_id, subnet_id, port_id, ip_address):
         alloc_qry = context.session.query(
@@ -318,11 +414,32 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             allocated.port_id = None
 
     @staticmethod
-    def _recycle_expired_ip_allocations(context, network_id):
-        """Return held ip allocations with expired leases back to the pool."""
+    def _recycle_expired_ip_allocations(context, network_id, inline=False):
+        """Return held ip allocations with expired leases back to the pool.
+
+        Unless inline is True, nothing is done when a periodic task
+        recycles the expired allocations.
+        """
+        if cfg.CONF.ip_recycle_interval and not inline:
+            # Expired allocations are recycled by a periodic task
+            return
         if network_id in getattr(context, '_recycled_networks', set()):
             return
 
+        NeutronDbPluginV2._recycle_expired_ips(context, network_id)
+
+        if hasattr(context, '_recycled_networks'):
+            context._recycled_networks.add(network_id)
+        else:
+            context._recycled_networks = set([network_id])
+
+    @staticmethod
+    def _recycle_expired_ips(context, network_id):
+        """Recycle the expired allocations of a network in bulk.
+
+        The addresses are grouped by subnet so that the IPAM backend can
+        coalesce them before writing the availability changes.
+        """
         expired_qry = context.session.query(
             models_v2.IPAllocation).with_lockmode('update')
         expired_qry = expired_qry.filter_by(network_id=network_id,
@@ -330,97 +447,49 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         expired_qry = expired_qry.filter(
             models_v2.IPAllocation.expiration <= timeutils.utcnow())
 
+        expired_by_subnet = {}
         for expired in expired_qry:
-            NeutronDbPluginV2._recycle_ip(context,
-                                          network_id,
-                                          expired['subnet_id'],
-                                          expired['ip_address'])
-
-        if hasattr(context, '_recycled_networks'):
-            context._recycled_networks.add(network_id)
-        else:
-            context._recycled_networks = set([network_id])
+            expired_by_subnet.setdefault(expired['subnet_id'],
+                                         []).append(expired)
+        for subnet_id, allocations in expired_by_subnet.iteritems():
+            ip_addresses = sorted(
+                (a['ip_address'] for a in allocations),
+                key=lambda ip_address: netaddr.IPAddress(ip_address))
+            LOG.debug(_("Recycle %(count)d expired IPs of "
+                        "%(network_id)s/%(subnet_id)s"),
+                      {'count': len(ip_addresses),
+                       'network_id': network_id,
+                       'subnet_id': subnet_id})
+            ipam.get_backend().release_ips(context, subnet_id, ip_addresses)
+            alloc_qry = context.session.query(models_v2.IPAllocation)
+            alloc_qry = alloc_qry.filter_by(network_id=network_id,
+                                            subnet_id=subnet_id)
+            alloc_qry = alloc_qry.filter(
+                models_v2.IPAllocation.ip_address.in_(ip_addresses))
+            alloc_qry.delete(synchronize_session=False)
+            for allocation in allocations:
+                context.session.expunge(allocation)
+
+    def recycle_expired_ip_allocations(self, context):
+        """Recycle the expired allocations of all the networks.
+
+        This is run periodically by the server when ip_recycle_interval
+        is set.
+        """
+        network_qry = context.session.query(
+            models_v2.IPAllocation.network_id).filter_by(port_id=None)
+        network_qry = network_qry.filter(
+            models_v2.IPAllocation.expiration <= timeutils.utcnow())
+        for (network_id,) in network_qry.distinct().all():
+            with context.session.begin(subtransactions=True):
+                self._recycle_expired_ips(context, network_id)
 
     @staticmethod
     def _recycle_ip(context, network_id, subnet_id, ip_address):
         """Return an IP address to the pool of free IP's on the network
         subnet.
         """
-        # Grab all allocation pools for the subnet
-        pool_qry = context.session.query(
-            models_v2.IPAllocationPool).with_lockmode('update')
-        allocation_pools = pool_qry.filter_by(subnet_id=subnet_id)
-        # Find the allocation pool for the IP to recycle
-        pool_id = None
-        for allocation_pool in allocation_pools:
-            allocation_pool_range = netaddr.IPRange(
-                allocation_pool['first_ip'],
-                allocation_pool['last_ip'])
-            if netaddr.IPAddress(ip_address) in allocation_pool_range:
-                pool_id = allocation_pool['id']
-                break
-        if not pool_id:
-            NeutronDbPluginV2._delete_ip_allocation(
-                context, network_id, subnet_id, ip_address)
-            return
-        # Two requests will be done on the database. The first will be to
-        # search if an entry starts with ip_address + 1 (r1). The second
-        # will be to see if an entry ends with ip_address -1 (r2).
-        # If 1 of the above holds true then the specific entry will be
-        # modified. If both hold true then the two ranges will be merged.
-        # If there are no entries then a single entry will be added.
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange).with_lockmode('update')
-        ip_first = str(netaddr.IPAddress(ip_address) + 1)
-        ip_last = str(netaddr.IPAddress(ip_address) - 1)
-        LOG.debug(_("Recycle %s"), ip_address)
-        try:
-            r1 = range_qry.filter_by(allocation_pool_id=pool_id,
-                                     first_ip=ip_first).one()
-            LOG.debug(_("Recycle: first match for %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
-        except exc.NoResultFound:
-            r1 = []
-        try:
-            r2 = range_qry.filter_by(allocation_pool_id=pool_id,
-                                     last_ip=ip_last).one()
-            LOG.debug(_("Recycle: last match for %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
-        except exc.NoResultFound:
-            r2 = []
-
-        if r1 and r2:
-            # Merge the two ranges
-            ip_range = models_v2.IPAvailabilityRange(
-                allocation_pool_id=pool_id,
-                first_ip=r2['first_ip'],
-                last_ip=r1['last_ip'])
-            context.session.add(ip_range)
-            LOG.debug(_("Recycle: merged %(first_ip1)s-%(last_ip1)s and "
-                        "%(first_ip2)s-%(last_ip2)s"),
-                      {'first_ip1': r2['first_ip'], 'last_ip1': r2['last_ip'],
-                       'first_ip2': r1['first_ip'], 'last_ip2': r1['last_ip']})
-            context.session.delete(r1)
-            context.session.delete(r2)
-        elif r1:
-            # Update the range with matched first IP
-            r1['first_ip'] = ip_address
-            LOG.debug(_("Recycle: updated first %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
-        elif r2:
-            # Update the range with matched last IP
-            r2['last_ip'] = ip_address
-            LOG.debug(_("Recycle: updated last %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
-        else:
-            # Create a new range
-            ip_range = models_v2.IPAvailabilityRange(
-                allocation_pool_id=pool_id,
-                first_ip=ip_address,
-                last_ip=ip_address)
-            context.session.add(ip_range)
-            LOG.debug(_("Recycle: created new %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': ip_address, 'last_ip': ip_address})
+        ipam.get_backend().release_ip(context, subnet_id, ip_address)
         NeutronDbPluginV2._delete_ip_allocation(context, network_id, subnet_id,
                                                 ip_address)
 
@@ -468,67 +537,27 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         """Generate an IP address.
 
         The IP address will be generated from one of the subnets defined on
-        the network.
+        the network. If the subnets are full and the expired allocations
+        are recycled periodically, those of the network are recycled now
+        before trying again, instead of failing until the task runs.
         """
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange).join(
-                models_v2.IPAllocationPool).with_lockmode('update')
-        for subnet in subnets:
-            range = range_qry.filter_by(subnet_id=subnet['id']).first()
-            if not range:
-                LOG.debug(_("All IP's from subnet %(subnet_id)s (%(cidr)s) "
-                            "allocated"),
-                          {'subnet_id': subnet['id'], 'cidr': subnet['cidr']})
-                continue
-            ip_address = range['first_ip']
-            LOG.debug(_("Allocated IP - %(ip_address)s from %(first_ip)s "
-                        "to %(last_ip)s"),
-                      {'ip_address': ip_address,
-                       'first_ip': range['first_ip'],
-                       'last_ip': range['last_ip']})
-            if range['first_ip'] == range['last_ip']:
-                # No more free indices on subnet => delete
-                LOG.debug(_("No more free IP's in slice. Deleting allocation "
-                            "pool."))
-                context.session.delete(range)
-            else:
-                # increment the first free
-                range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
-            return {'ip_address': ip_address, 'subnet_id': subnet['id']}
-        raise q_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
+        try:
+            return ipam.get_backend().generate_ip(context, subnets)
+        except q_exc.IpAddressGenerationFailure:
+            network_id = subnets[0]['network_id']
+            if (not cfg.CONF.ip_recycle_interval or network_id in
+                    getattr(context, '_recycled_networks', set())):
+                raise
+            LOG.debug(_("No IP available on network %s, recycling its "
+                        "expired allocations"), network_id)
+            NeutronDbPluginV2._recycle_expired_ip_allocations(
+                context, network_id, inline=True)
+            return ipam.get_backend().generate_ip(context, subnets)
 
     @staticmethod
     def _allocate_specific_ip(context, subnet_id, ip_address):
         """Allocate a specific IP address on the subnet."""
-        ip = int(netaddr.IPAddress(ip_address))
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange).join(
-                models_v2.IPAllocationPool).with_lockmode('update')
-        results = range_qry.filter_by(subnet_id=subnet_id)
-        for range in results:
-            first = int(netaddr.IPAddress(range['first_ip']))
-            last = int(netaddr.IPAddress(range['last_ip']))
-            if first <= ip <= last:
-                if first == last:
-                    context.session.delete(range)
-                    return
-                elif first == ip:
-                    range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
-                    return
-                elif last == ip:
-                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
-                    return
-                else:
-                    # Split into two ranges
-                    new_first = str(netaddr.IPAddress(ip_address) + 1)
-                    new_last = range['last_ip']
-                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
-                    ip_range = models_v2.IPAvailabilityRange(
-                        allocation_pool_id=range['allocation_pool_id'],
-                        first_ip=new_first,
-                        last_ip=new_last)
-                    context.session.add(ip_range)
-                    return
+        ipam.get_backend().allocate_specific_ip(context, subnet_id, ip_address)
 
     @staticmethod
     def _check_unique_ip(context, network_id, subnet_id, ip_address):
@@ -665,6 +694,67 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                             'subnet_id': result['subnet_id']})
         return ips
 
+    def _allocate_ips_for_ports(self, context, network_id, ports):
+        """Allocate the IP addresses of many ports of a network.
+
+        The addresses generated for the ports are taken from each subnet
+        at once, instead of port by port.
+
+        :returns: the list of the IPs of each port.
+        """
+        port_ips = []
+        # (port index, fixed IP index) of the addresses generated per
+        # subnet, and of the ports getting an address of each IP version
+        pending = {}
+        unconfigured = []
+        # The addresses requested by the ports are not flushed yet, so
+        # they are checked against each other here
+        requested = set()
+        for index, p in enumerate(ports):
+            ips = []
+            if p['fixed_ips'] is attributes.ATTR_NOT_SPECIFIED:
+                unconfigured.append(index)
+            else:
+                configured_ips = self._test_fixed_ips_for_port(
+                    context, network_id, p['fixed_ips'])
+                for fixed in configured_ips:
+                    if 'ip_address' in fixed:
+                        key = (fixed['subnet_id'], fixed['ip_address'])
+                        if key in requested:
+                            raise q_exc.IpAddressInUse(
+                                net_id=network_id,
+                                ip_address=fixed['ip_address'])
+                        requested.add(key)
+                        NeutronDbPluginV2._allocate_specific_ip(
+                            context, fixed['subnet_id'], fixed['ip_address'])
+                        ips.append({'ip_address': fixed['ip_address'],
+                                    'subnet_id': fixed['subnet_id']})
+                    else:
+                        pending.setdefault(fixed['subnet_id'], []).append(
+                            (index, len(ips)))
+                        ips.append(None)
+            port_ips.append(ips)
+
+        backend = ipam.get_backend()
+        for subnet_id, positions in pending.iteritems():
+            subnets = [self._get_subnet(context, subnet_id)]
+            results = backend.generate_ips(context, subnets, len(positions))
+            for (index, position), result in zip(positions, results):
+                port_ips[index][position] = result
+        if unconfigured:
+            filter = {'network_id': [network_id]}
+            subnets = self.get_subnets(context, filters=filter)
+            for ip_version in (4, 6):
+                version_subnets = [subnet for subnet in subnets
+                                   if subnet['ip_version'] == ip_version]
+                if not version_subnets:
+                    continue
+                results = backend.generate_ips(context, version_subnets,
+                                               len(unconfigured))
+                for index, result in zip(unconfigured, results):
+                    port_ips[index].append(result)
+        return port_ips
+
     def _update_ips_for_port(self, context, network_id, port_id, original_ips,
                              new_ips):
         """Add or remove IPs from the port."""
@@ -899,9 +989,11 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                'tenant_id': network['tenant_id'],
                'admin_state_up': network['admin_state_up'],
                'status': network['status'],
-               'shared': network['shared'],
-               'subnets': [subnet['id']
-                           for subnet in network['subnets']]}
+               'shared': network['shared']}
+        # The subnets are only read if requested, as they are loaded
+        # with a query of their own
+        if not fields or 'subnets' in fields:
+            res['subnets'] = [subnet['id'] for subnet in network['subnets']]
         # Call auxiliary extend functions, if any
         if process_extensions:
             for func in self._dict_extend_functions.get(attributes.NETWORKS,
@@ -921,13 +1013,17 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                     for pool in subnet['allocation_pools']],
                'gateway_ip': subnet['gateway_ip'],
                'enable_dhcp': subnet['enable_dhcp'],
-               'dns_nameservers': [dns['address']
-                                   for dns in subnet['dns_nameservers']],
-               'host_routes': [{'destination': route['destination'],
-                                'nexthop': route['nexthop']}
-                               for route in subnet['routes']],
                'shared': subnet['shared']
                }
+        # The name servers and routes are only read if requested, as they
+        # are loaded with queries of their own
+        if not fields or 'dns_nameservers' in fields:
+            res['dns_nameservers'] = [dns['address']
+                                      for dns in subnet['dns_nameservers']]
+        if not fields or 'host_routes' in fields:
+            res['host_routes'] = [{'destination': route['destination'],
+                                   'nexthop': route['nexthop']}
+                                  for route in subnet['routes']]
         return self._fields(res, fields)
 
     def _make_port_dict(self, port, fields=None,
@@ -1027,9 +1123,10 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             for port in ports:
                 self._delete_port(context, port['id'])
 
-            # clean up subnets
-            subnets_qry = context.session.query(models_v2.Subnet)
-            subnets_qry.filter_by(network_id=id).delete()
+            # clean up subnets through the session, so that the flush
+            # updates the quota usage of their tenant only
+            for subnet in self._get_subnets_by_network(context, id):
+                context.session.delete(subnet)
             context.session.delete(network)
 
     def get_network(self, context, id, fields=None):
@@ -1172,16 +1269,15 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                         nexthop=rt['nexthop'])
                     context.session.add(route)
 
+            ip_pools = []
             for pool in s['allocation_pools']:
                 ip_pool = models_v2.IPAllocationPool(subnet=subnet,
                                                      first_ip=pool['start'],
                                                      last_ip=pool['end'])
                 context.session.add(ip_pool)
-                ip_range = models_v2.IPAvailabilityRange(
-                    ipallocationpool=ip_pool,
-                    first_ip=pool['start'],
-                    last_ip=pool['end'])
-                context.session.add(ip_range)
+                ip_pools.append(ip_pool)
+            ipam.get_backend().create_subnet_availability(context, subnet,
+                                                          ip_pools)
 
         return self._make_subnet_dict(subnet)
 
@@ -1378,6 +1474,89 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
 
         return self._make_port_dict(port, process_extensions=False)
 
+    def _create_ports_bulk(self, context, ports):
+        """Create the ports of a bulk request together.
+
+        The MAC and IP addresses of the ports are allocated once per
+        network and subnet for the whole batch, and the rows are inserted
+        by a single flush. Plugins call it in their own transaction from
+        create_port_bulk, in place of create_port for each port.
+        """
+        items = [port['port'] for port in ports]
+        # NOTE(jkoelker) Get the tenant_id outside of the session to avoid
+        #                unneeded db action if the operation raises
+        tenant_ids = [self._get_tenant_id_for_create(context, p)
+                      for p in items]
+        network_ports = {}
+        for index, p in enumerate(items):
+            network_ports.setdefault(p['network_id'], []).append(index)
+
+        macs = [None] * len(items)
+        ips = [None] * len(items)
+        with context.session.begin(subtransactions=True):
+            for network_id, indexes in network_ports.iteritems():
+                self._recycle_expired_ip_allocations(context, network_id)
+                self._get_network(context, network_id)
+
+                # Ensure that the MAC addresses are defined and unique on
+                # the network
+                configured = [items[index]['mac_address']
+                              for index in indexes
+                              if items[index]['mac_address'] is not
+                              attributes.ATTR_NOT_SPECIFIED]
+                used = self._get_used_macs(context, network_id, configured)
+                if len(set(configured)) < len(configured):
+                    used.update(mac for mac in configured
+                                if configured.count(mac) > 1)
+                if used:
+                    raise q_exc.MacAddressInUse(net_id=network_id,
+                                                mac=used.pop())
+                generated = iter(self._generate_macs(
+                    context, network_id, len(indexes) - len(configured),
+                    reserved=configured))
+                for index in indexes:
+                    mac_address = items[index]['mac_address']
+                    if mac_address is attributes.ATTR_NOT_SPECIFIED:
+                        mac_address = generated.next()
+                    macs[index] = mac_address
+
+                network_ips = self._allocate_ips_for_ports(
+                    context, network_id, [items[index] for index in indexes])
+                for index, port_ips in zip(indexes, network_ips):
+                    ips[index] = port_ips
+
+            expiration = self._default_allocation_expiration()
+            created = []
+            for p, tenant_id, mac_address, port_ips in zip(items, tenant_ids,
+                                                          macs, ips):
+                port_id = p.get('id') or uuidutils.generate_uuid()
+                port = models_v2.Port(tenant_id=tenant_id,
+                                      name=p['name'],
+                                      id=port_id,
+                                      network_id=p['network_id'],
+                                      mac_address=mac_address,
+                                      admin_state_up=p['admin_state_up'],
+                                      status=p.get(
+                                          'status',
+                                          constants.PORT_STATUS_ACTIVE),
+                                      device_id=p['device_id'],
+                                      device_owner=p['device_owner'])
+                # The allocations are set on the new port so that they
+                # are flushed with it and never loaded back
+                port.fixed_ips = [
+                    models_v2.IPAllocation(network_id=p['network_id'],
+                                           port_id=port_id,
+                                           ip_address=ip['ip_address'],
+                                           subnet_id=ip['subnet_id'],
+                                           expiration=expiration)
+                    for ip in port_ips]
+                context.session.add(port)
+                created.append(port)
+            LOG.debug(_("Allocated the IPs of %d ports"), len(created))
+
+        return [self._make_port_dict(port, process_extensions=False)
+                for port in created]
+
     def update_port(self, context, id, port):
         p = port['port']
 
@@ -1486,6 +1665,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                       sorts=sorts, limit=limit,
                                       marker_obj=marker_obj,
                                       page_reverse=page_reverse)
+        query = self._apply_load_profile(query, models_v2.Port, fields)
         items = [self._make_port_dict(c, fields) for c in query]
         if limit and page_reverse:
             items.reverse()
@@ -13,6 +13,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
+
 from oslo.config import cfg
 from sqlalchemy.orm import exc
 
@@ -20,27 +22,66 @@ from neutron.api.v2 import attributes
 from neutron.common import constants
 from neutron.common import utils
 from neutron import manager
+from neutron.openstack.common import jsonutils
 from neutron.openstack.common import log as logging
 
 
 LOG = logging.getLogger(__name__)
 
+# The attributes of a network used by the DHCP agent, which make up its
+# digest
+DIGEST_SUBNET_FIELDS = ('id', 'cidr', 'ip_version', 'gateway_ip',
+                        'enable_dhcp', 'dns_nameservers', 'host_routes')
+DIGEST_PORT_FIELDS = ('id', 'mac_address', 'fixed_ips', 'device_id',
+                      'device_owner')
+
+
+def get_network_digest(network):
+    """Return a digest of the DHCP configuration of a network.
+
+    network holds its subnets and ports, as returned to the DHCP agent.
+    """
+    subnets = [dict((field, subnet.get(field))
+                    for field in DIGEST_SUBNET_FIELDS)
+               for subnet in network['subnets'] if subnet['enable_dhcp']]
+    ports = []
+    for port in network['ports']:
+        port = dict((field, port.get(field)) for field in DIGEST_PORT_FIELDS)
+        port['fixed_ips'] = sorted((ip['subnet_id'], ip['ip_address'])
+                                   for ip in port['fixed_ips'] or [])
+        ports.append(port)
+    state = {'id': network['id'],
+             'admin_state_up': network.get('admin_state_up'),
+             'subnets': sorted(subnets, key=lambda subnet: subnet['id']),
+             'ports': sorted(ports, key=lambda port: port['id'])}
+    return hashlib.sha1(jsonutils.dumps(state, sort_keys=True)).hexdigest()
+
 
 class DhcpRpcCallbackMixin(object):
     """A mix-in that enable DHCP agent support in plugin implementations."""
 
     def _get_active_networks(self, context, **kwargs):
-        """Retrieve and return a list of the active networks."""
+        """Retrieve and return a list of the active networks.
+
+        Only the networks listed in network_ids are returned if given,
+        without scheduling the networks first: the agent asks for them
+        after it got the list of its networks.
+        """
         host = kwargs.get('host')
+        network_ids = kwargs.get('network_ids')
         plugin = manager.NeutronManager.get_plugin()
         if utils.is_extension_supported(
             plugin, constants.DHCP_AGENT_SCHEDULER_EXT_ALIAS):
-            if cfg.CONF.network_auto_schedule:
+            if cfg.CONF.network_auto_schedule and network_ids is None:
                 plugin.auto_schedule_networks(context, host)
             nets = plugin.list_active_networks_on_active_dhcp_agent(
-                context, host)
+                context, host, network_ids=network_ids)
+        elif network_ids is not None and not network_ids:
+            nets = []
         else:
             filters = dict(admin_state_up=[True])
+            if network_ids is not None:
+                filters['id'] = network_ids
             nets = plugin.get_networks(context, filters=filters)
         return nets
 
@@ -54,25 +95,57 @@ class DhcpRpcCallbackMixin(object):
         nets = self._get_active_networks(context, **kwargs)
         return [net['id'] for net in nets]
 
-    def get_active_networks_info(self, context, **kwargs):
-        """Returns all the networks/subnets/ports in system."""
-        host = kwargs.get('host')
-        LOG.debug(_('get_active_networks_info from %s'), host)
+    def _get_active_networks_info(self, context, port_fields=None,
+                                  **kwargs):
+        """Return the active networks with their subnets and ports.
+
+        Only the networks listed in network_ids are returned if given.
+        """
         networks = self._get_active_networks(context, **kwargs)
+        if not networks:
+            return []
         plugin = manager.NeutronManager.get_plugin()
         filters = {'network_id': [network['id'] for network in networks]}
-        ports = plugin.get_ports(context, filters=filters)
+        ports = plugin.get_ports(context, filters=filters, fields=port_fields)
         filters['enable_dhcp'] = [True]
         subnets = plugin.get_subnets(context, filters=filters)
 
+        network_subnets = dict((network['id'], []) for network in networks)
+        network_ports = dict((network['id'], []) for network in networks)
+        for subnet in subnets:
+            network_subnets[subnet['network_id']].append(subnet)
+        for port in ports:
+            network_ports[port['network_id']].append(port)
         for network in networks:
-            network['subnets'] = [subnet for subnet in subnets
-                                  if subnet['network_id'] == network['id']]
-            network['ports'] = [port for port in ports
-                                if port['network_id'] == network['id']]
+            network['subnets'] = network_subnets[network['id']]
+            network['ports'] = network_ports[network['id']]
+            network['digest'] = get_network_digest(network)
 
         return networks
 
+    def get_active_networks_info(self, context, **kwargs):
+        """Returns all the networks/subnets/ports in system.
+
+        Only the networks listed in network_ids are returned if given.
+        """
+        host = kwargs.get('host')
+        LOG.debug(_('get_active_networks_info from %s'), host)
+        return self._get_active_networks_info(context, **kwargs)
+
+    def get_active_networks_digests(self, context, **kwargs):
+        """Return the digest of the DHCP configuration of each network.
+
+        The agent only needs to fetch the networks whose digest differs
+        from the one it last got for them.
+        """
+        host = kwargs.get('host')
+        LOG.debug(_('get_active_networks_digests from %s'), host)
+        networks = self._get_active_networks_info(
+            context, port_fields=DIGEST_PORT_FIELDS + ('network_id',),
+            **kwargs)
+        return dict((network['id'], network['digest'])
+                    for network in networks)
+
     def get_network_info(self, context, **kwargs):
         """Retrieve and return a extended information about a network."""
         network_id = kwargs.get('network_id')
@@ -86,6 +159,7 @@ class DhcpRpcCallbackMixin(object):
         filters = dict(network_id=[network_id])
         network['subnets'] = plugin.get_subnets(context, filters=filters)
         network['ports'] = plugin.get_ports(context, filters=filters)
+        network['digest'] = get_network_digest(network)
         return network
 
     def get_dhcp_port(self, context, **kwargs):
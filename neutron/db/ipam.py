@@ -0,0 +1,680 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""IP address management backends for NeutronDbPluginV2.
+
+A backend owns the bookkeeping of which addresses of a subnet's allocation
+pools are still free. NeutronDbPluginV2 keeps ownership of IPAllocation
+rows and delegates the free-address bookkeeping to the backend selected by
+the 'ipam_backend' configuration option.
+"""
+
+from abc import ABCMeta, abstractmethod
+
+import netaddr
+from oslo.config import cfg
+from sqlalchemy.orm import exc
+
+from neutron.common import exceptions as q_exc
+from neutron.db import models_v2
+from neutron.openstack.common import importutils
+from neutron.openstack.common import log as logging
+from neutron.openstack.common import uuidutils
+
+
+LOG = logging.getLogger(__name__)
+
+ipam_opts = [
+    cfg.StrOpt('ipam_backend',
+               default='neutron.db.ipam.RangeIpamBackend',
+               help=_("The IPAM backend used to track free IP addresses")),
+    cfg.IntOpt('ipam_bitmap_max_size', default=65536,
+               help=_("Largest number of addresses a subnet may span to be "
+                      "tracked with a bitmap. Larger subnets fall back to "
+                      "availability ranges")),
+    cfg.IntOpt('ipam_cas_retries', default=10,
+               help=_("How many times a conflicting bitmap update is "
+                      "retried before giving up")),
+]
+
+cfg.CONF.register_opts(ipam_opts)
+
+_BACKEND = None
+_BACKEND_CLASS = None
+
+
+def get_backend():
+    """Return the IPAM backend configured by the 'ipam_backend' option."""
+    global _BACKEND, _BACKEND_CLASS
+    if _BACKEND is None or _BACKEND_CLASS != cfg.CONF.ipam_backend:
+        _BACKEND_CLASS = cfg.CONF.ipam_backend
+        LOG.debug(_("Loading IPAM backend %s"), _BACKEND_CLASS)
+        _BACKEND = importutils.import_object(_BACKEND_CLASS)
+    return _BACKEND
+
+
+def coalesce_ranges(ranges):
+    """Merge overlapping or adjacent (first, last) integer pairs.
+
+    :returns: the merged pairs, sorted.
+    """
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            if last > merged[-1][1]:
+                merged[-1] = (merged[-1][0], last)
+        else:
+            merged.append((first, last))
+    return merged
+
+
+class IpamBackendBase(object):
+    """Interface of the free IP address bookkeeping of a subnet.
+
+    All methods run within the caller's transaction.
+    """
+
+    __metaclass__ = ABCMeta
+
+    @abstractmethod
+    def create_subnet_availability(self, context, subnet, ip_pools):
+        """Mark all the addresses of the given pools as free.
+
+        :param subnet: the Subnet model being created.
+        :param ip_pools: the IPAllocationPool models of the subnet.
+        """
+        pass
+
+    @abstractmethod
+    def generate_ip(self, context, subnets):
+        """Take a free IP address from the first subnet that has one.
+
+        :returns: a dict with the 'ip_address' and 'subnet_id' keys.
+        :raises: IpAddressGenerationFailure
+        """
+        pass
+
+    def generate_ips(self, context, subnets, count):
+        """Take count free IP addresses from the subnets, in order.
+
+        Backends should override this when they can do better than
+        generating the addresses one by one.
+
+        :returns: a list of dicts with the 'ip_address' and 'subnet_id' keys.
+        :raises: IpAddressGenerationFailure
+        """
+        return [self.generate_ip(context, subnets) for i in xrange(count)]
+
+    @abstractmethod
+    def allocate_specific_ip(self, context, subnet_id, ip_address):
+        """Mark the given IP address as no longer free."""
+        pass
+
+    @abstractmethod
+    def release_ip(self, context, subnet_id, ip_address):
+        """Return the given IP address to the free addresses of the subnet.
+
+        Addresses outside the allocation pools of the subnet are ignored.
+        """
+        pass
+
+    def release_ips(self, context, subnet_id, ip_addresses):
+        """Return many IP addresses of the subnet at once.
+
+        Backends should override this when they can do better than
+        releasing the addresses one by one.
+        """
+        for ip_address in ip_addresses:
+            self.release_ip(context, subnet_id, ip_address)
+
+
+class RangeIpamBackend(IpamBackendBase):
+    """Track free addresses as IPAvailabilityRange rows.
+
+    Every operation locks the availability ranges of the subnet with
+    SELECT ... FOR UPDATE.
+    """
+
+    def create_subnet_availability(self, context, subnet, ip_pools):
+        for ip_pool in ip_pools:
+            ip_range = models_v2.IPAvailabilityRange(
+                ipallocationpool=ip_pool,
+                first_ip=ip_pool['first_ip'],
+                last_ip=ip_pool['last_ip'])
+            context.session.add(ip_range)
+
+    def generate_ip(self, context, subnets):
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).join(
+                models_v2.IPAllocationPool).with_lockmode('update')
+        for subnet in subnets:
+            range = range_qry.filter_by(subnet_id=subnet['id']).first()
+            if not range:
+                LOG.debug(_("All IP's from subnet %(subnet_id)s (%(cidr)s) "
+                            "allocated"),
+                          {'subnet_id': subnet['id'], 'cidr': subnet['cidr']})
+                continue
+            ip_address = range['first_ip']
+            LOG.debug(_("Allocated IP - %(ip_address)s from %(first_ip)s "
+                        "to %(last_ip)s"),
+                      {'ip_address': ip_address,
+                       'first_ip': range['first_ip'],
+                       'last_ip': range['last_ip']})
+            if range['first_ip'] == range['last_ip']:
+                # No more free indices on subnet => delete
+                LOG.debug(_("No more free IP's in slice. Deleting allocation "
+                            "pool."))
+                context.session.delete(range)
+            else:
+                # increment the first free
+                range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
+            return {'ip_address': ip_address, 'subnet_id': subnet['id']}
+        raise q_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
+
+    def generate_ips(self, context, subnets, count):
+        """Take the addresses from the ranges of each subnet at once.
+
+        The availability ranges of a subnet are locked and read once for
+        the whole batch.
+        """
+        ips = []
+        if not count:
+            return ips
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).join(
+                models_v2.IPAllocationPool).with_lockmode('update')
+        for subnet in subnets:
+            for range in range_qry.filter_by(subnet_id=subnet['id']).all():
+                first_ip = netaddr.IPAddress(range['first_ip'])
+                first = int(first_ip)
+                last = int(netaddr.IPAddress(range['last_ip']))
+                taken = min(count - len(ips), last - first + 1)
+                ips.extend({'ip_address': str(netaddr.IPAddress(
+                               first + i, version=first_ip.version)),
+                            'subnet_id': subnet['id']}
+                           for i in xrange(taken))
+                if first + taken > last:
+                    context.session.delete(range)
+                else:
+                    range['first_ip'] = str(netaddr.IPAddress(
+                        first + taken, version=first_ip.version))
+                if len(ips) == count:
+                    LOG.debug(_("Allocated %(count)d IPs from subnets "
+                                "%(subnet_ids)s"),
+                              {'count': count,
+                               'subnet_ids': [s['id'] for s in subnets]})
+                    return ips
+            LOG.debug(_("All IP's from subnet %(subnet_id)s (%(cidr)s) "
+                        "allocated"),
+                      {'subnet_id': subnet['id'], 'cidr': subnet['cidr']})
+        raise q_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
+
+    def allocate_specific_ip(self, context, subnet_id, ip_address):
+        ip = int(netaddr.IPAddress(ip_address))
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).join(
+                models_v2.IPAllocationPool).with_lockmode('update')
+        results = range_qry.filter_by(subnet_id=subnet_id)
+        for range in results:
+            first = int(netaddr.IPAddress(range['first_ip']))
+            last = int(netaddr.IPAddress(range['last_ip']))
+            if first <= ip <= last:
+                if first == last:
+                    context.session.delete(range)
+                    return
+                elif first == ip:
+                    range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
+                    return
+                elif last == ip:
+                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
+                    return
+                else:
+                    # Split into two ranges
+                    new_first = str(netaddr.IPAddress(ip_address) + 1)
+                    new_last = range['last_ip']
+                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
+                    ip_range = models_v2.IPAvailabilityRange(
+                        allocation_pool_id=range['allocation_pool_id'],
+                        first_ip=new_first,
+                        last_ip=new_last)
+                    context.session.add(ip_range)
+                    return
+
+    def release_ip(self, context, subnet_id, ip_address):
+        # Grab all allocation pools for the subnet
+        pool_qry = context.session.query(
+            models_v2.IPAllocationPool).with_lockmode('update')
+        allocation_pools = pool_qry.filter_by(subnet_id=subnet_id)
+        # Find the allocation pool for the IP to recycle
+        pool_id = None
+        for allocation_pool in allocation_pools:
+            allocation_pool_range = netaddr.IPRange(
+                allocation_pool['first_ip'],
+                allocation_pool['last_ip'])
+            if netaddr.IPAddress(ip_address) in allocation_pool_range:
+                pool_id = allocation_pool['id']
+                break
+        if not pool_id:
+            return
+        # Two requests will be done on the database. The first will be to
+        # search if an entry starts with ip_address + 1 (r1). The second
+        # will be to see if an entry ends with ip_address -1 (r2).
+        # If 1 of the above holds true then the specific entry will be
+        # modified. If both hold true then the two ranges will be merged.
+        # If there are no entries then a single entry will be added.
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).with_lockmode('update')
+        ip_first = str(netaddr.IPAddress(ip_address) + 1)
+        ip_last = str(netaddr.IPAddress(ip_address) - 1)
+        LOG.debug(_("Recycle %s"), ip_address)
+        try:
+            r1 = range_qry.filter_by(allocation_pool_id=pool_id,
+                                     first_ip=ip_first).one()
+            LOG.debug(_("Recycle: first match for %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
+        except exc.NoResultFound:
+            r1 = []
+        try:
+            r2 = range_qry.filter_by(allocation_pool_id=pool_id,
+                                     last_ip=ip_last).one()
+            LOG.debug(_("Recycle: last match for %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
+        except exc.NoResultFound:
+            r2 = []
+
+        if r1 and r2:
+            # Merge the two ranges
+            ip_range = models_v2.IPAvailabilityRange(
+                allocation_pool_id=pool_id,
+                first_ip=r2['first_ip'],
+                last_ip=r1['last_ip'])
+            context.session.add(ip_range)
+            LOG.debug(_("Recycle: merged %(first_ip1)s-%(last_ip1)s and "
+                        "%(first_ip2)s-%(last_ip2)s"),
+                      {'first_ip1': r2['first_ip'], 'last_ip1': r2['last_ip'],
+                       'first_ip2': r1['first_ip'], 'last_ip2': r1['last_ip']})
+            context.session.delete(r1)
+            context.session.delete(r2)
+        elif r1:
+            # Update the range with matched first IP
+            r1['first_ip'] = ip_address
+            LOG.debug(_("Recycle: updated first %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
+        elif r2:
+            # Update the range with matched last IP
+            r2['last_ip'] = ip_address
+            LOG.debug(_("Recycle: updated last %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
+        else:
+            # Create a new range
+            ip_range = models_v2.IPAvailabilityRange(
+                allocation_pool_id=pool_id,
+                first_ip=ip_address,
+                last_ip=ip_address)
+            context.session.add(ip_range)
+            LOG.debug(_("Recycle: created new %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': ip_address, 'last_ip': ip_address})
+
+    def release_ips(self, context, subnet_id, ip_addresses):
+        """Merge the addresses into the availability ranges of their pool.
+
+        The ranges of every affected pool are coalesced in memory and
+        rewritten with one delete and one multi-row insert.
+        """
+        pool_qry = context.session.query(
+            models_v2.IPAllocationPool).with_lockmode('update')
+        pools = [(int(netaddr.IPAddress(pool['first_ip'])),
+                  int(netaddr.IPAddress(pool['last_ip'])),
+                  pool['id'])
+                 for pool in pool_qry.filter_by(subnet_id=subnet_id)]
+        released = {}
+        for ip_address in ip_addresses:
+            ip = int(netaddr.IPAddress(ip_address))
+            for first, last, pool_id in pools:
+                if first <= ip <= last:
+                    released.setdefault(pool_id, []).append((ip, ip))
+                    break
+        if not released:
+            return
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).with_lockmode('update')
+        range_table = models_v2.IPAvailabilityRange.__table__
+        for pool_id, ranges in released.iteritems():
+            existing = [(int(netaddr.IPAddress(r['first_ip'])),
+                         int(netaddr.IPAddress(r['last_ip'])))
+                        for r in range_qry.filter_by(
+                            allocation_pool_id=pool_id)]
+            merged = coalesce_ranges(existing + ranges)
+            if merged == sorted(existing):
+                continue
+            LOG.debug(_("Recycle %(count)d IPs into %(ranges)d ranges of "
+                        "allocation pool %(pool_id)s"),
+                      {'count': len(ranges), 'ranges': len(merged),
+                       'pool_id': pool_id})
+            if existing:
+                context.session.execute(range_table.delete().where(
+                    range_table.c.allocation_pool_id == pool_id))
+            context.session.execute(
+                range_table.insert(),
+                [{'allocation_pool_id': pool_id,
+                  'first_ip': str(netaddr.IPAddress(first)),
+                  'last_ip': str(netaddr.IPAddress(last))}
+                 for first, last in merged])
+
+
+class SubnetBitmap(object):
+    """Free address bitmap of the allocation pools of a subnet.
+
+    Bit i tracks the address base + i; a set bit means the address is not
+    available, either because it is allocated or because it lies outside
+    the allocation pools.
+    """
+
+    def __init__(self, base, size, pools, version=4, bits=None):
+        self.base = base
+        self.size = size
+        # Allocation pools as (first, last) integer offsets
+        self.pools = pools
+        self.version = version
+        if bits is None:
+            bits = bytearray('\xff' * ((size + 7) // 8))
+            for first, last in pools:
+                self._clear(bits, first, last)
+        self.bits = bits
+        # Every byte below the hint is known to be full
+        self._hint = 0
+
+    @staticmethod
+    def _clear(bits, first, last):
+        """Clear the bits first to last, whole bytes at a time."""
+        while first <= last and first & 7:
+            bits[first >> 3] &= ~(0x80 >> (first & 7))
+            first += 1
+        while first <= last and (last + 1) & 7:
+            bits[last >> 3] &= ~(0x80 >> (last & 7))
+            last -= 1
+        if first <= last:
+            bits[first >> 3:(last >> 3) + 1] = bytearray(
+                (last - first + 1) >> 3)
+
+    @staticmethod
+    def span(ip_pools):
+        """Return the (base, size) of the bitmap of the given pools."""
+        base = min(int(netaddr.IPAddress(first)) for first, last in ip_pools)
+        top = max(int(netaddr.IPAddress(last)) for first, last in ip_pools)
+        return base, top - base + 1
+
+    @classmethod
+    def from_pools(cls, ip_pools):
+        """Build an empty bitmap spanning the given (first, last) pairs."""
+        ranges = [(netaddr.IPAddress(first), netaddr.IPAddress(last))
+                  for first, last in ip_pools]
+        base, size = cls.span(ip_pools)
+        return cls(base, size,
+                   [(int(first) - base, int(last) - base)
+                    for first, last in ranges],
+                   version=ranges[0][0].version)
+
+    def copy(self):
+        bitmap = SubnetBitmap(self.base, self.size, self.pools,
+                              self.version, bytearray(self.bits))
+        bitmap._hint = self._hint
+        return bitmap
+
+    def _index(self, ip_address):
+        index = int(netaddr.IPAddress(ip_address)) - self.base
+        for first, last in self.pools:
+            if first <= index <= last:
+                return index
+
+    def allocate_first(self):
+        """Mark the lowest free address as used and return it.
+
+        :returns: the IP address as a string or None if the pools are full.
+        """
+        bits = self.bits
+        # Skip full bytes without looping in python
+        tail = str(bits[self._hint:]).lstrip('\xff')
+        self._hint = len(bits) - len(tail)
+        if not tail:
+            return
+        byte = bits[self._hint]
+        offset = 0
+        while byte & (0x80 >> offset):
+            offset += 1
+        bits[self._hint] = byte | (0x80 >> offset)
+        index = (self._hint << 3) + offset
+        return str(netaddr.IPAddress(self.base + index,
+                                     version=self.version))
+
+    def allocate(self, ip_address):
+        """Mark the given address as used.
+
+        :returns: False if the address is outside the pools or already used.
+        """
+        index = self._index(ip_address)
+        if index is None:
+            return False
+        mask = 0x80 >> (index & 7)
+        if self.bits[index >> 3] & mask:
+            return False
+        self.bits[index >> 3] |= mask
+        return True
+
+    def release(self, ip_address):
+        """Mark the given address as free.
+
+        :returns: False if the address is outside the pools or already free.
+        """
+        index = self._index(ip_address)
+        if index is None:
+            return False
+        mask = 0x80 >> (index & 7)
+        if not self.bits[index >> 3] & mask:
+            return False
+        self.bits[index >> 3] &= ~mask
+        self._hint = min(self._hint, index >> 3)
+        return True
+
+
+class BitmapIpamBackend(RangeIpamBackend):
+    """Track free addresses in one compact bitmap row per subnet.
+
+    Bitmaps are cached in memory together with the opaque revision token
+    stored next to them. An update is only written if the token in the
+    database still matches the cached one, i.e. it is a compare-and-swap,
+    so no row is locked before the allocation is decided. When the swap
+    loses a race the bitmap is reloaded, with a locking read so that
+    repeatable-read transactions observe the winning revision, and the
+    operation is retried.
+
+    Subnets spanning more than 'ipam_bitmap_max_size' addresses, as well
+    as subnets created before this backend was enabled, are handled with
+    availability ranges.
+    """
+
+    def __init__(self):
+        # subnet_id -> (revision, SubnetBitmap)
+        self._cache = {}
+
+    def create_subnet_availability(self, context, subnet, ip_pools):
+        pools = [(ip_pool['first_ip'], ip_pool['last_ip'])
+                 for ip_pool in ip_pools]
+        # Check the size before allocating anything, IPv6 subnets may span
+        # more addresses than fit in memory
+        if (not pools or SubnetBitmap.span(pools)[1] >
+                cfg.CONF.ipam_bitmap_max_size):
+            super(BitmapIpamBackend, self).create_subnet_availability(
+                context, subnet, ip_pools)
+            return
+        bitmap = SubnetBitmap.from_pools(pools)
+        revision = uuidutils.generate_uuid()
+        context.session.add(models_v2.IPAllocationBitmap(
+            subnet=subnet,
+            first_ip=str(netaddr.IPAddress(bitmap.base)),
+            size=bitmap.size,
+            bitmap=str(bitmap.bits),
+            revision=revision))
+        self._cache[subnet['id']] = (revision, bitmap.copy())
+
+    def _load(self, context, subnet_id, lock=False):
+        """Return the current (revision, bitmap) of the subnet or None."""
+        query = context.session.query(models_v2.IPAllocationBitmap.revision)
+        if lock:
+            query = query.with_lockmode('update')
+        row = query.filter_by(subnet_id=subnet_id).first()
+        if not row:
+            return
+        cached = self._cache.get(subnet_id)
+        if cached and cached[0] == row.revision:
+            return cached
+        db_bitmap = context.session.query(
+            models_v2.IPAllocationBitmap).filter_by(
+                subnet_id=subnet_id).one()
+        pool_qry = context.session.query(models_v2.IPAllocationPool)
+        first_ip = netaddr.IPAddress(db_bitmap.first_ip)
+        base = int(first_ip)
+        pools = [(int(netaddr.IPAddress(pool.first_ip)) - base,
+                  int(netaddr.IPAddress(pool.last_ip)) - base)
+                 for pool in pool_qry.filter_by(subnet_id=subnet_id)]
+        cached = (db_bitmap.revision,
+                  SubnetBitmap(base, db_bitmap.size, pools,
+                               first_ip.version,
+                               bytearray(db_bitmap.bitmap)))
+        self._cache[subnet_id] = cached
+        return cached
+
+    def _update(self, context, subnet_id, update_func):
+        """Apply update_func to the bitmap of the subnet with CAS semantic.
+
+        update_func takes a private copy of the bitmap and returns a result
+        or None if the bitmap was not modified.
+
+        :returns: a tuple (handled, result), handled is False if the subnet
+                  has no bitmap.
+        """
+        for attempt in xrange(cfg.CONF.ipam_cas_retries):
+            cached = self._load(context, subnet_id, lock=attempt > 0)
+            if not cached:
+                return False, None
+            revision, bitmap = cached
+            bitmap = bitmap.copy()
+            result = update_func(bitmap)
+            if result is None:
+                return True, None
+            new_revision = uuidutils.generate_uuid()
+            query = context.session.query(models_v2.IPAllocationBitmap)
+            updated = query.filter_by(
+                subnet_id=subnet_id, revision=revision).update(
+                    {'bitmap': str(bitmap.bits), 'revision': new_revision},
+                    synchronize_session=False)
+            if updated:
+                self._cache[subnet_id] = (new_revision, bitmap)
+                return True, result
+            LOG.debug(_("Concurrent update of the IP bitmap of subnet "
+                        "%(subnet_id)s, attempt %(attempt)d"),
+                      {'subnet_id': subnet_id, 'attempt': attempt + 1})
+            self._cache.pop(subnet_id, None)
+        raise q_exc.IpAddressAllocationConflict(subnet_id=subnet_id)
+
+    def generate_ip(self, context, subnets):
+        range_subnets = []
+        for subnet in subnets:
+            handled, ip_address = self._update(
+                context, subnet['id'], lambda bitmap: bitmap.allocate_first())
+            if not handled:
+                range_subnets.append(subnet)
+            elif ip_address:
+                LOG.debug(_("Allocated IP %(ip_address)s from bitmap of "
+                            "subnet %(subnet_id)s"),
+                          {'ip_address': ip_address,
+                           'subnet_id': subnet['id']})
+                return {'ip_address': ip_address, 'subnet_id': subnet['id']}
+        if range_subnets:
+            return super(BitmapIpamBackend, self).generate_ip(context,
+                                                              range_subnets)
+        raise q_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
+
+    def generate_ips(self, context, subnets, count):
+        ips = []
+        range_subnets = []
+        for subnet in subnets:
+            if len(ips) == count:
+                break
+
+            def _allocate(bitmap):
+                allocated = []
+                while len(ips) + len(allocated) < count:
+                    ip_address = bitmap.allocate_first()
+                    if not ip_address:
+                        break
+                    allocated.append(ip_address)
+                return allocated or None
+
+            handled, allocated = self._update(context, subnet['id'],
+                                              _allocate)
+            if not handled:
+                range_subnets.append(subnet)
+            elif allocated:
+                LOG.debug(_("Allocated %(count)d IPs from bitmap of subnet "
+                            "%(subnet_id)s"),
+                          {'count': len(allocated),
+                           'subnet_id': subnet['id']})
+                ips.extend({'ip_address': ip_address,
+                            'subnet_id': subnet['id']}
+                           for ip_address in allocated)
+        if len(ips) == count:
+            return ips
+        if range_subnets:
+            return ips + super(BitmapIpamBackend, self).generate_ips(
+                context, range_subnets, count - len(ips))
+        raise q_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
+
+    def allocate_specific_ip(self, context, subnet_id, ip_address):
+        handled, _result = self._update(
+            context, subnet_id,
+            lambda bitmap: bitmap.allocate(ip_address) or None)
+        if not handled:
+            super(BitmapIpamBackend, self).allocate_specific_ip(
+                context, subnet_id, ip_address)
+
+    def release_ip(self, context, subnet_id, ip_address):
+        handled, result = self._update(
+            context, subnet_id,
+            lambda bitmap: bitmap.release(ip_address) or None)
+        if not handled:
+            super(BitmapIpamBackend, self).release_ip(context, subnet_id,
+                                                      ip_address)
+        elif result:
+            LOG.debug(_("Recycle %(ip_address)s into bitmap of subnet "
+                        "%(subnet_id)s"),
+                      {'ip_address': ip_address, 'subnet_id': subnet_id})
+
+    def release_ips(self, context, subnet_id, ip_addresses):
+        def _release(bitmap):
+            released = [ip_address for ip_address in ip_addresses
+                        if bitmap.release(ip_address)]
+            return released or None
+
+        handled, result = self._update(context, subnet_id, _release)
+        if not handled:
+            super(BitmapIpamBackend, self).release_ips(context, subnet_id,
+                                                       ip_addresses)
+        elif result:
+            LOG.debug(_("Recycle %(count)d IPs into bitmap of subnet "
+                        "%(subnet_id)s"),
+                      {'count': len(result), 'subnet_id': subnet_id})
@@ -140,7 +140,10 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
                'status': router['status'],
                EXTERNAL_GW_INFO: None,
                'gw_port_id': router['gw_port_id']}
-        if router['gw_port_id']:
+        # The gateway port is only read if requested, as it is loaded
+        # with a query of its own
+        if router['gw_port_id'] and (not fields or
+                                     EXTERNAL_GW_INFO in fields):
             nw_id = router.gw_port['network_id']
             res[EXTERNAL_GW_INFO] = {'network_id': nw_id}
         if process_extensions:
@@ -794,6 +797,12 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
     db_base_plugin_v2.NeutronDbPluginV2.register_dict_extend_funcs(
         attributes.NETWORKS, [_extend_network_dict_l3])
 
+    # Register the relationships read to build routers and networks
+    db_base_plugin_v2.CommonDbMixin.register_model_load_profile(
+        Router, {EXTERNAL_GW_INFO: ['gw_port']})
+    db_base_plugin_v2.CommonDbMixin.register_model_load_profile(
+        models_v2.Network, {l3.EXTERNAL: ['external']})
+
     def _process_l3_create(self, context, net_data, req_data):
         external = req_data.get(l3.EXTERNAL)
         external_set = attributes.is_attr_set(external)
@@ -85,6 +85,23 @@ class IPAllocationPool(model_base.BASEV2, HasId):
         return "%s - %s" % (self.first_ip, self.last_ip)
 
 
+class IPAllocationBitmap(model_base.BASEV2):
+    """Bitmap of the unavailable IPs of the allocation pools of a subnet.
+
+    Bit i tracks the address first_ip + i. The revision is replaced on
+    every update so that writers can detect concurrent modifications.
+    """
+
+    subnet_id = sa.Column(sa.String(36), sa.ForeignKey('subnets.id',
+                                                       ondelete="CASCADE"),
+                          primary_key=True)
+    first_ip = sa.Column(sa.String(64), nullable=False)
+    size = sa.Column(sa.Integer, nullable=False)
+    bitmap = sa.Column(sa.LargeBinary, nullable=False)
+    revision = sa.Column(sa.String(36), nullable=False)
+    subnet = orm.relationship('Subnet')
+
+
 class IPAllocation(model_base.BASEV2):
     """Internal representation of allocated IP addresses in a Neutron subnet.
     """
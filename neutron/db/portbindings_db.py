@@ -113,3 +113,5 @@ def _extend_port_dict_binding(plugin, port_res, port_db):
     # Register dict extend functions for ports
 db_base_plugin_v2.NeutronDbPluginV2.register_dict_extend_funcs(
     attributes.PORTS, [_extend_port_dict_binding])
+db_base_plugin_v2.CommonDbMixin.register_model_load_profile(
+    models_v2.Port, {portbindings.HOST_ID: ['portbinding']})
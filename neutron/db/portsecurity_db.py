@@ -180,3 +180,7 @@ class PortSecurityDbMixin(object):
         attrs.NETWORKS, [_extend_port_security_dict])
     db_base_plugin_v2.NeutronDbPluginV2.register_dict_extend_funcs(
         attrs.PORTS, [_extend_port_security_dict])
+    db_base_plugin_v2.CommonDbMixin.register_model_load_profile(
+        models_v2.Network, {psec.PORTSECURITY: ['port_security']})
+    db_base_plugin_v2.CommonDbMixin.register_model_load_profile(
+        models_v2.Port, {psec.PORTSECURITY: ['port_security']})
@@ -0,0 +1,151 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Counts the SQL statements run on behalf of each request.
+
+The statements executed by an engine are timed by cursor event
+listeners. They are added to the QueryStats of the request being
+processed by the current greenthread, if any, and those running longer
+than slow_query_threshold are logged with the code that issued them.
+"""
+
+import sys
+import time
+import weakref
+
+from oslo.config import cfg
+import sqlalchemy
+
+from neutron.openstack.common import local
+from neutron.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+query_stats_opts = [
+    cfg.BoolOpt('report_query_stats', default=False,
+                help=_("Log the number of SQL statements, the database "
+                       "time, the lock waits and the rows of each API "
+                       "request, and send them in a notification")),
+    cfg.FloatOpt('slow_query_threshold', default=0,
+                 help=_("Log the SQL statements running longer than this "
+                        "number of seconds with the code issuing them. "
+                        "0 disables it")),
+]
+cfg.CONF.register_opts(query_stats_opts, 'database')
+
+# Number of neutron frames reported as the call site of a slow statement
+CALL_SITE_DEPTH = 3
+# Modules running the statements on behalf of the caller
+_SKIPPED_MODULES = ('sqlalchemy', 'neutron.openstack.common.db', __name__)
+
+_instrumented_engines = weakref.WeakSet()
+
+
+class QueryStats(object):
+    """SQL statements run on behalf of a request."""
+
+    def __init__(self):
+        self.statements = 0
+        self.db_time = 0.0
+        # Locking reads (SELECT ... FOR UPDATE), which may wait for the
+        # rows locked by other transactions
+        self.lock_waits = 0
+        self.lock_time = 0.0
+        # Rows returned or changed, as far as the driver reports them
+        self.rows = 0
+
+    def add(self, statement, elapsed, rowcount):
+        self.statements += 1
+        self.db_time += elapsed
+        if ' FOR UPDATE' in statement:
+            self.lock_waits += 1
+            self.lock_time += elapsed
+        if rowcount > 0:
+            self.rows += rowcount
+
+    def to_dict(self):
+        return {'statements': self.statements,
+                'db_time': round(self.db_time, 6),
+                'lock_waits': self.lock_waits,
+                'lock_time': round(self.lock_time, 6),
+                'rows': self.rows}
+
+    def __str__(self):
+        return ('statements=%(statements)d db_time=%(db_time).3fs '
+                'lock_waits=%(lock_waits)d lock_time=%(lock_time).3fs '
+                'rows=%(rows)d' % self.to_dict())
+
+
+def start(stats):
+    """Add the statements of the current greenthread to stats."""
+    local.store.query_stats = stats
+
+
+def stop():
+    if current() is not None:
+        del local.store.query_stats
+
+
+def current():
+    return getattr(local.store, 'query_stats', None)
+
+
+def instrument(engine):
+    """Time the statements executed by engine."""
+    if engine in _instrumented_engines:
+        return
+    sqlalchemy.event.listen(engine, 'before_cursor_execute',
+                            _before_cursor_execute)
+    sqlalchemy.event.listen(engine, 'after_cursor_execute',
+                            _after_cursor_execute)
+    _instrumented_engines.add(engine)
+
+
+def get_call_site(depth=CALL_SITE_DEPTH):
+    """Return the innermost neutron frames issuing a statement."""
+    frames = []
+    frame = sys._getframe(1)
+    while frame and len(frames) < depth:
+        module = frame.f_globals.get('__name__', '')
+        if (module.startswith('neutron.') and
+                not module.startswith(_SKIPPED_MODULES)):
+            frames.append('%s.%s:%d' % (module, frame.f_code.co_name,
+                                        frame.f_lineno))
+        frame = frame.f_back
+    return ' <- '.join(frames) or _('unknown')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    conn.info['query_start_time'] = time.time()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    start_time = conn.info.pop('query_start_time', None)
+    if start_time is None:
+        return
+    elapsed = time.time() - start_time
+    stats = current()
+    if stats is not None:
+        stats.add(statement, elapsed, cursor.rowcount)
+    threshold = cfg.CONF.database.slow_query_threshold
+    if threshold > 0 and elapsed > threshold:
+        LOG.warning(_("Slow SQL statement (%(elapsed).3fs) from "
+                      "%(call_site)s: %(statement)s"),
+                    {'elapsed': elapsed, 'call_site': get_call_site(),
+                     'statement': statement})
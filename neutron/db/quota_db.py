@@ -15,11 +15,47 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import datetime
+
+from oslo.config import cfg
 import sqlalchemy as sa
+from sqlalchemy import orm
 
 from neutron.common import exceptions
 from neutron.db import model_base
 from neutron.db import models_v2
+from neutron.openstack.common.db import exception as db_exc
+from neutron.openstack.common import log as logging
+from neutron.openstack.common import timeutils
+
+LOG = logging.getLogger(__name__)
+
+quota_usage_opts = [
+    cfg.BoolOpt('track_quota_usage', default=False,
+                help=_("Keep the number of resources of each tenant in a "
+                       "usage table updated by the creates and deletes, "
+                       "instead of counting the resources for every "
+                       "create")),
+    cfg.IntOpt('quota_usage_sync_interval', default=600,
+               help=_("Seconds after which a tracked quota usage is "
+                      "recounted from the resources when it is next "
+                      "read")),
+]
+cfg.CONF.register_opts(quota_usage_opts, 'QUOTAS')
+
+# Quota resource name -> model of the resource, for the tracked usages
+_tracked_models = {}
+_tracked_resources = {}
+
+
+def register_tracked_model(resource, model):
+    """Track the usage of a quota resource stored in model.
+
+    The model must have a tenant_id and an id column.
+    """
+    _tracked_models[resource] = model
+    _tracked_resources[model] = resource
 
 
 class Quota(model_base.BASEV2, models_v2.HasId):
@@ -33,6 +69,65 @@ class Quota(model_base.BASEV2, models_v2.HasId):
     limit = sa.Column(sa.Integer)
 
 
+class QuotaUsage(model_base.BASEV2):
+    """Number of resources of a tenant counted against its quota.
+
+    The usage is updated by the flushes creating and deleting the
+    resources, in their transaction.
+    """
+    tenant_id = sa.Column(sa.String(255), primary_key=True)
+    resource = sa.Column(sa.String(255), primary_key=True)
+    in_use = sa.Column(sa.Integer, nullable=False, default=0)
+    # NULL when the usage must be recounted from the resources
+    synced_at = sa.Column(sa.DateTime)
+
+
+def _update_usages(session, flush_context):
+    """Add the resources created and deleted by a flush to the usages."""
+    if not cfg.CONF.QUOTAS.track_quota_usage:
+        return
+    deltas = collections.defaultdict(int)
+    for obj in session.new:
+        resource = _tracked_resources.get(type(obj))
+        if resource:
+            deltas[obj.tenant_id, resource] += 1
+    for obj in session.deleted:
+        resource = _tracked_resources.get(type(obj))
+        if resource:
+            deltas[obj.tenant_id, resource] -= 1
+    usages = QuotaUsage.__table__
+    for (tenant_id, resource), delta in deltas.iteritems():
+        if delta:
+            # A missing usage is counted when it is first read
+            session.execute(usages.update().
+                            where(usages.c.tenant_id == tenant_id).
+                            where(usages.c.resource == resource).
+                            values(in_use=usages.c.in_use + delta))
+
+
+def _invalidate_usages(session, query, query_context, result):
+    """Recount the usages of the resources deleted by a query."""
+    if not cfg.CONF.QUOTAS.track_quota_usage or not result.rowcount:
+        return
+    resource = _tracked_resources.get(
+        query.column_descriptions[0]['type'])
+    if resource:
+        # The tenants of the deleted rows are not known, which is why the
+        # plugins delete tracked resources through the session instead
+        usages = QuotaUsage.__table__
+        session.execute(usages.update().
+                        where(usages.c.resource == resource).
+                        values(synced_at=None))
+
+
+sa.event.listen(orm.Session, 'after_flush', _update_usages)
+sa.event.listen(orm.Session, 'after_bulk_delete', _invalidate_usages)
+
+register_tracked_model('network', models_v2.Network)
+register_tracked_model('subnet', models_v2.Subnet)
+register_tracked_model('port', models_v2.Port)
+
+
 class DbQuotaDriver(object):
     """Driver to perform necessary checks to enforce quotas and obtain quota
     information.
@@ -179,3 +274,49 @@ class DbQuotaDriver(object):
                  if quotas[key] >= 0 and quotas[key] < val]
         if overs:
             raise exceptions.OverQuota(overs=sorted(overs))
+
+    def get_usage(self, context, resource, plugin, resources, tenant_id):
+        """Return the number of resources of a tenant from its usage.
+
+        The arguments following resource are the ones of its count
+        function. A usage missing, invalidated or last synchronized more
+        than quota_usage_sync_interval seconds ago is recounted by the
+        resource first. None is returned when the usage of the resource
+        is not tracked.
+        """
+        if (not cfg.CONF.QUOTAS.track_quota_usage or
+                resource.name not in _tracked_models):
+            return None
+        # Columns are read so that the session does not keep a usage the
+        # flushes update behind its back
+        usage = context.session.query(
+            QuotaUsage.in_use, QuotaUsage.synced_at).filter_by(
+                tenant_id=tenant_id, resource=resource.name).first()
+        now = timeutils.utcnow()
+        if usage and usage.synced_at:
+            age = now - usage.synced_at
+            if age < datetime.timedelta(
+                    seconds=cfg.CONF.QUOTAS.quota_usage_sync_interval):
+                return usage.in_use
+        in_use = resource.count(context, plugin, resources, tenant_id)
+        if usage:
+            if in_use != usage.in_use:
+                LOG.debug(_("Usage of %(resource)s by tenant %(tenant_id)s "
+                            "corrected from %(old)d to %(new)d"),
+                          {'resource': resource.name, 'tenant_id': tenant_id,
+                           'old': usage.in_use, 'new': in_use})
+            context.session.query(QuotaUsage).filter_by(
+                tenant_id=tenant_id, resource=resource.name).update(
+                    {'in_use': in_use, 'synced_at': now},
+                    synchronize_session=False)
+        else:
+            try:
+                with context.session.begin(subtransactions=True):
+                    context.session.add(QuotaUsage(tenant_id=tenant_id,
+                                                   resource=resource.name,
+                                                   in_use=in_use,
+                                                   synced_at=now))
+            except db_exc.DBDuplicateEntry:
+                # Created meanwhile by a concurrent request
+                pass
+        return in_use
@@ -444,6 +444,8 @@ class SecurityGroupDbMixin(ext_sg.SecurityGroupPluginBase):
     # Register dict extend functions for ports
     db_base_plugin_v2.NeutronDbPluginV2.register_dict_extend_funcs(
         attr.PORTS, [_extend_port_dict_security_group])
+    db_base_plugin_v2.CommonDbMixin.register_model_load_profile(
+        models_v2.Port, {ext_sg.SECURITYGROUPS: ['security_groups']})
 
     def _process_port_create_security_group(self, context, port,
                                             security_group_ids):
@@ -456,6 +458,22 @@ class SecurityGroupDbMixin(ext_sg.SecurityGroupPluginBase):
         port[ext_sg.SECURITYGROUPS] = (security_group_ids and
                                        list(security_group_ids) or [])
 
+    def _process_ports_create_security_group(self, context, ports,
+                                             security_group_ids):
+        """Bind new ports to their security groups in a single flush.
+
+        security_group_ids holds the groups of each of the ports.
+        """
+        with context.session.begin(subtransactions=True):
+            for port, port_sgids in zip(ports, security_group_ids):
+                if attr.is_attr_set(port_sgids):
+                    for security_group_id in port_sgids:
+                        context.session.add(SecurityGroupPortBinding(
+                            port_id=port['id'],
+                            security_group_id=security_group_id))
+                port[ext_sg.SECURITYGROUPS] = (port_sgids and
+                                               list(port_sgids) or [])
+
     def _ensure_default_security_group(self, context, tenant_id):
         """Create a default security group if one doesn't exist.
 
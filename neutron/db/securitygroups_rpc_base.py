@@ -15,7 +15,10 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import time
+
 import netaddr
+from oslo.config import cfg
 
 from neutron.common import constants as q_const
 from neutron.common import utils
@@ -34,6 +37,67 @@ IP_MASK = {q_const.IPv4: 32,
 DIRECTION_IP_PREFIX = {'ingress': 'source_ip_prefix',
                        'egress': 'dest_ip_prefix'}
 
+security_group_rpc_opts = [
+    cfg.IntOpt('security_group_cache_ttl', default=0,
+               help=_("Seconds the compiled rules and member addresses of "
+                      "security groups are cached for agents. Entries are "
+                      "also dropped whenever the rules or members of a "
+                      "group change through this server, so it is only "
+                      "safe with a single neutron-server. 0 disables the "
+                      "cache")),
+]
+cfg.CONF.register_opts(security_group_rpc_opts)
+
+
+class SecurityGroupCache(object):
+    """Compiled rules and member addresses of security groups.
+
+    'rules' entries hold the rule dicts of a group by rule id, as sent to
+    agents, and 'members' entries hold the addresses of the ports in a
+    group by ethertype. Results of a load that raced with an invalidation
+    are not cached.
+    """
+
+    KINDS = ('rules', 'members')
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._entries = dict((kind, {}) for kind in self.KINDS)
+        self.generation = 0
+
+    def get(self, kind, sg_ids):
+        """Return a dict of the unexpired entries cached for sg_ids."""
+        ttl = cfg.CONF.security_group_cache_ttl
+        entries = self._entries[kind]
+        now = time.time()
+        result = {}
+        for sg_id in sg_ids:
+            entry = entries.get(sg_id)
+            if entry and now - entry[0] < ttl:
+                result[sg_id] = entry[1]
+        return result
+
+    def set(self, kind, values, generation):
+        """Cache values loaded while the cache was at generation."""
+        if (not cfg.CONF.security_group_cache_ttl or
+            generation != self.generation):
+            return
+        entries = self._entries[kind]
+        now = time.time()
+        for sg_id, value in values.iteritems():
+            entries[sg_id] = (now, value)
+
+    def invalidate(self, kind, sg_ids):
+        self.generation += 1
+        entries = self._entries[kind]
+        for sg_id in sg_ids:
+            entries.pop(sg_id, None)
+
+
+SECURITY_GROUP_CACHE = SecurityGroupCache()
+
 
 class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
 
@@ -42,6 +106,7 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         rule = self.create_security_group_rule_bulk_native(context,
                                                            bulk_rule)[0]
         sgids = [rule['security_group_id']]
+        SECURITY_GROUP_CACHE.invalidate('rules', sgids)
         self.notifier.security_groups_rule_updated(context, sgids)
         return rule
 
@@ -51,6 +116,7 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
                       self).create_security_group_rule_bulk_native(
                           context, security_group_rule)
         sgids = set([r['security_group_id'] for r in rules])
+        SECURITY_GROUP_CACHE.invalidate('rules', sgids)
         self.notifier.security_groups_rule_updated(context, list(sgids))
         return rules
 
@@ -58,9 +124,16 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         rule = self.get_security_group_rule(context, sgrid)
         super(SecurityGroupServerRpcMixin,
               self).delete_security_group_rule(context, sgrid)
+        SECURITY_GROUP_CACHE.invalidate('rules', [rule['security_group_id']])
         self.notifier.security_groups_rule_updated(context,
                                                    [rule['security_group_id']])
 
+    def delete_security_group(self, context, id):
+        super(SecurityGroupServerRpcMixin,
+              self).delete_security_group(context, id)
+        for kind in SecurityGroupCache.KINDS:
+            SECURITY_GROUP_CACHE.invalidate(kind, [id])
+
     def update_security_group_on_port(self, context, id, port,
                                       original_port, updated_port):
         """Update security groups on port.
@@ -98,6 +171,9 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
             not utils.compare_elements(
                 original_port.get(ext_sg.SECURITYGROUPS),
                 updated_port.get(ext_sg.SECURITYGROUPS))):
+            # Groups the port left lose a member too
+            SECURITY_GROUP_CACHE.invalidate(
+                'members', original_port.get(ext_sg.SECURITYGROUPS) or [])
             self.notify_security_groups_member_updated(
                 context, updated_port)
             need_notify = True
@@ -114,12 +190,37 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         occurs and the plugin agent fetches the update provider
         rule in the other RPC call (security_group_rules_for_devices).
         """
+        SECURITY_GROUP_CACHE.invalidate(
+            'members', port.get(ext_sg.SECURITYGROUPS) or [])
         if port['device_owner'] == q_const.DEVICE_OWNER_DHCP:
             self.notifier.security_groups_provider_updated(context)
         else:
             self.notifier.security_groups_member_updated(
                 context, port.get(ext_sg.SECURITYGROUPS))
 
+    def notify_security_groups_member_updated_bulk(self, context, ports):
+        """Notify update event of security group members of many ports.
+
+        The groups of all the ports are sent in a single member update,
+        and the provider update is sent once if any of them is a DHCP port.
+        """
+        all_sec_groups = set()
+        sec_groups = set()
+        provider_updated = False
+        for port in ports:
+            port_sec_groups = port.get(ext_sg.SECURITYGROUPS) or []
+            all_sec_groups.update(port_sec_groups)
+            if port['device_owner'] == q_const.DEVICE_OWNER_DHCP:
+                provider_updated = True
+            else:
+                sec_groups.update(port_sec_groups)
+        SECURITY_GROUP_CACHE.invalidate('members', all_sec_groups)
+        if provider_updated:
+            self.notifier.security_groups_provider_updated(context)
+        if sec_groups:
+            self.notifier.security_groups_member_updated(
+                context, sorted(sec_groups))
+
 
 class SecurityGroupServerRpcCallbackMixin(object):
     """A mix-in that enable SecurityGroup agent support in plugin
@@ -148,6 +249,7 @@ class SecurityGroupServerRpcCallbackMixin(object):
         return self._security_group_rules_for_ports(context, ports)
 
     def _select_rules_for_ports(self, context, ports):
+        """Return (port_id, security_group_id, rule_id) rows of the ports."""
         if not ports:
             return []
         sg_binding_port = sg_db.SecurityGroupPortBinding.port_id
@@ -155,19 +257,65 @@ class SecurityGroupServerRpcCallbackMixin(object):
 
         sgr_sgid = sg_db.SecurityGroupRule.security_group_id
 
-        query = context.session.query(sg_db.SecurityGroupPortBinding,
-                                      sg_db.SecurityGroupRule)
+        query = context.session.query(sg_binding_port, sgr_sgid,
+                                      sg_db.SecurityGroupRule.id)
         query = query.join(sg_db.SecurityGroupRule,
                            sgr_sgid == sg_binding_sgid)
         query = query.filter(sg_binding_port.in_(ports.keys()))
         return query.all()
 
+    def _compile_rule(self, rule_in_db):
+        direction = rule_in_db['direction']
+        rule_dict = {
+            'security_group_id': rule_in_db['security_group_id'],
+            'direction': direction,
+            'ethertype': rule_in_db['ethertype'],
+        }
+        for key in ('protocol', 'port_range_min', 'port_range_max',
+                    'remote_ip_prefix', 'remote_group_id'):
+            if rule_in_db.get(key):
+                if key == 'remote_ip_prefix':
+                    direction_ip_prefix = DIRECTION_IP_PREFIX[direction]
+                    rule_dict[direction_ip_prefix] = rule_in_db[key]
+                    continue
+                rule_dict[key] = rule_in_db[key]
+        return rule_dict
+
+    def _select_rules_for_security_groups(self, context, rule_ids_by_group):
+        """Return the compiled rules of groups by group and rule id.
+
+        Rules cannot be updated, so a cached group is only reloaded when
+        it misses one of the requested rules.
+        """
+        rules_by_group = SECURITY_GROUP_CACHE.get('rules', rule_ids_by_group)
+        missing = set(sg_id for sg_id, rule_ids in
+                      rule_ids_by_group.iteritems()
+                      if not rule_ids.issubset(rules_by_group.get(sg_id, ())))
+        if not missing:
+            return rules_by_group
+        generation = SECURITY_GROUP_CACHE.generation
+        loaded = dict((sg_id, {}) for sg_id in missing)
+
+        sgr_sgid = sg_db.SecurityGroupRule.security_group_id
+        query = context.session.query(sg_db.SecurityGroupRule)
+        query = query.filter(sgr_sgid.in_(missing))
+        for rule_in_db in query:
+            loaded[rule_in_db['security_group_id']][rule_in_db['id']] = (
+                self._compile_rule(rule_in_db))
+        SECURITY_GROUP_CACHE.set('rules', loaded, generation)
+        rules_by_group.update(loaded)
+        return rules_by_group
+
     def _select_ips_for_remote_group(self, context, remote_group_ids):
-        ips_by_group = {}
-        if not remote_group_ids:
+        """Return the member addresses of groups by group and ethertype."""
+        ips_by_group = SECURITY_GROUP_CACHE.get('members', remote_group_ids)
+        missing = set(remote_group_ids) - set(ips_by_group)
+        if not missing:
             return ips_by_group
-        for remote_group_id in remote_group_ids:
-            ips_by_group[remote_group_id] = []
+        generation = SECURITY_GROUP_CACHE.generation
+        loaded = dict((remote_group_id,
+                       {q_const.IPv4: [], q_const.IPv6: []})
+                      for remote_group_id in missing)
 
         ip_port = models_v2.IPAllocation.port_id
         sg_binding_port = sg_db.SecurityGroupPortBinding.port_id
@@ -177,18 +325,22 @@ class SecurityGroupServerRpcCallbackMixin(object):
                                       models_v2.IPAllocation.ip_address)
         query = query.join(models_v2.IPAllocation,
                            ip_port == sg_binding_port)
-        query = query.filter(sg_binding_sgid.in_(remote_group_ids))
+        query = query.filter(sg_binding_sgid.in_(missing))
         for security_group_id, ip_address in query:
-            ips_by_group[security_group_id].append(ip_address)
+            ethertype = 'IPv%s' % netaddr.IPAddress(ip_address).version
+            loaded[security_group_id][ethertype].append(
+                (ip_address, "%s/%s" % (ip_address, IP_MASK[ethertype])))
+        SECURITY_GROUP_CACHE.set('members', loaded, generation)
+        ips_by_group.update(loaded)
         return ips_by_group
 
     def _select_remote_group_ids(self, ports):
-        remote_group_ids = []
+        remote_group_ids = set()
         for port in ports.values():
             for rule in port.get('security_group_rules'):
                 remote_group_id = rule.get('remote_group_id')
                 if remote_group_id:
-                    remote_group_ids.append(remote_group_id)
+                    remote_group_ids.add(remote_group_id)
         return remote_group_ids
 
     def _select_network_ids(self, ports):
@@ -212,32 +364,39 @@ class SecurityGroupServerRpcCallbackMixin(object):
             ips[port['network_id']].append(ip)
         return ips
 
+    def _expand_remote_group_rule(self, rule, ips):
+        remote_group_id = rule['remote_group_id']
+        direction_ip_prefix = DIRECTION_IP_PREFIX[rule['direction']]
+        expanded = []
+        for ip, ip_prefix in ips[remote_group_id][rule['ethertype']]:
+            ip_rule = rule.copy()
+            ip_rule[direction_ip_prefix] = ip_prefix
+            expanded.append((ip, ip_rule))
+        return expanded
+
     def _convert_remote_group_id_to_ip_prefix(self, context, ports):
         remote_group_ids = self._select_remote_group_ids(ports)
         ips = self._select_ips_for_remote_group(context, remote_group_ids)
+        # Ports sharing a group share its rules, which are only expanded
+        # once per member address
+        expanded_rules = {}
         for port in ports.values():
             updated_rule = []
+            fixed_ips = set(port.get('fixed_ips', []))
             for rule in port.get('security_group_rules'):
                 remote_group_id = rule.get('remote_group_id')
-                direction = rule.get('direction')
-                direction_ip_prefix = DIRECTION_IP_PREFIX[direction]
                 if not remote_group_id:
                     updated_rule.append(rule)
                     continue
 
                 port['security_group_source_groups'].append(remote_group_id)
-                base_rule = rule
-                for ip in ips[remote_group_id]:
-                    if ip in port.get('fixed_ips', []):
-                        continue
-                    ip_rule = base_rule.copy()
-                    version = netaddr.IPAddress(ip).version
-                    ethertype = 'IPv%s' % version
-                    if base_rule['ethertype'] != ethertype:
-                        continue
-                    ip_rule[direction_ip_prefix] = "%s/%s" % (
-                        ip, IP_MASK[ethertype])
-                    updated_rule.append(ip_rule)
+                key = frozenset(rule.iteritems())
+                if key not in expanded_rules:
+                    expanded_rules[key] = self._expand_remote_group_rule(
+                        rule, ips)
+                updated_rule.extend(ip_rule
+                                    for ip, ip_rule in expanded_rules[key]
+                                    if ip not in fixed_ips)
             port['security_group_rules'] = updated_rule
         return ports
 
@@ -280,23 +439,16 @@ class SecurityGroupServerRpcCallbackMixin(object):
 
     def _security_group_rules_for_ports(self, context, ports):
         rules_in_db = self._select_rules_for_ports(context, ports)
-        for (binding, rule_in_db) in rules_in_db:
-            port_id = binding['port_id']
-            port = ports[port_id]
-            direction = rule_in_db['direction']
-            rule_dict = {
-                'security_group_id': rule_in_db['security_group_id'],
-                'direction': direction,
-                'ethertype': rule_in_db['ethertype'],
-            }
-            for key in ('protocol', 'port_range_min', 'port_range_max',
-                        'remote_ip_prefix', 'remote_group_id'):
-                if rule_in_db.get(key):
-                    if key == 'remote_ip_prefix':
-                        direction_ip_prefix = DIRECTION_IP_PREFIX[direction]
-                        rule_dict[direction_ip_prefix] = rule_in_db[key]
-                        continue
-                    rule_dict[key] = rule_in_db[key]
-            port['security_group_rules'].append(rule_dict)
+        rule_ids_by_group = {}
+        for port_id, sg_id, rule_id in rules_in_db:
+            rule_ids_by_group.setdefault(sg_id, set()).add(rule_id)
+        rules_by_group = self._select_rules_for_security_groups(
+            context, rule_ids_by_group)
+        for port_id, sg_id, rule_id in rules_in_db:
+            rule = rules_by_group.get(sg_id, {}).get(rule_id)
+            if rule is None:
+                # The rule was deleted since the port rules were selected
+                continue
+            ports[port_id]['security_group_rules'].append(rule.copy())
         self._apply_provider_rule(context, ports)
         return self._convert_remote_group_id_to_ip_prefix(context, ports)
@@ -18,6 +18,7 @@
 from abc import abstractmethod
 
 from neutron.api import extensions
+from neutron.api.v2 import attributes
 from neutron.api.v2 import base
 from neutron.api.v2 import resource
 from neutron.common import constants
@@ -31,6 +32,9 @@ L3_ROUTER = 'l3-router'
 L3_ROUTERS = L3_ROUTER + 's'
 L3_AGENT = 'l3-agent'
 L3_AGENTS = L3_AGENT + 's'
+L3_AGENT_REBALANCE = 'l3-agent-rebalance'
+# Routers moved by a rebalancing unless the request says otherwise
+DEFAULT_REBALANCE_ROUTERS = 10
 
 
 class RouterSchedulerController(wsgi.Controller):
@@ -71,6 +75,20 @@ class L3AgentsHostingRouterController(wsgi.Controller):
             request.context, kwargs['router_id'])
 
 
+class L3AgentRebalanceController(wsgi.Controller):
+    def create(self, request, body, **kwargs):
+        plugin = manager.NeutronManager.get_plugin()
+        policy.enforce(request.context,
+                       "create_%s" % L3_AGENT_REBALANCE,
+                       {})
+        max_routers = attributes.convert_to_int(
+            (body or {}).get('max_routers', DEFAULT_REBALANCE_ROUTERS))
+        if max_routers < 1:
+            msg = _("'%s' should be positive") % max_routers
+            raise exceptions.InvalidInput(error_message=msg)
+        return plugin.rebalance_routers(request.context, max_routers)
+
+
 class L3agentscheduler(extensions.ExtensionDescriptor):
     """Extension class supporting l3 agent scheduler.
     """
@@ -114,6 +132,11 @@ class L3agentscheduler(extensions.ExtensionDescriptor):
                                        base.FAULT_MAP)
         exts.append(extensions.ResourceExtension(
             L3_AGENTS, controller, parent))
+
+        controller = resource.Resource(L3AgentRebalanceController(),
+                                       base.FAULT_MAP)
+        exts.append(extensions.ResourceExtension(
+            L3_AGENT_REBALANCE, controller))
         return exts
 
     def get_extended_resources(self, version):
@@ -139,6 +162,11 @@ class RouterNotHostedByL3Agent(exceptions.Conflict):
                 " by L3 agent %(agent_id)s.")
 
 
+class RouterRebalancingNotSupported(exceptions.BadRequest):
+    message = _("The router scheduler %(scheduler)s does not rebalance "
+                "routers.")
+
+
 class L3AgentSchedulerPluginBase(object):
     """REST API to operate the l3 agent scheduler.
 
@@ -160,3 +188,7 @@ class L3AgentSchedulerPluginBase(object):
     @abstractmethod
     def list_l3_agents_hosting_router(self, context, router_id):
         pass
+
+    @abstractmethod
+    def rebalance_routers(self, context, max_routers):
+        pass
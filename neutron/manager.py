@@ -70,6 +70,12 @@ def validate_post_plugin_load():
         msg = _("dhcp_agents_per_network must be >= 1. '%s' "
                 "is invalid.") % cfg.CONF.dhcp_agents_per_network
         return msg
+    if ('agent_heartbeat_batch_interval' in cfg.CONF and
+        cfg.CONF.agent_heartbeat_batch_interval >= cfg.CONF.agent_down_time):
+        msg = _("agent_heartbeat_batch_interval must be < "
+                "agent_down_time. '%s' is invalid.") % (
+                    cfg.CONF.agent_heartbeat_batch_interval)
+        return msg
 
 
 def validate_pre_plugin_load():
@@ -492,6 +492,8 @@ class LinuxBridgeNeutronAgentRPC(sg_rpc.SecurityGroupAgentRpcMixin):
                  root_helper):
         self.polling_interval = polling_interval
         self.root_helper = root_helper
+        self.device_details_chunk_size = (
+            cfg.CONF.AGENT.device_details_chunk_size)
         self.setup_linux_bridge(interface_mappings)
         self.agent_state = {
             'binary': 'neutron-linuxbridge-agent',
@@ -568,45 +570,62 @@ class LinuxBridgeNeutronAgentRPC(sg_rpc.SecurityGroupAgentRpcMixin):
         # If one of the above operations fails => resync with plugin
         return (resync_a | resync_b)
 
-    def treat_devices_added(self, devices):
-        resync = False
-        self.prepare_devices_filter(devices)
-        for device in devices:
-            LOG.debug(_("Port %s added"), device)
+    def _get_devices_details(self, devices):
+        """Yield device details from the plugin, a chunk at a time.
+
+        Yields None for a chunk whose details could not be retrieved.
+        """
+        devices = list(devices)
+        chunk_size = self.device_details_chunk_size or len(devices) or 1
+        for i in xrange(0, len(devices), chunk_size):
+            chunk = devices[i:i + chunk_size]
             try:
-                details = self.plugin_rpc.get_device_details(self.context,
-                                                             device,
-                                                             self.agent_id)
+                yield self.plugin_rpc.get_devices_details_list(self.context,
+                                                               chunk,
+                                                               self.agent_id)
             except Exception as e:
                 LOG.debug(_("Unable to get port details for "
-                            "%(device)s: %(e)s"),
-                          {'device': device, 'e': e})
+                            "%(devices)s: %(e)s"),
+                          {'devices': chunk, 'e': e})
+                yield
+
+    def treat_devices_added(self, devices):
+        resync = False
+        self.prepare_devices_filter(devices)
+        for devices_details in self._get_devices_details(devices):
+            if devices_details is None:
                 resync = True
                 continue
-            if 'port_id' in details:
-                LOG.info(_("Port %(device)s updated. Details: %(details)s"),
-                         {'device': device, 'details': details})
-                if details['admin_state_up']:
-                    # create the networking for the port
-                    network_type = details.get('network_type')
-                    if network_type:
-                        segmentation_id = details.get('segmentation_id')
-                    else:
-                        # compatibility with pre-Havana RPC vlan_id encoding
-                        vlan_id = details.get('vlan_id')
-                        (network_type,
-                         segmentation_id) = lconst.interpret_vlan_id(vlan_id)
-                    self.br_mgr.add_interface(details['network_id'],
-                                              network_type,
-                                              details['physical_network'],
-                                              segmentation_id,
-                                              details['port_id'])
+            for details in devices_details:
+                self.treat_device_added(details)
+        return resync
+
+    def treat_device_added(self, details):
+        device = details['device']
+        LOG.debug(_("Port %s added"), device)
+        if 'port_id' in details:
+            LOG.info(_("Port %(device)s updated. Details: %(details)s"),
+                     {'device': device, 'details': details})
+            if details['admin_state_up']:
+                # create the networking for the port
+                network_type = details.get('network_type')
+                if network_type:
+                    segmentation_id = details.get('segmentation_id')
                 else:
-                    self.remove_port_binding(details['network_id'],
-                                             details['port_id'])
+                    # compatibility with pre-Havana RPC vlan_id encoding
+                    vlan_id = details.get('vlan_id')
+                    (network_type,
+                     segmentation_id) = lconst.interpret_vlan_id(vlan_id)
+                self.br_mgr.add_interface(details['network_id'],
+                                          network_type,
+                                          details['physical_network'],
+                                          segmentation_id,
+                                          details['port_id'])
             else:
-                LOG.info(_("Device %s not defined on plugin"), device)
-        return resync
+                self.remove_port_binding(details['network_id'],
+                                         details['port_id'])
+        else:
+            LOG.info(_("Device %s not defined on plugin"), device)
 
     def treat_devices_removed(self, devices):
         resync = False
@@ -45,6 +45,10 @@ agent_opts = [
     cfg.IntOpt('polling_interval', default=2,
                help=_("The number of seconds the agent will wait between "
                       "polling for local device changes.")),
+    cfg.IntOpt('device_details_chunk_size', default=50,
+               help=_("The number of devices whose details are requested "
+                      "from the plugin in a single RPC call. 0 requests "
+                      "all added devices at once.")),
     #TODO(rkukura): Change default to False before havana rc1
     cfg.BoolOpt('rpc_support_old_agents', default=True,
                 help=_("Enable server RPC compatibility with old agents")),
@@ -13,6 +13,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+
+import sqlalchemy as sa
 from sqlalchemy.orm import exc
 
 from neutron.db import api as db_api
@@ -48,14 +51,30 @@ def add_network_segment(session, network_id, segment):
               'network_id': record.network_id})
 
 
+def _make_segment_dict(record):
+    return {api.NETWORK_TYPE: record.network_type,
+            api.PHYSICAL_NETWORK: record.physical_network,
+            api.SEGMENTATION_ID: record.segmentation_id}
+
+
 def get_network_segments(session, network_id):
     with session.begin(subtransactions=True):
         records = (session.query(models.NetworkSegment).
                    filter_by(network_id=network_id))
-        return [{api.NETWORK_TYPE: record.network_type,
-                 api.PHYSICAL_NETWORK: record.physical_network,
-                 api.SEGMENTATION_ID: record.segmentation_id}
-                for record in records]
+        return [_make_segment_dict(record) for record in records]
+
+
+def get_networks_segments(session, network_ids):
+    """Get the segments of several networks with a single query."""
+    segments = dict((network_id, []) for network_id in network_ids)
+    if not network_ids:
+        return segments
+    with session.begin(subtransactions=True):
+        records = (session.query(models.NetworkSegment).
+                   filter(models.NetworkSegment.network_id.in_(network_ids)))
+        for record in records:
+            segments[record.network_id].append(_make_segment_dict(record))
+    return segments
 
 
 def get_port(session, port_id):
@@ -75,6 +94,52 @@ def get_port(session, port_id):
             return
 
 
+def get_ports_and_segments(session, port_ids):
+    """Get port records and network segments for many ports at once.
+
+    Agents only know the leading part of a port id, so each id is matched
+    as a prefix, like get_port() does. Ports and their network segments
+    are fetched with a single joined query.
+
+    :returns: a dict mapping each requested port id to a (port, segments)
+              tuple. Ids that match no port, or more than one port, are
+              left out.
+    """
+    if not port_ids:
+        return {}
+    with session.begin(subtransactions=True):
+        query = session.query(models_v2.Port, models.NetworkSegment)
+        query = query.outerjoin(
+            models.NetworkSegment,
+            models.NetworkSegment.network_id == models_v2.Port.network_id)
+        query = query.filter(sa.or_(*[models_v2.Port.id.startswith(port_id)
+                                      for port_id in port_ids]))
+        # Requested ids grouped by length, to match rows back to them
+        ids_by_length = collections.defaultdict(set)
+        for port_id in port_ids:
+            ids_by_length[len(port_id)].add(port_id)
+        matches = collections.defaultdict(dict)
+        for port, segment in query:
+            for length, ids in ids_by_length.iteritems():
+                if port.id[:length] not in ids:
+                    continue
+                ports = matches[port.id[:length]]
+                segments = ports.setdefault(port.id, (port, []))[1]
+                if segment:
+                    segments.append(
+                        {api.NETWORK_TYPE: segment.network_type,
+                         api.PHYSICAL_NETWORK: segment.physical_network,
+                         api.SEGMENTATION_ID: segment.segmentation_id})
+        result = {}
+        for port_id, ports in matches.iteritems():
+            if len(ports) > 1:
+                LOG.error(_("Multiple ports have port_id starting with %s"),
+                          port_id)
+                continue
+            result[port_id] = ports.values()[0]
+        return result
+
+
 def get_port_and_sgs(port_id):
     """Get port from database with security group info."""
 
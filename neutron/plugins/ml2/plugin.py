@@ -147,9 +147,10 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
             value = None
         return value
 
-    def _extend_network_dict_provider(self, context, network):
+    def _extend_network_dict_provider(self, context, network, segments=None):
         id = network['id']
-        segments = self.get_network_segments(context, id)
+        if segments is None:
+            segments = self.get_network_segments(context, id)
         if not segments:
             LOG.error(_("Network %s has no segments"), id)
             network[provider.NETWORK_TYPE] = None
@@ -270,8 +271,11 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
             nets = super(Ml2Plugin,
                          self).get_networks(context, filters, None, sorts,
                                             limit, marker, page_reverse)
+            segments = db.get_networks_segments(
+                session, [net['id'] for net in nets])
             for net in nets:
-                self._extend_network_dict_provider(context, net)
+                self._extend_network_dict_provider(context, net,
+                                                   segments[net['id']])
 
             nets = self._filter_nets_provider(context, nets, filters)
             nets = self._filter_nets_l3(context, nets, filters)
@@ -335,6 +339,45 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
         self.notify_security_groups_member_updated(context, result)
         return result
 
+    def create_port_bulk(self, context, ports):
+        items = ports['ports']
+        for port in items:
+            port['port']['status'] = const.PORT_STATUS_DOWN
+
+        session = context.session
+        mech_contexts = []
+        with session.begin(subtransactions=True):
+            sgids = []
+            for port in items:
+                self._ensure_default_security_group_on_port(context, port)
+                sgids.append(self._get_security_groups_on_port(context, port))
+            results = super(Ml2Plugin, self)._create_ports_bulk(context,
+                                                                items)
+            for port, result in zip(items, results):
+                self._process_portbindings_create_and_update(
+                    context, port['port'], result)
+            self._process_ports_create_security_group(context, results,
+                                                      sgids)
+            for result in results:
+                self._extend_port_dict_binding(context, result)
+                mech_context = driver_context.PortContext(self, context,
+                                                          result)
+                self.mechanism_manager.create_port_precommit(mech_context)
+                mech_contexts.append(mech_context)
+
+        try:
+            for mech_context in mech_contexts:
+                self.mechanism_manager.create_port_postcommit(mech_context)
+        except ml2_exc.MechanismDriverError:
+            with excutils.save_and_reraise_exception():
+                port_ids = [result['id'] for result in results]
+                LOG.error(_("mechanism_manager.create_port failed, "
+                            "deleting ports %s"), port_ids)
+                for port_id in port_ids:
+                    self.delete_port(context, port_id)
+        self.notify_security_groups_member_updated_bulk(context, results)
+        return results
+
     def update_port(self, context, id, port):
         attrs = port['port']
         need_port_update_notify = False
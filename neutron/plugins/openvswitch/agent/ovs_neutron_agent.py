@@ -22,6 +22,7 @@
 # @author: Seetharama Ayyadevara, Freescale Semiconductor, Inc.
 # @author: Kyle Mestery, Cisco Systems, Inc.
 
+import contextlib
 import distutils.version as dist_version
 import sys
 import time
@@ -31,6 +32,7 @@ from oslo.config import cfg
 
 from neutron.agent.linux import ip_lib
 from neutron.agent.linux import ovs_lib
+from neutron.agent.linux import ovsdb_monitor
 from neutron.agent import rpc as agent_rpc
 from neutron.agent import securitygroups_rpc as sg_rpc
 from neutron.common import config as logging_config
@@ -151,7 +153,8 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
     def __init__(self, integ_br, tun_br, local_ip,
                  bridge_mappings, root_helper,
                  polling_interval, tunnel_types=None,
-                 veth_mtu=None):
+                 veth_mtu=None, minimize_polling=False,
+                 ovsdb_monitor_respawn_interval=30):
         '''Constructor.
 
         :param integ_br: name of the integration bridge.
@@ -164,6 +167,11 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
                the agent. If set, will automatically set enable_tunneling to
                True.
         :param veth_mtu: MTU size for veth interfaces.
+        :param minimize_polling: Optional, whether to minimize polling by
+               monitoring ovsdb for interface changes.
+        :param ovsdb_monitor_respawn_interval: Optional, when using polling
+               minimization, the number of seconds to wait before respawning
+               the ovsdb monitor.
         '''
         self.veth_mtu = veth_mtu
         self.root_helper = root_helper
@@ -174,6 +182,11 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
         self.local_vlan_map = {}
 
         self.polling_interval = polling_interval
+        if minimize_polling:
+            self.ovsdb_monitor = ovsdb_monitor.OvsdbMonitor(
+                root_helper, respawn_interval=ovsdb_monitor_respawn_interval)
+        else:
+            self.ovsdb_monitor = None
 
         if tunnel_types:
             self.enable_tunneling = True
@@ -183,6 +196,8 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
         self.tunnel_count = 0
         self.tunnel_types = tunnel_types or []
         self.vxlan_udp_port = cfg.CONF.AGENT.vxlan_udp_port
+        self.device_details_chunk_size = (
+            cfg.CONF.AGENT.device_details_chunk_size)
         self._check_ovs_version()
         if self.enable_tunneling:
             self.setup_tunnel_br(tun_br)
@@ -579,11 +594,20 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
         '''
         self.tun_br = ovs_lib.OVSBridge(tun_br, self.root_helper)
         self.tun_br.reset_bridge()
-        self.patch_tun_ofport = self.int_br.add_patch_port(
-            cfg.CONF.OVS.int_peer_patch_port, cfg.CONF.OVS.tun_peer_patch_port)
-        self.patch_int_ofport = self.tun_br.add_patch_port(
-            cfg.CONF.OVS.tun_peer_patch_port, cfg.CONF.OVS.int_peer_patch_port)
-        if int(self.patch_tun_ofport) < 0 or int(self.patch_int_ofport) < 0:
+        int_peer = cfg.CONF.OVS.int_peer_patch_port
+        tun_peer = cfg.CONF.OVS.tun_peer_patch_port
+        txn = ovs_lib.OVSTransaction(self.root_helper)
+        txn.add_port(self.int_br.br_name, int_peer,
+                     [("type", "patch"), ("options:peer", tun_peer)])
+        txn.add_port(self.tun_br.br_name, tun_peer,
+                     [("type", "patch"), ("options:peer", int_peer)])
+        txn.commit()
+        patch_tun_ofport = txn.get_port_ofport(int_peer)
+        patch_int_ofport = txn.get_port_ofport(tun_peer)
+        txn.commit()
+        self.patch_tun_ofport = patch_tun_ofport.result
+        self.patch_int_ofport = patch_int_ofport.result
+        if self.patch_tun_ofport < 0 or self.patch_int_ofport < 0:
             LOG.error(_("Failed to create OVS patch port. Cannot have "
                         "tunneling enabled on this agent, since this version "
                         "of OVS does not support tunnels or patch ports. "
@@ -624,15 +648,23 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
 
             # create veth to patch physical bridge with integration bridge
             int_veth_name = constants.VETH_INTEGRATION_PREFIX + bridge
-            self.int_br.delete_port(int_veth_name)
             phys_veth_name = constants.VETH_PHYSICAL_PREFIX + bridge
-            br.delete_port(phys_veth_name)
+            txn = ovs_lib.OVSTransaction(self.root_helper)
+            txn.delete_port(self.int_br.br_name, int_veth_name)
+            txn.delete_port(br.br_name, phys_veth_name)
+            txn.commit()
             if ip_lib.device_exists(int_veth_name, self.root_helper):
                 ip_lib.IPDevice(int_veth_name, self.root_helper).link.delete()
             int_veth, phys_veth = ip_wrapper.add_veth(int_veth_name,
                                                       phys_veth_name)
-            self.int_ofports[physical_network] = self.int_br.add_port(int_veth)
-            self.phys_ofports[physical_network] = br.add_port(phys_veth)
+            txn.add_port(self.int_br.br_name, int_veth_name)
+            txn.add_port(br.br_name, phys_veth_name)
+            txn.commit()
+            int_ofport = txn.get_port_ofport(int_veth_name)
+            phys_ofport = txn.get_port_ofport(phys_veth_name)
+            txn.commit()
+            self.int_ofports[physical_network] = int_ofport.result
+            self.phys_ofports[physical_network] = phys_ofport.result
 
             # block all untranslated traffic over veth between bridges
             self.int_br.add_flow(priority=2,
@@ -661,6 +693,28 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
                 'added': added,
                 'removed': removed}
 
+    def update_ports_from_changes(self, registered_ports, changes):
+        """Compute port deltas from the changes seen by the ovsdb monitor.
+
+        :param changes: a dict mapping iface-ids to interface names, or to
+               None for VIFs that went away.
+        """
+        added = set()
+        removed = set()
+        for port_id, port_name in changes.iteritems():
+            if port_name is None:
+                if port_id in registered_ports:
+                    removed.add(port_id)
+            elif (port_id not in registered_ports and
+                  ovs_lib.get_bridge_for_iface(
+                      self.root_helper, port_name) == self.int_br.br_name):
+                added.add(port_id)
+        if not (added or removed):
+            return
+        return {'current': (registered_ports | added) - removed,
+                'added': added,
+                'removed': removed}
+
     def update_ancillary_ports(self, registered_ports):
         ports = set()
         for bridge in self.ancillary_brs:
@@ -685,50 +739,60 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
         else:
             LOG.debug(_("No VIF port for port %s defined on agent."), port_id)
 
-    def treat_devices_added(self, devices):
-        resync = False
-        self.sg_agent.prepare_devices_filter(devices)
-        for device in devices:
-            LOG.info(_("Port %s added"), device)
+    def _get_devices_details(self, devices):
+        """Yield device details from the plugin, a chunk at a time.
+
+        Yields None for a chunk whose details could not be retrieved.
+        """
+        devices = list(devices)
+        chunk_size = self.device_details_chunk_size or len(devices) or 1
+        for i in xrange(0, len(devices), chunk_size):
+            chunk = devices[i:i + chunk_size]
             try:
-                details = self.plugin_rpc.get_device_details(self.context,
-                                                             device,
-                                                             self.agent_id)
+                yield self.plugin_rpc.get_devices_details_list(self.context,
+                                                               chunk,
+                                                               self.agent_id)
             except Exception as e:
                 LOG.debug(_("Unable to get port details for "
-                            "%(device)s: %(e)s"),
-                          {'device': device, 'e': e})
+                            "%(devices)s: %(e)s"),
+                          {'devices': chunk, 'e': e})
+                yield
+
+    def treat_devices_added(self, devices):
+        resync = False
+        self.sg_agent.prepare_devices_filter(devices)
+        for devices_details in self._get_devices_details(devices):
+            if devices_details is None:
                 resync = True
                 continue
-            port = self.int_br.get_vif_port_by_id(details['device'])
-            if 'port_id' in details:
-                LOG.info(_("Port %(device)s updated. Details: %(details)s"),
-                         {'device': device, 'details': details})
-                self.treat_vif_port(port, details['port_id'],
-                                    details['network_id'],
-                                    details['network_type'],
-                                    details['physical_network'],
-                                    details['segmentation_id'],
-                                    details['admin_state_up'])
-            else:
-                LOG.debug(_("Device %s not defined on plugin"), device)
-                if (port and int(port.ofport) != -1):
-                    self.port_dead(port)
+            for details in devices_details:
+                device = details['device']
+                LOG.info(_("Port %s added"), device)
+                port = self.int_br.get_vif_port_by_id(device)
+                if 'port_id' in details:
+                    LOG.info(_("Port %(device)s updated. "
+                               "Details: %(details)s"),
+                             {'device': device, 'details': details})
+                    self.treat_vif_port(port, details['port_id'],
+                                        details['network_id'],
+                                        details['network_type'],
+                                        details['physical_network'],
+                                        details['segmentation_id'],
+                                        details['admin_state_up'])
+                else:
+                    LOG.debug(_("Device %s not defined on plugin"), device)
+                    if (port and int(port.ofport) != -1):
+                        self.port_dead(port)
         return resync
 
     def treat_ancillary_devices_added(self, devices):
         resync = False
-        for device in devices:
-            LOG.info(_("Ancillary Port %s added"), device)
-            try:
-                self.plugin_rpc.get_device_details(self.context, device,
-                                                   self.agent_id)
-            except Exception as e:
-                LOG.debug(_("Unable to get port details for "
-                            "%(device)s: %(e)s"),
-                          {'device': device, 'e': e})
+        for devices_details in self._get_devices_details(devices):
+            if devices_details is None:
                 resync = True
                 continue
+            for details in devices_details:
+                LOG.info(_("Ancillary Port %s added"), details['device'])
         return resync
 
     def treat_devices_removed(self, devices):
@@ -773,13 +837,28 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
                 LOG.debug(_("Device %s not defined on plugin"), device)
         return resync
 
+    @contextlib.contextmanager
+    def deferred_flows(self):
+        """Batch the flow mods of every bridge until the block exits."""
+        bridges = [self.int_br] + self.phys_brs.values()
+        if self.enable_tunneling:
+            bridges.append(self.tun_br)
+        for bridge in bridges:
+            bridge.defer_apply_on()
+        try:
+            yield
+        finally:
+            for bridge in bridges:
+                bridge.defer_apply_off()
+
     def process_network_ports(self, port_info):
         resync_a = False
         resync_b = False
-        if 'added' in port_info:
-            resync_a = self.treat_devices_added(port_info['added'])
-        if 'removed' in port_info:
-            resync_b = self.treat_devices_removed(port_info['removed'])
+        with self.deferred_flows():
+            if 'added' in port_info:
+                resync_a = self.treat_devices_added(port_info['added'])
+            if 'removed' in port_info:
+                resync_b = self.treat_devices_removed(port_info['removed'])
         # If one of the above opertaions fails => resync with plugin
         return (resync_a | resync_b)
 
@@ -801,16 +880,16 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
                 details = self.plugin_rpc.tunnel_sync(self.context,
                                                       self.local_ip,
                                                       tunnel_type)
-                tunnels = details['tunnels']
-                for tunnel in tunnels:
+                tunnels = {}
+                for tunnel in details['tunnels']:
                     if self.local_ip != tunnel['ip_address']:
                         tunnel_id = tunnel.get('id', tunnel['ip_address'])
                         tun_name = '%s-%s' % (tunnel_type, tunnel_id)
-                        self.tun_br.add_tunnel_port(tun_name,
-                                                    tunnel['ip_address'],
-                                                    self.local_ip,
-                                                    tunnel_type,
-                                                    self.vxlan_udp_port)
+                        tunnels[tun_name] = tunnel['ip_address']
+                if tunnels:
+                    self.tun_br.add_tunnel_ports(tunnels, self.local_ip,
+                                                 tunnel_type,
+                                                 self.vxlan_udp_port)
         except Exception as e:
             LOG.debug(_("Unable to sync tunnel IP %(local_ip)s: %(e)s"),
                       {'local_ip': self.local_ip, 'e': e})
@@ -822,22 +901,34 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
         ports = set()
         ancillary_ports = set()
         tunnel_sync = True
+        if self.ovsdb_monitor:
+            self.ovsdb_monitor.start()
 
         while True:
             try:
                 start = time.time()
+                # None means the changes are unknown and all ports are
+                # polled, as they are when the monitor is disabled.
+                changes = None
+                if self.ovsdb_monitor:
+                    changes = self.ovsdb_monitor.get_changes()
                 if sync:
                     LOG.info(_("Agent out of sync with plugin!"))
                     ports.clear()
                     ancillary_ports.clear()
                     sync = False
+                    changes = None
 
                 # Notify the plugin of tunnel IP
                 if self.enable_tunneling and tunnel_sync:
                     LOG.info(_("Agent tunnel out of sync with plugin!"))
                     tunnel_sync = self.tunnel_sync()
 
-                port_info = self.update_ports(ports)
+                if changes is None:
+                    port_info = self.update_ports(ports)
+                else:
+                    port_info = self.update_ports_from_changes(ports,
+                                                               changes)
 
                 # notify plugin about port deltas
                 if port_info:
@@ -847,7 +938,7 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
                     ports = port_info['current']
 
                 # Treat ancillary devices if they exist
-                if self.ancillary_brs:
+                if self.ancillary_brs and (changes is None or changes):
                     port_info = self.update_ancillary_ports(ancillary_ports)
                     if port_info:
                         rc = self.process_ancillary_network_ports(port_info)
@@ -862,7 +953,11 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
             # sleep till end of polling interval
             elapsed = (time.time() - start)
             if (elapsed < self.polling_interval):
-                time.sleep(self.polling_interval - elapsed)
+                if self.ovsdb_monitor and not sync:
+                    # Wake up as soon as an interface changes
+                    self.ovsdb_monitor.wait(self.polling_interval - elapsed)
+                else:
+                    time.sleep(self.polling_interval - elapsed)
             else:
                 LOG.debug(_("Loop iteration exceeded interval "
                             "(%(polling_interval)s vs. %(elapsed)s)!"),
@@ -931,6 +1026,9 @@ def create_agent_config_map(config):
         polling_interval=config.AGENT.polling_interval,
         tunnel_types=config.AGENT.tunnel_types,
         veth_mtu=config.AGENT.veth_mtu,
+        minimize_polling=config.AGENT.minimize_polling,
+        ovsdb_monitor_respawn_interval=(
+            config.AGENT.ovsdb_monitor_respawn_interval),
     )
 
     # If enable_tunneling is TRUE, set tunnel_type to default to GRE
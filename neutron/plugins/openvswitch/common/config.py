@@ -62,6 +62,12 @@ agent_opts = [
     cfg.IntOpt('polling_interval', default=2,
                help=_("The number of seconds the agent will wait between "
                       "polling for local device changes.")),
+    cfg.BoolOpt('minimize_polling', default=False,
+                help=_("Minimize polling by monitoring ovsdb for interface "
+                       "changes.")),
+    cfg.IntOpt('ovsdb_monitor_respawn_interval', default=30,
+               help=_("The number of seconds to wait before respawning the "
+                      "ovsdb monitor after losing communication with it.")),
     cfg.ListOpt('tunnel_types', default=DEFAULT_TUNNEL_TYPES,
                 help=_("Network types supported by the agent "
                        "(gre and/or vxlan)")),
@@ -69,6 +75,10 @@ agent_opts = [
                help=_("The UDP port to use for VXLAN tunnels.")),
     cfg.IntOpt('veth_mtu', default=None,
                help=_("MTU size of veth interfaces")),
+    cfg.IntOpt('device_details_chunk_size', default=50,
+               help=_("The number of devices whose details are requested "
+                      "from the plugin in a single RPC call. 0 requests "
+                      "all added devices at once.")),
 ]
 
 
@@ -543,6 +543,27 @@ class OVSNeutronPluginV2(db_base_plugin_v2.NeutronDbPluginV2,
         self.notify_security_groups_member_updated(context, port)
         return port
 
+    def create_port_bulk(self, context, ports):
+        items = ports['ports']
+        # Set port status as 'DOWN'. This will be updated by agent
+        for port in items:
+            port['port']['status'] = q_const.PORT_STATUS_DOWN
+        session = context.session
+        with session.begin(subtransactions=True):
+            sgids = []
+            for port in items:
+                self._ensure_default_security_group_on_port(context, port)
+                sgids.append(self._get_security_groups_on_port(context, port))
+            results = super(OVSNeutronPluginV2, self)._create_ports_bulk(
+                context, items)
+            for port, result in zip(items, results):
+                self._process_portbindings_create_and_update(
+                    context, port['port'], result)
+            self._process_ports_create_security_group(context, results,
+                                                      sgids)
+        self.notify_security_groups_member_updated_bulk(context, results)
+        return results
+
     def update_port(self, context, id, port):
         session = context.session
         need_port_update_notify = False
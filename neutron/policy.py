@@ -35,6 +35,12 @@ from neutron.openstack.common import policy
 LOG = logging.getLogger(__name__)
 _POLICY_PATH = None
 _POLICY_CACHE = {}
+# The policy rules that _COMPILED_RULES and _ROLE_DECISIONS were built
+# from. Compiled read rules are kept by action, and the decisions of rules
+# which only depend on roles are kept by action and role set.
+_COMPILED_FOR = None
+_COMPILED_RULES = {}
+_ROLE_DECISIONS = {}
 ADMIN_CTX_POLICY = 'context_is_admin'
 # Maps deprecated 'extension' policies to new-style policies
 DEPRECATED_POLICY_MAP = {
@@ -61,9 +67,19 @@ def reset():
     global _POLICY_CACHE
     _POLICY_PATH = None
     _POLICY_CACHE = {}
+    _reset_compiled_rules(None)
     policy.reset()
 
 
+def _reset_compiled_rules(rules):
+    global _COMPILED_FOR
+    global _COMPILED_RULES
+    global _ROLE_DECISIONS
+    _COMPILED_FOR = rules
+    _COMPILED_RULES = {}
+    _ROLE_DECISIONS = {}
+
+
 def init():
     global _POLICY_PATH
     global _POLICY_CACHE
@@ -379,6 +395,98 @@ def enforce(context, action, target, plugin=None):
                         exc=exceptions.PolicyNotAuthorized, action=action)
 
 
+def _compile_rule(rule):
+    """Compile a check tree into a function of (target, credentials).
+
+    Rule references are resolved once, and boolean checks become plain
+    functions. Returns the function and whether its result only depends
+    on the roles in the credentials.
+    """
+    if isinstance(rule, policy.TrueCheck):
+        return (lambda target, creds: True), True
+    if isinstance(rule, policy.FalseCheck):
+        return (lambda target, creds: False), True
+    if isinstance(rule, policy.RoleCheck):
+        role = rule.match.lower()
+        return (lambda target, creds:
+                role in [x.lower() for x in creds['roles']]), True
+    if isinstance(rule, policy.RuleCheck):
+        try:
+            return _compile_rule(policy._rules[rule.match])
+        except KeyError:
+            # We don't have any matching rule; fail closed
+            return (lambda target, creds: False), True
+    if isinstance(rule, policy.NotCheck):
+        func, roles_only = _compile_rule(rule.rule)
+        return (lambda target, creds: not func(target, creds)), roles_only
+    if isinstance(rule, (policy.AndCheck, policy.OrCheck)):
+        compiled = [_compile_rule(sub_rule) for sub_rule in rule.rules]
+        funcs = [sub_func for sub_func, sub_roles_only in compiled]
+        roles_only = all(sub_roles_only
+                         for sub_func, sub_roles_only in compiled)
+        if isinstance(rule, policy.AndCheck):
+            def func(target, creds):
+                for sub_func in funcs:
+                    if not sub_func(target, creds):
+                        return False
+                return True
+        else:
+            def func(target, creds):
+                for sub_func in funcs:
+                    if sub_func(target, creds):
+                        return True
+                return False
+        return func, roles_only
+    # Generic, field, ownership and http checks look at the target
+    return rule, False
+
+
+def _get_compiled_rule(action):
+    """Return the compiled rule for a read action."""
+    if _COMPILED_FOR is not policy._rules:
+        _reset_compiled_rules(policy._rules)
+    compiled = _COMPILED_RULES.get(action)
+    if compiled is None:
+        compiled = _compile_rule(policy.RuleCheck('rule', action))
+        _COMPILED_RULES[action] = compiled
+    return compiled
+
+
+class CollectionChecker(object):
+    """Evaluates read policies for the items of a collection.
+
+    Listing a collection checks the same few read actions for every item.
+    The policy file is checked and the credentials are built once for all
+    items, and each rule is only compiled once. Rules which only depend on
+    roles, such as most attribute visibility rules, are decided once per
+    action and role set.
+    """
+
+    def __init__(self, context):
+        init()
+        self.credentials = context.to_dict()
+        self._roles = frozenset(role.lower()
+                                for role in self.credentials['roles'])
+
+    def check(self, action, target):
+        """Verify that the read action is valid on the target."""
+        func, roles_only = _get_compiled_rule(action)
+        if not roles_only:
+            return func(target, self.credentials)
+        key = (action, self._roles)
+        result = _ROLE_DECISIONS.get(key)
+        if result is None:
+            result = func(target, self.credentials)
+            _ROLE_DECISIONS[key] = result
+        return result
+
+    def check_if_exists(self, action, target):
+        """Like check, but raise if the action is not defined."""
+        if not policy._rules or action not in policy._rules:
+            raise exceptions.PolicyRuleNotFound(rule=action)
+        return self.check(action, target)
+
+
 def check_is_admin(context):
     """Verify context has admin rights according to policy settings."""
     init()
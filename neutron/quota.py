@@ -255,6 +255,12 @@ class QuotaEngine(object):
         if not res or not hasattr(res, 'count'):
             raise exceptions.QuotaResourceUnknown(unknown=[resource])
 
+        # Drivers may keep the usage of the resources instead
+        get_usage = getattr(self._driver, 'get_usage', None)
+        if get_usage:
+            usage = get_usage(context, res, *args, **kwargs)
+            if usage is not None:
+                return usage
         return res.count(context, *args, **kwargs)
 
     def limit_check(self, context, tenant_id, **values):
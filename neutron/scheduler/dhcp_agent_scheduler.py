@@ -70,15 +70,15 @@ class ChanceScheduler(object):
                 return
             active_dhcp_agents = [
                 agent for agent in set(enabled_dhcp_agents)
-                if not agents_db.AgentDbMixin.is_agent_down(
-                    agent['heartbeat_timestamp'])
+                if not agents_db.AgentDbMixin.is_agent_db_down(agent)
                 and agent not in dhcp_agents
             ]
             if not active_dhcp_agents:
                 LOG.warn(_('No more DHCP agents'))
                 return
             n_agents = min(len(active_dhcp_agents), n_agents)
-            chosen_agents = random.sample(active_dhcp_agents, n_agents)
+            chosen_agents = self._choose_network_agents(
+                plugin, context, active_dhcp_agents, n_agents)
             for agent in chosen_agents:
                 self._schedule_bind_network(context, agent, network['id'])
         return chosen_agents
@@ -96,8 +96,7 @@ class ChanceScheduler(object):
                                  agents_db.Agent.admin_state_up == True)
             dhcp_agents = query.all()
             for dhcp_agent in dhcp_agents:
-                if agents_db.AgentDbMixin.is_agent_down(
-                    dhcp_agent.heartbeat_timestamp):
+                if agents_db.AgentDbMixin.is_agent_db_down(dhcp_agent):
                     LOG.warn(_('DHCP agent %s is not active'), dhcp_agent.id)
                     continue
                 fields = ['network_id', 'enable_dhcp']
@@ -119,3 +118,83 @@ class ChanceScheduler(object):
                     binding.network_id = net_id
                     context.session.add(binding)
         return True
+
+    def _choose_network_agents(self, plugin, context, candidates, n_agents):
+        return random.sample(candidates, n_agents)
+
+
+class LeastNetworksScheduler(ChanceScheduler):
+    """Allocate the DHCP agents of a network to the least loaded agents.
+
+    Agents are compared by the number of networks bound to them, and then
+    by the number of ports on those networks. Each network is scheduled
+    to dhcp_agents_per_network agents.
+    """
+
+    def _choose_network_agents(self, plugin, context, candidates, n_agents):
+        loads = plugin.get_dhcp_agents_load(context, candidates)
+        return sorted(candidates,
+                      key=lambda agent: (loads[agent.id], agent.id))[:n_agents]
+
+    def auto_schedule_networks(self, plugin, context, host):
+        """Schedule non-hosted networks to the least loaded DHCP agents.
+
+        The networks lacking DHCP agents are spread over all the active
+        DHCP agents, including the one running on host, instead of all
+        going to the first agent syncing its networks. The other agents
+        are notified of the networks scheduled to them.
+        """
+        agents_per_network = cfg.CONF.dhcp_agents_per_network
+        scheduled = {}
+        with context.session.begin(subtransactions=True):
+            enabled_dhcp_agents = plugin.get_agents_db(
+                context, filters={
+                    'agent_type': [constants.AGENT_TYPE_DHCP],
+                    'admin_state_up': [True]})
+            active_dhcp_agents = [
+                agent for agent in enabled_dhcp_agents
+                if not agents_db.AgentDbMixin.is_agent_db_down(agent)]
+            if not any(agent.host == host for agent in active_dhcp_agents):
+                LOG.warn(_('No active DHCP agent on host %s'), host)
+                return False
+            fields = ['network_id', 'enable_dhcp']
+            subnets = plugin.get_subnets(context, fields=fields)
+            net_ids = set(s['network_id'] for s in subnets
+                          if s['enable_dhcp'])
+            if not net_ids:
+                LOG.debug(_('No non-hosted networks'))
+                return False
+            agents = dict((agent.id, agent) for agent in active_dhcp_agents)
+            query = context.session.query(
+                agentschedulers_db.NetworkDhcpAgentBinding)
+            query = query.filter(
+                agentschedulers_db.NetworkDhcpAgentBinding.network_id.in_(
+                    net_ids))
+            hosting = {}
+            for binding in query:
+                if binding.dhcp_agent_id in agents:
+                    hosting.setdefault(binding.network_id, set()).add(
+                        binding.dhcp_agent_id)
+            loads = plugin.get_dhcp_agents_load(context, active_dhcp_agents)
+            for net_id in sorted(net_ids):
+                hosting_ids = hosting.get(net_id, set())
+                n_agents = agents_per_network - len(hosting_ids)
+                if n_agents <= 0:
+                    continue
+                candidates = [agent for agent_id, agent in agents.iteritems()
+                              if agent_id not in hosting_ids]
+                candidates.sort(key=lambda agent: (loads[agent.id],
+                                                   agent.id))
+                for agent in candidates[:n_agents]:
+                    self._schedule_bind_network(context, agent, net_id)
+                    networks, ports = loads[agent.id]
+                    loads[agent.id] = (networks + 1, ports)
+                    scheduled.setdefault(agent.host, []).append(net_id)
+        dhcp_notifier = plugin.agent_notifiers.get(constants.AGENT_TYPE_DHCP)
+        for agent_host, scheduled_net_ids in scheduled.iteritems():
+            # The agent running on host gets its networks in the sync reply
+            if dhcp_notifier and agent_host != host:
+                for net_id in scheduled_net_ids:
+                    dhcp_notifier.network_added_to_agent(
+                        context, net_id, agent_host)
+        return True
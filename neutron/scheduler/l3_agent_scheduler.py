@@ -36,6 +36,23 @@ class ChanceScheduler(object):
     can be introduced later.
     """
 
+    def _get_enabled_l3_agent(self, context, host):
+        # query if we have valid l3 agent on the host
+        query = context.session.query(agents_db.Agent)
+        query = query.filter(agents_db.Agent.agent_type ==
+                             constants.AGENT_TYPE_L3,
+                             agents_db.Agent.host == host,
+                             agents_db.Agent.admin_state_up == True)
+        try:
+            l3_agent = query.one()
+        except (exc.MultipleResultsFound, exc.NoResultFound):
+            LOG.debug(_('No enabled L3 agent on host %s'),
+                      host)
+            return
+        if agents_db.AgentDbMixin.is_agent_db_down(l3_agent):
+            LOG.warn(_('L3 agent %s is not active'), l3_agent.id)
+        return l3_agent
+
     def auto_schedule_routers(self, plugin, context, host, router_ids):
         """Schedule non-hosted routers to L3 Agent running on host.
         If router_ids is given, each router in router_ids is scheduled
@@ -45,21 +62,9 @@ class ChanceScheduler(object):
         by active l3 agents.
         """
         with context.session.begin(subtransactions=True):
-            # query if we have valid l3 agent on the host
-            query = context.session.query(agents_db.Agent)
-            query = query.filter(agents_db.Agent.agent_type ==
-                                 constants.AGENT_TYPE_L3,
-                                 agents_db.Agent.host == host,
-                                 agents_db.Agent.admin_state_up == True)
-            try:
-                l3_agent = query.one()
-            except (exc.MultipleResultsFound, exc.NoResultFound):
-                LOG.debug(_('No enabled L3 agent on host %s'),
-                          host)
+            l3_agent = self._get_enabled_l3_agent(context, host)
+            if not l3_agent:
                 return False
-            if agents_db.AgentDbMixin.is_agent_down(
-                l3_agent.heartbeat_timestamp):
-                LOG.warn(_('L3 agent %s is not active'), l3_agent.id)
             # check if each of the specified routers is hosted
             if router_ids:
                 unscheduled_router_ids = []
@@ -143,7 +148,8 @@ class ChanceScheduler(object):
                          sync_router['id'])
                 return
 
-            chosen_agent = random.choice(candidates)
+            chosen_agent = self._choose_router_agent(plugin, context,
+                                                     candidates)
             binding = agentschedulers_db.RouterL3AgentBinding()
             binding.l3_agent = chosen_agent
             binding.router_id = sync_router['id']
@@ -153,3 +159,156 @@ class ChanceScheduler(object):
                       {'router_id': sync_router['id'],
                        'agent_id': chosen_agent['id']})
             return chosen_agent
+
+    def _choose_router_agent(self, plugin, context, candidates):
+        return random.choice(candidates)
+
+
+class LeastRoutersScheduler(ChanceScheduler):
+    """Allocate a L3 agent for a router to the least loaded agent.
+
+    Agents are compared by the number of routers bound to them, and then
+    by the number of interfaces and floating IPs they reported, which
+    lag behind the bindings by up to a report interval.
+    """
+
+    def _choose_router_agent(self, plugin, context, candidates):
+        loads = plugin.get_l3_agents_load(context, candidates)
+        return min(candidates, key=lambda agent: loads[agent.id])
+
+    def auto_schedule_routers(self, plugin, context, host, router_ids):
+        """Schedule non-hosted routers to the least loaded L3 agents.
+
+        The routers are spread over the active L3 agents, including the
+        one running on host, instead of all going to the first agent
+        syncing its routers. The other agents are notified of the routers
+        scheduled to them. Routers given by router_ids are scheduled to
+        the agent running on host, as by the ChanceScheduler.
+        """
+        if router_ids:
+            return super(LeastRoutersScheduler, self).auto_schedule_routers(
+                plugin, context, host, router_ids)
+        scheduled = {}
+        with context.session.begin(subtransactions=True):
+            l3_agent = self._get_enabled_l3_agent(context, host)
+            if not l3_agent:
+                return False
+            stmt = ~exists().where(
+                l3_db.Router.id ==
+                agentschedulers_db.RouterL3AgentBinding.router_id)
+            unscheduled_router_ids = [router_id_[0] for router_id_ in
+                                      context.session.query(
+                                          l3_db.Router.id).filter(stmt)]
+            if not unscheduled_router_ids:
+                LOG.debug(_('No non-hosted routers'))
+                return False
+            l3_agents = [agent for agent in
+                         plugin.get_l3_agents(context, active=True)
+                         if agent.id != l3_agent.id]
+            l3_agents.append(l3_agent)
+            loads = plugin.get_l3_agents_load(context, l3_agents)
+            routers = plugin.get_routers(
+                context, filters={'id': unscheduled_router_ids})
+            for router in routers:
+                candidates = plugin.get_l3_agent_candidates(router,
+                                                            l3_agents)
+                if not candidates:
+                    continue
+                chosen_agent = min(candidates,
+                                   key=lambda agent: loads[agent.id])
+                binding = agentschedulers_db.RouterL3AgentBinding()
+                binding.l3_agent = chosen_agent
+                binding.router_id = router['id']
+                context.session.add(binding)
+                routers_, ports = loads[chosen_agent.id]
+                loads[chosen_agent.id] = (routers_ + 1, ports)
+                scheduled.setdefault(chosen_agent.host, []).append(
+                    router['id'])
+        if not scheduled:
+            LOG.warn(_('No routers compatible with L3 agent configuration'
+                       ' on host %s'), host)
+            return False
+        l3_notifier = plugin.agent_notifiers.get(constants.AGENT_TYPE_L3)
+        for agent_host, scheduled_router_ids in scheduled.iteritems():
+            # The agent running on host gets its routers in the sync reply
+            if l3_notifier and agent_host != host:
+                l3_notifier.router_added_to_agent(
+                    context, scheduled_router_ids, agent_host)
+        return host in scheduled
+
+    def rebalance(self, plugin, context, max_routers):
+        """Move routers from the most to the least loaded active agents.
+
+        At most max_routers routers are moved, so that the agents are
+        loaded gradually when this is called repeatedly. Returns the
+        moves as (router_id, source agent, destination agent) tuples.
+        """
+        moves = []
+        with context.session.begin(subtransactions=True):
+            l3_agents = plugin.get_l3_agents(context, active=True)
+            if len(l3_agents) < 2:
+                return moves
+            agents = dict((agent.id, agent) for agent in l3_agents)
+            counts = dict((agent_id, load[0]) for agent_id, load in
+                          plugin.get_l3_agents_load(context,
+                                                    l3_agents).iteritems())
+            # Agents from which no router can be moved
+            exhausted = set()
+            while len(moves) < max_routers:
+                sources = [agent_id for agent_id in agents
+                           if agent_id not in exhausted]
+                if not sources:
+                    break
+                source_id = max(sources, key=lambda agent_id:
+                                (counts[agent_id], agent_id))
+                router_id, dest_id = self._find_move(
+                    plugin, context, agents, counts, source_id)
+                if not router_id:
+                    exhausted.add(source_id)
+                    continue
+                query = context.session.query(
+                    agentschedulers_db.RouterL3AgentBinding)
+                query = query.filter_by(router_id=router_id,
+                                        l3_agent_id=source_id)
+                query.update({'l3_agent_id': dest_id},
+                             synchronize_session=False)
+                counts[source_id] -= 1
+                counts[dest_id] += 1
+                moves.append((router_id, agents[source_id], agents[dest_id]))
+        l3_notifier = plugin.agent_notifiers.get(constants.AGENT_TYPE_L3)
+        if l3_notifier:
+            for router_id, source, dest in moves:
+                l3_notifier.router_removed_from_agent(context, router_id,
+                                                      source.host)
+                l3_notifier.router_added_to_agent(context, [router_id],
+                                                  dest.host)
+        for router_id, source, dest in moves:
+            LOG.info(_('Router %(router_id)s moved from L3 agent '
+                       '%(source)s to %(dest)s'),
+                     {'router_id': router_id, 'source': source.id,
+                      'dest': dest.id})
+        return moves
+
+    def _find_move(self, plugin, context, agents, counts, source_id):
+        """Find a router of source_id to move to a less loaded agent.
+
+        Only moves making the load of both agents closer are considered.
+        """
+        dest_ids = [agent_id for agent_id in agents
+                    if counts[agent_id] + 1 < counts[source_id]]
+        if not dest_ids:
+            return None, None
+        query = context.session.query(
+            agentschedulers_db.RouterL3AgentBinding.router_id)
+        query = query.filter_by(l3_agent_id=source_id)
+        router_ids = [item[0] for item in query]
+        if not router_ids:
+            return None, None
+        dest_agents = sorted([agents[agent_id] for agent_id in dest_ids],
+                             key=lambda agent: (counts[agent.id], agent.id))
+        for router in plugin.get_routers(context,
+                                         filters={'id': router_ids}):
+            candidates = plugin.get_l3_agent_candidates(router, dest_agents)
+            if candidates:
+                return router['id'], candidates[0].id
+        return None, None
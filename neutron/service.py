@@ -25,6 +25,8 @@ from oslo.config import cfg
 from neutron.common import config
 from neutron.common import legacy
 from neutron import context
+from neutron.db import agents_db
+from neutron import manager
 from neutron.openstack.common import importutils
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import loopingcall
@@ -71,6 +73,36 @@ class WsgiService(object):
 class NeutronApiService(WsgiService):
     """Class for neutron-api service."""
 
+    def start(self):
+        super(NeutronApiService, self).start()
+        if cfg.CONF.ip_recycle_interval:
+            self._start_ip_recycler()
+
+    def _start_ip_recycler(self):
+        plugin = manager.NeutronManager.get_plugin()
+        if not hasattr(plugin, 'recycle_expired_ip_allocations'):
+            LOG.warn(_("Plugin does not support recycling expired IP "
+                       "allocations in the background"))
+            return
+        recycler = loopingcall.FixedIntervalLoopingCall(
+            self._recycle_expired_ips, plugin)
+        recycler.start(interval=cfg.CONF.ip_recycle_interval,
+                       initial_delay=cfg.CONF.ip_recycle_interval)
+
+    def _recycle_expired_ips(self, plugin):
+        try:
+            plugin.recycle_expired_ip_allocations(
+                context.get_admin_context())
+        except Exception:
+            LOG.exception(_("Failed recycling expired IP allocations"))
+
+    def wait(self):
+        try:
+            super(NeutronApiService, self).wait()
+        finally:
+            # Write the agent heartbeats only kept in memory so far
+            agents_db.heartbeats.stop()
+
     @classmethod
     def create(cls, app_name='neutron'):
 
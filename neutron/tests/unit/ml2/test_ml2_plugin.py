@@ -13,6 +13,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+
+from neutron.common import constants
+from neutron import context
+from neutron import manager
 from neutron.plugins.ml2 import config as config
 from neutron.tests.unit import _test_extension_portbindings as test_bindings
 from neutron.tests.unit import test_db_plugin as test_plugin
@@ -52,7 +57,8 @@ class TestMl2NetworksV2(test_plugin.TestNetworksV2,
     pass
 
 
-class TestMl2PortsV2(test_plugin.TestPortsV2, Ml2PluginV2TestCase):
+class TestMl2PortsV2(test_plugin.NativeBulkPortsTestMixin,
+                     test_plugin.TestPortsV2, Ml2PluginV2TestCase):
 
     def test_update_port_status_build(self):
         with self.port() as port:
@@ -60,6 +66,47 @@ class TestMl2PortsV2(test_plugin.TestPortsV2, Ml2PluginV2TestCase):
             self.assertEqual(self.port_create_status, 'DOWN')
 
 
+class TestMl2DevicesDetails(Ml2PluginV2TestCase):
+
+    def setUp(self):
+        super(TestMl2DevicesDetails, self).setUp()
+        self.callbacks = manager.NeutronManager.get_plugin().callbacks
+        self.context = context.get_admin_context()
+
+    def test_get_devices_details_list(self):
+        with self.subnet() as subnet:
+            with contextlib.nested(self.port(subnet=subnet),
+                                   self.port(subnet=subnet)) as (port1,
+                                                                 port2):
+                devices = ['tap' + port['port']['id'][:11]
+                           for port in (port1, port2)] + ['tapfake_dev']
+                details = self.callbacks.get_devices_details_list(
+                    self.context, devices=devices, agent_id='fake_agent_id')
+                self.assertEqual(len(details), 3)
+                for port, entry in zip((port1, port2), details):
+                    expected = self.callbacks.get_device_details(
+                        self.context, device=entry['device'],
+                        agent_id='fake_agent_id')
+                    self.assertEqual(entry, expected)
+                    self.assertEqual(entry['port_id'], port['port']['id'])
+                    self.assertEqual(entry['network_type'], 'local')
+                self.assertEqual(details[2], {'device': 'tapfake_dev'})
+                port_id = port1['port']['id']
+                req = self.new_show_request('ports', port_id)
+                res = self.deserialize(self.fmt, req.get_response(self.api))
+                self.assertEqual(res['port']['status'],
+                                 constants.PORT_STATUS_ACTIVE)
+
+    def test_get_devices_details_list_ambiguous_device(self):
+        with self.subnet() as subnet:
+            with contextlib.nested(self.port(subnet=subnet),
+                                   self.port(subnet=subnet)):
+                # An empty port id prefix matches both ports
+                details = self.callbacks.get_devices_details_list(
+                    self.context, devices=['tap'], agent_id='fake_agent_id')
+                self.assertEqual(details, [{'device': 'tap'}])
+
+
 # TODO(rkukura) add TestMl2PortBinding
 
 
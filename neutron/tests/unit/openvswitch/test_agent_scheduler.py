@@ -169,6 +169,19 @@ class AgentSchedulerTestMixIn(object):
         res = req.get_response(self.ext_api)
         self.assertEqual(res.status_int, expected_code)
 
+    def _rebalance_l3_agents(self, max_routers=None,
+                             expected_code=exc.HTTPCreated.code,
+                             admin_context=True):
+        path = "/%s.%s" % (l3agentscheduler.L3_AGENT_REBALANCE, self.fmt)
+        data = {}
+        if max_routers is not None:
+            data['max_routers'] = max_routers
+        req = self._path_create_request(path, data,
+                                        admin_context=admin_context)
+        res = req.get_response(self.ext_api)
+        self.assertEqual(res.status_int, expected_code)
+        return self.deserialize(self.fmt, res)
+
     def _register_one_agent_state(self, agent_state):
         callback = agents_db.AgentExtRpcCallback()
         callback.report_state(self.adminContext,
@@ -423,6 +436,61 @@ class OvsAgentSchedulerTestCase(test_l3_plugin.L3NatTestCaseMixin,
         self.assertEqual(2, result1)
         self.assertEqual(3, result2)
 
+    def test_get_dhcp_agents_hosting_networks(self):
+        cfg.CONF.set_override('allow_overlapping_ips', True)
+        with contextlib.nested(self.network(), self.network(),
+                               self.network()) as (net1, net2, net3):
+            self._register_agent_states()
+            hosta_id = self._get_agent_id(constants.AGENT_TYPE_DHCP,
+                                          DHCP_HOSTA)
+            hostc_id = self._get_agent_id(constants.AGENT_TYPE_DHCP,
+                                          DHCP_HOSTC)
+            self._add_network_to_dhcp_agent(hosta_id,
+                                            net1['network']['id'])
+            self._add_network_to_dhcp_agent(hostc_id,
+                                            net2['network']['id'])
+            self._add_network_to_dhcp_agent(hostc_id,
+                                            net3['network']['id'])
+            plugin = manager.NeutronManager.get_plugin()
+            dhcp_agents = plugin.get_dhcp_agents_hosting_networks(
+                self.adminContext,
+                [net1['network']['id'], net2['network']['id']])
+        self.assertEqual(set([hosta_id, hostc_id]),
+                         set(dhcp_agent.id for dhcp_agent in dhcp_agents))
+        self.assertEqual(2, len(dhcp_agents))
+
+    def test_get_dhcp_agents_hosting_no_networks(self):
+        with self.network() as net1:
+            self._register_agent_states()
+            hosta_id = self._get_agent_id(constants.AGENT_TYPE_DHCP,
+                                          DHCP_HOSTA)
+            self._add_network_to_dhcp_agent(hosta_id,
+                                            net1['network']['id'])
+            plugin = manager.NeutronManager.get_plugin()
+            dhcp_agents = plugin.get_dhcp_agents_hosting_networks(
+                self.adminContext, [])
+        self.assertEqual([], dhcp_agents)
+
+    def test_list_active_networks_on_active_dhcp_agent_filtered(self):
+        with contextlib.nested(self.network(), self.network(),
+                               self.network()) as (net1, net2, net3):
+            self._register_agent_states()
+            hosta_id = self._get_agent_id(constants.AGENT_TYPE_DHCP,
+                                          DHCP_HOSTA)
+            self._add_network_to_dhcp_agent(hosta_id,
+                                            net1['network']['id'])
+            self._add_network_to_dhcp_agent(hosta_id,
+                                            net2['network']['id'])
+            plugin = manager.NeutronManager.get_plugin()
+            networks = plugin.list_active_networks_on_active_dhcp_agent(
+                self.adminContext, DHCP_HOSTA,
+                network_ids=[net2['network']['id'], net3['network']['id']])
+            no_networks = plugin.list_active_networks_on_active_dhcp_agent(
+                self.adminContext, DHCP_HOSTA, network_ids=[])
+        self.assertEqual([net2['network']['id']],
+                         [network['id'] for network in networks])
+        self.assertEqual([], no_networks)
+
     def test_network_scheduler_with_disabled_agent(self):
         dhcp_hosta = {
             'binary': 'neutron-dhcp-agent',
@@ -931,6 +999,281 @@ class OvsAgentSchedulerTestCase(test_l3_plugin.L3NatTestCaseMixin,
                 expected_code=exc.HTTPForbidden.code,
                 admin_context=False)
 
+    def test_rebalance_routers_not_supported(self):
+        self._rebalance_l3_agents(expected_code=exc.HTTPBadRequest.code)
+
+    def test_rebalance_routers_policy(self):
+        self._rebalance_l3_agents(expected_code=exc.HTTPForbidden.code,
+                                  admin_context=False)
+
+
+class OvsLeastRoutersSchedulerTestCase(test_l3_plugin.L3NatTestCaseMixin,
+                                       test_agent_ext_plugin.AgentDBTestMixIn,
+                                       AgentSchedulerTestMixIn,
+                                       test_plugin.NeutronDbPluginV2TestCase):
+    fmt = 'json'
+    plugin_str = ('neutron.plugins.openvswitch.'
+                  'ovs_neutron_plugin.OVSNeutronPluginV2')
+
+    def setUp(self):
+        cfg.CONF.set_override('router_scheduler_driver',
+                              'neutron.scheduler.l3_agent_scheduler.'
+                              'LeastRoutersScheduler')
+        self.saved_attr_map = {}
+        for resource, attrs in attributes.RESOURCE_ATTRIBUTE_MAP.iteritems():
+            self.saved_attr_map[resource] = attrs.copy()
+        super(OvsLeastRoutersSchedulerTestCase, self).setUp(self.plugin_str)
+        ext_mgr = extensions.PluginAwareExtensionManager.get_instance()
+        self.ext_api = test_extensions.setup_extensions_middleware(ext_mgr)
+        self.adminContext = context.get_admin_context()
+        attributes.RESOURCE_ATTRIBUTE_MAP.update(
+            agent.RESOURCE_ATTRIBUTE_MAP)
+        self.addCleanup(self.restore_attribute_map)
+        self.plugin = manager.NeutronManager.get_plugin()
+        self.l3_notifier = mock.Mock()
+        notifiers_p = mock.patch.dict(self.plugin.agent_notifiers,
+                                      {constants.AGENT_TYPE_L3:
+                                       self.l3_notifier})
+        notifiers_p.start()
+        self.addCleanup(notifiers_p.stop)
+
+    def restore_attribute_map(self):
+        attributes.RESOURCE_ATTRIBUTE_MAP = self.saved_attr_map
+
+    def _count_routers(self):
+        return dict((host, len(self._list_routers_hosted_by_l3_agent(
+            self._get_agent_id(constants.AGENT_TYPE_L3, host))['routers']))
+            for host in (L3_HOSTA, L3_HOSTB))
+
+    def test_schedule_router_to_least_routers(self):
+        with contextlib.nested(self.router(),
+                               self.router()) as (router1, router2):
+            self._register_agent_states()
+            hosta_id = self._get_agent_id(constants.AGENT_TYPE_L3,
+                                          L3_HOSTA)
+            self._add_router_to_l3_agent(hosta_id, router1['router']['id'])
+            chosen_agent = self.plugin.schedule_router(
+                self.adminContext, router2['router']['id'])
+        self.assertEqual(L3_HOSTB, chosen_agent.host)
+
+    def test_schedule_router_to_least_reported_ports(self):
+        l3_hosta = {
+            'binary': 'neutron-l3-agent',
+            'host': L3_HOSTA,
+            'topic': 'L3_AGENT',
+            'configurations': {'use_namespaces': True,
+                               'interfaces': 1,
+                               'floating_ips': 2},
+            'agent_type': constants.AGENT_TYPE_L3}
+        l3_hostb = copy.deepcopy(l3_hosta)
+        l3_hostb['host'] = L3_HOSTB
+        l3_hostb['configurations']['floating_ips'] = 4
+        with self.router() as router:
+            self._register_one_agent_state(l3_hosta)
+            self._register_one_agent_state(l3_hostb)
+            chosen_agent = self.plugin.schedule_router(
+                self.adminContext, router['router']['id'])
+        self.assertEqual(L3_HOSTA, chosen_agent.host)
+
+    def test_auto_schedule_spreads_routers(self):
+        with contextlib.nested(self.router(), self.router(),
+                               self.router(), self.router()) as routers:
+            l3_rpc = l3_rpc_base.L3RpcCallbackMixin()
+            self._register_agent_states()
+            ret_a = l3_rpc.sync_routers(self.adminContext, host=L3_HOSTA)
+            counts = self._count_routers()
+        self.assertEqual(2, len(ret_a))
+        self.assertEqual({L3_HOSTA: 2, L3_HOSTB: 2}, counts)
+        hostb_router_ids = (set(r['router']['id'] for r in routers) -
+                            set(r['id'] for r in ret_a))
+        self.l3_notifier.router_added_to_agent.assert_called_once_with(
+            mock.ANY, mock.ANY, L3_HOSTB)
+        notified_ids = self.l3_notifier.router_added_to_agent.call_args[0][1]
+        self.assertEqual(hostb_router_ids, set(notified_ids))
+
+    def test_rebalance_routers(self):
+        with contextlib.nested(self.router(), self.router(),
+                               self.router(), self.router()) as routers:
+            self._register_agent_states()
+            hosta_id = self._get_agent_id(constants.AGENT_TYPE_L3,
+                                          L3_HOSTA)
+            hostb_id = self._get_agent_id(constants.AGENT_TYPE_L3,
+                                          L3_HOSTB)
+            for router in routers:
+                self._add_router_to_l3_agent(hosta_id, router['router']['id'])
+            self.l3_notifier.reset_mock()
+            moved = self._rebalance_l3_agents(max_routers=1)['moved_routers']
+            self.assertEqual(1, len(moved))
+            self.assertEqual(hosta_id, moved[0]['source_agent_id'])
+            self.assertEqual(hostb_id, moved[0]['destination_agent_id'])
+            self.l3_notifier.router_removed_from_agent.assert_called_once_with(
+                mock.ANY, moved[0]['router_id'], L3_HOSTA)
+            self.l3_notifier.router_added_to_agent.assert_called_once_with(
+                mock.ANY, [moved[0]['router_id']], L3_HOSTB)
+            self.assertEqual(1, len(self._rebalance_l3_agents()[
+                'moved_routers']))
+            self.assertEqual({L3_HOSTA: 2, L3_HOSTB: 2},
+                             self._count_routers())
+            self.assertEqual([], self._rebalance_l3_agents()[
+                'moved_routers'])
+
+    def test_rebalance_routers_invalid_max_routers(self):
+        self._rebalance_l3_agents(max_routers=0,
+                                  expected_code=exc.HTTPBadRequest.code)
+
+
+class OvsLeastNetworksSchedulerTestCase(
+    test_l3_plugin.L3NatTestCaseMixin,
+    test_agent_ext_plugin.AgentDBTestMixIn,
+    AgentSchedulerTestMixIn,
+    test_plugin.NeutronDbPluginV2TestCase):
+    fmt = 'json'
+    plugin_str = ('neutron.plugins.openvswitch.'
+                  'ovs_neutron_plugin.OVSNeutronPluginV2')
+
+    def setUp(self):
+        cfg.CONF.set_override('network_scheduler_driver',
+                              'neutron.scheduler.dhcp_agent_scheduler.'
+                              'LeastNetworksScheduler')
+        cfg.CONF.set_override('allow_overlapping_ips', True)
+        self.saved_attr_map = {}
+        for resource, attrs in attributes.RESOURCE_ATTRIBUTE_MAP.iteritems():
+            self.saved_attr_map[resource] = attrs.copy()
+        super(OvsLeastNetworksSchedulerTestCase, self).setUp(self.plugin_str)
+        ext_mgr = extensions.PluginAwareExtensionManager.get_instance()
+        self.ext_api = test_extensions.setup_extensions_middleware(ext_mgr)
+        self.adminContext = context.get_admin_context()
+        attributes.RESOURCE_ATTRIBUTE_MAP.update(
+            agent.RESOURCE_ATTRIBUTE_MAP)
+        self.addCleanup(self.restore_attribute_map)
+        self.plugin = manager.NeutronManager.get_plugin()
+        self.dhcp_notifier = mock.Mock()
+        notifiers_p = mock.patch.dict(self.plugin.agent_notifiers,
+                                      {constants.AGENT_TYPE_DHCP:
+                                       self.dhcp_notifier})
+        notifiers_p.start()
+        self.addCleanup(notifiers_p.stop)
+
+    def restore_attribute_map(self):
+        attributes.RESOURCE_ATTRIBUTE_MAP = self.saved_attr_map
+
+    def _get_hosting_hosts(self, network_id):
+        return sorted(dhcp_agent['host'] for dhcp_agent in
+                      self._list_dhcp_agents_hosting_network(
+                          network_id)['agents'])
+
+    def test_schedule_network_to_least_networks(self):
+        with contextlib.nested(self.network(), self.network(),
+                               self.network()) as (net1, net2, net3):
+            self._register_agent_states()
+            hosta_id = self._get_agent_id(constants.AGENT_TYPE_DHCP,
+                                          DHCP_HOSTA)
+            self._add_network_to_dhcp_agent(hosta_id,
+                                            net1['network']['id'])
+            chosen_agents = self.plugin.schedule_network(
+                self.adminContext, net2['network'])
+            self.assertEqual([DHCP_HOSTC],
+                             [dhcp_agent.host for dhcp_agent in
+                              chosen_agents])
+            # Both agents now host one network
+            chosen_agents = self.plugin.schedule_network(
+                self.adminContext, net3['network'])
+        self.assertEqual(1, len(chosen_agents))
+
+    def test_schedule_network_to_least_ports(self):
+        with contextlib.nested(self.subnet(), self.network(),
+                               self.network()) as (subnet, net2, net3):
+            self._register_agent_states()
+            hosta_id = self._get_agent_id(constants.AGENT_TYPE_DHCP,
+                                          DHCP_HOSTA)
+            hostc_id = self._get_agent_id(constants.AGENT_TYPE_DHCP,
+                                          DHCP_HOSTC)
+            self._add_network_to_dhcp_agent(
+                hosta_id, subnet['subnet']['network_id'])
+            self._add_network_to_dhcp_agent(hostc_id,
+                                            net2['network']['id'])
+            with self.port(subnet=subnet):
+                loads = self.plugin.get_dhcp_agents_load(
+                    self.adminContext, self.plugin.get_agents_db(
+                        self.adminContext,
+                        filters={'id': [hosta_id, hostc_id]}))
+                chosen_agents = self.plugin.schedule_network(
+                    self.adminContext, net3['network'])
+        self.assertEqual({hosta_id: (1, 1), hostc_id: (1, 0)}, loads)
+        self.assertEqual([DHCP_HOSTC],
+                         [dhcp_agent.host for dhcp_agent in chosen_agents])
+
+    def test_schedule_network_to_several_agents(self):
+        cfg.CONF.set_override('dhcp_agents_per_network', 2)
+        with contextlib.nested(self.network(),
+                               self.network()) as (net1, net2):
+            self._register_agent_states()
+            self._register_one_dhcp_agent()
+            hosta_id = self._get_agent_id(constants.AGENT_TYPE_DHCP,
+                                          DHCP_HOSTA)
+            self._add_network_to_dhcp_agent(hosta_id,
+                                            net1['network']['id'])
+            self.plugin.schedule_network(self.adminContext, net2['network'])
+            hosts = self._get_hosting_hosts(net2['network']['id'])
+        self.assertEqual([test_agent_ext_plugin.DHCP_HOST1, DHCP_HOSTC],
+                         hosts)
+
+    def test_auto_schedule_spreads_networks(self):
+        with contextlib.nested(self.subnet(), self.subnet(),
+                               self.subnet(), self.subnet()) as subnets:
+            dhcp_rpc = dhcp_rpc_base.DhcpRpcCallbackMixin()
+            self._register_agent_states()
+            hosta_id = self._get_agent_id(constants.AGENT_TYPE_DHCP,
+                                          DHCP_HOSTA)
+            hostc_id = self._get_agent_id(constants.AGENT_TYPE_DHCP,
+                                          DHCP_HOSTC)
+            hosta_nets = dhcp_rpc.get_active_networks(self.adminContext,
+                                                      host=DHCP_HOSTA)
+            hostc_nets = self._list_networks_hosted_by_dhcp_agent(
+                hostc_id)['networks']
+            num_hosta_nets = len(self._list_networks_hosted_by_dhcp_agent(
+                hosta_id)['networks'])
+        self.assertEqual(2, len(hosta_nets))
+        self.assertEqual(2, num_hosta_nets)
+        self.assertEqual(2, len(hostc_nets))
+        self.assertEqual(
+            sorted(net['id'] for net in hostc_nets),
+            sorted(call[0][1] for call in
+                   self.dhcp_notifier.network_added_to_agent.call_args_list))
+        for call in self.dhcp_notifier.network_added_to_agent.call_args_list:
+            self.assertEqual(DHCP_HOSTC, call[0][2])
+        self.assertEqual(
+            set(subnet['subnet']['network_id'] for subnet in subnets),
+            set(hosta_nets) | set(net['id'] for net in hostc_nets))
+
+    def test_auto_schedule_to_several_agents(self):
+        cfg.CONF.set_override('dhcp_agents_per_network', 2)
+        with contextlib.nested(self.subnet(), self.subnet()) as subnets:
+            dhcp_rpc = dhcp_rpc_base.DhcpRpcCallbackMixin()
+            self._register_agent_states()
+            dhcp_rpc.get_active_networks(self.adminContext, host=DHCP_HOSTA)
+            # Syncing again does not add agents to the networks
+            dhcp_rpc.get_active_networks(self.adminContext, host=DHCP_HOSTC)
+            hosts = [self._get_hosting_hosts(subnet['subnet']['network_id'])
+                     for subnet in subnets]
+        self.assertEqual([[DHCP_HOSTA, DHCP_HOSTC]] * 2, hosts)
+        self.assertEqual(
+            2, self.dhcp_notifier.network_added_to_agent.call_count)
+
+    def test_auto_schedule_skips_hosted_networks(self):
+        with contextlib.nested(self.subnet(), self.subnet()) as subnets:
+            dhcp_rpc = dhcp_rpc_base.DhcpRpcCallbackMixin()
+            self._register_agent_states()
+            hostc_id = self._get_agent_id(constants.AGENT_TYPE_DHCP,
+                                          DHCP_HOSTC)
+            self._add_network_to_dhcp_agent(
+                hostc_id, subnets[0]['subnet']['network_id'])
+            self.dhcp_notifier.reset_mock()
+            hosta_nets = dhcp_rpc.get_active_networks(self.adminContext,
+                                                      host=DHCP_HOSTA)
+        self.assertEqual([subnets[1]['subnet']['network_id']], hosta_nets)
+        self.assertFalse(self.dhcp_notifier.network_added_to_agent.called)
+
 
 class OvsDhcpAgentNotifierTestCase(test_l3_plugin.L3NatTestCaseMixin,
                                    test_agent_ext_plugin.AgentDBTestMixIn,
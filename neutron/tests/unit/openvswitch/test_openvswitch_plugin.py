@@ -39,7 +39,8 @@ class TestOpenvswitchV2HTTPResponse(test_plugin.TestV2HTTPResponse,
     pass
 
 
-class TestOpenvswitchPortsV2(test_plugin.TestPortsV2,
+class TestOpenvswitchPortsV2(test_plugin.NativeBulkPortsTestMixin,
+                             test_plugin.TestPortsV2,
                              OpenvswitchPluginV2TestCase):
 
     def test_update_port_status_build(self):
@@ -183,36 +183,101 @@ class OVS_Lib_Test(base.BaseTestCase):
         self.br.delete_flows(dl_vlan=vid)
         self.mox.VerifyAll()
 
+    def test_deferred_flows(self):
+        utils.execute(["ovs-ofctl", "add-flows", self.BR_NAME, "-"],
+                      root_helper=self.root_helper,
+                      process_input="hard_timeout=0,idle_timeout=0,"
+                      "priority=1,actions=normal\n"
+                      "hard_timeout=0,idle_timeout=0,"
+                      "priority=2,in_port=5,actions=drop\n")
+        utils.execute(["ovs-ofctl", "del-flows", self.BR_NAME, "-"],
+                      root_helper=self.root_helper,
+                      process_input="in_port=5\ndl_vlan=39\n")
+        utils.execute(["ovs-ofctl", "add-flows", self.BR_NAME, "-"],
+                      root_helper=self.root_helper,
+                      process_input="hard_timeout=0,idle_timeout=0,"
+                      "priority=0,in_port=6,actions=drop\n")
+        self.mox.ReplayAll()
+
+        with self.br.defer_apply():
+            self.br.add_flow(priority=1, actions="normal")
+            self.br.add_flow(priority=2, in_port=5, actions="drop")
+            self.br.delete_flows(in_port=5)
+            self.br.delete_flows(dl_vlan=39)
+            self.br.add_flow(in_port=6, actions="drop")
+        self.assertEqual(self.br.deferred_flows, [])
+        self.mox.VerifyAll()
+
+    def test_deferred_delete_all_flows(self):
+        utils.execute(["ovs-ofctl", "add-flows", self.BR_NAME, "-"],
+                      root_helper=self.root_helper,
+                      process_input="hard_timeout=0,idle_timeout=0,"
+                      "priority=1,actions=normal\n")
+        utils.execute(["ovs-ofctl", "del-flows", self.BR_NAME, ""],
+                      root_helper=self.root_helper)
+        self.mox.ReplayAll()
+
+        self.br.defer_apply_on()
+        self.br.add_flow(priority=1, actions="normal")
+        self.br.delete_flows()
+        self.br.defer_apply_off()
+        self.mox.VerifyAll()
+
     def test_add_tunnel_port(self):
         pname = "tap99"
         local_ip = "1.1.1.1"
         remote_ip = "9.9.9.9"
         ofport = "6"
 
-        utils.execute(["ovs-vsctl", self.TO, "add-port",
-                       self.BR_NAME, pname], root_helper=self.root_helper)
-        utils.execute(["ovs-vsctl", self.TO, "set", "Interface",
-                       pname, "type=gre"], root_helper=self.root_helper)
-        utils.execute(["ovs-vsctl", self.TO, "set", "Interface",
-                       pname, "options:remote_ip=" + remote_ip],
-                      root_helper=self.root_helper)
-        utils.execute(["ovs-vsctl", self.TO, "set", "Interface",
-                       pname, "options:local_ip=" + local_ip],
-                      root_helper=self.root_helper)
-        utils.execute(["ovs-vsctl", self.TO, "set", "Interface",
-                       pname, "options:in_key=flow"],
-                      root_helper=self.root_helper)
-        utils.execute(["ovs-vsctl", self.TO, "set", "Interface",
-                       pname, "options:out_key=flow"],
-                      root_helper=self.root_helper)
-        utils.execute(["ovs-vsctl", self.TO, "get",
-                       "Interface", pname, "ofport"],
-                      root_helper=self.root_helper).AndReturn(ofport)
+        utils.execute(["ovs-vsctl", self.TO, "--oneline",
+                       "--", "--may-exist", "add-port", self.BR_NAME, pname,
+                       "--", "set", "Interface", pname, "type=gre",
+                       "options:remote_ip=" + remote_ip,
+                       "options:local_ip=" + local_ip,
+                       "options:in_key=flow",
+                       "options:out_key=flow"],
+                      root_helper=self.root_helper).AndReturn("\n\n")
+        utils.execute(["ovs-vsctl", self.TO, "--oneline",
+                       "--", "get", "Interface", pname, "ofport"],
+                      root_helper=self.root_helper).AndReturn(ofport + "\n")
         self.mox.ReplayAll()
 
         self.assertEqual(
             self.br.add_tunnel_port(pname, remote_ip, local_ip),
-            ofport)
+            int(ofport))
+        self.mox.VerifyAll()
+
+    def test_add_tunnel_ports_vxlan(self):
+        local_ip = "1.1.1.1"
+        tunnels = {"vxlan-1": "9.9.9.9", "vxlan-2": "9.9.9.8"}
+
+        utils.execute(["ovs-vsctl", self.TO, "--oneline",
+                       "--", "--may-exist", "add-port", self.BR_NAME,
+                       "vxlan-1",
+                       "--", "set", "Interface", "vxlan-1", "type=vxlan",
+                       "options:dst_port=9999",
+                       "options:remote_ip=9.9.9.9",
+                       "options:local_ip=" + local_ip,
+                       "options:in_key=flow",
+                       "options:out_key=flow",
+                       "--", "--may-exist", "add-port", self.BR_NAME,
+                       "vxlan-2",
+                       "--", "set", "Interface", "vxlan-2", "type=vxlan",
+                       "options:dst_port=9999",
+                       "options:remote_ip=9.9.9.8",
+                       "options:local_ip=" + local_ip,
+                       "options:in_key=flow",
+                       "options:out_key=flow"],
+                      root_helper=self.root_helper).AndReturn("\n" * 4)
+        utils.execute(["ovs-vsctl", self.TO, "--oneline",
+                       "--", "get", "Interface", "vxlan-1", "ofport",
+                       "--", "get", "Interface", "vxlan-2", "ofport"],
+                      root_helper=self.root_helper).AndReturn("7\n[]\n")
+        self.mox.ReplayAll()
+
+        self.assertEqual(self.br.add_tunnel_ports(tunnels, local_ip,
+                                                  "vxlan", 9999),
+                         {"vxlan-1": 7, "vxlan-2": -1})
         self.mox.VerifyAll()
 
     def test_add_patch_port(self):
@@ -220,19 +285,59 @@ class OVS_Lib_Test(base.BaseTestCase):
         peer = "bar10"
         ofport = "6"
 
-        utils.execute(["ovs-vsctl", self.TO, "add-port",
-                       self.BR_NAME, pname], root_helper=self.root_helper)
-        utils.execute(["ovs-vsctl", self.TO, "set", "Interface",
-                       pname, "type=patch"], root_helper=self.root_helper)
-        utils.execute(["ovs-vsctl", self.TO, "set",
-                       "Interface", pname, "options:peer=" + peer],
-                      root_helper=self.root_helper)
-        utils.execute(["ovs-vsctl", self.TO, "get",
-                       "Interface", pname, "ofport"],
-                      root_helper=self.root_helper).AndReturn(ofport)
+        utils.execute(["ovs-vsctl", self.TO, "--oneline",
+                       "--", "--may-exist", "add-port", self.BR_NAME, pname,
+                       "--", "set", "Interface", pname, "type=patch",
+                       "options:peer=" + peer],
+                      root_helper=self.root_helper).AndReturn("\n\n")
+        utils.execute(["ovs-vsctl", self.TO, "--oneline",
+                       "--", "get", "Interface", pname, "ofport"],
+                      root_helper=self.root_helper).AndReturn(ofport + "\n")
+        self.mox.ReplayAll()
+
+        self.assertEqual(self.br.add_patch_port(pname, peer), int(ofport))
+        self.mox.VerifyAll()
+
+    def test_transaction_results(self):
+        utils.execute(["ovs-vsctl", self.TO, "--oneline",
+                       "--", "set", "Port", "tap1", "tag=5",
+                       "--", "get", "Interface", "tap1", "external_ids",
+                       "--", "get", "Interface", "tap1", "name",
+                       "--", "get", "Interface", "tap1", "ofport"],
+                      root_helper=self.root_helper).AndReturn(
+                          '\n{attached-mac="ca:fe:de:ad:be:ef", '
+                          'iface-id="abc"}\nfoo\\nbar\\\\n\n3\n')
+        self.mox.ReplayAll()
+
+        txn = self.br.transaction()
+        txn.set_db_attribute("Port", "tap1", "tag", 5)
+        external_ids = txn.db_get_map("Interface", "tap1", "external_ids")
+        name = txn.db_get_val("Interface", "tap1", "name")
+        ofport = txn.get_port_ofport("tap1")
+        self.assertTrue(txn.commit())
+        self.assertEqual(external_ids.result,
+                         {"attached-mac": "ca:fe:de:ad:be:ef",
+                          "iface-id": "abc"})
+        self.assertEqual(name.result, "foo\nbar\\n")
+        self.assertEqual(ofport.result, 3)
+        # Committing again does not run the same commands twice
+        self.assertTrue(txn.commit())
+        self.mox.VerifyAll()
+
+    def test_transaction_failure_keeps_defaults(self):
+        utils.execute(["ovs-vsctl", self.TO, "--oneline",
+                       "--", "get", "Interface", "tap1", "external_ids",
+                       "--", "get", "Interface", "tap1", "ofport"],
+                      root_helper=self.root_helper).AndRaise(
+                          RuntimeError())
         self.mox.ReplayAll()
 
-        self.assertEqual(self.br.add_patch_port(pname, peer), ofport)
+        txn = self.br.transaction()
+        external_ids = txn.db_get_map("Interface", "tap1", "external_ids")
+        ofport = txn.get_port_ofport("tap1")
+        self.assertFalse(txn.commit())
+        self.assertEqual(external_ids.result, {})
+        self.assertEqual(ofport.result, -1)
         self.mox.VerifyAll()
 
     def _test_get_vif_ports(self, is_xen=False):
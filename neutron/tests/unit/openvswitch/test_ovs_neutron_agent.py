@@ -38,6 +38,13 @@ class CreateAgentConfigMap(base.BaseTestCase):
     def test_create_agent_config_map_succeeds(self):
         self.assertTrue(ovs_neutron_agent.create_agent_config_map(cfg.CONF))
 
+    def test_create_agent_config_map_minimize_polling(self):
+        self.addCleanup(cfg.CONF.reset)
+        cfg.CONF.set_override('minimize_polling', True, 'AGENT')
+        cfgmap = ovs_neutron_agent.create_agent_config_map(cfg.CONF)
+        self.assertTrue(cfgmap['minimize_polling'])
+        self.assertEqual(cfgmap['ovsdb_monitor_respawn_interval'], 30)
+
     def test_create_agent_config_map_fails_for_invalid_tunnel_config(self):
         self.addCleanup(cfg.CONF.reset)
         # An ip address is required for tunneling but there is no default,
@@ -148,11 +155,49 @@ class TestOvsNeutronAgent(base.BaseTestCase):
         actual = self.mock_update_ports(vif_port_set, registered_ports)
         self.assertEqual(expected, actual)
 
+    def test_update_ports_from_changes(self):
+        self.agent.int_br.br_name = 'br-int'
+        changes = {'port3': 'tap3', 'port4': 'tap4', 'port1': 'tap1',
+                   'port2': None, 'port5': None}
+        bridges = {'tap3': 'br-int', 'tap4': 'br-ex'}
+        with mock.patch.object(ovs_lib, 'get_bridge_for_iface',
+                               side_effect=lambda root_helper, name:
+                               bridges[name]):
+            actual = self.agent.update_ports_from_changes(set(['port1',
+                                                               'port2']),
+                                                          changes)
+        expected = dict(current=set(['port1', 'port3']),
+                        added=set(['port3']), removed=set(['port2']))
+        self.assertEqual(expected, actual)
+
+    def test_update_ports_from_changes_returns_none_for_no_deltas(self):
+        self.assertIsNone(self.agent.update_ports_from_changes(
+            set(['port1']), {'port1': 'tap1', 'port2': None}))
+
     def test_treat_devices_added_returns_true_for_missing_device(self):
-        with mock.patch.object(self.agent.plugin_rpc, 'get_device_details',
+        with mock.patch.object(self.agent.plugin_rpc,
+                               'get_devices_details_list',
                                side_effect=Exception()):
             self.assertTrue(self.agent.treat_devices_added([{}]))
 
+    def test_treat_devices_added_requests_details_in_chunks(self):
+        self.agent.device_details_chunk_size = 2
+        devices = ['tap1', 'tap2', 'tap3']
+        with contextlib.nested(
+            mock.patch.object(self.agent.plugin_rpc,
+                              'get_devices_details_list',
+                              side_effect=lambda ctx, devs, agent_id:
+                              [{'device': dev} for dev in devs]),
+            mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
+                              return_value=None)
+        ) as (get_dev_fn, get_vif_func):
+            self.assertFalse(self.agent.treat_devices_added(devices))
+        get_dev_fn.assert_has_calls(
+            [mock.call(self.agent.context, ['tap1', 'tap2'],
+                       self.agent.agent_id),
+             mock.call(self.agent.context, ['tap3'], self.agent.agent_id)])
+        get_vif_func.assert_has_calls([mock.call(dev) for dev in devices])
+
     def _mock_treat_devices_added(self, details, port, func_name):
         """Mock treat devices added.
 
@@ -162,8 +207,9 @@ class TestOvsNeutronAgent(base.BaseTestCase):
         :returns: whether the named function was called
         """
         with contextlib.nested(
-            mock.patch.object(self.agent.plugin_rpc, 'get_device_details',
-                              return_value=details),
+            mock.patch.object(self.agent.plugin_rpc,
+                              'get_devices_details_list',
+                              return_value=[details]),
             mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
                               return_value=port),
             mock.patch.object(self.agent, func_name)
@@ -221,6 +267,20 @@ class TestOvsNeutronAgent(base.BaseTestCase):
                 self.assertTrue(device_added.called)
                 self.assertTrue(device_removed.called)
 
+    def test_process_network_ports_defers_flows(self):
+        reply = {'current': set(['tap0']), 'added': set(['tap0'])}
+
+        def treat_devices_added(devices):
+            self.assertTrue(self.agent.int_br.defer_apply_on.called)
+            self.assertFalse(self.agent.int_br.defer_apply_off.called)
+            raise Exception()
+
+        with mock.patch.object(self.agent, 'treat_devices_added',
+                               side_effect=treat_devices_added):
+            self.assertRaises(Exception, self.agent.process_network_ports,
+                              reply)
+        self.assertTrue(self.agent.int_br.defer_apply_off.called)
+
     def test_report_state(self):
         with contextlib.nested(
             mock.patch.object(self.agent.int_br, "get_vif_port_set"),
@@ -308,27 +368,45 @@ class TestOvsNeutronAgent(base.BaseTestCase):
             mock.patch.object(sys, "exit"),
             mock.patch.object(ovs_lib.OVSBridge, "remove_all_flows"),
             mock.patch.object(ovs_lib.OVSBridge, "add_flow"),
-            mock.patch.object(ovs_lib.OVSBridge, "add_port"),
-            mock.patch.object(ovs_lib.OVSBridge, "delete_port"),
-            mock.patch.object(self.agent.int_br, "add_port"),
-            mock.patch.object(self.agent.int_br, "delete_port"),
+            mock.patch.object(ovs_lib, "OVSTransaction"),
             mock.patch.object(ip_lib.IPWrapper, "add_veth"),
             mock.patch.object(ip_lib.IpLinkCommand, "delete"),
             mock.patch.object(ip_lib.IpLinkCommand, "set_up"),
             mock.patch.object(ip_lib.IpLinkCommand, "set_mtu")
         ) as (devex_fn, sysexit_fn, remflows_fn, ovs_addfl_fn,
-              ovs_addport_fn, ovs_delport_fn, br_addport_fn,
-              br_delport_fn, addveth_fn, linkdel_fn, linkset_fn, linkmtu_fn):
+              txn_cls, addveth_fn, linkdel_fn, linkset_fn, linkmtu_fn):
             devex_fn.return_value = True
             addveth_fn.return_value = (ip_lib.IPDevice("int-br-eth1"),
                                        ip_lib.IPDevice("phy-br-eth1"))
-            ovs_addport_fn.return_value = "int_ofport"
-            br_addport_fn.return_value = "phys_veth"
+            self.agent.int_br.br_name = "br-int"
+            txn = txn_cls.return_value
+            ofports = {"int-br-eth": ovs_lib.OVSCommand([], default=5),
+                       "phy-br-eth": ovs_lib.OVSCommand([], default=6)}
+            txn.get_port_ofport.side_effect = ofports.get
             self.agent.setup_physical_bridges({"physnet1": "br-eth"})
-            self.assertEqual(self.agent.int_ofports["physnet1"],
-                             "phys_veth")
-            self.assertEqual(self.agent.phys_ofports["physnet1"],
-                             "int_ofport")
+            self.assertEqual(self.agent.int_ofports["physnet1"], 5)
+            self.assertEqual(self.agent.phys_ofports["physnet1"], 6)
+            # Both veth ends are deleted, added and read in three calls
+            self.assertEqual(txn.commit.call_count, 3)
+            txn.delete_port.assert_has_calls(
+                [mock.call("br-int", "int-br-eth"),
+                 mock.call("br-eth", "phy-br-eth")])
+            txn.add_port.assert_has_calls(
+                [mock.call("br-int", "int-br-eth"),
+                 mock.call("br-eth", "phy-br-eth")])
+
+    def test_tunnel_sync_adds_ports_in_one_batch(self):
+        self.agent.local_ip = '10.0.0.1'
+        self.agent.tunnel_types = ['gre']
+        tunnels = [{'id': 1, 'ip_address': '10.0.0.1'},
+                   {'id': 2, 'ip_address': '10.0.0.2'},
+                   {'id': 3, 'ip_address': '10.0.0.3'}]
+        with mock.patch.object(self.agent.plugin_rpc, 'tunnel_sync',
+                               return_value={'tunnels': tunnels}):
+            self.assertFalse(self.agent.tunnel_sync())
+        self.agent.tun_br.add_tunnel_ports.assert_called_once_with(
+            {'gre-2': '10.0.0.2', 'gre-3': '10.0.0.3'}, '10.0.0.1', 'gre',
+            self.agent.vxlan_udp_port)
 
     def test_port_unbound(self):
         with contextlib.nested(
@@ -81,7 +81,9 @@ class TunnelTest(base.BaseTestCase):
         self.intb.link = self.mox.CreateMock(ip_lib.IpLinkCommand)
 
         self.mox.StubOutClassWithMocks(ovs_lib, 'OVSBridge')
+        self.mox.StubOutClassWithMocks(ovs_lib, 'OVSTransaction')
         self.mock_int_bridge = ovs_lib.OVSBridge(self.INT_BRIDGE, 'sudo')
+        self.mock_int_bridge.br_name = self.INT_BRIDGE
         self.mock_int_bridge.delete_port('patch-tun')
         self.mock_int_bridge.remove_all_flows()
         self.mock_int_bridge.add_flow(priority=1, actions='normal')
@@ -91,10 +93,19 @@ class TunnelTest(base.BaseTestCase):
         self.mock_map_tun_bridge.br_name = self.MAP_TUN_BRIDGE
         self.mock_map_tun_bridge.remove_all_flows()
         self.mock_map_tun_bridge.add_flow(priority=1, actions='normal')
-        self.mock_int_bridge.delete_port('int-tunnel_bridge_mapping')
-        self.mock_map_tun_bridge.delete_port('phy-tunnel_bridge_mapping')
-        self.mock_int_bridge.add_port(self.inta)
-        self.mock_map_tun_bridge.add_port(self.intb)
+        phys_txn = ovs_lib.OVSTransaction('sudo')
+        phys_txn.delete_port(self.INT_BRIDGE, 'int-tunnel_bridge_mapping')
+        phys_txn.delete_port(self.MAP_TUN_BRIDGE,
+                             'phy-tunnel_bridge_mapping')
+        phys_txn.commit()
+        phys_txn.add_port(self.INT_BRIDGE, 'int-tunnel_bridge_mapping')
+        phys_txn.add_port(self.MAP_TUN_BRIDGE, 'phy-tunnel_bridge_mapping')
+        phys_txn.commit()
+        phys_txn.get_port_ofport('int-tunnel_bridge_mapping').AndReturn(
+            ovs_lib.OVSCommand([]))
+        phys_txn.get_port_ofport('phy-tunnel_bridge_mapping').AndReturn(
+            ovs_lib.OVSCommand([]))
+        phys_txn.commit()
         self.inta.link.set_up()
         self.intb.link.set_up()
 
@@ -103,11 +114,19 @@ class TunnelTest(base.BaseTestCase):
             priority=2, in_port=None, actions='drop')
 
         self.mock_tun_bridge = ovs_lib.OVSBridge(self.TUN_BRIDGE, 'sudo')
+        self.mock_tun_bridge.br_name = self.TUN_BRIDGE
         self.mock_tun_bridge.reset_bridge()
-        self.mock_int_bridge.add_patch_port(
-            'patch-tun', 'patch-int').AndReturn(self.TUN_OFPORT)
-        self.mock_tun_bridge.add_patch_port(
-            'patch-int', 'patch-tun').AndReturn(self.INT_OFPORT)
+        tun_txn = ovs_lib.OVSTransaction('sudo')
+        tun_txn.add_port(self.INT_BRIDGE, 'patch-tun',
+                         [('type', 'patch'), ('options:peer', 'patch-int')])
+        tun_txn.add_port(self.TUN_BRIDGE, 'patch-int',
+                         [('type', 'patch'), ('options:peer', 'patch-tun')])
+        tun_txn.commit()
+        tun_txn.get_port_ofport('patch-tun').AndReturn(
+            ovs_lib.OVSCommand([], default=self.TUN_OFPORT))
+        tun_txn.get_port_ofport('patch-int').AndReturn(
+            ovs_lib.OVSCommand([], default=self.INT_OFPORT))
+        tun_txn.commit()
         self.mock_tun_bridge.remove_all_flows()
         self.mock_tun_bridge.add_flow(priority=1, actions='drop')
 
@@ -18,6 +18,7 @@
 import copy
 import time
 
+import mock
 from oslo.config import cfg
 from webob import exc
 
@@ -29,6 +30,8 @@ from neutron import context
 from neutron.db import agents_db
 from neutron.db import db_base_plugin_v2
 from neutron.extensions import agent
+from neutron import manager
+from neutron.openstack.common import jsonutils
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import timeutils
 from neutron.openstack.common import uuidutils
@@ -242,5 +245,123 @@ class AgentDBTestCase(AgentDBTestMixIn,
         self.assertFalse(agents['agents'][0]['alive'])
 
 
+class AgentDBHeartbeatBatchTestCase(AgentDBTestCase):
+
+    def setUp(self):
+        super(AgentDBHeartbeatBatchTestCase, self).setUp()
+        cfg.CONF.set_override('agent_heartbeat_batch_interval', 2)
+        self.heartbeats = agents_db.AgentHeartbeats()
+        heartbeats_p = mock.patch.object(agents_db, 'heartbeats',
+                                         self.heartbeats)
+        heartbeats_p.start()
+        self.addCleanup(heartbeats_p.stop)
+        looping_call_p = mock.patch.object(agents_db.loopingcall,
+                                           'FixedIntervalLoopingCall')
+        self.looping_call = looping_call_p.start()
+        self.addCleanup(looping_call_p.stop)
+        self.addCleanup(timeutils.clear_time_override)
+        timeutils.set_time_override(timeutils.utcnow())
+        self.plugin = manager.NeutronManager.get_plugin()
+
+    def _get_agent_db(self, host):
+        agents = self.plugin.get_agents_db(
+            context.get_admin_context(),
+            filters={'agent_type': [constants.AGENT_TYPE_L3],
+                     'host': [host]})
+        return agents[0]
+
+    def _get_agent(self, host):
+        agents = self._list_agents(
+            query_string='binary=neutron-l3-agent&host=' + host)
+        return agents['agents'][0]
+
+    def test_dead_agent(self):
+        cfg.CONF.set_override('agent_down_time', 1)
+        self._register_agent_states()
+        timeutils.advance_time_seconds(2)
+        self.assertFalse(self._get_agent(L3_HOSTB)['alive'])
+
+    def test_unchanged_report_kept_in_memory(self):
+        cfg.CONF.set_override('agent_down_time', 1)
+        agent_states = self._register_agent_states()
+        heartbeat = self._get_agent_db(L3_HOSTA).heartbeat_timestamp
+        timeutils.advance_time_seconds(2)
+        self.plugin.create_or_update_agent(self.adminContext,
+                                           agent_states[0])
+        self.assertEqual(heartbeat,
+                         self._get_agent_db(L3_HOSTA).heartbeat_timestamp)
+        self.assertTrue(self._get_agent(L3_HOSTA)['alive'])
+        self.assertFalse(self._get_agent(L3_HOSTB)['alive'])
+        self.looping_call.assert_called_once_with(self.heartbeats.flush)
+        self.looping_call.return_value.start.assert_called_once_with(2)
+
+    def test_flush_writes_heartbeats(self):
+        agent_states = self._register_agent_states()
+        timeutils.advance_time_seconds(2)
+        for agent_state in agent_states:
+            self.plugin.create_or_update_agent(self.adminContext,
+                                               agent_state)
+        self.heartbeats.flush()
+        self.assertEqual(timeutils.utcnow(),
+                         self._get_agent_db(L3_HOSTA).heartbeat_timestamp)
+        self.assertEqual(timeutils.utcnow(),
+                         self._get_agent_db(L3_HOSTB).heartbeat_timestamp)
+
+    def test_changed_configurations_written(self):
+        agent_states = self._register_agent_states()
+        timeutils.advance_time_seconds(2)
+        agent_state = copy.deepcopy(agent_states[0])
+        agent_state['configurations']['routers'] = 1
+        self.plugin.create_or_update_agent(self.adminContext, agent_state)
+        agent_db = self._get_agent_db(L3_HOSTA)
+        self.assertEqual(timeutils.utcnow(), agent_db.heartbeat_timestamp)
+        self.assertEqual(
+            1, self.plugin.get_configuration_dict(agent_db)['routers'])
+        self.assertFalse(self.looping_call.called)
+
+    def test_start_flag_written(self):
+        agent_states = self._register_agent_states()
+        timeutils.advance_time_seconds(2)
+        agent_state = dict(agent_states[0], start_flag=True)
+        self.plugin.create_or_update_agent(self.adminContext, agent_state)
+        self.assertEqual(timeutils.utcnow(),
+                         self._get_agent_db(L3_HOSTA).started_at)
+
+    def test_deleted_agent_forgotten(self):
+        agent_states = self._register_agent_states()
+        self._delete('agents', self._get_agent(L3_HOSTA)['id'])
+        self.plugin.create_or_update_agent(self.adminContext,
+                                           agent_states[0])
+        self.assertEqual(L3_HOSTA, self._get_agent(L3_HOSTA)['host'])
+
+    def test_agent_deleted_by_other_server_forgotten_on_flush(self):
+        agent_states = self._register_agent_states()
+        self.heartbeats.flush()
+        query = self.adminContext.session.query(agents_db.Agent)
+        query.filter_by(id=self._get_agent_db(L3_HOSTA).id).delete()
+        timeutils.advance_time_seconds(2)
+        self.plugin.create_or_update_agent(self.adminContext,
+                                           agent_states[0])
+        self.heartbeats.flush()
+        self.plugin.create_or_update_agent(self.adminContext,
+                                           agent_states[0])
+        self.assertEqual(L3_HOSTA, self._get_agent(L3_HOSTA)['host'])
+
+    def test_agents_reloaded_after_agent_down_time(self):
+        agent_states = self._register_agent_states()
+        self.heartbeats.flush()
+        query = self.adminContext.session.query(agents_db.Agent)
+        query.filter_by(id=self._get_agent_db(L3_HOSTA).id).update(
+            {'configurations': jsonutils.dumps({'routers': 1})})
+        timeutils.advance_time_seconds(cfg.CONF.agent_down_time + 1)
+        self.heartbeats.flush()
+        self.plugin.create_or_update_agent(self.adminContext,
+                                           agent_states[0])
+        agent_db = self._get_agent_db(L3_HOSTA)
+        self.assertEqual(timeutils.utcnow(), agent_db.heartbeat_timestamp)
+        self.assertNotIn(
+            'routers', self.plugin.get_configuration_dict(agent_db))
+
+
 class AgentDBTestCaseXML(AgentDBTestCase):
     fmt = 'xml'
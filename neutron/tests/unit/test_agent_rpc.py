@@ -19,6 +19,7 @@ import mock
 
 from neutron.agent import rpc
 from neutron.openstack.common import context
+from neutron.openstack.common.rpc import common as rpc_common
 from neutron.tests import base
 
 
@@ -42,6 +43,37 @@ class AgentRPCPluginApi(base.BaseTestCase):
     def test_update_device_down(self):
         self._test_rpc_call('update_device_down')
 
+    def test_get_devices_details_list(self):
+        self._test_rpc_call('get_devices_details_list')
+
+    def test_get_devices_details_list_unsupported(self):
+        agent = rpc.PluginApi('fake_topic')
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        error = rpc_common.RemoteError(exc_type='UnsupportedRpcVersion')
+        with mock.patch('neutron.openstack.common.rpc.call',
+                        side_effect=[error, 'foo', 'bar', 'baz']) as rpc_call:
+            self.assertEqual(agent.get_devices_details_list(
+                ctxt, ['dev1', 'dev2'], 'fake_agent_id'), ['foo', 'bar'])
+            # The bulk call is not retried once it failed
+            self.assertEqual(agent.get_devices_details_list(
+                ctxt, ['dev3'], 'fake_agent_id'), ['baz'])
+        methods = [call[0][2]['method'] for call in rpc_call.call_args_list]
+        self.assertEqual(methods, ['get_devices_details_list',
+                                   'get_device_details',
+                                   'get_device_details',
+                                   'get_device_details'])
+
+    def test_get_devices_details_list_remote_error(self):
+        agent = rpc.PluginApi('fake_topic')
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        error = rpc_common.RemoteError(exc_type='DBError')
+        with mock.patch('neutron.openstack.common.rpc.call',
+                        side_effect=error):
+            self.assertRaises(rpc_common.RemoteError,
+                              agent.get_devices_details_list,
+                              ctxt, ['dev1'], 'fake_agent_id')
+        self.assertTrue(agent.devices_details_list_supported)
+
     def test_tunnel_sync(self):
         self._test_rpc_call('tunnel_sync')
 
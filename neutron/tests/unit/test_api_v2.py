@@ -32,6 +32,7 @@ from neutron.api.v2 import router
 from neutron.common import config
 from neutron.common import exceptions as q_exc
 from neutron import context
+from neutron.db import db_base_plugin_v2
 from neutron.manager import NeutronManager
 from neutron.openstack.common.notifier import api as notifer_api
 from neutron.openstack.common import policy as common_policy
@@ -515,6 +516,43 @@ class APIv2TestCase(APIv2TestBase):
                                                     ('id', True)])
         instance.get_networks.assert_called_once_with(mock.ANY, **kwargs)
 
+    def test_db_plugin_paging_is_native(self):
+        controller = v2_base.Controller(_FakeDbPlugin(), 'routers', 'router',
+                                        {}, allow_pagination=True,
+                                        allow_sorting=True)
+        self.assertTrue(controller._native_pagination)
+        self.assertTrue(controller._native_sorting)
+        self.assertIsInstance(controller._get_pagination_helper(
+            webob.Request.blank('/')), api_common.PaginationNativeHelper)
+
+    def test_db_plugin_paging_without_args_is_emulated(self):
+        controller = v2_base.Controller(_FakeDbPlugin(), 'pools', 'pool',
+                                        {}, allow_pagination=True,
+                                        allow_sorting=True)
+        self.assertFalse(controller._native_pagination)
+        self.assertFalse(controller._native_sorting)
+
+    def test_non_db_plugin_paging_is_emulated(self):
+        controller = v2_base.Controller(_FakePlugin(), 'routers', 'router',
+                                        {}, allow_pagination=True,
+                                        allow_sorting=True)
+        self.assertFalse(controller._native_pagination)
+        self.assertFalse(controller._native_sorting)
+
+
+class _FakePlugin(object):
+
+    def get_routers(self, context, filters=None, fields=None, sorts=None,
+                    limit=None, marker=None, page_reverse=False):
+        return []
+
+    def get_pools(self, context, filters=None, fields=None):
+        return []
+
+
+class _FakeDbPlugin(_FakePlugin, db_base_plugin_v2.CommonDbMixin):
+    pass
+
 
 # Note: since all resources use the same controller and validation
 # logic, we actually get really good coverage from testing just networks.
@@ -564,6 +602,18 @@ class JSONV2TestCase(APIv2TestBase, testlib_api.WebTestCase):
         tenant_id = _uuid()
         self._test_list(tenant_id + "bad", tenant_id)
 
+    def test_list_view_failure_returns_fault(self):
+        instance = self.plugin.return_value
+        instance.get_networks.return_value = [{'id': _uuid(),
+                                               'tenant_id': _uuid()}]
+        with mock.patch.object(v2_base.Controller, '_view',
+                               side_effect=q_exc.PolicyNotAuthorized(
+                                   action='get_network')):
+            res = self.api.get(_get_path('networks', fmt=self.fmt),
+                               expect_errors=True)
+        self.assertEqual(exc.HTTPForbidden.code, res.status_int)
+        self.assertIn('NeutronError', self.deserialize(res))
+
     def test_list_pagination(self):
         id1 = str(_uuid())
         id2 = str(_uuid())
@@ -1343,6 +1393,20 @@ class QuotaTest(APIv2TestBase):
             _get_path('networks'), initial_input)
         self.assertEqual(res.status_int, exc.HTTPCreated.code)
 
+    def test_create_networks_bulk_counted_once_per_tenant(self):
+        cfg.CONF.set_override('quota_network', 3, group='QUOTAS')
+        tenant_id = _uuid()
+        initial_input = {'networks': [{'name': 'net%d' % i,
+                                       'tenant_id': tenant_id}
+                                      for i in range(3)]}
+        instance = self.plugin.return_value
+        instance.get_networks_count.return_value = 1
+        res = self.api.post_json(
+            _get_path('networks'), initial_input, expect_errors=True)
+        self.assertEqual(1, instance.get_networks_count.call_count)
+        self.assertTrue("Quota exceeded for resources" in
+                        res.json['NeutronError'])
+
 
 class ExtensionTestCase(base.BaseTestCase):
     def setUp(self):
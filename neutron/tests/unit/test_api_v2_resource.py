@@ -19,12 +19,15 @@
 #
 
 import mock
+import testtools
 from webob import exc
 import webtest
 
+from neutron.api.v2 import attributes
 from neutron.api.v2 import resource as wsgi_resource
 from neutron.common import exceptions as q_exc
 from neutron import context
+from neutron.db import query_stats
 from neutron.tests import base
 from neutron import wsgi
 
@@ -228,6 +231,159 @@ class ResourceTestCase(base.BaseTestCase):
         res = resource.get('', extra_environ=environ, expect_errors=True)
         self.assertEqual(res.status_int, 200)
 
+    def test_collection_with_json(self):
+        controller = mock.MagicMock()
+        controller.index = lambda request: {
+            'foos': [dict(id=i) for i in range(3)],
+            'foos_links': []}
+
+        resource = wsgi_resource.Resource(controller)
+
+        environ = {'wsgiorg.routing_args': (None, {'action': 'index',
+                                                   'format': 'json'})}
+        request = wsgi.Request.blank('', environ=environ)
+        status, headers, app_iter = request.call_application(resource)
+        self.assertEqual('200 OK', status)
+        self.assertNotIn('Content-Length', dict(headers))
+        self.assertEqual({'foos': [{'id': 0}, {'id': 1}, {'id': 2}],
+                          'foos_links': []},
+                         wsgi.JSONDeserializer().deserialize(
+                             ''.join(app_iter))['body'])
+
+    def test_collection_with_xml(self):
+        controller = mock.MagicMock()
+        controller.index = lambda request: {
+            'foos': [dict(id=i) for i in range(2)]}
+
+        resource = webtest.TestApp(wsgi_resource.Resource(controller))
+
+        environ = {'wsgiorg.routing_args': (None, {'action': 'index',
+                                                   'format': 'xml'})}
+        res = resource.get('', extra_environ=environ)
+        self.assertEqual(res.status_int, 200)
+        serializer = wsgi.XMLDictSerializer(attributes.get_attr_metadata())
+        self.assertEqual(serializer.serialize(
+            {'foos': [{'id': 0}, {'id': 1}]}), res.body)
+
+    def test_lazy_collection_with_json(self):
+        controller = mock.MagicMock()
+        controller.index = lambda request: {
+            'foos': (dict(id=i) for i in range(3))}
+
+        resource = webtest.TestApp(wsgi_resource.Resource(controller))
+
+        environ = {'wsgiorg.routing_args': (None, {'action': 'index',
+                                                   'format': 'json'})}
+        res = resource.get('', extra_environ=environ)
+        self.assertEqual(res.status_int, 200)
+        self.assertEqual({'foos': [{'id': 0}, {'id': 1}, {'id': 2}]},
+                         wsgi.JSONDeserializer().deserialize(
+                             res.body)['body'])
+
+    def test_lazy_collection_with_xml(self):
+        controller = mock.MagicMock()
+        controller.index = lambda request: {
+            'foos': (dict(id=i) for i in range(2))}
+
+        resource = webtest.TestApp(wsgi_resource.Resource(controller))
+
+        environ = {'wsgiorg.routing_args': (None, {'action': 'index',
+                                                   'format': 'xml'})}
+        res = resource.get('', extra_environ=environ)
+        self.assertEqual(res.status_int, 200)
+        serializer = wsgi.XMLDictSerializer()
+        self.assertEqual(serializer.serialize(
+            {'foos': [{'id': 0}, {'id': 1}]}), res.body)
+
+    def _lazy_failing_collection(self, count):
+        for i in range(count):
+            yield dict(id=i)
+        raise q_exc.PolicyNotAuthorized(action='get_foo')
+
+    def test_lazy_collection_failure_returns_fault(self):
+        controller = mock.MagicMock()
+        controller.index = lambda request: {
+            'foos': self._lazy_failing_collection(
+                wsgi_resource.STREAM_PREFETCH - 1)}
+
+        resource = webtest.TestApp(wsgi_resource.Resource(
+            controller, faults={q_exc.PolicyNotAuthorized:
+                                exc.HTTPForbidden}))
+
+        environ = {'wsgiorg.routing_args': (None, {'action': 'index',
+                                                   'format': 'json'})}
+        res = resource.get('', extra_environ=environ, expect_errors=True)
+        self.assertEqual(exc.HTTPForbidden.code, res.status_int)
+        self.assertIn('NeutronError',
+                      wsgi.JSONDeserializer().deserialize(res.body)['body'])
+
+    def test_lazy_collection_failure_while_sent_raised(self):
+        controller = mock.MagicMock()
+        controller.index = lambda request: {
+            'foos': self._lazy_failing_collection(
+                wsgi_resource.STREAM_PREFETCH)}
+
+        resource = wsgi_resource.Resource(controller)
+
+        environ = {'wsgiorg.routing_args': (None, {'action': 'index',
+                                                   'format': 'json'})}
+        request = wsgi.Request.blank('', environ=environ)
+        status, headers, app_iter = request.call_application(resource)
+        self.assertEqual('200 OK', status)
+        with testtools.ExpectedException(q_exc.PolicyNotAuthorized):
+            ''.join(app_iter)
+
+    def _get_with_query_stats(self, controller):
+        self.config(report_query_stats=True, group='database')
+        ctx = context.Context('user', 'tenant')
+        resource = webtest.TestApp(wsgi_resource.Resource(controller))
+        environ = {'wsgiorg.routing_args': (None, {'action': 'test'}),
+                   'neutron.context': ctx}
+        with mock.patch.object(wsgi_resource.notifier_api,
+                               'notify') as notify:
+            res = resource.get('', extra_environ=environ,
+                               expect_errors=True)
+        self.assertIsNone(query_stats.current())
+        self.assertEqual(1, notify.call_count)
+        return ctx, res, notify.call_args[0]
+
+    def test_query_stats_reported(self):
+        def test(request):
+            query_stats.current().add('SELECT 1 FOR UPDATE', 0.5, 1)
+            return {'foo': 'bar'}
+        controller = mock.MagicMock()
+        controller.test = test
+
+        ctx, res, args = self._get_with_query_stats(controller)
+        self.assertEqual(200, res.status_int)
+        self.assertEqual(ctx, args[0])
+        self.assertEqual('api.request.query_stats', args[2])
+        self.assertEqual({'statements': 1, 'db_time': 0.5,
+                          'lock_waits': 1, 'lock_time': 0.5, 'rows': 1,
+                          'method': 'GET', 'path': '', 'status': 200},
+                         args[4])
+
+    def test_query_stats_reported_on_error(self):
+        controller = mock.MagicMock()
+        controller.test.side_effect = exc.HTTPGatewayTimeout()
+
+        ctx, res, args = self._get_with_query_stats(controller)
+        self.assertEqual(exc.HTTPGatewayTimeout.code, res.status_int)
+        self.assertEqual(exc.HTTPGatewayTimeout.code, args[4]['status'])
+
+    def test_query_stats_not_reported(self):
+        controller = mock.MagicMock()
+        controller.test = lambda request: {'foo': 'bar'}
+
+        resource = webtest.TestApp(wsgi_resource.Resource(controller))
+
+        environ = {'wsgiorg.routing_args': (None, {'action': 'test'})}
+        with mock.patch.object(wsgi_resource.notifier_api,
+                               'notify') as notify:
+            res = resource.get('', extra_environ=environ)
+        self.assertEqual(200, res.status_int)
+        self.assertFalse(notify.called)
+
     def test_status_204(self):
         controller = mock.MagicMock()
         controller.test = lambda request: {'foo': 'bar'}
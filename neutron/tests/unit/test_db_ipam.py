@@ -0,0 +1,303 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import contextlib
+
+import mock
+from oslo.config import cfg
+
+from neutron.common import exceptions as q_exc
+from neutron import context
+from neutron.db import ipam
+from neutron.db import models_v2
+from neutron.tests import base
+from neutron.tests.unit import test_db_plugin
+
+BITMAP_BACKEND = 'neutron.db.ipam.BitmapIpamBackend'
+
+
+class TestCoalesceRanges(base.BaseTestCase):
+
+    def test_coalesce_adjacent_and_overlapping(self):
+        self.assertEqual(ipam.coalesce_ranges([(7, 7), (1, 3), (4, 4),
+                                               (9, 12), (10, 11), (8, 8)]),
+                         [(1, 4), (7, 12)])
+
+    def test_coalesce_disjoint(self):
+        self.assertEqual(ipam.coalesce_ranges([(5, 6), (1, 2)]),
+                         [(1, 2), (5, 6)])
+
+    def test_coalesce_empty(self):
+        self.assertEqual(ipam.coalesce_ranges([]), [])
+
+
+class TestSubnetBitmap(base.BaseTestCase):
+
+    def test_allocate_first_skips_addresses_outside_pools(self):
+        bitmap = ipam.SubnetBitmap.from_pools([('10.0.0.2', '10.0.0.3'),
+                                               ('10.0.0.6', '10.0.0.6')])
+        self.assertEqual(bitmap.allocate_first(), '10.0.0.2')
+        self.assertEqual(bitmap.allocate_first(), '10.0.0.3')
+        self.assertEqual(bitmap.allocate_first(), '10.0.0.6')
+        self.assertIsNone(bitmap.allocate_first())
+
+    def test_release_makes_lowest_address_available(self):
+        bitmap = ipam.SubnetBitmap.from_pools([('10.0.0.1', '10.0.0.254')])
+        for i in range(20):
+            bitmap.allocate_first()
+        self.assertTrue(bitmap.release('10.0.0.5'))
+        self.assertFalse(bitmap.release('10.0.0.5'))
+        self.assertEqual(bitmap.allocate_first(), '10.0.0.5')
+        self.assertEqual(bitmap.allocate_first(), '10.0.0.21')
+
+    def test_allocate_specific(self):
+        bitmap = ipam.SubnetBitmap.from_pools([('10.0.0.2', '10.0.0.10')])
+        self.assertTrue(bitmap.allocate('10.0.0.2'))
+        self.assertFalse(bitmap.allocate('10.0.0.2'))
+        self.assertFalse(bitmap.allocate('10.0.0.11'))
+        self.assertEqual(bitmap.allocate_first(), '10.0.0.3')
+
+    def test_release_outside_pools(self):
+        bitmap = ipam.SubnetBitmap.from_pools([('10.0.0.2', '10.0.0.3'),
+                                               ('10.0.0.6', '10.0.0.6')])
+        self.assertFalse(bitmap.release('10.0.0.4'))
+        self.assertFalse(bitmap.release('10.0.0.100'))
+
+    def test_ipv6(self):
+        bitmap = ipam.SubnetBitmap.from_pools([('fe80::2', 'fe80::ff')])
+        self.assertEqual(bitmap.allocate_first(), 'fe80::2')
+
+    def test_pools_not_byte_aligned(self):
+        bitmap = ipam.SubnetBitmap.from_pools([('10.0.0.3', '10.0.0.21'),
+                                               ('10.0.0.30', '10.0.0.30')])
+        free = []
+        while True:
+            ip_address = bitmap.allocate_first()
+            if not ip_address:
+                break
+            free.append(ip_address)
+        self.assertEqual(['10.0.0.%d' % i for i in range(3, 22)] +
+                         ['10.0.0.30'], free)
+
+    def test_copy_is_independent(self):
+        bitmap = ipam.SubnetBitmap.from_pools([('10.0.0.2', '10.0.0.10')])
+        bitmap_copy = bitmap.copy()
+        bitmap_copy.allocate_first()
+        self.assertEqual(bitmap.allocate_first(), '10.0.0.2')
+
+
+class TestPortsV2BitmapIpam(test_db_plugin.TestPortsV2):
+
+    def setUp(self):
+        super(TestPortsV2BitmapIpam, self).setUp()
+        cfg.CONF.set_override('ipam_backend', BITMAP_BACKEND)
+
+
+class TestBitmapIpamBackend(test_db_plugin.NeutronDbPluginV2TestCase):
+
+    def setUp(self):
+        super(TestBitmapIpamBackend, self).setUp()
+        cfg.CONF.set_override('ipam_backend', BITMAP_BACKEND)
+        self.backend = ipam.get_backend()
+        self.context = context.get_admin_context()
+
+    def test_get_backend(self):
+        self.assertIsInstance(self.backend, ipam.BitmapIpamBackend)
+        cfg.CONF.set_override('ipam_backend',
+                              'neutron.db.ipam.RangeIpamBackend')
+        self.assertIsInstance(ipam.get_backend(), ipam.RangeIpamBackend)
+
+    def test_create_subnet_uses_bitmap(self):
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            subnet_id = subnet['subnet']['id']
+            bitmap = self.context.session.query(
+                models_v2.IPAllocationBitmap).filter_by(
+                    subnet_id=subnet_id).one()
+            self.assertEqual(bitmap.first_ip, '10.0.0.2')
+            self.assertEqual(bitmap.size, 253)
+            ranges = self.context.session.query(
+                models_v2.IPAvailabilityRange).join(
+                    models_v2.IPAllocationPool).filter_by(
+                        subnet_id=subnet_id)
+            self.assertEqual(ranges.count(), 0)
+
+    def test_large_subnet_falls_back_to_ranges(self):
+        cfg.CONF.set_override('ipam_bitmap_max_size', 16)
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            subnet_id = subnet['subnet']['id']
+            bitmaps = self.context.session.query(
+                models_v2.IPAllocationBitmap).filter_by(subnet_id=subnet_id)
+            self.assertEqual(bitmaps.count(), 0)
+            with self.port(subnet=subnet) as port:
+                ips = port['port']['fixed_ips']
+                self.assertEqual(ips[0]['ip_address'], '10.0.0.2')
+
+    def test_ipv6_subnet_falls_back_to_ranges(self):
+        span = ipam.SubnetBitmap.span
+        with mock.patch.object(ipam, 'SubnetBitmap') as bitmap_cls:
+            bitmap_cls.span = span
+            with self.subnet(cidr='2001:db8::/64', ip_version=6) as subnet:
+                subnet_id = subnet['subnet']['id']
+                bitmaps = self.context.session.query(
+                    models_v2.IPAllocationBitmap).filter_by(
+                        subnet_id=subnet_id)
+                self.assertEqual(bitmaps.count(), 0)
+                with self.port(subnet=subnet) as port:
+                    ips = port['port']['fixed_ips']
+                    self.assertEqual(ips[0]['ip_address'], '2001:db8::2')
+        self.assertFalse(bitmap_cls.called)
+        self.assertFalse(bitmap_cls.from_pools.called)
+
+    def test_generate_ip_retries_on_conflict(self):
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            subnet_id = subnet['subnet']['id']
+            current = self.backend._load(self.context, subnet_id)
+            with mock.patch.object(self.backend, '_load',
+                                   side_effect=[('stale', current[1]),
+                                                current]) as load:
+                result = self.backend.generate_ip(self.context,
+                                                  [subnet['subnet']])
+            self.assertEqual(result['ip_address'], '10.0.0.2')
+            self.assertEqual(load.call_count, 2)
+            self.assertEqual(load.call_args, mock.call(self.context,
+                                                       subnet_id, lock=True))
+
+    def test_generate_ip_conflict_retries_exhausted(self):
+        cfg.CONF.set_override('ipam_cas_retries', 2)
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            subnet_id = subnet['subnet']['id']
+            revision, bitmap = self.backend._load(self.context, subnet_id)
+            with mock.patch.object(self.backend, '_load',
+                                   return_value=('stale', bitmap)):
+                self.assertRaises(q_exc.IpAddressAllocationConflict,
+                                  self.backend.generate_ip,
+                                  self.context, [subnet['subnet']])
+
+    def test_stale_cache_is_reloaded(self):
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            subnet_id = subnet['subnet']['id']
+            self.backend.generate_ip(self.context, [subnet['subnet']])
+            # Simulate an allocation made by another server
+            other = ipam.BitmapIpamBackend()
+            result = other.generate_ip(self.context, [subnet['subnet']])
+            self.assertEqual(result['ip_address'], '10.0.0.3')
+            result = self.backend.generate_ip(self.context,
+                                              [subnet['subnet']])
+            self.assertEqual(result['ip_address'], '10.0.0.4')
+            self.backend.release_ip(self.context, subnet_id, '10.0.0.3')
+            result = other.generate_ip(self.context, [subnet['subnet']])
+            self.assertEqual(result['ip_address'], '10.0.0.3')
+
+    def test_subnet_exhausted(self):
+        with self.subnet(cidr='10.0.0.0/30') as subnet:
+            self.backend.generate_ip(self.context, [subnet['subnet']])
+            self.assertRaises(q_exc.IpAddressGenerationFailure,
+                              self.backend.generate_ip,
+                              self.context, [subnet['subnet']])
+
+    def test_generate_ips(self):
+        with contextlib.nested(
+                self.subnet(cidr='10.0.0.0/29'),
+                self.subnet(cidr='10.0.1.0/24')) as (subnet1, subnet2):
+            subnets = [subnet1['subnet'], subnet2['subnet']]
+            with mock.patch.object(self.backend, '_update',
+                                   wraps=self.backend._update) as update:
+                results = self.backend.generate_ips(self.context, subnets, 7)
+            self.assertEqual(update.call_count, 2)
+            self.assertEqual([r['ip_address'] for r in results],
+                             ['10.0.0.2', '10.0.0.3', '10.0.0.4',
+                              '10.0.0.5', '10.0.0.6', '10.0.1.2',
+                              '10.0.1.3'])
+            self.assertEqual(results[5]['subnet_id'],
+                             subnet2['subnet']['id'])
+
+    def test_generate_ips_subnet_exhausted(self):
+        with self.subnet(cidr='10.0.0.0/30') as subnet:
+            self.assertRaises(q_exc.IpAddressGenerationFailure,
+                              self.backend.generate_ips,
+                              self.context, [subnet['subnet']], 2)
+
+    def test_release_ips(self):
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            subnet_id = subnet['subnet']['id']
+            for i in range(3):
+                self.backend.generate_ip(self.context, [subnet['subnet']])
+            with mock.patch.object(self.backend, 'release_ip') as release:
+                self.backend.release_ips(self.context, subnet_id,
+                                         ['10.0.0.3', '10.0.0.2', '10.0.1.1'])
+                self.assertFalse(release.called)
+            result = self.backend.generate_ip(self.context,
+                                              [subnet['subnet']])
+            self.assertEqual(result['ip_address'], '10.0.0.2')
+
+
+class TestRangeIpamBackend(test_db_plugin.NeutronDbPluginV2TestCase):
+
+    def setUp(self):
+        super(TestRangeIpamBackend, self).setUp()
+        self.backend = ipam.get_backend()
+        self.context = context.get_admin_context()
+
+    def _ranges(self, subnet_id):
+        ranges = self.context.session.query(
+            models_v2.IPAvailabilityRange).join(
+                models_v2.IPAllocationPool).filter_by(subnet_id=subnet_id)
+        return sorted((r['first_ip'], r['last_ip']) for r in ranges)
+
+    def test_release_ips_coalesces_ranges(self):
+        allocation_pools = [{'start': '10.0.0.2', 'end': '10.0.0.20'},
+                            {'start': '10.0.0.30', 'end': '10.0.0.40'}]
+        with self.subnet(cidr='10.0.0.0/24',
+                         allocation_pools=allocation_pools) as subnet:
+            subnet_id = subnet['subnet']['id']
+            for ip in ('10.0.0.5', '10.0.0.6', '10.0.0.8', '10.0.0.30'):
+                self.backend.allocate_specific_ip(self.context, subnet_id,
+                                                  ip)
+            self.assertEqual(self._ranges(subnet_id),
+                             [('10.0.0.2', '10.0.0.4'),
+                              ('10.0.0.31', '10.0.0.40'),
+                              ('10.0.0.7', '10.0.0.7'),
+                              ('10.0.0.9', '10.0.0.20')])
+            with self.context.session.begin(subtransactions=True):
+                self.backend.release_ips(self.context, subnet_id,
+                                         ['10.0.0.5', '10.0.0.6',
+                                          '10.0.0.30', '10.0.0.100'])
+            self.assertEqual(self._ranges(subnet_id),
+                             [('10.0.0.2', '10.0.0.7'),
+                              ('10.0.0.30', '10.0.0.40'),
+                              ('10.0.0.9', '10.0.0.20')])
+
+    def test_generate_ips_spans_ranges(self):
+        allocation_pools = [{'start': '10.0.0.2', 'end': '10.0.0.3'},
+                            {'start': '10.0.0.30', 'end': '10.0.0.40'}]
+        with self.subnet(cidr='10.0.0.0/24',
+                         allocation_pools=allocation_pools) as subnet:
+            subnet_id = subnet['subnet']['id']
+            with self.context.session.begin(subtransactions=True):
+                results = self.backend.generate_ips(
+                    self.context, [subnet['subnet']], 4)
+            self.assertEqual([r['ip_address'] for r in results],
+                             ['10.0.0.2', '10.0.0.3', '10.0.0.30',
+                              '10.0.0.31'])
+            self.assertEqual(self._ranges(subnet_id),
+                             [('10.0.0.32', '10.0.0.40')])
+
+    def test_generate_ips_subnet_exhausted(self):
+        with self.subnet(cidr='10.0.0.0/30') as subnet:
+            self.assertRaises(q_exc.IpAddressGenerationFailure,
+                              self.backend.generate_ips,
+                              self.context, [subnet['subnet']], 2)
@@ -0,0 +1,219 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import weakref
+
+import sqlalchemy
+
+from neutron.common import constants
+from neutron import context
+from neutron.db import api as db_api
+from neutron.db import db_base_plugin_v2
+from neutron.db import extraroute_db
+from neutron.db import l3_db
+from neutron.db import models_v2
+from neutron.db import portbindings_db
+from neutron.db import portsecurity_db
+from neutron.db import securitygroups_db
+from neutron.extensions import portbindings
+from neutron.extensions import portsecurity as psec
+from neutron.extensions import securitygroup as ext_sg
+from neutron.openstack.common.db.sqlalchemy import session
+from neutron.tests import base
+
+TENANT = 'load-profile-tenant'
+# Enough rows for one query per row to be obvious
+PORTS = 1000
+NETWORKS = 100
+ROUTERS = 100
+# Queries allowed to list any number of rows of a collection
+MAX_QUERIES = 4
+
+
+# Lists the statements executed are recorded in, while counting them
+_recorders = []
+# SQLAlchemy 0.7 cannot remove engine listeners, so every engine gets one
+# listener which does not refer to the tests
+_listened_engines = weakref.WeakSet()
+
+
+def _record_statement(conn, cursor, statement, parameters, context,
+                      executemany):
+    for statements in _recorders:
+        statements.append(statement)
+
+
+def _listen(engine):
+    if engine not in _listened_engines:
+        sqlalchemy.event.listen(engine, 'before_cursor_execute',
+                                _record_statement)
+        _listened_engines.add(engine)
+
+
+class LoadProfilePlugin(db_base_plugin_v2.NeutronDbPluginV2,
+                        extraroute_db.ExtraRoute_db_mixin,
+                        securitygroups_db.SecurityGroupDbMixin,
+                        portbindings_db.PortBindingMixin,
+                        portsecurity_db.PortSecurityDbMixin):
+
+    supported_extension_aliases = ['router', 'extraroute', 'security-group',
+                                   'binding', 'port-security']
+
+
+class TestLoadProfiles(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestLoadProfiles, self).setUp()
+        self.plugin = LoadProfilePlugin()
+        self.addCleanup(db_api.clear_db)
+        _listen(session.get_engine(sqlite_fk=True))
+        self._create_resources()
+
+    def _count_queries(self, func, *args, **kwargs):
+        """Call func with a fresh context and count the queries it runs."""
+        statements = []
+        _recorders.append(statements)
+        try:
+            result = func(context.get_admin_context(), *args, **kwargs)
+            return result, len(statements)
+        finally:
+            _recorders.remove(statements)
+
+    def _create_resources(self):
+        db_session = db_api.get_session()
+        with db_session.begin():
+            db_session.add(securitygroups_db.SecurityGroup(
+                id='sg', tenant_id=TENANT, name='default', description=''))
+            for i in xrange(NETWORKS):
+                network_id = 'net-%d' % i
+                subnet_id = 'subnet-%d' % i
+                db_session.add(models_v2.Network(
+                    id=network_id, tenant_id=TENANT, name=network_id,
+                    admin_state_up=True, shared=False,
+                    status=constants.NET_STATUS_ACTIVE))
+                db_session.add(portsecurity_db.NetworkSecurityBinding(
+                    network_id=network_id, port_security_enabled=True))
+                if i % 2:
+                    db_session.add(l3_db.ExternalNetwork(
+                        network_id=network_id))
+                db_session.add(models_v2.Subnet(
+                    id=subnet_id, tenant_id=TENANT, network_id=network_id,
+                    ip_version=4, cidr='10.%d.0.0/16' % i,
+                    gateway_ip='10.%d.0.1' % i, enable_dhcp=True,
+                    shared=False))
+                db_session.add(models_v2.DNSNameServer(
+                    address='10.%d.0.2' % i, subnet_id=subnet_id))
+                db_session.add(models_v2.SubnetRoute(
+                    destination='192.168.%d.0/24' % i,
+                    nexthop='10.%d.0.3' % i, subnet_id=subnet_id))
+            db_session.flush()
+            for i in xrange(PORTS):
+                port_id = 'port-%d' % i
+                network_id = 'net-%d' % (i % NETWORKS)
+                db_session.add(models_v2.Port(
+                    id=port_id, tenant_id=TENANT, name='',
+                    network_id=network_id,
+                    mac_address='fa:16:3e:00:%02x:%02x' % (i >> 8, i & 255),
+                    admin_state_up=True,
+                    status=constants.PORT_STATUS_ACTIVE,
+                    device_id='vm-%d' % i, device_owner='compute:nova'))
+            db_session.flush()
+            for i in xrange(PORTS):
+                port_id = 'port-%d' % i
+                network_index = i % NETWORKS
+                db_session.add(models_v2.IPAllocation(
+                    port_id=port_id, ip_address='10.%d.1.%d' % (
+                        network_index, i // NETWORKS),
+                    subnet_id='subnet-%d' % network_index,
+                    network_id='net-%d' % network_index))
+                db_session.add(securitygroups_db.SecurityGroupPortBinding(
+                    port_id=port_id, security_group_id='sg'))
+                db_session.add(portbindings_db.PortBindingPort(
+                    port_id=port_id, host='host-%d' % (i % 10)))
+                db_session.add(portsecurity_db.PortSecurityBinding(
+                    port_id=port_id, port_security_enabled=True))
+            for i in xrange(ROUTERS):
+                router_id = 'router-%d' % i
+                db_session.add(l3_db.Router(
+                    id=router_id, tenant_id=TENANT, name=router_id,
+                    admin_state_up=True, status=constants.NET_STATUS_ACTIVE,
+                    gw_port_id='port-%d' % i))
+            db_session.flush()
+            for i in xrange(ROUTERS):
+                db_session.add(extraroute_db.RouterRoute(
+                    router_id='router-%d' % i,
+                    destination='172.16.%d.0/24' % i,
+                    nexthop='10.%d.0.4' % i))
+
+    def test_list_ports(self):
+        ports, queries = self._count_queries(self.plugin.get_ports)
+        self.assertEqual(PORTS, len(ports))
+        self.assertTrue(queries <= MAX_QUERIES)
+        port = [p for p in ports if p['id'] == 'port-1'][0]
+        self.assertEqual([{'subnet_id': 'subnet-1',
+                           'ip_address': '10.1.1.0'}], port['fixed_ips'])
+        self.assertEqual(['sg'], port[ext_sg.SECURITYGROUPS])
+        self.assertEqual('host-1', port[portbindings.HOST_ID])
+        self.assertTrue(port[psec.PORTSECURITY])
+
+    def test_list_ports_with_fields(self):
+        ports, queries = self._count_queries(self.plugin.get_ports,
+                                             fields=['id', 'fixed_ips'])
+        self.assertEqual(PORTS, len(ports))
+        self.assertTrue(queries <= MAX_QUERIES)
+        self.assertEqual(set(['id', 'fixed_ips']), set(ports[0]))
+
+    def test_list_networks(self):
+        networks, queries = self._count_queries(self.plugin.get_networks)
+        self.assertEqual(NETWORKS, len(networks))
+        self.assertTrue(queries <= MAX_QUERIES)
+        network = [n for n in networks if n['id'] == 'net-1'][0]
+        self.assertEqual(['subnet-1'], network['subnets'])
+        self.assertTrue(network['router:external'])
+        self.assertTrue(network[psec.PORTSECURITY])
+
+    def test_list_networks_without_subnets(self):
+        networks, queries = self._count_queries(self.plugin.get_networks,
+                                                fields=['id', 'name'])
+        self.assertEqual(NETWORKS, len(networks))
+        self.assertEqual(1, queries)
+        self.assertEqual(set(['id', 'name']), set(networks[0]))
+
+    def test_list_subnets(self):
+        subnets, queries = self._count_queries(self.plugin.get_subnets)
+        self.assertEqual(NETWORKS, len(subnets))
+        self.assertTrue(queries <= MAX_QUERIES)
+        subnet = [s for s in subnets if s['id'] == 'subnet-1'][0]
+        self.assertEqual(['10.1.0.2'], subnet['dns_nameservers'])
+        self.assertEqual([{'destination': '192.168.1.0/24',
+                           'nexthop': '10.1.0.3'}], subnet['host_routes'])
+
+    def test_list_routers(self):
+        routers, queries = self._count_queries(self.plugin.get_routers)
+        self.assertEqual(ROUTERS, len(routers))
+        self.assertTrue(queries <= MAX_QUERIES)
+        router = [r for r in routers if r['id'] == 'router-1'][0]
+        self.assertEqual({'network_id': 'net-1'},
+                         router[l3_db.EXTERNAL_GW_INFO])
+        self.assertEqual([{'destination': '172.16.1.0/24',
+                           'nexthop': '10.1.0.4'}], router['routes'])
+
+    def test_register_model_load_profile(self):
+        profiles = db_base_plugin_v2.CommonDbMixin._model_load_profiles
+        self.assertIn('subnets', profiles[models_v2.Network])
+        self.assertEqual(['security_groups'],
+                         profiles[models_v2.Port][ext_sg.SECURITYGROUPS])
@@ -1781,6 +1781,76 @@ fixed_ips=ip_address%%3D%s&fixed_ips=ip_address%%3D%s&fixed_ips=subnet_id%%3D%s
                     self.assertEqual(update_context._recycled_networks,
                                      set([subnet['subnet']['network_id']]))
 
+    def _expire_port_ips(self, plugin, ctx, port_id):
+        port_obj = plugin._get_port(ctx, port_id)
+        with ctx.session.begin(subtransactions=True):
+            for fixed_ip in port_obj.fixed_ips:
+                fixed_ip.port_id = None
+                fixed_ip.expiration = datetime.datetime.utcnow()
+
+    def test_recycle_expired_ips_in_bulk(self):
+        plugin = NeutronManager.get_plugin()
+        ctx = context.get_admin_context()
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            network_id = subnet['subnet']['network_id']
+            ports = [self._make_port(self.fmt, network_id)['port']
+                     for i in range(4)]
+            for port in ports:
+                self._expire_port_ips(plugin, ctx, port['id'])
+            with mock.patch.object(plugin, '_recycle_ip') as rc:
+                with ctx.session.begin(subtransactions=True):
+                    plugin._recycle_expired_ip_allocations(ctx, network_id)
+                self.assertFalse(rc.called)
+            for port in ports:
+                self._delete('ports', port['id'])
+            q = ctx.session.query(models_v2.IPAllocation)
+            self.assertEqual(q.filter_by(network_id=network_id).count(), 0)
+            with self.port(subnet=subnet) as port:
+                ips = port['port']['fixed_ips']
+                self.assertEqual(ips[0]['ip_address'], '10.0.0.2')
+
+    def test_recycle_expired_skipped_with_recycle_interval(self):
+        cfg.CONF.set_override('ip_recycle_interval', 30)
+        plugin = NeutronManager.get_plugin()
+        ctx = context.get_admin_context()
+        with mock.patch.object(plugin, '_recycle_expired_ips') as rc:
+            plugin._recycle_expired_ip_allocations(ctx, 'fake_net_id')
+            self.assertFalse(rc.called)
+
+    def test_recycle_expired_inline_when_pools_full(self):
+        cfg.CONF.set_override('ip_recycle_interval', 30)
+        plugin = NeutronManager.get_plugin()
+        ctx = context.get_admin_context()
+        pools = [{'start': '10.0.0.2', 'end': '10.0.0.2'}]
+        with self.subnet(cidr='10.0.0.0/24',
+                         allocation_pools=pools) as subnet:
+            network_id = subnet['subnet']['network_id']
+            port = self._make_port(self.fmt, network_id)['port']
+            self._expire_port_ips(plugin, ctx, port['id'])
+            self._delete('ports', port['id'])
+            with self.port(subnet=subnet) as port:
+                ips = port['port']['fixed_ips']
+                self.assertEqual(ips[0]['ip_address'], '10.0.0.2')
+                # No expired allocation left to recycle
+                res = self._create_port(self.fmt, network_id)
+                self.assertEqual(res.status_int, 409)
+
+    def test_recycle_expired_ip_allocations_of_all_networks(self):
+        plugin = NeutronManager.get_plugin()
+        ctx = context.get_admin_context()
+        with contextlib.nested(self.subnet(cidr='10.0.0.0/24'),
+                               self.subnet(cidr='10.0.1.0/24')) as subnets:
+            for subnet in subnets:
+                with self.port(subnet=subnet) as port:
+                    self._expire_port_ips(plugin, ctx, port['port']['id'])
+            plugin.recycle_expired_ip_allocations(ctx)
+            q = ctx.session.query(models_v2.IPAllocation)
+            self.assertEqual(q.count(), 0)
+            for subnet in subnets:
+                with self.port(subnet=subnet) as port:
+                    ips = port['port']['fixed_ips']
+                    self.assertEqual(ips[0]['ip_address'][-2:], '.2')
+
     def test_max_fixed_ips_exceeded(self):
         with self.subnet(gateway_ip='10.0.0.3',
                          cidr='10.0.0.0/24') as subnet:
@@ -1814,6 +1884,85 @@ fixed_ips=ip_address%%3D%s&fixed_ips=ip_address%%3D%s&fixed_ips=subnet_id%%3D%s
                 self.assertEqual(res.status_int, 400)
 
 
+class NativeBulkPortsTestMixin(object):
+    """Tests of the plugins creating the ports of a bulk request together.
+
+    Such plugins do not call create_port for each port, so the failures
+    are injected in the port bindings of the ports instead.
+    """
+
+    def test_create_ports_bulk_emulated_plugin_failure(self):
+        plugin = NeutronManager.get_plugin()
+        # Create the ports one by one through create_port
+        with mock.patch.object(plugin, 'create_port_bulk',
+                               new=lambda context, ports:
+                               plugin._create_bulk('port', context, ports)):
+            super(NativeBulkPortsTestMixin,
+                  self).test_create_ports_bulk_emulated_plugin_failure()
+
+    def test_create_ports_bulk_native_plugin_failure(self):
+        ctx = context.get_admin_context()
+        plugin = NeutronManager.get_plugin()
+        with self.network() as net:
+            orig = plugin._process_portbindings_create_and_update
+            with mock.patch.object(plugin,
+                                   '_process_portbindings_create_and_update'
+                                   ) as patched_plugin:
+
+                def side_effect(*args, **kwargs):
+                    return self._do_side_effect(patched_plugin, orig,
+                                                *args, **kwargs)
+
+                patched_plugin.side_effect = side_effect
+                res = self._create_port_bulk(self.fmt, 2, net['network']['id'],
+                                             'test', True, context=ctx)
+                # We expect a 500 as we injected a fault in the plugin
+                self._validate_behavior_on_bulk_failure(res, 'ports', 500)
+
+    def test_create_ports_bulk_allocates_addresses(self):
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            override = {1: {'fixed_ips': [{'ip_address': '10.0.0.2'}]},
+                        2: {'mac_address': '00:11:22:33:44:55'}}
+            res = self._create_port_bulk(self.fmt, 3,
+                                         subnet['subnet']['network_id'],
+                                         'test', True, override=override)
+            self.assertEqual(res.status_int, webob.exc.HTTPCreated.code)
+            ports = self.deserialize(self.fmt, res)['ports']
+            ips = [port['fixed_ips'][0]['ip_address'] for port in ports]
+            self.assertEqual(ips[1], '10.0.0.2')
+            self.assertEqual(sorted(ips), ['10.0.0.2', '10.0.0.3',
+                                           '10.0.0.4'])
+            self.assertEqual(ports[2]['mac_address'], '00:11:22:33:44:55')
+            self.assertEqual(len(set(port['mac_address']
+                                     for port in ports)), 3)
+            for port in ports:
+                self._delete('ports', port['id'])
+
+    def test_create_ports_bulk_same_ip_address(self):
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            fixed_ips = [{'ip_address': '10.0.0.5'}]
+            override = {0: {'fixed_ips': fixed_ips},
+                        1: {'fixed_ips': fixed_ips}}
+            res = self._create_port_bulk(self.fmt, 2,
+                                         subnet['subnet']['network_id'],
+                                         'test', True, override=override)
+            self._validate_behavior_on_bulk_failure(
+                res, 'ports', webob.exc.HTTPConflict.code)
+
+    def test_create_ports_bulk_notifies_security_groups_once(self):
+        plugin = NeutronManager.get_plugin()
+        with self.subnet() as subnet:
+            with mock.patch.object(
+                    plugin.notifier,
+                    'security_groups_member_updated') as member_updated:
+                res = self._create_port_bulk(self.fmt, 3,
+                                             subnet['subnet']['network_id'],
+                                             'test', True)
+                self.assertEqual(member_updated.call_count, 1)
+            for port in self.deserialize(self.fmt, res)['ports']:
+                self._delete('ports', port['id'])
+
+
 class TestNetworksV2(NeutronDbPluginV2TestCase):
     # NOTE(cerberus): successful network update and delete are
     #                 effectively tested above
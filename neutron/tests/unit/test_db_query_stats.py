@@ -0,0 +1,92 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from neutron import context
+from neutron.db import api as db_api
+from neutron.db import db_base_plugin_v2
+from neutron.db import query_stats
+from neutron.tests import base
+
+
+class TestQueryStats(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestQueryStats, self).setUp()
+        self.plugin = db_base_plugin_v2.NeutronDbPluginV2()
+        self.addCleanup(db_api.clear_db)
+        self.addCleanup(query_stats.stop)
+        self.context = context.get_admin_context()
+
+    def _create_network(self):
+        return self.plugin.create_network(
+            self.context, {'network': {'name': 'net',
+                                       'admin_state_up': True,
+                                       'shared': False,
+                                       'tenant_id': 'tenant'}})
+
+    def test_statements_counted_for_request(self):
+        query_stats.start(self.context.query_stats)
+        network = self._create_network()
+        self.plugin.get_network(self.context, network['id'])
+        stats = self.context.query_stats
+        self.assertTrue(stats.statements >= 2)
+        self.assertTrue(stats.db_time > 0)
+        # The network row inserted
+        self.assertTrue(stats.rows >= 1)
+
+    def test_statements_not_counted_without_request(self):
+        self._create_network()
+        self.assertEqual(0, self.context.query_stats.statements)
+
+    def test_elevated_context_shares_stats(self):
+        query_stats.start(self.context.query_stats)
+        self.plugin.get_networks(self.context.elevated())
+        self.assertEqual(1, self.context.query_stats.statements)
+
+    def test_stop(self):
+        query_stats.start(self.context.query_stats)
+        query_stats.stop()
+        self.plugin.get_networks(self.context)
+        self.assertIsNone(query_stats.current())
+        self.assertEqual(0, self.context.query_stats.statements)
+
+    def test_lock_waits(self):
+        stats = query_stats.QueryStats()
+        stats.add('SELECT id FROM ports FOR UPDATE', 0.25, -1)
+        stats.add('SELECT id FROM ports', 0.5, 3)
+        self.assertEqual({'statements': 2, 'db_time': 0.75,
+                          'lock_waits': 1, 'lock_time': 0.25, 'rows': 3},
+                         stats.to_dict())
+
+    def test_slow_statement_logged_with_call_site(self):
+        self.config(slow_query_threshold=0.000001, group='database')
+        with mock.patch.object(query_stats.LOG, 'warning') as warning:
+            self.plugin.get_networks(self.context)
+        self.assertTrue(warning.called)
+        args = warning.call_args[0][1]
+        self.assertTrue(args['elapsed'] > 0.000001)
+        self.assertTrue(args['call_site'].startswith(
+            'neutron.db.db_base_plugin_v2._get_collection:'))
+        self.assertIn('FROM networks', args['statement'])
+
+    def test_fast_statement_not_logged(self):
+        self.config(slow_query_threshold=60, group='database')
+        with mock.patch.object(query_stats.LOG, 'warning') as warning:
+            self.plugin.get_networks(self.context)
+        self.assertFalse(warning.called)
@@ -14,7 +14,9 @@
 # limitations under the License.
 
 import mock
+from oslo.config import cfg
 
+from neutron.common import constants
 from neutron.db import dhcp_rpc_base
 from neutron.tests import base
 
@@ -52,8 +54,8 @@ class TestDhcpRpcCallackMixin(base.BaseTestCase):
     def test_get_network_info(self):
         network_retval = dict(id='a')
 
-        subnet_retval = mock.Mock()
-        port_retval = mock.Mock()
+        subnet_retval = [dict(id='s1', network_id='a', enable_dhcp=True)]
+        port_retval = [dict(id='p1', network_id='a', fixed_ips=[])]
 
         self.plugin.get_network.return_value = network_retval
         self.plugin.get_subnets.return_value = subnet_retval
@@ -64,6 +66,60 @@ class TestDhcpRpcCallackMixin(base.BaseTestCase):
         self.assertEqual(retval['subnets'], subnet_retval)
         self.assertEqual(retval['ports'], port_retval)
 
+    def test_get_active_networks_info_filtered(self):
+        self.plugin.get_networks.return_value = [dict(id='b')]
+        self.plugin.get_subnets.return_value = [
+            dict(id='s1', network_id='b', enable_dhcp=True)]
+        self.plugin.get_ports.return_value = [
+            dict(id='p1', network_id='b', fixed_ips=[])]
+
+        networks = self.callbacks.get_active_networks_info(
+            mock.Mock(), host='host', network_ids=['b'])
+
+        self.assertEqual([network['id'] for network in networks], ['b'])
+        self.assertEqual(networks[0]['ports'],
+                         self.plugin.get_ports.return_value)
+        self.plugin.get_networks.assert_called_once_with(
+            mock.ANY, filters=dict(admin_state_up=[True], id=['b']))
+        filters = self.plugin.get_ports.call_args[1]['filters']
+        self.assertEqual(filters['network_id'], ['b'])
+
+    def test_get_active_networks_info_filtered_not_scheduled(self):
+        cfg.CONF.import_opt('network_auto_schedule',
+                            'neutron.db.agentschedulers_db')
+        self.plugin.supported_extension_aliases = [
+            constants.DHCP_AGENT_SCHEDULER_EXT_ALIAS]
+        list_networks = self.plugin.list_active_networks_on_active_dhcp_agent
+        list_networks.return_value = []
+
+        networks = self.callbacks.get_active_networks_info(
+            mock.Mock(), host='host', network_ids=['b'])
+
+        self.assertEqual([], networks)
+        self.assertFalse(self.plugin.auto_schedule_networks.called)
+        list_networks.assert_called_once_with(mock.ANY, 'host',
+                                              network_ids=['b'])
+        self.assertFalse(self.plugin.get_ports.called)
+
+    def test_get_active_networks_digests(self):
+        self.plugin.get_networks.return_value = [dict(id='a')]
+        port = dict(id='p1', network_id='a', mac_address='aa:bb:cc:dd:ee:ff',
+                    fixed_ips=[dict(subnet_id='s1', ip_address='10.0.0.3')],
+                    device_id='vm1', device_owner='compute:nova')
+        self.plugin.get_subnets.return_value = []
+        self.plugin.get_ports.return_value = [port]
+        self.plugin.get_network.return_value = dict(id='a')
+
+        digests = self.callbacks.get_active_networks_digests(mock.Mock(),
+                                                             host='host')
+        network = self.callbacks.get_network_info(mock.Mock(),
+                                                  network_id='a')
+
+        self.assertEqual(digests, {'a': network['digest']})
+        port['mac_address'] = 'aa:bb:cc:dd:ee:00'
+        self.assertNotEqual(dhcp_rpc_base.get_network_digest(network),
+                            digests['a'])
+
     def _test_get_dhcp_port_helper(self, port_retval, other_expectations=[],
                                    update_port=None, create_port=None):
         subnets_retval = [dict(id='a', enable_dhcp=True),
@@ -312,6 +312,49 @@ class TestDhcpAgent(base.BaseTestCase):
     def test_sync_state_disabled_net(self):
         self._test_sync_state_helper(['b'], ['a'])
 
+    def test_sync_state_digests(self):
+        cfg.CONF.set_override('sync_network_digests', True)
+        with mock.patch('neutron.agent.dhcp_agent.DhcpPluginApi') as plug:
+            mock_plugin = mock.Mock()
+            mock_plugin.get_active_networks_digests.return_value = {
+                'a': 'digest-a', 'b': 'new-digest-b'}
+            network_b = FakeModel('b')
+            mock_plugin.get_active_networks_info.return_value = [network_b]
+            plug.return_value = mock_plugin
+
+            dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+            attrs_to_mock = dict(
+                [(a, mock.DEFAULT) for a in
+                 ['configure_dhcp_for_network', 'disable_dhcp_helper',
+                  'cache']])
+            with mock.patch.multiple(dhcp, **attrs_to_mock) as mocks:
+                cached = {'a': FakeModel('a', digest='digest-a'),
+                          'b': FakeModel('b', digest='digest-b'),
+                          'c': FakeModel('c', digest='digest-c')}
+                mocks['cache'].get_network_ids.return_value = cached.keys()
+                mocks['cache'].get_network_by_id.side_effect = cached.get
+                dhcp.sync_state()
+
+                mock_plugin.get_active_networks_info.assert_called_once_with(
+                    network_ids=['b'])
+                mocks['configure_dhcp_for_network'].assert_called_once_with(
+                    network_b)
+                mocks['disable_dhcp_helper'].assert_called_once_with('c')
+
+    def test_sync_state_digests_unsupported(self):
+        cfg.CONF.set_override('sync_network_digests', True)
+        with mock.patch('neutron.agent.dhcp_agent.DhcpPluginApi') as plug:
+            mock_plugin = mock.Mock()
+            mock_plugin.get_active_networks_digests.side_effect = Exception
+            mock_plugin.get_active_networks_info.return_value = []
+            plug.return_value = mock_plugin
+
+            dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+            dhcp.sync_state()
+
+            mock_plugin.get_active_networks_info.assert_called_once_with()
+            self.assertFalse(dhcp.needs_resync)
+
     def test_sync_state_plugin_error(self):
         with mock.patch('neutron.agent.dhcp_agent.DhcpPluginApi') as plug:
             mock_plugin = mock.Mock()
@@ -751,7 +794,32 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
                                                  fake_network)
         self.dhcp.device_manager.update.assert_called_once_with(fake_network)
 
+    def test_network_changed(self):
+        payload = dict(network_id=fake_network.id, port_ids=[fake_port1.id])
+        self.cache.get_network_by_id.return_value = fake_network
+        self.plugin.get_network_info.return_value = fake_network
+        self.dhcp.device_manager.update = mock.Mock()
+
+        self.dhcp.network_changed(None, payload)
+
+        self.plugin.get_network_info.assert_called_once_with(fake_network.id)
+        self.cache.assert_has_calls([mock.call.put(fake_network)])
+        self.call_driver.assert_called_once_with('reload_allocations',
+                                                 fake_network)
+
+    def test_subnet_update_end_reload_failure(self):
+        payload = dict(subnet=dict(network_id=fake_network.id))
+        self.cache.get_network_by_id.return_value = fake_network
+        self.plugin.get_network_info.return_value = fake_network
+        self.call_driver.return_value = False
+        self.dhcp.device_manager.update = mock.Mock()
+
+        self.dhcp.subnet_update_end(None, payload)
+
+        self.assertFalse(self.cache.put.called)
+
     def test_port_update_end(self):
+        cfg.CONF.set_override('dhcp_reload_delay', 0)
         payload = dict(port=vars(fake_port2))
         self.cache.get_network_by_id.return_value = fake_network
         self.dhcp.port_update_end(None, payload)
@@ -762,6 +830,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
                                                  fake_network)
 
     def test_port_delete_end(self):
+        cfg.CONF.set_override('dhcp_reload_delay', 0)
         payload = dict(port_id=fake_port2.id)
         self.cache.get_network_by_id.return_value = fake_network
         self.cache.get_port_by_id.return_value = fake_port2
@@ -784,6 +853,35 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.cache.assert_has_calls([mock.call.get_port_by_id('unknown')])
         self.assertEqual(self.call_driver.call_count, 0)
 
+    def test_port_events_coalesce_reloads(self):
+        payload = dict(port=vars(fake_port2))
+        self.cache.get_network_by_id.return_value = fake_network
+        self.cache.get_port_by_id.return_value = fake_port2
+        with mock.patch.object(eventlet, 'spawn_after') as spawn_after:
+            self.dhcp.port_create_end(None, payload)
+            self.dhcp.port_update_end(None, payload)
+            self.dhcp.port_delete_end(None, dict(port_id=fake_port2.id))
+            spawn_after.assert_called_once_with(
+                cfg.CONF.dhcp_reload_delay,
+                self.dhcp._reload_pending_networks)
+        self.assertFalse(self.call_driver.called)
+        self.assertEqual(self.dhcp.pending_reloads, set([fake_network.id]))
+
+        self.dhcp._reload_pending_networks()
+        self.call_driver.assert_called_once_with('reload_allocations',
+                                                 fake_network)
+        self.assertEqual(self.dhcp.pending_reloads, set())
+
+        with mock.patch.object(eventlet, 'spawn_after') as spawn_after:
+            self.dhcp.port_update_end(None, payload)
+            self.assertTrue(spawn_after.called)
+
+    def test_reload_pending_networks_removed_network(self):
+        self.dhcp.pending_reloads.add(fake_network.id)
+        self.cache.get_network_by_id.return_value = None
+        self.dhcp._reload_pending_networks()
+        self.assertFalse(self.call_driver.called)
+
 
 class TestDhcpPluginApiProxy(base.BaseTestCase):
     def setUp(self):
@@ -983,6 +1081,25 @@ class TestNetworkCache(base.BaseTestCase):
         nc.put(fake_network)
         self.assertEqual(nc.get_port_by_id(fake_port1.id), fake_port1)
 
+    def test_remove_port_keeps_index(self):
+        ports = [FakeModel('port%d' % i, network_id=fake_network.id)
+                 for i in range(4)]
+        network = FakeModel(fake_network.id, subnets=[], ports=list(ports))
+        nc = dhcp_agent.NetworkCache()
+        nc.put(network)
+        nc.remove_port(ports[1])
+        nc.remove_port(ports[3])
+
+        self.assertEqual(sorted(p.id for p in network.ports),
+                         ['port0', 'port2'])
+        self.assertIsNone(nc.get_port_by_id('port1'))
+        self.assertEqual(nc.get_port_by_id('port2'), ports[2])
+
+        updated = FakeModel('port2', network_id=fake_network.id)
+        nc.put_port(updated)
+        self.assertEqual(len(network.ports), 2)
+        self.assertEqual(nc.get_port_by_id('port2'), updated)
+
 
 class FakePort1:
     id = 'eeeeeeee-eeee-eeee-eeee-eeeeeeeeeeee'
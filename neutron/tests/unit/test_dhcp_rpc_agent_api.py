@@ -0,0 +1,107 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from oslo.config import cfg
+
+from neutron.api.rpc.agentnotifiers import dhcp_rpc_agent_api
+from neutron.tests import base
+
+NETWORK_ID = 'net-1'
+
+
+class TestDhcpAgentNotifyAPI(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestDhcpAgentNotifyAPI, self).setUp()
+        self.addCleanup(mock.patch.stopall)
+        self.plugin = mock.Mock()
+        agent = mock.Mock(host='hosta', topic='dhcp_agent')
+        self.plugin.get_dhcp_agents_hosting_networks.return_value = [agent]
+        self.plugin.schedule_network.return_value = []
+        get_plugin = mock.patch('neutron.manager.NeutronManager.get_plugin')
+        get_plugin.start().return_value = self.plugin
+        mock.patch('neutron.common.utils.is_extension_supported',
+                   return_value=True).start()
+        self.spawn_after = mock.patch('eventlet.spawn_after').start()
+        mock.patch.dict(dhcp_rpc_agent_api._pending_changes,
+                        clear=True).start()
+        self.notifier = dhcp_rpc_agent_api.DhcpAgentNotifyAPI()
+        self.cast = mock.patch.object(self.notifier, 'cast').start()
+        self.fanout_cast = mock.patch.object(self.notifier,
+                                             'fanout_cast').start()
+        self.context = mock.Mock()
+
+    def _port(self, port_id):
+        return {'port': {'id': port_id, 'network_id': NETWORK_ID}}
+
+    def test_notify_each_event(self):
+        self.notifier.notify(self.context, self._port('p1'),
+                             'port.create.end')
+        self.notifier.notify(self.context, self._port('p2'),
+                             'port.update.end')
+        self.assertEqual(self.cast.call_count, 2)
+        self.assertFalse(self.spawn_after.called)
+
+    def test_notify_bulk_items(self):
+        data = {'ports': [self._port('p1')['port'],
+                          self._port('p2')['port']]}
+        self.notifier.notify(self.context, data, 'port.create.end')
+        self.assertEqual(self.cast.call_args_list, [
+            mock.call(self.context,
+                      self.notifier.make_msg('port_create_end',
+                                             payload=self._port(port_id)),
+                      topic='dhcp_agent.hosta')
+            for port_id in ('p1', 'p2')])
+
+    def test_notify_coalesced_in_window(self):
+        cfg.CONF.set_override('dhcp_notification_window', 2)
+        self.notifier.notify(self.context, self._port('p2'),
+                             'port.create.end')
+        self.notifier.notify(self.context, self._port('p1'),
+                             'port.update.end')
+        self.notifier.notify(self.context,
+                             {'subnet': {'id': 's1',
+                                         'network_id': NETWORK_ID}},
+                             'subnet.update.end')
+        self.assertFalse(self.cast.called)
+        self.assertEqual(self.plugin.schedule_network.call_count, 1)
+        self.spawn_after.assert_called_once_with(
+            2, self.notifier._network_changed, NETWORK_ID)
+
+        self.notifier._network_changed(NETWORK_ID)
+        msg = self.notifier.make_msg('network_changed',
+                                     payload={'network_id': NETWORK_ID,
+                                              'port_ids': ['p1', 'p2']})
+        self.cast.assert_called_once_with(mock.ANY, msg,
+                                          topic='dhcp_agent.hosta',
+                                          version='1.1')
+
+    def test_network_delete_drops_pending_changes(self):
+        cfg.CONF.set_override('dhcp_notification_window', 2)
+        self.notifier.notify(self.context, self._port('p1'),
+                             'port.update.end')
+        self.notifier.notify(self.context,
+                             {'network': {'id': NETWORK_ID}},
+                             'network.delete.end')
+        self.notifier._network_changed(NETWORK_ID)
+        self.assertFalse(self.cast.called)
+        self.fanout_cast.assert_called_once_with(
+            self.context,
+            self.notifier.make_msg('network_delete_end',
+                                   payload={'network_id': NETWORK_ID}),
+            topic='dhcp_agent')
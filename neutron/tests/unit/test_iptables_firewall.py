@@ -34,9 +34,9 @@ FAKE_IP = {'IPv4': '10.0.0.1',
            'IPv6': 'fe80::1'}
 
 
-class IptablesFirewallTestCase(base.BaseTestCase):
+class BaseIptablesFirewallTestCase(base.BaseTestCase):
     def setUp(self):
-        super(IptablesFirewallTestCase, self).setUp()
+        super(BaseIptablesFirewallTestCase, self).setUp()
         cfg.CONF.register_opts(a_cfg.ROOT_HELPER_OPTS, 'AGENT')
         self.utils_exec_p = mock.patch(
             'neutron.agent.linux.utils.execute')
@@ -62,6 +62,8 @@ class IptablesFirewallTestCase(base.BaseTestCase):
                 'fixed_ips': [FAKE_IP['IPv4'],
                               FAKE_IP['IPv6']]}
 
+
+class IptablesFirewallTestCase(BaseIptablesFirewallTestCase):
     def test_prepare_port_filter_with_no_sg(self):
         port = self._fake_port()
         self.firewall.prepare_port_filter(port)
@@ -1059,3 +1061,78 @@ class IptablesFirewallTestCase(base.BaseTestCase):
                  call.add_rule('ofake_dev', '-j $sg-fallback'),
                  call.add_rule('sg-chain', '-j ACCEPT')]
         self.v4filter_inst.assert_has_calls(calls)
+
+
+class IptablesFirewallIpsetTestCase(BaseIptablesFirewallTestCase):
+    def setUp(self):
+        # the driver reads the option when it is created
+        cfg.CONF.set_override('enable_ipset', True, 'SECURITYGROUP')
+        super(IptablesFirewallIpsetTestCase, self).setUp()
+        self.ipset = mock.Mock()
+        self.ipset.sets = {}
+        self.firewall.ipset = self.ipset
+
+    def _member_rule(self, ip):
+        return {'ethertype': 'IPv4',
+                'direction': 'ingress',
+                'protocol': 'tcp',
+                'port_range_min': 22,
+                'port_range_max': 22,
+                'remote_group_id': 'fake_sgid',
+                'source_ip_prefix': '%s/32' % ip}
+
+    def _member_port(self, *ips):
+        port = self._fake_port()
+        port['security_group_rules'] = [self._member_rule(ip) for ip in ips]
+        return port
+
+    def test_remote_group_rules_match_set(self):
+        port = self._member_port('10.0.0.2', '10.0.0.3')
+        self.firewall.prepare_port_filter(port)
+        self.ipset.set_members.assert_called_once_with(
+            'IPv4fake_sgid', 'IPv4', set(['10.0.0.2', '10.0.0.3']))
+        rule = call.add_rule(
+            'ifake_dev',
+            '-p tcp -m tcp --dport 22 '
+            '-m set --match-set IPv4fake_sgid src -j RETURN')
+        self.assertEqual(1, self.v4filter_inst.mock_calls.count(rule))
+        for call_args in self.v4filter_inst.add_rule.call_args_list:
+            self.assertNotIn('10.0.0.2', call_args[0][1])
+
+    def test_update_members_only_updates_set(self):
+        self.firewall.prepare_port_filter(self._member_port('10.0.0.2'))
+        self.iptables_inst.reset_mock()
+        self.v4filter_inst.reset_mock()
+        self.firewall.update_port_filter(
+            self._member_port('10.0.0.2', '10.0.0.3'))
+        self.ipset.set_members.assert_called_with(
+            'IPv4fake_sgid', 'IPv4', set(['10.0.0.2', '10.0.0.3']))
+        self.assertFalse(self.iptables_inst.apply.called)
+        self.assertFalse(self.v4filter_inst.mock_calls)
+
+    def test_deferred_update_members_skips_iptables_apply(self):
+        self.firewall.prepare_port_filter(self._member_port('10.0.0.2'))
+        self.v4filter_inst.reset_mock()
+        with self.firewall.defer_apply():
+            self.firewall.update_port_filter(
+                self._member_port('10.0.0.3'))
+        self.iptables_inst.defer_apply_off.assert_called_once_with(
+            apply=False)
+        self.ipset.set_members.assert_called_with(
+            'IPv4fake_sgid', 'IPv4', set(['10.0.0.3']))
+        self.assertFalse(self.v4filter_inst.mock_calls)
+
+    def test_update_rules_rebuilds_chains(self):
+        self.firewall.prepare_port_filter(self._member_port('10.0.0.2'))
+        self.iptables_inst.reset_mock()
+        port = self._member_port('10.0.0.2')
+        port['security_group_rules'][0]['port_range_max'] = 23
+        self.firewall.update_port_filter(port)
+        self.iptables_inst.apply.assert_called_once_with()
+
+    def test_remove_port_filter_destroys_unused_sets(self):
+        port = self._member_port('10.0.0.2')
+        self.firewall.prepare_port_filter(port)
+        self.ipset.sets = {'IPv4fake_sgid': set(['10.0.0.2'])}
+        self.firewall.remove_port_filter(port)
+        self.ipset.destroy.assert_called_once_with('IPv4fake_sgid')
@@ -21,6 +21,7 @@ import inspect
 import os
 
 import mox
+from oslo.config import cfg
 
 from neutron.agent.linux import iptables_manager
 from neutron.tests import base
@@ -67,6 +68,8 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
 
     def setUp(self):
         super(IptablesManagerStateFulTestCase, self).setUp()
+        # These tests check the whole ruleset of each apply
+        cfg.CONF.set_override('iptables_incremental_apply', False, 'AGENT')
         self.mox = mox.Mox()
         self.root_helper = 'sudo'
         self.iptables = (iptables_manager.
@@ -289,6 +292,87 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
         self.mox.VerifyAll()
 
 
+class IptablesManagerIncrementalTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IptablesManagerIncrementalTestCase, self).setUp()
+        self.mox = mox.Mox()
+        self.root_helper = 'sudo'
+        self.iptables = (iptables_manager.
+                         IptablesManager(root_helper=self.root_helper))
+        self.mox.StubOutWithMock(self.iptables, "execute")
+        self.addCleanup(self.mox.UnsetStubs)
+
+    def _expect_full_apply(self):
+        self.iptables.execute(['iptables-save', '-c'],
+                              root_helper=self.root_helper).AndReturn('')
+        self.iptables.execute(['iptables-restore', '-c'],
+                              process_input=mox.IgnoreArg(),
+                              root_helper=self.root_helper).AndReturn(None)
+
+    def test_restore_changed_chains_only(self):
+        self._expect_full_apply()
+        self.iptables.execute(['iptables-restore', '-n'],
+                              process_input=('*filter\n'
+                                             ':%(bn)s-INPUT - [0:0]\n'
+                                             ':%(bn)s-filter - [0:0]\n'
+                                             '-A %(bn)s-INPUT -j '
+                                             '%(bn)s-filter\n'
+                                             '-A %(bn)s-filter -j DROP\n'
+                                             'COMMIT\n' % IPTABLES_ARG),
+                              root_helper=self.root_helper).AndReturn(None)
+        self.iptables.execute(['iptables-restore', '-n'],
+                              process_input=('*filter\n'
+                                             ':%(bn)s-INPUT - [0:0]\n'
+                                             ':%(bn)s-filter - [0:0]\n'
+                                             '-X %(bn)s-filter\n'
+                                             'COMMIT\n' % IPTABLES_ARG),
+                              root_helper=self.root_helper).AndReturn(None)
+        self.mox.ReplayAll()
+
+        self.iptables.apply()
+        self.iptables.ipv4['filter'].add_chain('filter')
+        self.iptables.ipv4['filter'].add_rule('filter', '-j DROP')
+        self.iptables.ipv4['filter'].add_rule('INPUT', '-j $filter')
+        self.iptables.apply()
+        self.iptables.ipv4['filter'].remove_chain('filter')
+        self.iptables.apply()
+        self.mox.VerifyAll()
+
+    def test_apply_without_changes_runs_nothing(self):
+        self._expect_full_apply()
+        self.mox.ReplayAll()
+
+        self.iptables.apply()
+        self.iptables.apply()
+        self.mox.VerifyAll()
+
+    def test_shared_chain_change_applies_all_chains(self):
+        self._expect_full_apply()
+        self._expect_full_apply()
+        self.mox.ReplayAll()
+
+        self.iptables.apply()
+        self.iptables.ipv4['filter'].add_rule('neutron-filter-top',
+                                              '-j DROP', wrap=False)
+        self.iptables.apply()
+        self.mox.VerifyAll()
+
+    def test_failed_restore_applies_all_chains(self):
+        self._expect_full_apply()
+        self.iptables.execute(['iptables-restore', '-n'],
+                              process_input=mox.IgnoreArg(),
+                              root_helper=self.root_helper
+                              ).AndRaise(RuntimeError())
+        self._expect_full_apply()
+        self.mox.ReplayAll()
+
+        self.iptables.apply()
+        self.iptables.ipv4['filter'].add_rule('INPUT', '-j DROP')
+        self.iptables.apply()
+        self.mox.VerifyAll()
+
+
 class IptablesManagerStateLessTestCase(base.BaseTestCase):
 
     def setUp(self):
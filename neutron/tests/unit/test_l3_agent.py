@@ -16,6 +16,7 @@
 #    under the License.
 
 import copy
+import datetime
 
 import mock
 from oslo.config import cfg
@@ -547,6 +548,56 @@ class TestBasicRouterOperations(base.BaseTestCase):
         agent.router_deleted(None, router['id'])
         agent._process_router_delete()
         self.assertFalse(list(agent.removed_routers))
+        update = agent.router_queue.get()
+        self.assertEqual(router['id'], update.router_id)
+        self.assertEqual(l3_agent.PRIORITY_RPC, update.priority)
+        agent._process_router_update(update)
+        self.assertNotIn(router['id'], agent.router_info)
+
+    def test_process_routers_queues_routers(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        self.plugin_api.get_external_network_id.return_value = None
+        stale_id = _uuid()
+        agent.router_info[stale_id] = mock.Mock()
+        router = {'id': _uuid(),
+                  'admin_state_up': True,
+                  'external_gateway_info': {}}
+        agent._process_routers([router], all_routers=True,
+                               priority=l3_agent.PRIORITY_SYNC_ROUTERS_TASK)
+        self.assertEqual(2, len(agent.router_queue))
+        updates = dict((update.router_id, update) for update in
+                       (agent.router_queue.get(), agent.router_queue.get()))
+        self.assertEqual(router, updates[router['id']].router)
+        self.assertIsNone(updates[stale_id].router)
+        self.assertEqual(l3_agent.PRIORITY_SYNC_ROUTERS_TASK,
+                         updates[stale_id].priority)
+
+    def test_process_router_update_adds_router(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = self._prepare_router_data()
+        with mock.patch.object(agent, 'process_router') as process_router:
+            agent.router_queue.add(l3_agent.RouterUpdate(
+                router['id'], l3_agent.PRIORITY_RPC, router=router))
+            agent._process_router_update(agent.router_queue.get())
+        ri = agent.router_info[router['id']]
+        self.assertEqual(router, ri.router)
+        process_router.assert_called_once_with(ri)
+        self.assertEqual(0, len(agent.router_queue))
+
+    def test_process_router_update_failure_sets_fullsync(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent.fullsync = False
+        router = self._prepare_router_data()
+        update = l3_agent.RouterUpdate(router['id'], l3_agent.PRIORITY_RPC,
+                                       router=router)
+        agent.router_queue.add(update)
+        with mock.patch.object(agent, 'process_router',
+                               side_effect=RuntimeError):
+            agent._process_router_update(agent.router_queue.get())
+        self.assertTrue(agent.fullsync)
+        # The router can be processed again
+        agent.router_queue.add(update)
+        self.assertIs(update, agent.router_queue.get())
 
     def testDestroyNamespace(self):
 
@@ -699,3 +750,58 @@ class TestL3AgentEventHandler(base.BaseTestCase):
                 ])
         finally:
             self.external_process_p.start()
+
+
+class TestRouterProcessingQueue(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestRouterProcessingQueue, self).setUp()
+        self.queue = l3_agent.RouterProcessingQueue()
+        self.now = datetime.datetime(2013, 10, 1)
+
+    def _update(self, router_id, priority=l3_agent.PRIORITY_RPC, seconds=0,
+                router=None):
+        return l3_agent.RouterUpdate(
+            router_id, priority,
+            self.now + datetime.timedelta(seconds=seconds), router=router)
+
+    def test_rpc_updates_before_resync(self):
+        self.queue.add(self._update('r1', l3_agent.PRIORITY_SYNC_ROUTERS_TASK))
+        self.queue.add(self._update('r2', l3_agent.PRIORITY_SYNC_ROUTERS_TASK))
+        self.queue.add(self._update('r3'))
+        self.assertEqual(['r3', 'r1', 'r2'],
+                         [self.queue.get().router_id for i in range(3)])
+
+    def test_updates_of_router_are_merged(self):
+        self.queue.add(self._update('r1', seconds=1, router={'v': 1}))
+        self.queue.add(self._update('r1', seconds=2, router={'v': 2}))
+        self.assertEqual(1, len(self.queue))
+        self.assertEqual({'v': 2}, self.queue.get().router)
+
+    def test_newest_state_wins(self):
+        self.queue.add(self._update('r1', seconds=2, router={'v': 2}))
+        # A resync which fetched the router before the notified update
+        self.queue.add(self._update('r1', l3_agent.PRIORITY_SYNC_ROUTERS_TASK,
+                                    seconds=1, router={'v': 1}))
+        update = self.queue.get()
+        self.assertEqual({'v': 2}, update.router)
+        self.assertEqual(l3_agent.PRIORITY_RPC, update.priority)
+
+    def test_merge_raises_priority(self):
+        self.queue.add(self._update('r1', l3_agent.PRIORITY_SYNC_ROUTERS_TASK))
+        self.queue.add(self._update('r2', l3_agent.PRIORITY_SYNC_ROUTERS_TASK))
+        self.queue.add(self._update('r2', seconds=1))
+        self.assertEqual(['r2', 'r1'],
+                         [self.queue.get().router_id for i in range(2)])
+        self.assertEqual(0, len(self.queue))
+
+    def test_update_held_while_router_processed(self):
+        self.queue.add(self._update('r1', router={'v': 1}))
+        self.assertEqual({'v': 1}, self.queue.get().router)
+        self.queue.add(self._update('r1', seconds=1, router={'v': 2}))
+        self.queue.add(self._update('r2'))
+        self.assertEqual('r2', self.queue.get().router_id)
+        self.queue.done('r2')
+        self.queue.done('r1')
+        self.assertEqual({'v': 2}, self.queue.get().router)
+        self.assertEqual(0, len(self.queue))
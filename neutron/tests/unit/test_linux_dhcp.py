@@ -476,6 +476,9 @@ class TestDnsmasq(TestBase):
                                   version=float(2.59))
                 dm.spawn_process()
                 self.assertTrue(mocks['_output_opts_file'].called)
+                self.safe.assert_any_call(
+                    '/dhcp/cccccccc-cccc-cccc-cccc-cccccccccccc/cmdline',
+                    '\n'.join(sorted(expected[5:7]) + expected[7:]))
                 self.execute.assert_called_once_with(expected,
                                                      root_helper='sudo',
                                                      check_exit_code=True)
@@ -678,6 +681,69 @@ tag:tag1,249,%s,%s""".lstrip() % (fake_v6,
                                     mock.call(exp_opt_name, exp_opt_data)])
         self.execute.assert_called_once_with(exp_args, 'sudo')
 
+    def _reload_with_conf_files(self, hosts_changed=False):
+        dm = dhcp.Dnsmasq(self.conf, FakeV4Network(), version=float(2.59))
+        with mock.patch.object(dm, '_make_subnet_interface_ip_map') as ip_map:
+            ip_map.return_value = {}
+            files = {'host': dm._build_hosts(), 'opts': dm._build_opts()}
+            if hosts_changed:
+                files['host'] = ''
+            with mock.patch.object(dm, '_get_value_from_conf_file') as gv:
+                gv.side_effect = files.get
+                with mock.patch.object(dhcp.Dnsmasq, 'active') as active:
+                    active.__get__ = mock.Mock(return_value=True)
+                    with mock.patch.object(dhcp.Dnsmasq, 'pid') as pid:
+                        pid.__get__ = mock.Mock(return_value=5)
+                        dm.reload_allocations()
+        return dm
+
+    def test_reload_allocations_unchanged(self):
+        self._reload_with_conf_files()
+        self.assertFalse(self.safe.called)
+        self.assertFalse(self.execute.called)
+
+    def test_reload_allocations_only_changed_file(self):
+        dm = self._reload_with_conf_files(hosts_changed=True)
+        self.safe.assert_called_once_with(dm.get_conf_file_name('host'),
+                                          dm._build_hosts())
+        self.execute.assert_called_once_with(['kill', '-HUP', 5], 'sudo')
+
+    def _enable_with_conf_files(self, hosts_changed=False,
+                                lease_duration=None):
+        delegate = mock.Mock()
+        delegate.setup.return_value = 'tap0'
+        dm = dhcp.Dnsmasq(self.conf, FakeV4Network(), version=float(2.59),
+                          device_delegate=delegate)
+        with mock.patch.object(dm, '_make_subnet_interface_ip_map') as ip_map:
+            ip_map.return_value = {}
+            files = {'host': dm._build_hosts(), 'opts': dm._build_opts(),
+                     'interface': 'tap0'}
+            if hosts_changed:
+                files['host'] = ''
+            with mock.patch.object(dm, '_get_value_from_conf_file') as gv:
+                gv.side_effect = files.get
+                files['cmdline'] = dm._format_cmdline(*dm._build_cmdline())
+                if lease_duration:
+                    self.conf.set_override('dhcp_lease_duration',
+                                           lease_duration)
+                with mock.patch.object(dhcp.Dnsmasq, 'active') as active:
+                    active.__get__ = mock.Mock(return_value=True)
+                    with mock.patch.object(dm, 'restart') as restart:
+                        dm.enable()
+        return restart
+
+    def test_enable_active_unchanged(self):
+        restart = self._enable_with_conf_files()
+        self.assertFalse(restart.called)
+
+    def test_enable_active_changed(self):
+        restart = self._enable_with_conf_files(hosts_changed=True)
+        restart.assert_called_once_with()
+
+    def test_enable_active_lease_duration_changed(self):
+        restart = self._enable_with_conf_files(lease_duration=240)
+        restart.assert_called_once_with()
+
     def test_make_subnet_interface_ip_map(self):
         with mock.patch('neutron.agent.linux.ip_lib.IPDevice') as ip_dev:
             ip_dev.return_value.addr.list.return_value = [
@@ -0,0 +1,66 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from neutron.agent.linux import ipset_manager
+from neutron.tests import base
+
+
+class TestIpsetManager(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestIpsetManager, self).setUp()
+        self.execute = mock.Mock()
+        self.ipset = ipset_manager.IpsetManager(_execute=self.execute,
+                                                root_helper='sudo')
+
+    def _restored(self):
+        args, kwargs = self.execute.call_args
+        self.assertEqual(['ipset', 'restore', '-exist'], args[0])
+        return kwargs['process_input'].splitlines()
+
+    def test_get_set_name_is_truncated(self):
+        name = ipset_manager.get_set_name('a' * 36, 'IPv6')
+        self.assertEqual(ipset_manager.MAX_SET_NAME_LEN, len(name))
+        self.assertTrue(name.startswith('IPv6aaa'))
+
+    def test_set_members_creates_set(self):
+        self.ipset.set_members('IPv4sg1', 'IPv4', ['10.0.0.1'])
+        self.assertEqual(['create IPv4sg1 hash:ip family inet',
+                          'flush IPv4sg1',
+                          'add IPv4sg1 10.0.0.1'], self._restored())
+        self.assertEqual({'IPv4sg1': set(['10.0.0.1'])}, self.ipset.sets)
+
+    def test_set_members_only_applies_changes(self):
+        self.ipset.set_members('IPv6sg1', 'IPv6', ['fe80::1', 'fe80::2'])
+        self.ipset.set_members('IPv6sg1', 'IPv6', ['fe80::2', 'fe80::3'])
+        self.assertEqual(['add IPv6sg1 fe80::3',
+                          'del IPv6sg1 fe80::1'], self._restored())
+
+    def test_set_members_unchanged_runs_nothing(self):
+        self.ipset.set_members('IPv4sg1', 'IPv4', ['10.0.0.1'])
+        self.execute.reset_mock()
+        self.ipset.set_members('IPv4sg1', 'IPv4', ['10.0.0.1'])
+        self.assertFalse(self.execute.called)
+
+    def test_destroy(self):
+        self.ipset.set_members('IPv4sg1', 'IPv4', [])
+        self.ipset.destroy('IPv4sg1')
+        self.execute.assert_called_with(['ipset', 'destroy', 'IPv4sg1'],
+                                        root_helper='sudo')
+        self.assertEqual({}, self.ipset.sets)
@@ -0,0 +1,129 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import StringIO
+
+import mock
+
+from neutron.agent.linux import ovsdb_monitor
+from neutron.openstack.common import jsonutils
+from neutron.tests import base
+
+HEADINGS = ['row', 'action', 'name', 'ofport', 'external_ids']
+
+
+def _vif_ids(iface_id, mac='fa:16:3e:00:00:01'):
+    return ['map', [['attached-mac', mac], ['iface-id', iface_id]]]
+
+
+def _update(*rows):
+    return jsonutils.dumps({'headings': HEADINGS, 'data': list(rows)}) + '\n'
+
+
+class TestOvsdbMonitor(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestOvsdbMonitor, self).setUp()
+        self.monitor = ovsdb_monitor.OvsdbMonitor('sudo')
+        self.process = mock.Mock()
+        self.process.poll.return_value = None
+        self.popen_p = mock.patch('neutron.common.utils.subprocess_popen',
+                                  return_value=self.process)
+        self.popen = self.popen_p.start()
+        self.addCleanup(self.popen_p.stop)
+        self.spawn_p = mock.patch('eventlet.spawn_n')
+        self.spawn = self.spawn_p.start()
+        self.addCleanup(self.spawn_p.stop)
+        self.monitor.start()
+        # Discard the full resync requested by start()
+        self.monitor.get_changes()
+
+    def _feed(self, *lines):
+        for line in lines:
+            self.monitor._process_line(line)
+
+    def test_start(self):
+        cmd = self.popen.call_args[0][0]
+        self.assertEqual(cmd, ['sudo', 'ovsdb-client', 'monitor', 'Interface',
+                               'name,ofport,external_ids', '--format=json'])
+
+    def test_initial_and_inserted_vifs(self):
+        self._feed(_update(['uuid1', 'initial', 'tap1', 1, _vif_ids('port1')],
+                           ['uuid2', 'initial', 'patch-tun', 2,
+                            ['map', []]]),
+                   _update(['uuid3', 'insert', 'tap3', 3,
+                            _vif_ids('port3')]))
+        self.assertEqual(self.monitor.get_changes(),
+                         {'port1': 'tap1', 'port3': 'tap3'})
+        self.assertEqual(self.monitor.get_changes(), {})
+
+    def test_vif_reported_once_ofport_assigned(self):
+        self._feed(_update(['uuid1', 'insert', 'tap1', ['set', []],
+                            _vif_ids('port1')]))
+        self.assertEqual(self.monitor.get_changes(), {})
+        self._feed(_update(['uuid1', 'old', None, ['set', []], None],
+                           ['', 'new', 'tap1', 5, _vif_ids('port1')]))
+        self.assertEqual(self.monitor.get_changes(), {'port1': 'tap1'})
+
+    def test_deleted_vif(self):
+        self._feed(_update(['uuid1', 'insert', 'tap1', 1, _vif_ids('port1')]),
+                   _update(['uuid1', 'delete', 'tap1', 1, _vif_ids('port1')]),
+                   _update(['uuid2', 'delete', 'tap2', 2, _vif_ids('port2')]))
+        self.assertEqual(self.monitor.get_changes(), {'port1': None})
+
+    def test_changed_iface_id(self):
+        self._feed(_update(['uuid1', 'initial', 'tap1', 1,
+                            _vif_ids('port1')]))
+        self.monitor.get_changes()
+        self._feed(_update(['uuid1', 'old', None, None, _vif_ids('port1')],
+                           ['', 'new', 'tap1', 1, _vif_ids('port2')]))
+        self.assertEqual(self.monitor.get_changes(),
+                         {'port1': None, 'port2': 'tap1'})
+
+    def test_xenserver_vif_requires_resync(self):
+        self._feed(_update(['uuid1', 'insert', 'tap1', 1,
+                            ['map', [['attached-mac', 'fa:16:3e:00:00:01'],
+                                     ['xs-vif-uuid', 'xs1']]]]))
+        self.assertIsNone(self.monitor.get_changes())
+        self.assertEqual(self.monitor.get_changes(), {})
+
+    def test_invalid_output_requires_resync(self):
+        self._feed('garbage\n')
+        self.assertIsNone(self.monitor.get_changes())
+
+    def test_read_stdout(self):
+        self.process.stdout = StringIO.StringIO(
+            _update(['uuid1', 'insert', 'tap1', 1, _vif_ids('port1')]))
+        self.monitor._read_stdout(self.process)
+        self.assertTrue(self.monitor._resync)
+        self.assertEqual(self.monitor._changes, {'port1': 'tap1'})
+
+    def test_exited_monitor_is_respawned(self):
+        self.process.poll.return_value = 1
+        started_at = self.monitor._started_at
+        with mock.patch('time.time', return_value=started_at + 1):
+            self.assertIsNone(self.monitor.get_changes())
+            self.assertEqual(self.popen.call_count, 1)
+        with mock.patch('time.time', return_value=started_at + 30):
+            self.assertIsNone(self.monitor.get_changes())
+            self.assertEqual(self.popen.call_count, 2)
+
+    def test_stop(self):
+        self.monitor.stop()
+        self.assertTrue(self.process.stdout.close.called)
+        self.assertFalse(self.monitor.is_active)
+        self.spawn.assert_called_with(self.process.wait)
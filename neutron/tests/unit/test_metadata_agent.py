@@ -38,6 +38,9 @@ class FakeConf(object):
     nova_metadata_ip = '9.9.9.9'
     nova_metadata_port = 8775
     metadata_proxy_shared_secret = 'secret'
+    metadata_cache_ttl = 5
+    metadata_cache_size = 2
+    metadata_pool_size = 8
 
 
 class TestMetadataProxyHandler(base.BaseTestCase):
@@ -182,6 +185,34 @@ class TestMetadataProxyHandler(base.BaseTestCase):
             self._get_instance_id_helper(headers, ports, networks=['the_id'])
         )
 
+    def test_get_instance_id_cached(self):
+        headers = {'X-Neutron-Network-ID': 'the_id'}
+        self.assertEqual(
+            'device_id',
+            self._get_instance_id_helper(headers, [[{'device_id':
+                                                     'device_id'}]],
+                                         networks=['the_id']))
+        list_ports = self.qclient.return_value.list_ports
+        list_ports.reset_mock()
+        req = mock.Mock(headers=headers)
+        self.assertEqual('device_id', self.handler._get_instance_id(req))
+        self.assertFalse(list_ports.called)
+        self.assertEqual(1, self.handler.instance_cache.hits)
+        self.assertEqual(1, self.handler.instance_cache.misses)
+
+    def test_get_instance_id_no_match_not_cached(self):
+        headers = {'X-Neutron-Network-ID': 'the_id'}
+        self._get_instance_id_helper(headers, [[]], networks=['the_id'])
+        self.assertEqual(0, len(self.handler.instance_cache))
+
+    def test_get_instance_id_reuses_client(self):
+        headers = {'X-Forwarded-For': '192.168.1.1'}
+        self.qclient.return_value.list_ports.return_value = {'ports': []}
+        for router_id in ('r1', 'r2'):
+            headers['X-Neutron-Router-ID'] = router_id
+            self.handler._get_instance_id(mock.Mock(headers=headers))
+        self.assertEqual(1, self.qclient.call_count)
+
     def _proxy_request_test_helper(self, response_code=200, method='GET'):
         hdrs = {'X-Forwarded-For': '8.8.8.8'}
         body = 'body'
@@ -237,6 +268,17 @@ class TestMetadataProxyHandler(base.BaseTestCase):
         with testtools.ExpectedException(Exception):
             self._proxy_request_test_helper(302)
 
+    def test_proxy_request_reuses_connection(self):
+        req = mock.Mock(path_info='/the_path', query_string='',
+                        headers={}, method='GET', body='')
+        with mock.patch('httplib2.Http') as mock_http:
+            mock_http.return_value.request.return_value = (
+                mock.Mock(status=200), 'content')
+            self.handler._proxy_request('the_id', req)
+            self.handler._proxy_request('the_id', req)
+        mock_http.assert_called_once_with()
+        self.assertEqual(2, mock_http.return_value.request.call_count)
+
     def test_sign_instance_id(self):
         self.assertEqual(
             self.handler._sign_instance_id('foo'),
@@ -244,6 +286,42 @@ class TestMetadataProxyHandler(base.BaseTestCase):
         )
 
 
+class TestInstanceCache(base.BaseTestCase):
+    def setUp(self):
+        super(TestInstanceCache, self).setUp()
+        self.time_p = mock.patch('time.time', return_value=100)
+        self.time = self.time_p.start()
+        self.addCleanup(self.time_p.stop)
+        self.cache = agent.InstanceCache(5, 2)
+
+    def test_get(self):
+        self.cache.set(('net', '10.0.0.2'), 'vm1')
+        self.assertEqual('vm1', self.cache.get(('net', '10.0.0.2')))
+        self.assertIsNone(self.cache.get(('net', '10.0.0.3')))
+        self.assertEqual(0.5, self.cache.hit_rate())
+
+    def test_get_expired(self):
+        self.cache.set(('net', '10.0.0.2'), 'vm1')
+        self.time.return_value = 105
+        self.assertIsNone(self.cache.get(('net', '10.0.0.2')))
+        self.assertEqual(0, len(self.cache))
+
+    def test_least_recently_used_dropped(self):
+        self.cache.set(('net', '10.0.0.2'), 'vm1')
+        self.cache.set(('net', '10.0.0.3'), 'vm2')
+        self.cache.get(('net', '10.0.0.2'))
+        self.cache.set(('net', '10.0.0.4'), 'vm3')
+        self.assertIsNone(self.cache.get(('net', '10.0.0.3')))
+        self.assertEqual('vm1', self.cache.get(('net', '10.0.0.2')))
+        self.assertEqual('vm3', self.cache.get(('net', '10.0.0.4')))
+
+    def test_disabled(self):
+        cache = agent.InstanceCache(0, 2)
+        cache.set(('net', '10.0.0.2'), 'vm1')
+        self.assertIsNone(cache.get(('net', '10.0.0.2')))
+        self.assertEqual(0.0, cache.hit_rate())
+
+
 class TestUnixDomainHttpProtocol(base.BaseTestCase):
     def test_init_empty_client(self):
         u = agent.UnixDomainHttpProtocol(mock.Mock(), '', mock.Mock())
@@ -279,6 +357,25 @@ class TestUnixDomainWSGIServer(base.BaseTestCase):
                 self.eventlet.listen.return_value
             )
 
+    def test_start_workers(self):
+        server = agent.UnixDomainWSGIServer('test', workers=2)
+        mock_app = mock.Mock()
+        with mock.patch.object(agent.service,
+                               'ProcessLauncher') as launcher:
+            with mock.patch.object(server, 'pool') as pool:
+                server.start(mock_app, '/the/path')
+                self.assertFalse(pool.spawn_n.called)
+                launcher.return_value.launch_service.assert_called_once_with(
+                    mock.ANY, workers=2)
+                worker = launcher.return_value.launch_service.call_args[0][0]
+                worker.start()
+                self.eventlet.spawn.assert_called_once_with(
+                    server._run, mock_app, self.eventlet.listen.return_value)
+                worker.wait()
+                self.eventlet.spawn.return_value.wait.assert_called_once_with()
+            server.wait()
+            launcher.return_value.wait.assert_called_once_with()
+
     def test_run(self):
         with mock.patch.object(agent, 'logging') as logging:
             self.server._run('app', 'sock')
@@ -361,7 +458,8 @@ class TestUnixDomainMetadataProxy(base.BaseTestCase):
                         isdir.assert_called_once_with('/the')
                         makedirs.assert_called_once_with('/the', 0o755)
                         server.assert_has_calls([
-                            mock.call('neutron-metadata-agent'),
+                            mock.call('neutron-metadata-agent',
+                                      workers=self.cfg.CONF.metadata_workers),
                             mock.call().start(handler.return_value,
                                               '/the/path'),
                             mock.call().wait()]
@@ -122,6 +122,16 @@ class NeutronManagerTestCase(base.BaseTestCase):
         cfg.CONF.set_override('dhcp_agents_per_network', -1)
         self.assertIsNotNone(validate_post_plugin_load())
 
+    def test_post_plugin_validation_heartbeat_batch_interval(self):
+        cfg.CONF.import_opt('agent_heartbeat_batch_interval',
+                            'neutron.db.agents_db')
+
+        cfg.CONF.set_override('agent_down_time', 9)
+        cfg.CONF.set_override('agent_heartbeat_batch_interval', 4)
+        self.assertIsNone(validate_post_plugin_load())
+        cfg.CONF.set_override('agent_heartbeat_batch_interval', 9)
+        self.assertIsNotNone(validate_post_plugin_load())
+
     def test_pre_plugin_validation(self):
         self.assertIsNotNone(validate_pre_plugin_load())
         cfg.CONF.set_override('core_plugin', 'dummy.plugin')
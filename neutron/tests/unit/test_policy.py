@@ -464,6 +464,60 @@ class NeutronPolicyTestCase(base.BaseTestCase):
     def test_enforce_tenant_id_check_invalid_parent_resource_raises(self):
         self._test_enforce_tenant_id_raises('tenant_id:%(foobaz_tenant_id)s')
 
+    def test_collection_checker_target_check(self):
+        checker = policy.CollectionChecker(self.context)
+        self.assertTrue(checker.check('get_network', {'tenant_id': 'fake'}))
+        self.assertTrue(checker.check('get_network',
+                                      {'tenant_id': 'somebody_else',
+                                       'shared': True}))
+        self.assertFalse(checker.check('get_network',
+                                       {'tenant_id': 'somebody_else',
+                                        'shared': False}))
+
+    def test_collection_checker_role_check(self):
+        self.rules['get_network:secret'] = common_policy.parse_rule(
+            'rule:admin_only')
+        target = {'tenant_id': 'fake'}
+        checker = policy.CollectionChecker(self.context)
+        self.assertFalse(checker.check('get_network:secret', target))
+        admin_context = context.get_admin_context()
+        admin_checker = policy.CollectionChecker(admin_context)
+        self.assertTrue(admin_checker.check('get_network:secret', target))
+
+    def test_collection_checker_role_decision_is_cached(self):
+        self.rules['get_network:secret'] = common_policy.parse_rule(
+            'rule:admin_only')
+        checker = policy.CollectionChecker(self.context)
+        self.assertFalse(checker.check('get_network:secret', {}))
+        self.assertFalse(policy._ROLE_DECISIONS[('get_network:secret',
+                                                 frozenset(['user']))])
+        # Rules looking at the target are never decided by role
+        checker.check('get_network', {'tenant_id': 'fake'})
+        self.assertNotIn(('get_network', frozenset(['user'])),
+                         policy._ROLE_DECISIONS)
+
+    def test_collection_checker_compiles_rules_once(self):
+        checker = policy.CollectionChecker(self.context)
+        with mock.patch.object(policy, '_compile_rule',
+                               wraps=policy._compile_rule) as compile_rule:
+            checker.check('get_network', {'tenant_id': 'fake'})
+            self.assertTrue(compile_rule.called)
+            compile_rule.reset_mock()
+            checker.check('get_network', {'tenant_id': 'other'})
+            self.assertFalse(compile_rule.called)
+
+    def test_collection_checker_follows_new_rules(self):
+        checker = policy.CollectionChecker(self.context)
+        self.assertFalse(checker.check('get_network', {'tenant_id': 'x'}))
+        self.rules['get_network'] = common_policy.parse_rule('@')
+        checker = policy.CollectionChecker(self.context)
+        self.assertTrue(checker.check('get_network', {'tenant_id': 'x'}))
+
+    def test_collection_checker_check_if_exists_raises(self):
+        checker = policy.CollectionChecker(self.context)
+        self.assertRaises(exceptions.PolicyRuleNotFound,
+                          checker.check_if_exists, 'get_network:nope', {})
+
     def test_get_roles_context_is_admin_rule_missing(self):
         rules = dict((k, common_policy.parse_rule(v)) for k, v in {
             "some_other_rule": "role:admin",
@@ -9,6 +9,8 @@ from neutron.common import config
 from neutron.common import exceptions
 from neutron import context
 from neutron.db import api as db
+from neutron.db import db_base_plugin_v2
+from neutron.db import models_v2
 from neutron.db import quota_db
 from neutron import manager
 from neutron.plugins.linuxbridge.db import l2network_db_v2
@@ -384,3 +386,112 @@ class TestDbQuotaDriver(base.BaseTestCase):
             get_tenant_quotas.assert_called_once_with(ctx,
                                                       default_quotas,
                                                       target_tenant)
+
+
+class TestDbQuotaUsages(base.BaseTestCase):
+    """Test the usages tracked by neutron.db.quota_db.DbQuotaDriver."""
+
+    def setUp(self):
+        super(TestDbQuotaUsages, self).setUp()
+        self.config(track_quota_usage=True, group='QUOTAS')
+        self.plugin = db_base_plugin_v2.NeutronDbPluginV2()
+        self.addCleanup(db.clear_db)
+        self.context = context.get_admin_context()
+        self.driver = quota_db.DbQuotaDriver()
+        self.quotas = quota.QuotaEngine(self.driver)
+        self.quotas.register_resource_by_name('network')
+        self.count = mock.patch.object(
+            self.quotas.resources['network'], 'count',
+            side_effect=quota._count_resource).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def _create_network(self, tenant_id='tenant'):
+        return self.plugin.create_network(
+            self.context, {'network': {'name': 'net',
+                                       'admin_state_up': True,
+                                       'shared': False,
+                                       'tenant_id': tenant_id}})
+
+    def _create_subnet(self, network, cidr='10.0.0.0/24'):
+        return self.plugin.create_subnet(
+            self.context, {'subnet': {
+                'name': 'subnet',
+                'network_id': network['id'],
+                'tenant_id': network['tenant_id'],
+                'ip_version': 4,
+                'cidr': cidr,
+                'enable_dhcp': False,
+                'gateway_ip': attributes.ATTR_NOT_SPECIFIED,
+                'allocation_pools': attributes.ATTR_NOT_SPECIFIED,
+                'dns_nameservers': attributes.ATTR_NOT_SPECIFIED,
+                'host_routes': attributes.ATTR_NOT_SPECIFIED}})
+
+    def _usage(self, tenant_id='tenant', resource='network'):
+        return self.quotas.count(self.context, resource, self.plugin,
+                                 resource + 's', tenant_id)
+
+    def test_usage_counted_once(self):
+        self._create_network()
+        self._create_network()
+        self.assertEqual(2, self._usage())
+        self.assertEqual(2, self._usage())
+        self.assertEqual(1, self.count.call_count)
+
+    def test_usage_updated_by_create_and_delete(self):
+        self._create_network()
+        self.assertEqual(1, self._usage())
+        network = self._create_network()
+        self._create_network(tenant_id='other')
+        self.assertEqual(2, self._usage())
+        self.plugin.delete_network(self.context, network['id'])
+        self.assertEqual(1, self._usage())
+        self.assertEqual(1, self.count.call_count)
+
+    def test_usage_not_updated_by_rolled_back_create(self):
+        self.assertEqual(0, self._usage())
+        with testtools.ExpectedException(RuntimeError):
+            with self.context.session.begin():
+                self._create_network()
+                self.context.session.flush()
+                raise RuntimeError()
+        self.assertEqual(0, self._usage())
+        self.assertEqual(1, self.count.call_count)
+
+    def test_network_delete_keeps_other_tenant_usages_synced(self):
+        self.quotas.register_resource_by_name('subnet')
+        count = mock.patch.object(
+            self.quotas.resources['subnet'], 'count',
+            side_effect=quota._count_resource).start()
+        network = self._create_network()
+        self._create_subnet(network)
+        self._create_subnet(self._create_network(tenant_id='other'),
+                            cidr='10.0.1.0/24')
+        self.assertEqual(1, self._usage(resource='subnet'))
+        self.assertEqual(1, self._usage('other', resource='subnet'))
+        self.plugin.delete_network(self.context, network['id'])
+        self.assertEqual(0, self._usage(resource='subnet'))
+        self.assertEqual(1, self._usage('other', resource='subnet'))
+        self.assertEqual(2, count.call_count)
+
+    def test_usage_recounted_after_bulk_delete(self):
+        self._create_network()
+        self.assertEqual(1, self._usage())
+        self.context.session.query(models_v2.Network).delete()
+        self.assertEqual(0, self._usage())
+        self.assertEqual(2, self.count.call_count)
+
+    def test_usage_recounted_after_sync_interval(self):
+        self.config(quota_usage_sync_interval=0, group='QUOTAS')
+        self._create_network()
+        self.assertEqual(1, self._usage())
+        self.assertEqual(1, self._usage())
+        self.assertEqual(2, self.count.call_count)
+
+    def test_usage_not_tracked(self):
+        self.config(track_quota_usage=False, group='QUOTAS')
+        self._create_network()
+        self.assertEqual(1, self._usage())
+        self.assertEqual(1, self._usage())
+        self.assertEqual(2, self.count.call_count)
+        self.assertEqual(
+            [], self.context.session.query(quota_db.QuotaUsage).all())
@@ -16,6 +16,7 @@
 #    under the License.
 
 from contextlib import nested
+import copy
 
 import mock
 from mock import call
@@ -50,6 +51,8 @@ class SGServerRpcCallBackMixinTestCase(test_sg.SecurityGroupDBTestCase):
     def setUp(self):
         super(SGServerRpcCallBackMixinTestCase, self).setUp()
         self.rpc = FakeSGCallback()
+        sg_db_rpc.SECURITY_GROUP_CACHE.clear()
+        self.addCleanup(sg_db_rpc.SECURITY_GROUP_CACHE.clear)
 
     def test_security_group_rules_for_devices_ipv4_ingress(self):
         fake_prefix = test_fw.FAKE_PREFIX['IPv4']
@@ -393,11 +396,161 @@ class SGServerRpcCallBackMixinTestCase(test_sg.SecurityGroupDBTestCase):
                 self._delete('ports', port_id1)
                 self._delete('ports', port_id2)
 
+    def _rules_for_port(self, port):
+        # The fake callback updates the port dict it hands out
+        self.rpc.devices = {port['id']: copy.deepcopy(port)}
+        ctx = context.get_admin_context()
+        ports_rpc = self.rpc.security_group_rules_for_devices(
+            ctx, devices=[port['id']])
+        return ports_rpc[port['id']]['security_group_rules']
+
+    def _source_ips(self, port):
+        return sorted(rule['source_ip_prefix']
+                      for rule in self._rules_for_port(port)
+                      if rule.get('remote_group_id'))
+
+    def test_security_group_rules_for_devices_cached_members(self):
+        cfg.CONF.set_override('security_group_cache_ttl', 60)
+        with self.network() as n:
+            with nested(self.subnet(n),
+                        self.security_group()) as (subnet_v4, sg1):
+                sg1_id = sg1['security_group']['id']
+                rule1 = self._build_security_group_rule(
+                    sg1_id, 'ingress', 'tcp', '22', '22',
+                    remote_group_id=sg1_id)
+                res = self._create_security_group_rule(
+                    self.fmt,
+                    {'security_group_rules': [rule1['security_group_rule']]})
+                self.assertEqual(res.status_int, 201)
+                ports = []
+                for i in range(3):
+                    res = self._create_port(self.fmt, n['network']['id'],
+                                            security_groups=[sg1_id])
+                    ports.append(self.deserialize(self.fmt, res)['port'])
+                self.assertEqual(self._source_ips(ports[0]),
+                                 ['10.0.0.3/32', '10.0.0.4/32'])
+                # Members are served from the cache until invalidated
+                self._delete('ports', ports[2]['id'])
+                self.assertEqual(self._source_ips(ports[0]),
+                                 ['10.0.0.3/32', '10.0.0.4/32'])
+                sg_db_rpc.SECURITY_GROUP_CACHE.invalidate('members',
+                                                          [sg1_id])
+                self.assertEqual(self._source_ips(ports[0]),
+                                 ['10.0.0.3/32'])
+                self._delete('ports', ports[1]['id'])
+                self._delete('ports', ports[0]['id'])
+
+    def test_security_group_rules_for_devices_new_rule_reloads_group(self):
+        with self.network() as n:
+            with nested(self.subnet(n),
+                        self.security_group()) as (subnet_v4, sg1):
+                sg1_id = sg1['security_group']['id']
+                res = self._create_port(self.fmt, n['network']['id'],
+                                        security_groups=[sg1_id])
+                port = self.deserialize(self.fmt, res)['port']
+                self.assertEqual(len(self._rules_for_port(port)), 2)
+                rule1 = self._build_security_group_rule(
+                    sg1_id, 'ingress', 'tcp', '22', '22')
+                res = self._create_security_group_rule(
+                    self.fmt,
+                    {'security_group_rules': [rule1['security_group_rule']]})
+                self.assertEqual(res.status_int, 201)
+                self.assertEqual(len(self._rules_for_port(port)), 3)
+                self._delete('ports', port['id'])
+
 
 class SGServerRpcCallBackMixinTestCaseXML(SGServerRpcCallBackMixinTestCase):
     fmt = 'xml'
 
 
+class SecurityGroupCacheTestCase(base.BaseTestCase):
+    def setUp(self):
+        super(SecurityGroupCacheTestCase, self).setUp()
+        self.cache = sg_db_rpc.SecurityGroupCache()
+        cfg.CONF.set_override('security_group_cache_ttl', 60)
+        self.addCleanup(cfg.CONF.reset)
+
+    def test_get_unexpired_entries(self):
+        with mock.patch('time.time', return_value=1000):
+            self.cache.set('members', {'sg1': 'ips1', 'sg2': 'ips2'},
+                           self.cache.generation)
+        with mock.patch('time.time', return_value=1059):
+            self.assertEqual(self.cache.get('members', ['sg1', 'sg3']),
+                             {'sg1': 'ips1'})
+        with mock.patch('time.time', return_value=1060):
+            self.assertEqual(self.cache.get('members', ['sg1']), {})
+
+    def test_invalidate(self):
+        generation = self.cache.generation
+        self.cache.set('rules', {'sg1': 'rules1', 'sg2': 'rules2'},
+                       generation)
+        self.cache.invalidate('rules', ['sg1'])
+        self.assertEqual(self.cache.get('rules', ['sg1', 'sg2']),
+                         {'sg2': 'rules2'})
+        # A load started before the invalidation is not cached
+        self.cache.set('rules', {'sg1': 'stale'}, generation)
+        self.assertEqual(self.cache.get('rules', ['sg1']), {})
+
+    def test_disabled(self):
+        cfg.CONF.set_override('security_group_cache_ttl', 0)
+        self.cache.set('rules', {'sg1': 'rules1'}, self.cache.generation)
+        self.assertEqual(self.cache.get('rules', ['sg1']), {})
+
+
+class SGServerRpcMixinCacheTestCase(base.BaseTestCase):
+    def setUp(self):
+        super(SGServerRpcMixinCacheTestCase, self).setUp()
+        self.mixin = sg_db_rpc.SecurityGroupServerRpcMixin()
+        self.mixin.notifier = mock.Mock()
+        invalidate_p = mock.patch.object(sg_db_rpc.SECURITY_GROUP_CACHE,
+                                         'invalidate')
+        self.invalidate = invalidate_p.start()
+        self.addCleanup(invalidate_p.stop)
+
+    def test_member_updated_invalidates_members(self):
+        port = {'device_owner': 'compute:nova',
+                ext_sg.SECURITYGROUPS: ['sg1']}
+        self.mixin.notify_security_groups_member_updated(None, port)
+        self.invalidate.assert_called_once_with('members', ['sg1'])
+
+    def test_security_group_change_invalidates_old_groups(self):
+        original_port = {'fixed_ips': [], ext_sg.SECURITYGROUPS: ['sg1']}
+        updated_port = {'fixed_ips': [], 'device_owner': 'compute:nova',
+                        ext_sg.SECURITYGROUPS: ['sg2']}
+        self.assertTrue(self.mixin.is_security_group_member_updated(
+            None, original_port, updated_port))
+        self.invalidate.assert_has_calls([call('members', ['sg1']),
+                                          call('members', ['sg2'])])
+
+    def test_rule_deleted_invalidates_rules(self):
+        with nested(
+            mock.patch.object(sg_db_rpc.sg_db.SecurityGroupDbMixin,
+                              'get_security_group_rule',
+                              return_value={'security_group_id': 'sg1'}),
+            mock.patch.object(sg_db_rpc.sg_db.SecurityGroupDbMixin,
+                              'delete_security_group_rule')):
+            self.mixin.delete_security_group_rule(None, 'rule1')
+        self.invalidate.assert_called_once_with('rules', ['sg1'])
+
+    def test_rule_deleted_after_port_rules_selected(self):
+        rpc = sg_db_rpc.SecurityGroupServerRpcCallbackMixin()
+        ports = {'port1': {'security_group_rules': []}}
+        rule = {'direction': 'ingress', 'ethertype': 'IPv4'}
+        with nested(
+            mock.patch.object(rpc, '_select_rules_for_ports',
+                              return_value=[('port1', 'sg1', 'rule1'),
+                                            ('port1', 'sg1', 'rule2')]),
+            mock.patch.object(rpc,
+                              '_select_rules_for_security_groups',
+                              return_value={'sg1': {'rule1': rule}}),
+            mock.patch.object(rpc, '_apply_provider_rule'),
+            mock.patch.object(rpc,
+                              '_convert_remote_group_id_to_ip_prefix',
+                              side_effect=lambda context, ports: ports)):
+            ports = rpc._security_group_rules_for_ports(None, ports)
+        self.assertEqual([rule], ports['port1']['security_group_rules'])
+
+
 class SGAgentRpcCallBackMixinTestCase(base.BaseTestCase):
     def setUp(self):
         super(SGAgentRpcCallBackMixinTestCase, self).setUp()
@@ -1114,6 +1267,9 @@ class TestSecurityGroupAgentWithIptables(base.BaseTestCase):
             'firewall_driver',
             self.FIREWALL_DRIVER,
             group='SECURITYGROUP')
+        # Check the whole ruleset of each apply
+        cfg.CONF.set_override('iptables_incremental_apply', False,
+                              group='AGENT')
         self.addCleanup(mock.patch.stopall)
         self.addCleanup(self.mox.UnsetStubs)
 
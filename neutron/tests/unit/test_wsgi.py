@@ -28,6 +28,7 @@ import webob.exc
 from neutron.api.v2 import attributes
 from neutron.common import constants
 from neutron.common import exceptions as exception
+from neutron.openstack.common import jsonutils
 from neutron.tests import base
 from neutron import wsgi
 
@@ -588,6 +589,33 @@ class JSONDictSerializerTest(base.BaseTestCase):
 
         self.assertEqual(result, expected_json)
 
+    def test_iter_serialize(self):
+        input_dict = {'servers': ({'id': i} for i in range(3)),
+                      'servers_links': [{'rel': 'next'}]}
+        serializer = wsgi.JSONDictSerializer()
+        result = ''.join(serializer.iter_serialize(input_dict))
+
+        self.assertEqual({'servers': [{'id': 0}, {'id': 1}, {'id': 2}],
+                          'servers_links': [{'rel': 'next'}]},
+                         jsonutils.loads(result))
+
+    def test_iter_serialize_matches_serialize(self):
+        input_dict = dict(servers=[dict(a=(2, u'\u7f51\u7edc')), {}],
+                          count=2)
+        serializer = wsgi.JSONDictSerializer()
+
+        self.assertEqual(serializer.serialize(input_dict),
+                         ''.join(serializer.iter_serialize(input_dict)))
+
+    def test_iter_serialize_chunks(self):
+        serializer = wsgi.JSONDictSerializer()
+        serializer.chunk_size = 10
+        chunks = list(serializer.iter_serialize(
+            {'servers': ['server-%d' % i for i in range(10)]}))
+
+        self.assertTrue(len(chunks) > 1)
+        self.assertTrue(all(len(chunk) >= 10 for chunk in chunks[:-1]))
+
 
 class TextDeserializerTest(base.BaseTestCase):
 
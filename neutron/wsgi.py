@@ -24,6 +24,7 @@ import socket
 import ssl
 import sys
 import time
+import types
 from xml.etree import ElementTree as etree
 from xml.parsers import expat
 
@@ -332,11 +333,53 @@ class DictSerializer(ActionDispatcher):
 class JSONDictSerializer(DictSerializer):
     """Default JSON request body serialization."""
 
+    # Minimum size of the pieces of body produced by iter_serialize
+    chunk_size = 65536
+
     def default(self, data):
         def sanitizer(obj):
             return unicode(obj)
         return jsonutils.dumps(data, default=sanitizer)
 
+    def iter_serialize(self, data):
+        """Yield the serialization of data in chunks.
+
+        Lists and generators found in the values of a dict are encoded
+        one element at a time, so the whole body is never held in memory
+        and lazily built collections are only built while being sent.
+        """
+        chunks = []
+        size = 0
+        for chunk in self._iter_encode(data):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= self.chunk_size:
+                yield ''.join(chunks)
+                chunks = []
+                size = 0
+        if chunks:
+            yield ''.join(chunks)
+
+    def _iter_encode(self, data):
+        if not isinstance(data, dict):
+            yield self.default(data)
+            return
+        yield '{'
+        for i, (key, value) in enumerate(data.iteritems()):
+            if i:
+                yield ', '
+            yield '%s: ' % self.default(key)
+            if isinstance(value, (list, types.GeneratorType)):
+                yield '['
+                for j, item in enumerate(value):
+                    if j:
+                        yield ', '
+                    yield self.default(item)
+                yield ']'
+            else:
+                yield self.default(value)
+        yield '}'
+
 
 class XMLDictSerializer(DictSerializer):
 
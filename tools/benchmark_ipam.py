@@ -0,0 +1,83 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure IP allocations per second of the IPAM backends.
+
+Usage: python tools/benchmark_ipam.py [allocations] [sql_connection]
+
+Every allocation runs in its own transaction, as create_port does. The
+default database is an in-memory sqlite database.
+"""
+
+import sys
+import time
+
+from oslo.config import cfg
+
+from neutron.api.v2 import attributes
+from neutron.common import config  # noqa
+from neutron import context
+from neutron.db import api as db
+from neutron.db import db_base_plugin_v2
+from neutron.db import ipam
+
+BACKENDS = ['neutron.db.ipam.RangeIpamBackend',
+            'neutron.db.ipam.BitmapIpamBackend']
+CIDRS = ['10.0.0.0/16', '10.1.0.0/20']
+
+
+def _create_subnet(plugin, ctx, cidr):
+    network = plugin.create_network(ctx, {'network': {
+        'name': 'bench', 'admin_state_up': True, 'shared': False,
+        'tenant_id': 'bench'}})
+    return plugin.create_subnet(ctx, {'subnet': {
+        'network_id': network['id'], 'cidr': cidr, 'ip_version': 4,
+        'name': 'bench', 'tenant_id': 'bench', 'enable_dhcp': True,
+        'gateway_ip': attributes.ATTR_NOT_SPECIFIED,
+        'allocation_pools': attributes.ATTR_NOT_SPECIFIED,
+        'dns_nameservers': attributes.ATTR_NOT_SPECIFIED,
+        'host_routes': attributes.ATTR_NOT_SPECIFIED}})
+
+
+def run(backend, cidr, allocations):
+    cfg.CONF.set_override('ipam_backend', backend)
+    plugin = db_base_plugin_v2.NeutronDbPluginV2()
+    ctx = context.get_admin_context()
+    subnet = _create_subnet(plugin, ctx, cidr)
+    start = time.time()
+    for i in xrange(allocations):
+        with ctx.session.begin(subtransactions=True):
+            plugin._generate_ip(ctx, [subnet])
+    elapsed = time.time() - start
+    db.clear_db()
+    return allocations / elapsed
+
+
+def main(argv):
+    allocations = int(argv[1]) if len(argv) > 1 else 2000
+    if len(argv) > 2:
+        cfg.CONF.set_override('connection', argv[2], 'database')
+    cfg.CONF(args=[], project='neutron')
+    for cidr in CIDRS:
+        for backend in BACKENDS:
+            rate = run(backend, cidr, allocations)
+            print('%-12s %-40s %10.1f allocations/s' %
+                  (cidr, ipam.get_backend().__class__.__name__, rate))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,125 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure the policy checks of GET /v2.0/ports.
+
+Usage: python tools/benchmark_list_ports.py [ports] [policy_file]
+
+The plugin returns the same in-memory ports on every call, so only the
+API layer is measured: the authZ filtering of the items and the policy
+checks on the visibility of their attributes. Each run lists the ports
+as an admin and as the tenant owning half of them, once with a policy
+check per item and attribute as before, and once through a
+CollectionChecker as the controller does now.
+"""
+
+import os
+import sys
+import time
+
+from oslo.config import cfg
+
+from neutron.api.v2 import attributes
+from neutron.api.v2 import base
+from neutron.common import config  # noqa
+from neutron import context
+from neutron.extensions import portbindings
+from neutron.openstack.common import uuidutils
+from neutron import policy
+from neutron import wsgi
+
+REQUESTS = 5
+
+
+class BenchmarkPlugin(object):
+
+    def __init__(self, ports):
+        self.ports = ports
+
+    def get_ports(self, context, filters=None, fields=None):
+        return [dict(port) for port in self.ports]
+
+
+def _create_ports(count):
+    ports = []
+    for i in xrange(count):
+        ports.append({'id': uuidutils.generate_uuid(),
+                      'name': '',
+                      'network_id': 'bench-net',
+                      'tenant_id': 'bench-%d' % (i % 2),
+                      'admin_state_up': True,
+                      'status': 'ACTIVE',
+                      'mac_address': 'fa:16:3e:%02x:%02x:%02x' %
+                                     (i >> 16, (i >> 8) & 255, i & 255),
+                      'fixed_ips': [{'subnet_id': 'bench-subnet',
+                                     'ip_address': '10.0.%d.%d' %
+                                                   (i >> 8, i & 255)}],
+                      'device_id': 'vm%d' % i,
+                      'device_owner': 'compute:nova',
+                      portbindings.VIF_TYPE: portbindings.VIF_TYPE_OVS,
+                      portbindings.HOST_ID: 'compute%d' % (i % 100),
+                      portbindings.CAPABILITIES: {
+                          portbindings.CAP_PORT_FILTER: True}})
+    return ports
+
+
+def _list_per_item(controller, ctx):
+    """List the ports with the per item policy checks used before."""
+    obj_list = controller._plugin.get_ports(ctx)
+    obj_list = [obj for obj in obj_list
+                if policy.check(ctx, 'get_port', obj)]
+    return {'ports': [controller._view(ctx, obj) for obj in obj_list]}
+
+
+def run(ctx, list_func):
+    request = wsgi.Request.blank('/v2.0/ports',
+                                 environ={'neutron.context': ctx})
+    count = 0
+    start = time.time()
+    for i in xrange(REQUESTS):
+        # The controller builds the views while they are serialized
+        count = len(list(list_func(request)['ports']))
+    elapsed = time.time() - start
+    return REQUESTS / elapsed, count
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 5000
+    policy_file = (argv[2] if len(argv) > 2 else
+                   os.path.join(os.path.dirname(__file__), os.pardir,
+                                'etc', 'policy.json'))
+    cfg.CONF(args=[], project='neutron')
+    cfg.CONF.set_override('policy_file', os.path.abspath(policy_file))
+    attributes.RESOURCE_ATTRIBUTE_MAP['ports'].update(
+        portbindings.EXTENDED_ATTRIBUTES_2_0['ports'])
+    plugin = BenchmarkPlugin(_create_ports(count))
+    controller = base.Controller(plugin, 'ports', 'port',
+                                 attributes.RESOURCE_ATTRIBUTE_MAP['ports'])
+    for name, ctx in (('admin', context.get_admin_context()),
+                      ('tenant', context.Context('user', 'bench-0',
+                                                 roles=['member']))):
+        for mode, list_func in (
+                ('per item', lambda request: _list_per_item(
+                    controller, request.context)),
+                ('collection', controller.index)):
+            rate, listed = run(ctx, list_func)
+            print('%5d ports  %-6s  %-10s %8.2f requests/s  %d listed' %
+                  (count, name, mode, rate, listed))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,191 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure the metadata requests per second served by the metadata agent.
+
+Usage: python tools/benchmark_metadata_agent.py [instances] [workers]
+
+Each instance boots at the same time and requests the metadata paths
+read by cloud-init, one connection per request, through the UNIX domain
+socket of the agent as the namespace proxy does. Neutron is replaced by
+a client answering list_ports after NEUTRON_LATENCY seconds, and Nova by
+an HTTP server answering every request. Each run is made with and
+without the instance cache, by the agent process alone and by workers.
+"""
+
+import httplib
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+
+import eventlet
+from oslo.config import cfg
+
+from neutron.agent.metadata import agent
+from neutron.common import config  # noqa
+
+NEUTRON_LATENCY = 0.02
+ROUTER_ID = 'bench-router'
+CLOUD_INIT_PATHS = ['/',
+                    '/2009-04-04/meta-data/',
+                    '/2009-04-04/meta-data/instance-id',
+                    '/2009-04-04/meta-data/ami-launch-index',
+                    '/2009-04-04/meta-data/hostname',
+                    '/2009-04-04/meta-data/local-hostname',
+                    '/2009-04-04/meta-data/local-ipv4',
+                    '/2009-04-04/meta-data/public-ipv4',
+                    '/2009-04-04/meta-data/public-keys/',
+                    '/2009-04-04/meta-data/public-keys/0/openssh-key',
+                    '/2009-04-04/meta-data/placement/availability-zone',
+                    '/2009-04-04/meta-data/block-device-mapping/',
+                    '/2009-04-04/meta-data/security-groups',
+                    '/2009-04-04/user-data',
+                    '/openstack/latest/meta_data.json',
+                    '/openstack/latest/user_data']
+
+
+class FakeNeutronClient(object):
+
+    def list_ports(self, **kwargs):
+        eventlet.sleep(NEUTRON_LATENCY)
+        if 'device_id' in kwargs:
+            return {'ports': [{'network_id': 'bench-net'}]}
+        address = kwargs['fixed_ips'][0].split('=', 1)[1]
+        return {'ports': [{'device_id': 'vm-%s' % address}]}
+
+    def get_auth_info(self):
+        return {}
+
+
+class BenchmarkProxyHandler(agent.MetadataProxyHandler):
+
+    def _get_neutron_client(self):
+        return FakeNeutronClient()
+
+
+def nova_app(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [environ.get('HTTP_X_INSTANCE_ID', '')]
+
+
+class UnixHTTPConnection(httplib.HTTPConnection):
+
+    def __init__(self, path):
+        httplib.HTTPConnection.__init__(self, 'localhost')
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+def _fork(func, *args):
+    pid = os.fork()
+    if pid == 0:
+        try:
+            func(*args)
+        finally:
+            os._exit(0)
+    return pid
+
+
+def _stop(pid):
+    os.kill(pid, signal.SIGTERM)
+    os.waitpid(pid, 0)
+
+
+def serve_nova(sock):
+    eventlet.wsgi.server(sock, nova_app, log=open(os.devnull, 'w'))
+
+
+def serve_metadata(socket_path, workers):
+    server = agent.UnixDomainWSGIServer('bench', workers=workers)
+    server.start(BenchmarkProxyHandler(cfg.CONF), socket_path)
+    server.wait()
+
+
+def boot_instance(socket_path, address):
+    for path in CLOUD_INIT_PATHS:
+        conn = UnixHTTPConnection(socket_path)
+        conn.request('GET', path, headers={'X-Forwarded-For': address,
+                                           'X-Neutron-Router-ID': ROUTER_ID})
+        response = conn.getresponse()
+        response.read()
+        conn.close()
+        if response.status != 200:
+            raise Exception('%s returned %d' % (path, response.status))
+
+
+def _wait_for_socket(socket_path):
+    for i in xrange(100):
+        try:
+            UnixHTTPConnection(socket_path).connect()
+            return
+        except socket.error:
+            eventlet.sleep(0.1)
+    raise Exception('The metadata agent did not start')
+
+
+def run(socket_path, instances, workers, cache_ttl):
+    cfg.CONF.set_override('metadata_cache_ttl', cache_ttl)
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server_pid = _fork(serve_metadata, socket_path, workers)
+    try:
+        _wait_for_socket(socket_path)
+        pool = eventlet.GreenPool(instances)
+        start = time.time()
+        for i in xrange(instances):
+            pool.spawn_n(boot_instance, socket_path,
+                         '10.0.%d.%d' % (i >> 8, i & 255))
+        pool.waitall()
+        elapsed = time.time() - start
+    finally:
+        _stop(server_pid)
+    return instances * len(CLOUD_INIT_PATHS) / elapsed
+
+
+def main(argv):
+    eventlet.monkey_patch()
+    instances = int(argv[1]) if len(argv) > 1 else 200
+    workers = int(argv[2]) if len(argv) > 2 else 4
+    cfg.CONF.register_opts(agent.MetadataProxyHandler.OPTS)
+    cfg.CONF(args=[], project='neutron')
+    nova_sock = eventlet.listen(('127.0.0.1', 0))
+    cfg.CONF.set_override('nova_metadata_ip', '127.0.0.1')
+    cfg.CONF.set_override('nova_metadata_port', nova_sock.getsockname()[1])
+    nova_pid = _fork(serve_nova, nova_sock)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        socket_path = os.path.join(tmpdir, 'metadata_proxy')
+        for cache_ttl in (0, 5):
+            for server_workers in (0, workers):
+                rate = run(socket_path, instances, server_workers, cache_ttl)
+                print('%5d instances  workers=%d  cache_ttl=%d %10.1f '
+                      'requests/s' % (instances, server_workers, cache_ttl,
+                                      rate))
+    finally:
+        _stop(nova_pid)
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
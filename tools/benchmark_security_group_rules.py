@@ -0,0 +1,136 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure security_group_rules_for_devices against a large group.
+
+Usage: python tools/benchmark_security_group_rules.py [ports] [sql_connection]
+
+All the ports are members of a "default" style group whose ingress rule
+references the group itself, and an agent asks for the rules of 20 of
+them, as it does after each member update. The default database is an
+in-memory sqlite database.
+"""
+
+import sys
+import time
+
+import netaddr
+from oslo.config import cfg
+
+from neutron.common import config  # noqa
+from neutron import context
+from neutron.db import api as db
+from neutron.db import models_v2
+from neutron.db import securitygroups_db as sg_db
+from neutron.db import securitygroups_rpc_base as sg_db_rpc
+from neutron.openstack.common import uuidutils
+
+AGENT_PORTS = 20
+REQUESTS = 20
+
+
+class BenchmarkCallbacks(sg_db_rpc.SecurityGroupServerRpcCallbackMixin):
+
+    def __init__(self, ports):
+        self.ports = ports
+
+    def get_port_from_device(self, device):
+        port = self.ports[device]
+        return {'id': port.id,
+                'network_id': port.network_id,
+                'device_owner': port.device_owner,
+                'fixed_ips': [ip.ip_address for ip in port.fixed_ips],
+                'security_group_rules': [],
+                'security_group_source_groups': []}
+
+
+def _create_ports(ctx, count):
+    session = ctx.session
+    with session.begin(subtransactions=True):
+        network = models_v2.Network(id=uuidutils.generate_uuid(),
+                                    name='bench', tenant_id='bench',
+                                    admin_state_up=True, status='ACTIVE',
+                                    shared=False)
+        subnet = models_v2.Subnet(id=uuidutils.generate_uuid(),
+                                  network_id=network.id, tenant_id='bench',
+                                  ip_version=4, cidr='10.0.0.0/16',
+                                  enable_dhcp=False, shared=False)
+        group = sg_db.SecurityGroup(id=uuidutils.generate_uuid(),
+                                    name='default', tenant_id='bench')
+        session.add_all([network, subnet, group])
+        session.add_all(
+            sg_db.SecurityGroupRule(id=uuidutils.generate_uuid(),
+                                    tenant_id='bench',
+                                    security_group_id=group.id,
+                                    remote_group_id=remote_group_id,
+                                    direction=direction, ethertype='IPv4')
+            for direction, remote_group_id in (('ingress', group.id),
+                                               ('egress', None)))
+        ports = {}
+        first_ip = netaddr.IPAddress('10.0.0.2')
+        for i in xrange(count):
+            mac = 'fa:16:3e:%02x:%02x:%02x' % (i >> 16, (i >> 8) & 255,
+                                               i & 255)
+            port = models_v2.Port(id=uuidutils.generate_uuid(),
+                                  network_id=network.id, tenant_id='bench',
+                                  name='', mac_address=mac,
+                                  admin_state_up=True, status='ACTIVE',
+                                  device_id='vm%d' % i,
+                                  device_owner='compute:nova')
+            port.fixed_ips = [models_v2.IPAllocation(
+                port_id=port.id, subnet_id=subnet.id, network_id=network.id,
+                ip_address=str(first_ip + i))]
+            session.add(port)
+            session.add(sg_db.SecurityGroupPortBinding(
+                port_id=port.id, security_group_id=group.id))
+            ports[port.id] = port
+    return ports
+
+
+def run(ports, cache_ttl):
+    cfg.CONF.set_override('security_group_cache_ttl', cache_ttl)
+    sg_db_rpc.SECURITY_GROUP_CACHE.clear()
+    ctx = context.get_admin_context()
+    callbacks = BenchmarkCallbacks(ports)
+    devices = list(ports)[:AGENT_PORTS]
+    rules = 0
+    start = time.time()
+    for i in xrange(REQUESTS):
+        result = callbacks.security_group_rules_for_devices(ctx,
+                                                            devices=devices)
+        rules = sum(len(port['security_group_rules'])
+                    for port in result.values())
+    elapsed = time.time() - start
+    return REQUESTS / elapsed, rules
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 1000
+    if len(argv) > 2:
+        cfg.CONF.set_override('connection', argv[2], 'database')
+    cfg.CONF(args=[], project='neutron')
+    db.configure_db()
+    ports = _create_ports(context.get_admin_context(), count)
+    for cache_ttl in (0, 60):
+        rate, rules = run(ports, cache_ttl)
+        print('%5d members  cache_ttl=%-3d %8.1f requests/s  %d rules' %
+              (count, cache_ttl, rate, rules))
+    db.clear_db()
+
+
+if __name__ == '__main__':
+    main(sys.argv)